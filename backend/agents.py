@@ -11,6 +11,7 @@ from groq import RateLimitError
 
 # Import observability components
 from logging_config import get_ai_logger
+from rewards import GOAL_WEIGHTS, DEFAULT_GOAL, POINT_VALUE
 from metrics import track_ai_request, track_recommendation
 
 logger = get_ai_logger()
@@ -230,7 +231,7 @@ Card: {card['card_name']} ({card['issuer']})
         # Calculate raw values
         cash_back = amount * cash_back_rate
         points = amount * points_mult
-        points_value = points * 0.015  # 1 point = $0.015
+        points_value = points * POINT_VALUE  # 1 point = $0.015
 
         # Calculate category-relevant benefits value
         # Benefits should only contribute if they're relevant to the category
@@ -264,23 +265,11 @@ Card: {card['card_name']} ({card['issuer']})
         other_benefits_value = (benefits_count - relevant_benefits) * 0.01  # $0.01 per irrelevant benefit
         benefits_value = relevant_benefits_value + other_benefits_value
 
-        # Define weights based on optimization goal
-        # Strong differentiation to ensure goal drives card selection
-        if goal == "cash_back":
-            # Heavily favor cash back cards, almost ignore points
-            weights = {"cash": 1.0, "points": 0.05, "benefits": 0.2}
-        elif goal == "travel_points":
-            # Heavily favor points cards, almost ignore cash back
-            weights = {"cash": 0.05, "points": 1.0, "benefits": 0.2}
-        elif goal == "specific_discounts":
-            # Focus on benefits/discounts
-            weights = {"cash": 0.3, "points": 0.3, "benefits": 1.5}
-        elif goal == "balanced":
-            # Equal weight to both cash and points
-            weights = {"cash": 0.5, "points": 0.5, "benefits": 0.2}
-        else:
+        # Define weights based on optimization goal (shared with SQL-side ranking)
+        weights = GOAL_WEIGHTS.get(goal)
+        if weights is None:
             # Default to balanced
-            weights = {"cash": 0.5, "points": 0.5, "benefits": 0.2}
+            weights = GOAL_WEIGHTS[DEFAULT_GOAL]
             logger.warning(f"Unknown optimization goal: {goal}, using balanced weights")
 
         # Calculate weighted total value
@@ -673,7 +662,7 @@ Rank #{i}: {card['card_name']} ({card['issuer']})
             
             cash_back = transaction_data['amount'] * cash_back_rate
             points = transaction_data['amount'] * points_mult
-            value = cash_back + (points * 0.015)
+            value = cash_back + (points * POINT_VALUE)
             
             alternatives.append({
                 "card_id": card['card_id'],
@@ -703,7 +692,7 @@ Rank #{i}: {card['card_name']} ({card['issuer']})
             
             cash_back = amount * cash_back_rate
             points = amount * points_mult
-            value = cash_back + (points * 0.015)  # 1 point = $0.015
+            value = cash_back + (points * POINT_VALUE)  # 1 point = $0.015
             
             card_values.append({
                 "card": card,
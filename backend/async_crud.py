@@ -0,0 +1,254 @@
+"""
+Async CRUD Operations
+Awaitable variants of the hot-path operations in crud.py for use with
+database.get_async_db, so request handlers don't block the event loop on queries.
+
+Simple lookups are written natively against AsyncSession. Heavier operations
+(writes that maintain rollups, analytics aggregates) reuse the sync implementations
+in crud.py through AsyncSession.run_sync, which runs them on the async connection
+without blocking the loop and keeps a single source of truth for the logic.
+
+Lazy relationship loads don't work on an AsyncSession, so every function here
+returns objects with the relationships its callers read already loaded.
+"""
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from typing import List, Optional, Dict, Tuple, Iterable
+from datetime import datetime
+
+import crud
+from cache import cached
+from models import (
+    User, CreditCard, UserCreditCard, Transaction,
+    CategoryEnum
+)
+
+
+# ============================================================================
+# USER OPERATIONS
+# ============================================================================
+
+@cached(tags=lambda user, user_id: [f"user:{user_id}"])
+async def get_user(db: AsyncSession, user_id: str) -> Optional[User]:
+    """Get user by ID"""
+    result = await db.execute(crud.USER_BY_ID, {"user_id": user_id})
+    return result.scalars().first()
+
+
+# ============================================================================
+# CREDIT CARD OPERATIONS
+# ============================================================================
+
+async def get_card(db: AsyncSession, card_id: str) -> Optional[CreditCard]:
+    """Get a specific credit card"""
+    result = await db.execute(crud.CARD_BY_ID, {"card_id": card_id})
+    return result.scalars().first()
+
+
+async def get_card_names(db: AsyncSession, card_ids: Iterable[Optional[str]]) -> Dict[str, str]:
+    """
+    Resolve card names for a set of card IDs in one query.
+
+    Args:
+        db: Async database session
+        card_ids: Card IDs (None entries are ignored)
+
+    Returns:
+        Dictionary of card_id -> card_name for the cards that exist
+    """
+    ids = {card_id for card_id in card_ids if card_id}
+    if not ids:
+        return {}
+    result = await db.execute(
+        select(CreditCard.card_id, CreditCard.card_name).where(CreditCard.card_id.in_(ids))
+    )
+    return {card_id: card_name for card_id, card_name in result.all()}
+
+
+# ============================================================================
+# USER CREDIT CARD OPERATIONS (Wallet Management)
+# ============================================================================
+
+async def get_user_credit_card(
+    db: AsyncSession,
+    user_card_id: int,
+    user_id: Optional[str] = None
+) -> Optional[UserCreditCard]:
+    """Get a specific user credit card by ID, with its library card loaded (see crud.get_user_credit_card)"""
+    result = await db.execute(
+        select(UserCreditCard)
+        .options(selectinload(UserCreditCard.credit_card))
+        .where(crud._user_card_filter(user_card_id, user_id))
+        .limit(1)
+    )
+    return result.scalars().first()
+
+
+@cached(tags=lambda cards, user_id, active_only: [f"wallet:{user_id}"] + [f"card:{card['card_id']}" for card in cards])
+async def get_user_cards_with_details(
+    db: AsyncSession,
+    user_id: str,
+    active_only: bool = True
+) -> List[Dict]:
+    """
+    Get user's credit cards with full card library details.
+
+    Args:
+        db: Async database session
+        user_id: User ID
+        active_only: Only return active cards
+
+    Returns:
+        List of dictionaries with combined UserCreditCard and CreditCard data
+        (same shape as crud.get_user_cards_with_details)
+    """
+    query = (
+        select(UserCreditCard, CreditCard)
+        .join(CreditCard, UserCreditCard.card_id == CreditCard.card_id)
+        .where(UserCreditCard.user_id == user_id)
+    )
+    if active_only:
+        query = query.where(UserCreditCard.is_active == True)
+
+    result = await db.execute(query.order_by(UserCreditCard.user_card_id))
+    return [
+        {
+            # User-specific data
+            "user_card_id": user_card.user_card_id,
+            "nickname": user_card.nickname,
+            "last_four_digits": user_card.last_four_digits,
+            "credit_limit": user_card.credit_limit,
+            "current_balance": user_card.current_balance,
+            "is_active": user_card.is_active,
+            "activation_date": user_card.activation_date,
+
+            # Card library data
+            "card_id": card.card_id,
+            "card_name": card.card_name,
+            "issuer": card.issuer.value,
+            "annual_fee": card.annual_fee,
+            "cash_back_rate": card.cash_back_rate,
+            "points_multiplier": card.points_multiplier,
+            "benefits": card.benefits,
+        }
+        for user_card, card in result.all()
+    ]
+
+
+def _with_credit_card(user_card: Optional[UserCreditCard]) -> Optional[UserCreditCard]:
+    """Load the library card while still inside the sync context"""
+    if user_card is not None:
+        user_card.credit_card
+    return user_card
+
+
+async def add_user_credit_card(
+    db: AsyncSession,
+    user_id: str,
+    card_id: str,
+    nickname: Optional[str] = None,
+    last_four_digits: Optional[str] = None,
+    credit_limit: Optional[float] = None
+) -> Optional[UserCreditCard]:
+    """Add a credit card from the library to a user's wallet (see crud.add_user_credit_card)"""
+    def _add(session):
+        return _with_credit_card(crud.add_user_credit_card(
+            session, user_id, card_id,
+            nickname=nickname,
+            last_four_digits=last_four_digits,
+            credit_limit=credit_limit
+        ))
+    return await db.run_sync(_add)
+
+
+async def update_user_credit_card(
+    db: AsyncSession,
+    user_card_id: int,
+    user_id: Optional[str] = None,
+    **kwargs
+) -> Optional[UserCreditCard]:
+    """Update a user's credit card information (see crud.update_user_credit_card)"""
+    def _update(session):
+        return _with_credit_card(crud.update_user_credit_card(session, user_card_id, user_id, **kwargs))
+    return await db.run_sync(_update)
+
+
+async def delete_user_credit_card(db: AsyncSession, user_card_id: int, user_id: Optional[str] = None) -> bool:
+    """Delete (remove) a credit card from user's wallet"""
+    return await db.run_sync(crud.delete_user_credit_card, user_card_id, user_id)
+
+
+async def deactivate_user_credit_card(db: AsyncSession, user_card_id: int, user_id: Optional[str] = None) -> bool:
+    """Deactivate a user's credit card (soft delete)"""
+    return await db.run_sync(crud.deactivate_user_credit_card, user_card_id, user_id)
+
+
+# ============================================================================
+# TRANSACTION OPERATIONS
+# ============================================================================
+
+async def create_transaction(db: AsyncSession, **kwargs) -> Transaction:
+    """Create a new transaction and update the daily rollups (see crud.create_transaction)"""
+    return await db.run_sync(lambda session: crud.create_transaction(session, **kwargs))
+
+
+async def bulk_create_transactions(db: AsyncSession, rows: List[Dict]) -> int:
+    """Insert a batch of transactions in one transaction (see crud.bulk_create_transactions)"""
+    return await db.run_sync(crud.bulk_create_transactions, rows)
+
+
+async def get_user_transactions_page(
+    db: AsyncSession,
+    user_id: str,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    category: Optional[CategoryEnum] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+) -> Tuple[List[Transaction], Optional[str]]:
+    """
+    Get one page of a user's transactions, newest first (see crud.get_user_transactions_page)
+
+    Each transaction's `card` relationship is loaded.
+
+    Raises:
+        ValueError: If the cursor is malformed or limit is out of range
+    """
+    def _page(session):
+        transactions, next_cursor = crud.get_user_transactions_page(
+            session, user_id,
+            limit=limit,
+            cursor=cursor,
+            category=category,
+            start_date=start_date,
+            end_date=end_date
+        )
+        for t in transactions:
+            t.card
+        return transactions, next_cursor
+    return await db.run_sync(_page)
+
+
+# ============================================================================
+# ANALYTICS OPERATIONS
+# ============================================================================
+
+async def get_user_analytics(db: AsyncSession, user_id: str, days: int = 30) -> Dict:
+    """Get comprehensive analytics for a user (see crud.get_user_analytics)"""
+    return await db.run_sync(crud.get_user_analytics, user_id, days=days)
+
+
+async def get_user_analytics_windows(db: AsyncSession, user_id: str, windows: List[int]) -> Dict[int, Dict]:
+    """Analytics for several windows in one pass (see crud.get_user_analytics_windows)"""
+    return await db.run_sync(crud.get_user_analytics_windows, user_id, windows)
+
+
+# ============================================================================
+# BUSINESS COUNTERS
+# ============================================================================
+
+async def get_business_counters(db: AsyncSession) -> Dict[str, int]:
+    """Current business counter values (see crud.get_business_counters)"""
+    return await db.run_sync(crud.get_business_counters)
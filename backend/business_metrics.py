@@ -0,0 +1,96 @@
+"""
+Business Metrics Refresher
+Keeps the business gauges (users_total, cards_registered_total,
+wallet_cards_total) and the per-category transactions_total counter in step
+with the business_counters table, which the crud writes increment in the same
+transaction as the rows they count. A refresh reads that small table instead of
+running COUNT(*) over users, cards and transactions.
+
+Refreshed at startup and then every BUSINESS_METRICS_REFRESH_SECONDS. With
+user shards, each database counts the rows it holds and the totals are summed.
+"""
+
+import asyncio
+import os
+from typing import Callable, Dict, List, Optional
+
+import async_crud
+from crud import USERS_COUNTER, CARDS_COUNTER, WALLET_CARDS_COUNTER, TRANSACTIONS_COUNTER_PREFIX
+from logging_config import get_logger
+from metrics import update_business_metrics, TRANSACTIONS_TOTAL
+
+logger = get_logger("business_metrics")
+
+REFRESH_SECONDS = float(os.getenv("BUSINESS_METRICS_REFRESH_SECONDS", "15"))
+
+
+class BusinessMetricsRefresher:
+    """Copies the business counters into the Prometheus metrics on an interval"""
+
+    def __init__(self, refresh_seconds: float = REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._session_factories: List[Callable] = []
+        self._task: Optional[asyncio.Task] = None
+        # Per-category transaction totals already added to the transactions_total counter
+        self._transactions_reported: Dict[str, int] = {}
+
+    def update(self, counters: Dict[str, int]) -> None:
+        """Set the gauges from counter values, and advance transactions_total to the new totals"""
+        update_business_metrics(
+            users=counters.get(USERS_COUNTER, 0),
+            cards=counters.get(CARDS_COUNTER, 0),
+            wallet_cards=counters.get(WALLET_CARDS_COUNTER, 0)
+        )
+        for name, total in counters.items():
+            if not name.startswith(TRANSACTIONS_COUNTER_PREFIX):
+                continue
+            category = name[len(TRANSACTIONS_COUNTER_PREFIX):]
+            # Counters only go up; a lower total (e.g. after a recount) is caught up to later
+            delta = total - self._transactions_reported.get(category, 0)
+            if delta > 0:
+                TRANSACTIONS_TOTAL.labels(category=category).inc(delta)
+                self._transactions_reported[category] = total
+
+    async def refresh(self) -> Dict[str, int]:
+        """Read the counters (summed over every database) and update the metrics"""
+        counters: Dict[str, int] = {}
+        for session_factory in self._session_factories:
+            async with session_factory() as session:
+                for name, value in (await async_crud.get_business_counters(session)).items():
+                    counters[name] = counters.get(name, 0) + value
+        self.update(counters)
+        return counters
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning(f"Could not refresh business metrics: {e}")
+
+    def start(self, *session_factories: Callable) -> None:
+        """
+        Start refreshing in the background
+
+        Args:
+            session_factories: Each returns a new AsyncSession on one database
+                (database.get_async_session, plus the shards' session factories)
+        """
+        self._session_factories = list(session_factories)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background refresh"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Global refresher instance
+business_metrics = BusinessMetricsRefresher()
@@ -0,0 +1,497 @@
+"""
+Read-Through Cache for crud Reads
+Keeps the results of selected crud read functions in memory so repeated
+lookups (user existence, wallet details, card library, automation rules)
+don't go to the database on every request.
+
+- Entries are tagged (user:{id}, wallet:{id}, card:{id}, rules:{id}, library)
+  and dropped when a session that wrote a tracked model commits
+- Bounded LRU (READ_CACHE_MAX_ENTRIES) with a TTL (READ_CACHE_TTL_SECONDS)
+  that also bounds staleness from other workers' writes, should their
+  invalidations (invalidation.py) be missed
+- Committed tags are handed to publishers (add_publisher) so other workers
+  can drop them too
+- Concurrent misses for the same key wait for one load instead of all
+  querying (stampede protection)
+- Hit / miss / bypass counts per function (Prometheus and stats())
+
+ORM instances are cached as column snapshots and merged into the caller's
+session on a hit (Session.merge(load=False)), so callers get session-bound
+objects exactly as from a query. Sessions with uncommitted writes bypass the
+cache, and replica sessions read from it but never fill it.
+"""
+
+import asyncio
+import copy
+import functools
+import inspect
+import os
+import threading
+import time
+from collections import OrderedDict
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Set, Tuple
+
+from sqlalchemy import event
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.exc import NoInspectionAvailable
+from sqlalchemy.orm import Session, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+
+from logging_config import get_logger
+from metrics import (
+    READ_CACHE_REQUESTS_TOTAL,
+    READ_CACHE_INVALIDATIONS_TOTAL,
+    READ_CACHE_EVICTIONS_TOTAL,
+    READ_CACHE_ENTRIES
+)
+
+logger = get_logger(__name__)
+
+CACHE_ENABLED = os.getenv("READ_CACHE_ENABLED", "true").lower() == "true"
+MAX_ENTRIES = int(os.getenv("READ_CACHE_MAX_ENTRIES", "10000"))
+TTL_SECONDS = float(os.getenv("READ_CACHE_TTL_SECONDS", "60"))
+
+# How long a caller waits for another caller's in-flight load of the same key
+LOAD_WAIT_SECONDS = 5.0
+
+# Session.info keys
+PENDING_TAGS = "read_cache_pending_tags"
+REPLICA = "replica"
+
+# Tag that drops every entry (writes whose affected rows can't be determined)
+ALL = "*"
+
+# Tag of merchant writes: no cached crud reads, but other workers reset their
+# in-memory merchant index (merchant_index.py) when it arrives
+MERCHANTS = "merchants"
+
+# Execution option for ORM UPDATE / DELETE ... RETURNING statements whose caller
+# tags the returned rows itself (ReadCache.mark_written) instead of dropping ALL
+TAGGED_BY_CALLER = "read_cache_tagged_by_caller"
+
+
+class _Uncacheable(Exception):
+    """Raised while freezing a result that can't be snapshotted"""
+
+
+class _Row:
+    """Column values of an ORM instance, cached instead of the session-bound instance"""
+    __slots__ = ("cls", "values")
+
+    def __init__(self, cls, values: Dict[str, Any]):
+        self.cls = cls
+        self.values = values
+
+
+def _freeze(value):
+    """Deep-copy a result into cacheable form (ORM instances become _Row snapshots)"""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, list):
+        return [_freeze(item) for item in value]
+    if isinstance(value, tuple):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return {key: _freeze(item) for key, item in value.items()}
+    try:
+        state = sa_inspect(value)
+    except NoInspectionAvailable:
+        return copy.deepcopy(value)
+    if not getattr(state, "persistent", False) or state.modified:
+        raise _Uncacheable(f"{type(value).__name__} is not a clean persistent instance")
+    keys = [prop.key for prop in state.mapper.column_attrs]
+    if any(key not in state.dict for key in keys):
+        raise _Uncacheable(f"{type(value).__name__} has unloaded columns")
+    return _Row(state.mapper.class_, {key: copy.deepcopy(state.dict[key]) for key in keys})
+
+
+def _thaw(value, session: Session):
+    """Rebuild a frozen result for `session` (fresh containers, session-bound instances)"""
+    if isinstance(value, list):
+        return [_thaw(item, session) for item in value]
+    if isinstance(value, tuple):
+        return tuple(_thaw(item, session) for item in value)
+    if isinstance(value, dict):
+        return {key: _thaw(item, session) for key, item in value.items()}
+    if isinstance(value, _Row):
+        instance = sa_inspect(value.cls).class_manager.new_instance()
+        for key, column_value in value.values.items():
+            set_committed_value(instance, key, copy.deepcopy(column_value))
+        make_transient_to_detached(instance)
+        return session.merge(instance, load=False)
+    return value
+
+
+class _Entry:
+    __slots__ = ("value", "tags", "expires_at")
+
+    def __init__(self, value, tags: Set[str], expires_at: float):
+        self.value = value
+        self.tags = tags
+        self.expires_at = expires_at
+
+
+class _Flight:
+    """An in-progress load that concurrent callers for the same key can wait on"""
+    __slots__ = ("done", "thread_id", "generation")
+
+    def __init__(self, generation: int):
+        self.done = threading.Event()
+        self.thread_id = threading.get_ident()
+        self.generation = generation
+
+
+class ReadCache:
+    """Tagged LRU cache with TTL, stampede protection and commit-time invalidation"""
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, ttl_seconds: float = TTL_SECONDS, enabled: bool = CACHE_ENABLED):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._tag_keys: Dict[str, Set[Hashable]] = {}
+        self._flights: Dict[Hashable, _Flight] = {}
+        # Invalidation counter, and the last value at which each tag was invalidated,
+        # so a load that overlapped a commit doesn't store what it read before it
+        self._generation = 0
+        self._invalidated_at: Dict[str, int] = {}
+        self._model_tags: Dict[type, Callable] = {}
+        self._publishers: List[Callable[[Set[str]], None]] = []
+        self._counts: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Entries
+    # ------------------------------------------------------------------
+
+    def _lookup(self, key) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            if entry.expires_at <= time.monotonic():
+                self._remove(key)
+                return False, None
+            self._entries.move_to_end(key)
+            return True, entry.value
+
+    def _remove(self, key) -> None:
+        """Drop one entry and its tag references (lock held)"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry.tags:
+            keys = self._tag_keys.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tag_keys[tag]
+
+    def _store(self, key, value, tags: Set[str], flight: _Flight) -> None:
+        with self._lock:
+            # A commit touched one of these tags while we were loading
+            if any(self._invalidated_at.get(tag, -1) > flight.generation for tag in tags | {ALL}):
+                return
+            self._remove(key)
+            self._entries[key] = _Entry(value, tags, time.monotonic() + self.ttl_seconds)
+            for tag in tags:
+                self._tag_keys.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                READ_CACHE_EVICTIONS_TOTAL.inc()
+            READ_CACHE_ENTRIES.set(len(self._entries))
+
+    def _begin(self, key) -> Tuple[_Flight, bool]:
+        """Join the in-flight load of key, or start one (returns (flight, is_leader))"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                return flight, False
+            flight = self._flights[key] = _Flight(self._generation)
+            return flight, True
+
+    def _end(self, key, flight: _Flight) -> None:
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            if not self._flights:
+                self._invalidated_at.clear()
+        flight.done.set()
+
+    def invalidate(self, tags: Iterable[str]) -> int:
+        """
+        Drop every entry carrying any of the tags
+
+        Args:
+            tags: Tags to invalidate (ALL drops everything)
+
+        Returns:
+            Number of entries dropped
+        """
+        tags = set(tags)
+        if not tags:
+            return 0
+        dropped = 0
+        with self._lock:
+            self._generation += 1
+            for tag in tags:
+                self._invalidated_at[tag] = self._generation
+            if ALL in tags:
+                dropped = len(self._entries)
+                self._entries.clear()
+                self._tag_keys.clear()
+                READ_CACHE_INVALIDATIONS_TOTAL.labels(tag=ALL).inc(dropped)
+            else:
+                for tag in tags:
+                    keys = list(self._tag_keys.get(tag, ()))
+                    for key in keys:
+                        self._remove(key)
+                    if keys:
+                        READ_CACHE_INVALIDATIONS_TOTAL.labels(tag=tag.split(":", 1)[0]).inc(len(keys))
+                    dropped += len(keys)
+            READ_CACHE_ENTRIES.set(len(self._entries))
+        return dropped
+
+    def add_publisher(self, publisher: Callable[[Set[str]], None]) -> None:
+        """Also pass the tags of every committed write to publisher (cross-worker invalidation)"""
+        if publisher not in self._publishers:
+            self._publishers.append(publisher)
+
+    def remove_publisher(self, publisher: Callable[[Set[str]], None]) -> None:
+        """Stop passing committed tags to publisher"""
+        if publisher in self._publishers:
+            self._publishers.remove(publisher)
+
+    def committed(self, tags: Set[str]) -> None:
+        """Invalidate the tags of a committed write here, and hand them to the publishers"""
+        self.invalidate(tags)
+        for publisher in list(self._publishers):
+            try:
+                publisher(tags)
+            except Exception as e:
+                logger.warning(f"Could not publish cache invalidation: {e}")
+
+    def clear(self) -> None:
+        """Drop all entries and reset the per-function counts"""
+        with self._lock:
+            self._entries.clear()
+            self._tag_keys.clear()
+            self._counts.clear()
+            READ_CACHE_ENTRIES.set(0)
+
+    # ------------------------------------------------------------------
+    # Stats
+    # ------------------------------------------------------------------
+
+    def _count(self, function: str, result: str) -> None:
+        READ_CACHE_REQUESTS_TOTAL.labels(function=function, result=result).inc()
+        with self._lock:
+            counts = self._counts.setdefault(function, {"hit": 0, "miss": 0, "bypass": 0})
+            counts[result] += 1
+
+    def stats(self) -> Dict:
+        """Entry count and hit / miss / bypass counts and hit rate per function"""
+        with self._lock:
+            functions = {}
+            for function, counts in self._counts.items():
+                lookups = counts["hit"] + counts["miss"]
+                functions[function] = {
+                    "hits": counts["hit"],
+                    "misses": counts["miss"],
+                    "bypassed": counts["bypass"],
+                    "hit_rate": round(counts["hit"] / lookups, 4) if lookups else None,
+                }
+            return {"enabled": self.enabled, "entries": len(self._entries), "functions": functions}
+
+    # ------------------------------------------------------------------
+    # Write tracking
+    # ------------------------------------------------------------------
+
+    def track(self, model: type, tags: Callable[[Any], Iterable[str]]) -> None:
+        """
+        Invalidate tags(instance) whenever a committed session wrote an instance of model
+
+        Args:
+            model: Mapped class
+            tags: Maps the loaded values of an instance (or a bulk-write parameter
+                row), as attributes, to its tags
+        """
+        self._model_tags[model] = tags
+
+    def _tags_of_instances(self, instances) -> Set[str]:
+        tags = set()
+        for instance in instances:
+            tag_fn = self._model_tags.get(type(instance))
+            if tag_fn is None:
+                continue
+            # Loaded values only: attribute access could reload an expired or deleted row
+            state = sa_inspect(instance)
+            try:
+                tags.update(tag_fn(SimpleNamespace(**state.dict)))
+            except AttributeError:
+                tags.add(ALL)
+        return tags
+
+    def _tags_of_bulk_write(self, model, parameters) -> Set[str]:
+        tag_fn = self._model_tags.get(model)
+        if tag_fn is None:
+            return set()
+        rows = parameters if isinstance(parameters, list) else [parameters]
+        if not rows or not all(isinstance(row, dict) and row for row in rows):
+            return {ALL}
+        try:
+            return {tag for row in rows for tag in tag_fn(SimpleNamespace(**row))}
+        except AttributeError:
+            return {ALL}
+
+    def mark_written(self, session: Session, instances: Iterable) -> None:
+        """Tag rows written by a TAGGED_BY_CALLER statement (dropped when the session commits)"""
+        tags = self._tags_of_instances(instances)
+        if tags:
+            session.info.setdefault(PENDING_TAGS, set()).update(tags)
+
+    def usable(self, session: Session) -> bool:
+        """The cache serves sessions with no uncommitted writes"""
+        return self.enabled and not (
+            session.new or session.dirty or session.deleted or session.info.get(PENDING_TAGS)
+        )
+
+    # ------------------------------------------------------------------
+    # Read-through
+    # ------------------------------------------------------------------
+
+    def _prepare(self, function: str, signature: inspect.Signature, db, args, kwargs):
+        """Resolve the session and cache key for a call (None key: bypass)"""
+        session = getattr(db, "sync_session", db)
+        if not self.usable(session):
+            return session, None, None
+        bound = signature.bind(db, *args, **kwargs)
+        bound.apply_defaults()
+        arguments = dict(list(bound.arguments.items())[1:])
+        key = (function, tuple(arguments.items()))
+        try:
+            hash(key)
+        except TypeError:
+            return session, None, None
+        return session, key, arguments
+
+    def _fill(self, key, result, session: Session, tags: Callable, arguments: Dict, flight: _Flight) -> None:
+        if session.info.get(REPLICA) or not self.usable(session):
+            return
+        try:
+            frozen = _freeze(result)
+        except _Uncacheable as e:
+            logger.debug("Result not cached", extra={'event': 'read_cache_skip', 'reason': str(e)})
+            return
+        self._store(key, frozen, set(tags(result, **arguments)), flight)
+
+    def cached(self, tags: Callable[..., Iterable[str]]):
+        """
+        Decorator: serve a crud read function (sync or async, session first) from the cache
+
+        Args:
+            tags: Called as tags(result, **arguments) to get the entry's tags
+
+        Returns:
+            The decorated function; calls with the same arguments share an entry
+            across the sync and async variants of a function with the same name
+        """
+        def decorator(fn):
+            function = fn.__name__
+            signature = inspect.signature(fn)
+
+            if asyncio.iscoroutinefunction(fn):
+                @functools.wraps(fn)
+                async def async_wrapper(db, *args, **kwargs):
+                    session, key, arguments = self._prepare(function, signature, db, args, kwargs)
+                    if key is None:
+                        self._count(function, "bypass")
+                        return await fn(db, *args, **kwargs)
+                    hit, value = self._lookup(key)
+                    if not hit:
+                        flight, leader = self._begin(key)
+                        if not leader:
+                            # Wait off the event loop so the leading coroutine can finish its load
+                            await asyncio.to_thread(flight.done.wait, LOAD_WAIT_SECONDS)
+                            hit, value = self._lookup(key)
+                    if hit:
+                        self._count(function, "hit")
+                        return _thaw(value, session)
+                    self._count(function, "miss")
+                    try:
+                        result = await fn(db, *args, **kwargs)
+                        if leader:
+                            self._fill(key, result, session, tags, arguments, flight)
+                        return result
+                    finally:
+                        if leader:
+                            self._end(key, flight)
+                return async_wrapper
+
+            @functools.wraps(fn)
+            def wrapper(db, *args, **kwargs):
+                session, key, arguments = self._prepare(function, signature, db, args, kwargs)
+                if key is None:
+                    self._count(function, "bypass")
+                    return fn(db, *args, **kwargs)
+                hit, value = self._lookup(key)
+                if not hit:
+                    flight, leader = self._begin(key)
+                    # A leader on this thread is suspended mid-load (async greenlet); don't block it
+                    if not leader and flight.thread_id != threading.get_ident():
+                        flight.done.wait(LOAD_WAIT_SECONDS)
+                        hit, value = self._lookup(key)
+                if hit:
+                    self._count(function, "hit")
+                    return _thaw(value, session)
+                self._count(function, "miss")
+                try:
+                    result = fn(db, *args, **kwargs)
+                    if leader:
+                        self._fill(key, result, session, tags, arguments, flight)
+                    return result
+                finally:
+                    if leader:
+                        self._end(key, flight)
+            return wrapper
+        return decorator
+
+
+read_cache = ReadCache()
+cached = read_cache.cached
+
+
+# ============================================================================
+# SESSION EVENTS (all sessions: primary, replica, test and async sync_session)
+# ============================================================================
+
+@event.listens_for(Session, "after_flush")
+def _collect_flushed_tags(session, flush_context):
+    tags = read_cache._tags_of_instances(list(session.new) + list(session.dirty) + list(session.deleted))
+    if tags:
+        session.info.setdefault(PENDING_TAGS, set()).update(tags)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk_write_tags(orm_execute_state):
+    # Bulk / Core-style ORM writes, e.g. session.execute(insert(CreditCard), rows)
+    if orm_execute_state.is_select or orm_execute_state.bind_mapper is None:
+        return
+    if orm_execute_state.execution_options.get(TAGGED_BY_CALLER):
+        return
+    tags = read_cache._tags_of_bulk_write(orm_execute_state.bind_mapper.class_, orm_execute_state.parameters)
+    if tags:
+        orm_execute_state.session.info.setdefault(PENDING_TAGS, set()).update(tags)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_tags(session):
+    tags = session.info.pop(PENDING_TAGS, None)
+    if tags:
+        read_cache.committed(tags)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_tags(session):
+    session.info.pop(PENDING_TAGS, None)
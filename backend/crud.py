@@ -3,21 +3,109 @@ CRUD Operations for all database models
 Centralized database operations for the Credit Card Rewards Maximizer
 """
 
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func, desc
-from typing import List, Optional, Dict
-from datetime import datetime, timedelta
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import (
+    and_, or_, func, desc, select, delete, insert, update, case, cast, extract, literal, tuple_,
+    bindparam, exists, true, type_coerce, Integer, DateTime
+)
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.dialects.postgresql import JSONB
+from typing import List, Optional, Dict, Tuple
+from collections import namedtuple
+from datetime import datetime, timedelta, date, time
 import uuid
 import json
 import os
-
+import base64
+import hashlib
+import random
+
+from cache import read_cache, cached, TAGGED_BY_CALLER, MERCHANTS
+from merchant_index import merchant_index
+from transaction_archive import transaction_archive
+from partitions import is_partitioned, list_partitions, partition_month
+from rewards import GOAL_WEIGHTS, DEFAULT_GOAL, POINT_VALUE
 from models import (
-    User, CreditCard, UserCreditCard, CardBenefit, Transaction, TransactionFeedback,
-    UserBehavior, AutomationRule, Merchant, Offer, AIModelMetrics,
-    OptimizationGoalEnum, CategoryEnum, CardIssuerEnum
+    User, CreditCard, CardRewardRate, UserCreditCard, CardBenefit, Transaction, TransactionFeedback,
+    UserBehavior, UserBehaviorDay, UserDailyRollup, AutomationRule, Merchant, Offer, AIModelMetrics,
+    SeedChecksum, BusinessCounter, OptimizationGoalEnum, CategoryEnum, CardIssuerEnum
 )
 
 
+# ============================================================================
+# PREBUILT STATEMENTS (hot lookups)
+# ============================================================================
+# Built once at import with bound parameters instead of a new Query per call.
+# Executing the same statement object skips Query construction, and its SQL
+# compiles once and is then served from the engine's compiled cache.
+
+USER_BY_ID = select(User).where(User.user_id == bindparam("user_id")).limit(1)
+
+CARD_BY_ID = select(CreditCard).where(CreditCard.card_id == bindparam("card_id")).limit(1)
+
+USER_CREDIT_CARDS = select(UserCreditCard).where(UserCreditCard.user_id == bindparam("user_id"))
+
+# is_active stays a literal so the planner can match idx_user_card_user_active
+ACTIVE_USER_CREDIT_CARDS = USER_CREDIT_CARDS.where(UserCreditCard.is_active == True)
+
+USER_BEHAVIOR_BY_USER = select(UserBehavior).where(UserBehavior.user_id == bindparam("user_id")).limit(1)
+
+USER_BEHAVIOR_FOR_UPDATE = USER_BEHAVIOR_BY_USER.with_for_update()
+
+
+# ============================================================================
+# READ CACHE TAGS (invalidated when a session that wrote these models commits)
+# ============================================================================
+
+read_cache.track(User, lambda user: [f"user:{user.user_id}", f"wallet:{user.user_id}", f"rules:{user.user_id}"])
+read_cache.track(UserCreditCard, lambda user_card: [f"wallet:{user_card.user_id}"])
+read_cache.track(CreditCard, lambda card: [f"card:{card.card_id}", "library"])
+read_cache.track(AutomationRule, lambda rule: [f"rules:{rule.user_id}"])
+read_cache.track(Merchant, lambda merchant: [MERCHANTS])
+
+
+# ============================================================================
+# SINGLE-STATEMENT WRITES
+# ============================================================================
+# Sessions don't expire on commit, so created rows are returned as built (no
+# refresh), and updates are one UPDATE ... RETURNING instead of a SELECT, an
+# UPDATE and a refresh.
+
+def _column_values(model, values: Dict) -> Dict:
+    """The entries of values that name a column of model (other keys are ignored)"""
+    columns = model.__mapper__.column_attrs.keys()
+    return {key: value for key, value in values.items() if key in columns}
+
+
+def _update_returning(db: Session, model, criteria, values: Dict):
+    """
+    UPDATE model SET values WHERE criteria RETURNING the row, without committing.
+
+    Returns:
+        The updated instance (the session's copy, refreshed from RETURNING),
+        or None when no row matched
+    """
+    instance = db.execute(
+        update(model).where(criteria).values(**values).returning(model),
+        execution_options={TAGGED_BY_CALLER: True}
+    ).scalars().first()
+    if instance is not None:
+        read_cache.mark_written(db, [instance])
+    return instance
+
+
+def _delete_returning(db: Session, model, criteria):
+    """DELETE FROM model WHERE criteria RETURNING the row, without committing (None when no row matched)"""
+    instance = db.execute(
+        delete(model).where(criteria).returning(model),
+        execution_options={TAGGED_BY_CALLER: True}
+    ).scalars().first()
+    if instance is not None:
+        read_cache.mark_written(db, [instance])
+    return instance
+
+
 # ============================================================================
 # USER OPERATIONS
 # ============================================================================
@@ -28,30 +116,36 @@ def create_user(
     full_name: str,
     password_hash: str,
     phone: Optional[str] = None,
-    default_optimization_goal: OptimizationGoalEnum = OptimizationGoalEnum.BALANCED
+    default_optimization_goal: OptimizationGoalEnum = OptimizationGoalEnum.BALANCED,
+    user_id: Optional[str] = None
 ) -> User:
-    """Create a new user"""
+    """
+    Create a new user and their (empty) behavior profile in one commit
+
+    user_id is generated unless given (sharded signup picks it first, since
+    it decides the user's shard).
+
+    Raises:
+        IntegrityError: The email is already registered (the caller rolls back)
+    """
     user = User(
-        user_id=f"user_{uuid.uuid4().hex[:12]}",
+        user_id=user_id or f"user_{uuid.uuid4().hex[:12]}",
         email=email,
         password_hash=password_hash,
         full_name=full_name,
         phone=phone,
         default_optimization_goal=default_optimization_goal
     )
-    db.add(user)
+    db.add_all([user, _new_user_behavior(user.user_id)])
+    increment_business_counters(db, {USERS_COUNTER: 1})
     db.commit()
-    db.refresh(user)
-
-    # Initialize user behavior
-    create_user_behavior(db, user.user_id)
-
     return user
 
 
+@cached(tags=lambda user, user_id: [f"user:{user_id}"])
 def get_user(db: Session, user_id: str) -> Optional[User]:
     """Get user by ID"""
-    return db.query(User).filter(User.user_id == user_id).first()
+    return db.execute(USER_BY_ID, {"user_id": user_id}).scalars().first()
 
 
 def get_user_by_email(db: Session, email: str) -> Optional[User]:
@@ -61,16 +155,12 @@ def get_user_by_email(db: Session, email: str) -> Optional[User]:
 
 def update_user(db: Session, user_id: str, **kwargs) -> Optional[User]:
     """Update user information"""
-    user = get_user(db, user_id)
-    if not user:
-        return None
-    
-    for key, value in kwargs.items():
-        if hasattr(user, key):
-            setattr(user, key, value)
-    
+    values = _column_values(User, kwargs)
+    if not values:
+        return get_user(db, user_id)
+
+    user = _update_returning(db, User, User.user_id == user_id, values)
     db.commit()
-    db.refresh(user)
     return user
 
 
@@ -102,8 +192,10 @@ def create_credit_card(
         **kwargs
     )
     db.add(card)
+    db.flush()
+    sync_card_reward_rates(db, [card])
+    increment_business_counters(db, {CARDS_COUNTER: 1})
     db.commit()
-    db.refresh(card)
     return card
 
 
@@ -119,48 +211,159 @@ def get_user_cards(
     return query.all()
 
 
+@cached(tags=lambda card, card_id: [f"card:{card_id}"])
 def get_card(db: Session, card_id: str) -> Optional[CreditCard]:
     """Get a specific credit card"""
-    return db.query(CreditCard).filter(CreditCard.card_id == card_id).first()
+    return db.execute(CARD_BY_ID, {"card_id": card_id}).scalars().first()
+
+
+def _json_array_contains(db: Session, column, value):
+    """
+    Filter for rows whose JSON array column has value as an element.
+
+    PostgreSQL uses JSONB containment (@>), which the column's GIN index
+    answers; SQLite expands the array with json_each.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        return type_coerce(column, JSONB).contains([value])
+    elements = func.json_each(column).table_valued("value")
+    return exists(select(literal(1)).select_from(elements).where(elements.c.value == value))
+
+
+def _json_array_mentions(db: Session, column, text_value: str):
+    """
+    Filter for rows whose JSON array column has an element containing
+    text_value (case-insensitive substring).
+
+    PostgreSQL expands the array with jsonb_array_elements_text, SQLite with
+    json_each; neither can use the column's GIN index, so this suits small
+    tables like the card library.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        elements = func.jsonb_array_elements_text(type_coerce(column, JSONB)).table_valued("value")
+    else:
+        elements = func.json_each(column).table_valued("value")
+    pattern = f"%{_escape_like(text_value)}%"
+    return exists(select(literal(1)).select_from(elements).where(elements.c.value.ilike(pattern, escape="\\")))
+
+
+@cached(tags=lambda cards, **filters: ["library"])
+def get_card_library(
+    db: Session,
+    issuer: Optional[str] = None,
+    min_fee: Optional[float] = None,
+    max_fee: Optional[float] = None,
+    benefit: Optional[str] = None,
+    category: Optional[str] = None,
+    min_points_multiplier: Optional[float] = None,
+    min_cash_back_rate: Optional[float] = None,
+    limit: int = 100
+) -> List[Dict]:
+    """
+    Get cards from the library, optionally filtered by issuer, annual fee,
+    benefit and reward rate.
+
+    Reward rate minimums apply to the given category, falling back to the
+    card's "other" rate like the reward lookup does, and are read from the
+    normalized card_reward_rates rows.
+
+    Args:
+        db: Database session
+        issuer: Issuer name (unknown issuers are ignored)
+        min_fee: Minimum annual fee
+        max_fee: Maximum annual fee
+        benefit: Text one of the card's benefits must mention (case-insensitive)
+        category: Category key for the reward rate minimums (default "other")
+        min_points_multiplier: Minimum points multiplier in the category
+        min_cash_back_rate: Minimum cash back rate in the category
+        limit: Maximum number of cards
+
+    Returns:
+        List of card dictionaries
+    """
+    query = db.query(CreditCard)
+
+    filters = []
+    if issuer:
+        try:
+            filters.append(CreditCard.issuer == CardIssuerEnum(issuer))
+        except ValueError:
+            pass
+    if min_fee is not None:
+        filters.append(CreditCard.annual_fee >= min_fee)
+    if max_fee is not None:
+        filters.append(CreditCard.annual_fee <= max_fee)
+    if benefit:
+        filters.append(_json_array_mentions(db, CreditCard.benefits, benefit))
+    if min_points_multiplier is not None or min_cash_back_rate is not None:
+        category_key = category.value if isinstance(category, CategoryEnum) else (category or "other").lower()
+        rate = aliased(CardRewardRate)
+        other = aliased(CardRewardRate)
+        query = query.outerjoin(
+            rate, and_(rate.card_id == CreditCard.card_id, rate.category == category_key)
+        ).outerjoin(
+            other, and_(other.card_id == CreditCard.card_id, other.category == "other")
+        )
+        if min_points_multiplier is not None:
+            filters.append(func.coalesce(rate.points_multiplier, other.points_multiplier, 0.0) >= min_points_multiplier)
+        if min_cash_back_rate is not None:
+            filters.append(func.coalesce(rate.cash_back_rate, other.cash_back_rate, 0.0) >= min_cash_back_rate)
+    if filters:
+        query = query.filter(and_(*filters))
+
+    return [
+        {
+            "card_id": card.card_id,
+            "card_name": card.card_name,
+            "issuer": card.issuer.value,
+            "cash_back_rate": card.cash_back_rate,
+            "points_multiplier": card.points_multiplier,
+            "annual_fee": card.annual_fee,
+            "benefits": card.benefits or [],
+            "is_active": card.is_active,
+        }
+        for card in query.limit(limit).all()
+    ]
 
 
 def update_card(db: Session, card_id: str, **kwargs) -> Optional[CreditCard]:
     """Update credit card information"""
-    card = get_card(db, card_id)
-    if not card:
+    values = _column_values(CreditCard, kwargs)
+    if not values:
+        return get_card(db, card_id)
+
+    card = _update_returning(db, CreditCard, CreditCard.card_id == card_id, values)
+    if card is None:
         return None
-    
-    for key, value in kwargs.items():
-        if hasattr(card, key):
-            setattr(card, key, value)
-    
+
+    if "cash_back_rate" in values or "points_multiplier" in values:
+        sync_card_reward_rates(db, [card])
+
     db.commit()
-    db.refresh(card)
     return card
 
 
 def deactivate_card(db: Session, card_id: str) -> bool:
     """Deactivate a credit card"""
-    card = get_card(db, card_id)
-    if not card:
-        return False
-
-    card.is_active = False
+    card = _update_returning(db, CreditCard, CreditCard.card_id == card_id, {"is_active": False})
     db.commit()
-    return True
+    return card is not None
 
 
-def create_credit_cards_from_library(db: Session, user_id: str) -> List[CreditCard]:
+def create_credit_cards_from_library(db: Session, user_id: str, force: bool = False) -> List[CreditCard]:
     """
     Seed credit cards from the card_library.json file for a user.
-    Reads all card data from seed_data/card_library.json and creates them in the database.
+    Reads all card data from seed_data/card_library.json and upserts them in one
+    transaction. Skipped entirely when the file is unchanged since the last run
+    for this user (unless force=True).
 
     Args:
         db: Database session
         user_id: User ID to associate cards with
+        force: Upsert even if the seed file checksum is unchanged
 
     Returns:
-        List of created CreditCard objects
+        List of upserted CreditCard objects (empty if the seed was skipped)
     """
     # Determine the path to the seed data file
     current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -172,44 +375,237 @@ def create_credit_cards_from_library(db: Session, user_id: str) -> List[CreditCa
 
     # Read the JSON file
     try:
-        with open(library_path, 'r') as f:
-            cards_data = json.load(f)
+        with open(library_path, 'rb') as f:
+            raw = f.read()
+        cards_data = json.loads(raw)
     except Exception as e:
         print(f"❌ Error reading card library: {e}")
         return []
 
-    created_cards = []
+    seed_name = f"card_library:{user_id}"
+    checksum = seed_checksum(raw)
+    if not force and is_seed_current(db, seed_name, checksum):
+        print(f"⏭️  Card library unchanged for {user_id}, skipping")
+        return []
 
-    # Process each card in the library
+    cards = []
     for card_data in cards_data:
+        # Map issuer string to CardIssuerEnum
+        issuer_name = card_data.get("issuer", "Other")
         try:
-            # Map issuer string to CardIssuerEnum
-            issuer_name = card_data.get("issuer", "Other")
-            try:
-                issuer_enum = CardIssuerEnum(issuer_name)
-            except ValueError:
-                # If issuer not in enum, use OTHER
-                issuer_enum = CardIssuerEnum.OTHER
-
-            # Create the credit card
-            card = create_credit_card(
-                db=db,
-                user_id=user_id,
-                card_name=card_data["card_name"],
-                issuer=issuer_enum,
-                cash_back_rate=card_data["cash_back_rate"],
-                points_multiplier=card_data["points_multiplier"],
-                annual_fee=card_data.get("annual_fee", 0.0),
-                benefits=card_data.get("benefits", [])
-            )
-            created_cards.append(card)
+            issuer_enum = CardIssuerEnum(issuer_name)
+        except ValueError:
+            # If issuer not in enum, use OTHER
+            issuer_enum = CardIssuerEnum.OTHER
+
+        cards.append({
+            "card_name": card_data["card_name"],
+            "issuer": issuer_enum,
+            "cash_back_rate": card_data["cash_back_rate"],
+            "points_multiplier": card_data["points_multiplier"],
+            "annual_fee": card_data.get("annual_fee", 0.0),
+            "benefits": card_data.get("benefits", []),
+        })
+
+    card_ids = bulk_upsert_credit_cards(db, user_id, cards)
+    mark_seed_applied(db, seed_name, checksum, len(card_ids))
+    db.commit()
+
+    print(f"✅ Upserted {len(card_ids)} cards from library")
+    return db.query(CreditCard).filter(CreditCard.card_id.in_(card_ids)).all()
+
+
+def bulk_upsert_credit_cards(db: Session, user_id: str, cards: List[Dict]) -> List[str]:
+    """
+    Insert or update a user's cards in one statement, without committing.
+
+    Cards are matched on (user_id, card_name, issuer) by the unique index
+    idx_card_user_name_issuer, so concurrent runs can't insert the same card
+    twice: existing cards keep their card_id and get their rewards data
+    updated, new cards are inserted.
+
+    Args:
+        db: Database session
+        user_id: Owner of the cards
+        cards: Dictionaries with card_name, issuer, cash_back_rate,
+            points_multiplier and optionally annual_fee and benefits
+
+    Returns:
+        card_ids of the upserted cards, in input order (duplicates collapsed)
+    """
+    if not cards:
+        return []
+
+    rows = {}
+    for card in cards:
+        key = (card["card_name"], CardIssuerEnum(card["issuer"]))
+        rows[key] = {
+            "card_id": f"card_{uuid.uuid4().hex[:12]}",
+            "user_id": user_id,
+            "card_name": key[0],
+            "issuer": key[1],
+            "cash_back_rate": card["cash_back_rate"],
+            "points_multiplier": card["points_multiplier"],
+            "annual_fee": card.get("annual_fee", 0.0),
+            "benefits": card.get("benefits") or [],
+            "is_active": True,
+            "current_balance": 0.0,
+            "created_at": datetime.utcnow(),
+        }
+
+    statement = _upsert_statement(db, CreditCard)
+    upserted = db.execute(
+        statement.on_conflict_do_update(
+            index_elements=["user_id", "card_name", "issuer"],
+            set_={
+                column: getattr(statement.excluded, column)
+                for column in ("cash_back_rate", "points_multiplier", "annual_fee", "benefits")
+            }
+        ).returning(CreditCard.card_id, CreditCard.card_name, CreditCard.issuer),
+        list(rows.values())
+    ).all()
+
+    # Updated cards come back with their existing card_id
+    inserted = 0
+    for card_id, card_name, issuer in upserted:
+        row = rows[(card_name, CardIssuerEnum(issuer))]
+        inserted += row["card_id"] == card_id
+        row["card_id"] = card_id
+
+    sync_card_reward_rates(db, list(rows.values()))
+    increment_business_counters(db, {CARDS_COUNTER: inserted})
+    return [row["card_id"] for row in rows.values()]
+
+
+# ============================================================================
+# CARD REWARD RATE OPERATIONS
+# ============================================================================
+
+def _reward_rate_rows(card_id: str, cash_back_rate: Optional[Dict], points_multiplier: Optional[Dict]) -> List[Dict]:
+    """One card_reward_rates row per category key present in either JSON column"""
+    cash_back_rate = cash_back_rate or {}
+    points_multiplier = points_multiplier or {}
+    return [
+        {
+            "card_id": card_id,
+            "category": category,
+            "cash_back_rate": cash_back_rate.get(category),
+            "points_multiplier": points_multiplier.get(category),
+        }
+        for category in sorted(set(cash_back_rate) | set(points_multiplier))
+    ]
+
+
+def sync_card_reward_rates(db: Session, cards: List) -> int:
+    """
+    Replace the card_reward_rates rows of the given cards from their JSON
+    rewards columns, without committing.
+
+    Args:
+        db: Database session
+        cards: CreditCard objects or dictionaries with card_id,
+            cash_back_rate and points_multiplier
+
+    Returns:
+        Number of rate rows written
+    """
+    if not cards:
+        return 0
+
+    def value(card, key):
+        return card[key] if isinstance(card, dict) else getattr(card, key)
+
+    rows = [
+        row
+        for card in cards
+        for row in _reward_rate_rows(
+            value(card, "card_id"), value(card, "cash_back_rate"), value(card, "points_multiplier")
+        )
+    ]
+    db.execute(delete(CardRewardRate).where(
+        CardRewardRate.card_id.in_([value(card, "card_id") for card in cards])
+    ))
+    if rows:
+        db.execute(insert(CardRewardRate), rows)
+    return len(rows)
+
+
+def rebuild_card_reward_rates(db: Session) -> int:
+    """
+    Rebuild card_reward_rates for every card from the JSON columns (backfill).
+
+    Returns:
+        Number of rate rows written
+    """
+    cards = db.execute(
+        select(CreditCard.card_id, CreditCard.cash_back_rate, CreditCard.points_multiplier)
+    ).mappings().all()
+    db.execute(delete(CardRewardRate))
+    rows = [
+        row
+        for card in cards
+        for row in _reward_rate_rows(card["card_id"], card["cash_back_rate"], card["points_multiplier"])
+    ]
+    for start in range(0, len(rows), 5000):
+        db.execute(insert(CardRewardRate), rows[start:start + 5000])
+    db.commit()
+    return len(rows)
+
+
+def get_best_cards(
+    db: Session,
+    user_id: str,
+    category,
+    goal=DEFAULT_GOAL,
+    limit: int = 1
+) -> List[Dict]:
+    """
+    Rank a user's active wallet cards for a category and goal in one SQL query.
 
-        except Exception as e:
-            print(f"⚠️  Error creating card '{card_data.get('card_name', 'Unknown')}': {e}")
-            continue
+    Uses the agent's reward weights (rewards.GOAL_WEIGHTS) over the normalized
+    rates, falling back to each card's "other" rate like the JSON lookup does.
+    Benefits are not scored (they are free text), so this is the rewards-rate
+    ranking the agent starts from.
+
+    Args:
+        db: Database session
+        user_id: User ID
+        category: CategoryEnum or category key
+        goal: OptimizationGoalEnum or goal name (unknown goals rank as balanced)
+        limit: Number of cards to return
+
+    Returns:
+        Dictionaries with user_card_id, card_id, card_name, cash_back_rate,
+        points_multiplier and score (weighted value per $1 spent), best first
+    """
+    category_key = category.value if isinstance(category, CategoryEnum) else str(category).lower()
+    goal_key = goal.value if isinstance(goal, OptimizationGoalEnum) else goal
+    weights = GOAL_WEIGHTS.get(goal_key, GOAL_WEIGHTS[DEFAULT_GOAL])
+
+    rate = aliased(CardRewardRate)
+    other = aliased(CardRewardRate)
+    cash_back_rate = func.coalesce(rate.cash_back_rate, other.cash_back_rate, 0.0)
+    points_multiplier = func.coalesce(rate.points_multiplier, other.points_multiplier, 0.0)
+    score = weights["cash"] * cash_back_rate + weights["points"] * POINT_VALUE * points_multiplier
+
+    rows = db.execute(
+        select(
+            UserCreditCard.user_card_id,
+            CreditCard.card_id,
+            CreditCard.card_name,
+            cash_back_rate.label("cash_back_rate"),
+            points_multiplier.label("points_multiplier"),
+            score.label("score")
+        )
+        .join(CreditCard, CreditCard.card_id == UserCreditCard.card_id)
+        .outerjoin(rate, and_(rate.card_id == CreditCard.card_id, rate.category == category_key))
+        .outerjoin(other, and_(other.card_id == CreditCard.card_id, other.category == "other"))
+        .where(UserCreditCard.user_id == user_id, UserCreditCard.is_active == True)
+        .order_by(desc(score), CreditCard.card_name)
+        .limit(limit)
+    ).mappings().all()
 
-    print(f"✅ Created {len(created_cards)} cards from library")
-    return created_cards
+    return [dict(row) for row in rows]
 
 
 # ============================================================================
@@ -238,18 +634,6 @@ def add_user_credit_card(
     Returns:
         UserCreditCard object or None if card already exists
     """
-    # Check if user already has this card
-    existing = db.query(UserCreditCard).filter(
-        and_(
-            UserCreditCard.user_id == user_id,
-            UserCreditCard.card_id == card_id
-        )
-    ).first()
-
-    if existing:
-        print(f"⚠️  User already has this card")
-        return None
-
     # Verify the card exists in the library
     card = get_card(db, card_id)
     if not card:
@@ -266,9 +650,16 @@ def add_user_credit_card(
         is_active=True
     )
 
+    # Duplicates are caught by idx_user_card_unique rather than a SELECT first,
+    # which also covers two concurrent adds of the same card
     db.add(user_card)
-    db.commit()
-    db.refresh(user_card)
+    increment_business_counters(db, {WALLET_CARDS_COUNTER: 1})
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        print(f"⚠️  User already has this card")
+        return None
     return user_card
 
 
@@ -288,20 +679,24 @@ def get_user_credit_cards(
     Returns:
         List of UserCreditCard objects with relationships loaded
     """
-    query = db.query(UserCreditCard).filter(UserCreditCard.user_id == user_id)
-    if active_only:
-        query = query.filter(UserCreditCard.is_active == True)
-    return query.all()
+    statement = ACTIVE_USER_CREDIT_CARDS if active_only else USER_CREDIT_CARDS
+    return db.execute(statement, {"user_id": user_id}).scalars().all()
+
+
+def _user_card_filter(user_card_id: int, user_id: Optional[str]):
+    """Match a wallet card by ID, and by owner when user_id is given"""
+    if user_id is None:
+        return UserCreditCard.user_card_id == user_card_id
+    return and_(UserCreditCard.user_card_id == user_card_id, UserCreditCard.user_id == user_id)
 
 
 def get_user_credit_card(
     db: Session,
-    user_card_id: int
+    user_card_id: int,
+    user_id: Optional[str] = None
 ) -> Optional[UserCreditCard]:
-    """Get a specific user credit card by ID"""
-    return db.query(UserCreditCard).filter(
-        UserCreditCard.user_card_id == user_card_id
-    ).first()
+    """Get a specific user credit card by ID (only if it belongs to user_id, when given)"""
+    return db.query(UserCreditCard).filter(_user_card_filter(user_card_id, user_id)).first()
 
 
 def get_user_credit_card_by_card_id(
@@ -321,6 +716,7 @@ def get_user_credit_card_by_card_id(
 def update_user_credit_card(
     db: Session,
     user_card_id: int,
+    user_id: Optional[str] = None,
     **kwargs
 ) -> Optional[UserCreditCard]:
     """
@@ -329,27 +725,25 @@ def update_user_credit_card(
     Args:
         db: Database session
         user_card_id: UserCreditCard ID
+        user_id: Only update the card if it belongs to this user
         **kwargs: Fields to update (nickname, last_four_digits, credit_limit, is_active, etc.)
 
     Returns:
         Updated UserCreditCard object or None if not found
     """
-    user_card = get_user_credit_card(db, user_card_id)
-    if not user_card:
-        return None
-
-    for key, value in kwargs.items():
-        if hasattr(user_card, key):
-            setattr(user_card, key, value)
+    values = _column_values(UserCreditCard, kwargs)
+    if not values:
+        return get_user_credit_card(db, user_card_id, user_id)
 
+    user_card = _update_returning(db, UserCreditCard, _user_card_filter(user_card_id, user_id), values)
     db.commit()
-    db.refresh(user_card)
     return user_card
 
 
 def delete_user_credit_card(
     db: Session,
-    user_card_id: int
+    user_card_id: int,
+    user_id: Optional[str] = None
 ) -> bool:
     """
     Delete (remove) a credit card from user's wallet.
@@ -357,22 +751,22 @@ def delete_user_credit_card(
     Args:
         db: Database session
         user_card_id: UserCreditCard ID
+        user_id: Only delete the card if it belongs to this user
 
     Returns:
         True if deleted, False if not found
     """
-    user_card = get_user_credit_card(db, user_card_id)
-    if not user_card:
-        return False
-
-    db.delete(user_card)
+    user_card = _delete_returning(db, UserCreditCard, _user_card_filter(user_card_id, user_id))
+    if user_card is not None:
+        increment_business_counters(db, {WALLET_CARDS_COUNTER: -1})
     db.commit()
-    return True
+    return user_card is not None
 
 
 def deactivate_user_credit_card(
     db: Session,
-    user_card_id: int
+    user_card_id: int,
+    user_id: Optional[str] = None
 ) -> bool:
     """
     Deactivate a user's credit card (soft delete).
@@ -380,19 +774,19 @@ def deactivate_user_credit_card(
     Args:
         db: Database session
         user_card_id: UserCreditCard ID
+        user_id: Only deactivate the card if it belongs to this user
 
     Returns:
         True if deactivated, False if not found
     """
-    user_card = get_user_credit_card(db, user_card_id)
-    if not user_card:
-        return False
-
-    user_card.is_active = False
+    user_card = _update_returning(
+        db, UserCreditCard, _user_card_filter(user_card_id, user_id), {"is_active": False}
+    )
     db.commit()
-    return True
+    return user_card is not None
 
 
+@cached(tags=lambda cards, user_id, active_only: [f"wallet:{user_id}"] + [f"card:{card['card_id']}" for card in cards])
 def get_user_cards_with_details(
     db: Session,
     user_id: str,
@@ -470,13 +864,51 @@ def create_transaction(
     # Determine if user followed recommendation
     if recommended_card_id and card_id:
         transaction.used_recommended_card = (card_id == recommended_card_id)
-    
+
+    # The rollup needs the date before the row is flushed
+    if transaction.transaction_date is None:
+        transaction.transaction_date = datetime.utcnow()
+
     db.add(transaction)
+    record_transaction_rollups(db, [transaction])
+    record_behavior_transactions(db, [transaction])
+    increment_business_counters(db, _transaction_counter_deltas([transaction]))
     db.commit()
-    db.refresh(transaction)
     return transaction
 
 
+def bulk_create_transactions(db: Session, rows: List[Dict]) -> int:
+    """
+    Insert a batch of transactions in one transaction.
+
+    Rows are inserted with a single executemany (no per-row flush or refresh)
+    and added to the daily rollups, behavior and business counters before the commit.
+
+    Args:
+        db: Database session
+        rows: Dictionaries of Transaction column values; transaction_id and
+            transaction_date are filled in when missing
+
+    Returns:
+        Number of rows inserted
+    """
+    if not rows:
+        return 0
+
+    now = datetime.utcnow()
+    for row in rows:
+        row.setdefault("transaction_id", f"txn_{uuid.uuid4().hex[:12]}")
+        if row.get("transaction_date") is None:
+            row["transaction_date"] = now
+
+    db.execute(insert(Transaction), rows)
+    record_transaction_rollups(db, rows)
+    record_behavior_transactions(db, rows)
+    increment_business_counters(db, _transaction_counter_deltas(rows))
+    db.commit()
+    return len(rows)
+
+
 def get_transaction(db: Session, transaction_id: str) -> Optional[Transaction]:
     """Get a specific transaction"""
     return db.query(Transaction).filter(
@@ -504,7 +936,96 @@ def get_user_transactions(
     if end_date:
         query = query.filter(Transaction.transaction_date <= end_date)
     
-    return query.order_by(desc(Transaction.transaction_date)).limit(limit).all()
+    return query.order_by(
+        desc(Transaction.transaction_date), desc(Transaction.transaction_id)
+    ).limit(limit).all()
+
+
+def encode_transaction_cursor(transaction: Transaction) -> str:
+    """Opaque cursor pointing just past a transaction in history order"""
+    position = f"{transaction.transaction_date.isoformat()}|{transaction.transaction_id}"
+    return base64.urlsafe_b64encode(position.encode()).decode().rstrip("=")
+
+
+def decode_transaction_cursor(cursor: str) -> Tuple[datetime, str]:
+    """
+    Decode a cursor from encode_transaction_cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        transaction_date, transaction_id = base64.urlsafe_b64decode(padded).decode().split("|", 1)
+        return datetime.fromisoformat(transaction_date), transaction_id
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+# Largest page get_user_transactions_page returns
+MAX_TRANSACTIONS_PAGE_SIZE = 500
+
+
+def get_user_transactions_page(
+    db: Session,
+    user_id: str,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    category: Optional[CategoryEnum] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+) -> Tuple[List[Transaction], Optional[str]]:
+    """
+    Get one page of a user's transactions, newest first, using keyset pagination.
+
+    Pages are ordered by (transaction_date, transaction_id) descending and
+    continue strictly after the cursor position, so every page is a range scan
+    on idx_transaction_user_date_id (or idx_transaction_user_category_date_id
+    when filtering by category) however deep the user scrolls.
+
+    Args:
+        db: Database session
+        user_id: User ID
+        limit: Page size (1 to MAX_TRANSACTIONS_PAGE_SIZE)
+        cursor: next_cursor from the previous page (None for the first page)
+        category: Optional category filter
+        start_date: Optional lower bound on transaction_date
+        end_date: Optional upper bound on transaction_date
+
+    Returns:
+        Tuple of (transactions, next_cursor); next_cursor is None on the last page
+
+    Raises:
+        ValueError: If the cursor is malformed or limit is out of range
+    """
+    if limit < 1 or limit > MAX_TRANSACTIONS_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_TRANSACTIONS_PAGE_SIZE}")
+
+    statement = select(Transaction).where(Transaction.user_id == user_id)
+
+    if category:
+        statement = statement.where(Transaction.category == category)
+    if start_date:
+        statement = statement.where(Transaction.transaction_date >= start_date)
+    if end_date:
+        statement = statement.where(Transaction.transaction_date <= end_date)
+    if cursor:
+        statement = statement.where(
+            tuple_(Transaction.transaction_date, Transaction.transaction_id)
+            < tuple_(*decode_transaction_cursor(cursor))
+        )
+
+    # Fetch one extra row to learn whether another page exists
+    transactions = db.execute(
+        statement.order_by(
+            desc(Transaction.transaction_date), desc(Transaction.transaction_id)
+        ).limit(limit + 1)
+    ).scalars().all()
+
+    if len(transactions) > limit:
+        transactions = transactions[:limit]
+        return transactions, encode_transaction_cursor(transactions[-1])
+    return transactions, None
 
 
 def get_recent_transactions(
@@ -524,97 +1045,428 @@ def calculate_transaction_stats(
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None
 ) -> Dict:
-    """Calculate transaction statistics for a user"""
-    query = db.query(Transaction).filter(Transaction.user_id == user_id)
-    
-    if start_date:
-        query = query.filter(Transaction.transaction_date >= start_date)
-    if end_date:
-        query = query.filter(Transaction.transaction_date <= end_date)
-    
-    transactions = query.all()
-    
-    if not transactions:
-        return {
-            "total_transactions": 0,
-            "total_spent": 0.0,
-            "total_rewards": 0.0,
-            "total_potential_rewards": 0.0,
-            "missed_value": 0.0,
-            "optimization_rate": 0.0
-        }
-    
-    total_spent = sum(t.amount for t in transactions)
-    total_rewards = sum(t.total_value_earned for t in transactions if t.total_value_earned)
-    total_potential = sum(t.optimal_value for t in transactions if t.optimal_value)
-    missed_value = sum(t.missed_value for t in transactions if t.missed_value)
-    
-    followed_recommendations = sum(
-        1 for t in transactions 
-        if t.used_recommended_card is True
-    )
-    
+    """
+    Calculate transaction statistics for a user in a single aggregate query.
+
+    Open-ended ranges starting on a day boundary are answered from the daily
+    rollups; any other range is aggregated over the raw transactions.
+    """
+    if end_date is None and (start_date is None or start_date.time() == time.min):
+        filters = [UserDailyRollup.user_id == user_id]
+        if start_date:
+            filters.append(UserDailyRollup.day >= start_date.date())
+        statement = select(
+            func.coalesce(func.sum(UserDailyRollup.transaction_count), 0),
+            func.coalesce(func.sum(UserDailyRollup.total_spent), 0.0),
+            func.coalesce(func.sum(UserDailyRollup.rewards_earned), 0.0),
+            func.coalesce(func.sum(UserDailyRollup.optimal_value), 0.0),
+            func.coalesce(func.sum(UserDailyRollup.missed_value), 0.0),
+            func.coalesce(func.sum(UserDailyRollup.followed_count), 0)
+        ).where(*filters)
+    else:
+        filters = [Transaction.user_id == user_id]
+        if start_date:
+            filters.append(Transaction.transaction_date >= start_date)
+        if end_date:
+            filters.append(Transaction.transaction_date <= end_date)
+        statement = select(
+            func.count(Transaction.transaction_id),
+            func.coalesce(func.sum(Transaction.amount), 0.0),
+            func.coalesce(func.sum(Transaction.total_value_earned), 0.0),
+            func.coalesce(func.sum(Transaction.optimal_value), 0.0),
+            func.coalesce(func.sum(Transaction.missed_value), 0.0),
+            func.count(Transaction.transaction_id).filter(Transaction.used_recommended_card == True)
+        ).where(*filters)
+
+    total_transactions, total_spent, total_rewards, total_potential, missed_value, followed = db.execute(
+        statement
+    ).one()
+
     return {
-        "total_transactions": len(transactions),
+        "total_transactions": total_transactions,
         "total_spent": round(total_spent, 2),
         "total_rewards": round(total_rewards, 2),
         "total_potential_rewards": round(total_potential, 2),
         "missed_value": round(missed_value, 2),
         "optimization_rate": round(
-            (followed_recommendations / len(transactions) * 100) if transactions else 0.0,
+            (followed / total_transactions * 100) if total_transactions else 0.0,
             2
         )
     }
 
 
 # ============================================================================
-# TRANSACTION FEEDBACK OPERATIONS
+# DAILY ROLLUP OPERATIONS
 # ============================================================================
 
-def create_transaction_feedback(
-    db: Session,
-    transaction_id: str,
-    accepted_recommendation: bool,
-    satisfaction_rating: Optional[int] = None,
-    feedback_text: Optional[str] = None,
-    actual_card_used: Optional[str] = None,
-    reason_for_different_card: Optional[str] = None
-) -> TransactionFeedback:
-    """Create feedback for a transaction"""
-    feedback = TransactionFeedback(
-        transaction_id=transaction_id,
-        accepted_recommendation=accepted_recommendation,
-        satisfaction_rating=satisfaction_rating,
-        feedback_text=feedback_text,
-        actual_card_used=actual_card_used,
+def _upsert_statement(db: Session, model):
+    """Dialect-specific INSERT supporting ON CONFLICT (Postgres and SQLite)"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(model)
+    if dialect == "sqlite":
+        return sqlite.insert(model)
+    raise NotImplementedError(f"Upserts are not supported on {dialect}")
+
+
+def record_transaction_rollups(db: Session, transactions: List) -> None:
+    """
+    Add transactions to the per-user daily rollups without committing.
+
+    Accepts Transaction objects or dictionaries of Transaction column values.
+    Rows sharing a rollup key are combined first, then applied with a single
+    INSERT ... ON CONFLICT DO UPDATE so the counters are incremented atomically
+    in the caller's database transaction.
+    """
+    rollups = {}
+    for txn in transactions:
+        get = txn.get if isinstance(txn, dict) else lambda key: getattr(txn, key, None)
+        key = (
+            get("user_id"),
+            get("transaction_date").date(),
+            CategoryEnum(get("category")),
+            get("card_id") or ""
+        )
+        row = rollups.setdefault(key, {
+            "user_id": key[0], "day": key[1], "category": key[2], "card_id": key[3],
+            "transaction_count": 0, "followed_count": 0, "total_spent": 0.0,
+            "rewards_earned": 0.0, "optimal_value": 0.0, "missed_value": 0.0,
+            "updated_at": datetime.utcnow()
+        })
+        row["transaction_count"] += 1
+        row["followed_count"] += 1 if get("used_recommended_card") is True else 0
+        row["total_spent"] += get("amount")
+        row["rewards_earned"] += get("total_value_earned") or 0.0
+        row["optimal_value"] += get("optimal_value") or 0.0
+        row["missed_value"] += get("missed_value") or 0.0
+
+    if not rollups:
+        return
+
+    statement = _upsert_statement(db, UserDailyRollup)
+    counters = [
+        "transaction_count", "followed_count", "total_spent",
+        "rewards_earned", "optimal_value", "missed_value"
+    ]
+    set_ = {
+        column: getattr(UserDailyRollup, column) + getattr(statement.excluded, column)
+        for column in counters
+    }
+    set_["updated_at"] = statement.excluded.updated_at
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=["user_id", "day", "category", "card_id"],
+            set_=set_
+        ),
+        list(rollups.values())
+    )
+
+
+def _rollup_rebuild_floor(db: Session) -> Optional[date]:
+    """
+    First day the transactions table can still hold rows for: rollups of
+    earlier days cover detached partitions and are kept by a rebuild
+    (None when the table isn't partitioned)
+    """
+    connection = db.connection()
+    months = [partition_month(name) for name in list_partitions(connection)]
+    months = [month for month in months if month is not None]
+    if not months:
+        return None
+    oldest = db.execute(select(func.min(Transaction.transaction_date))).scalar()
+    return min(months + ([oldest.date()] if oldest else []))
+
+
+def _replace_daily_rollups(db: Session, start: Optional[date], user_filter) -> int:
+    """
+    Replace the rollups of days from start on (every day when None) with
+    aggregates of the transactions table, for the users matched by
+    user_filter(user_id column)
+    """
+    cleanup = delete(UserDailyRollup).where(user_filter(UserDailyRollup.user_id))
+    source = select(
+        Transaction.user_id,
+        func.date(Transaction.transaction_date),
+        Transaction.category,
+        func.coalesce(Transaction.card_id, ""),
+        func.count(Transaction.transaction_id),
+        func.count(Transaction.transaction_id).filter(Transaction.used_recommended_card == True),
+        func.sum(Transaction.amount),
+        func.coalesce(func.sum(Transaction.total_value_earned), 0.0),
+        func.coalesce(func.sum(Transaction.optimal_value), 0.0),
+        func.coalesce(func.sum(Transaction.missed_value), 0.0),
+        literal(datetime.utcnow(), DateTime)
+    ).where(user_filter(Transaction.user_id))
+    if start is not None:
+        cleanup = cleanup.where(UserDailyRollup.day >= start)
+        source = source.where(Transaction.transaction_date >= datetime.combine(start, time.min))
+    source = source.group_by(
+        Transaction.user_id,
+        func.date(Transaction.transaction_date),
+        Transaction.category,
+        func.coalesce(Transaction.card_id, "")
+    )
+
+    db.execute(cleanup)
+    result = db.execute(
+        insert(UserDailyRollup).from_select(
+            [
+                "user_id", "day", "category", "card_id",
+                "transaction_count", "followed_count", "total_spent",
+                "rewards_earned", "optimal_value", "missed_value", "updated_at"
+            ],
+            source
+        )
+    )
+    return result.rowcount
+
+
+def rebuild_user_daily_rollups(db: Session, user_id: Optional[str] = None) -> int:
+    """
+    Rebuild daily rollups from the transactions table (backfill).
+
+    Days whose transactions have left the table are kept as they are: those
+    before a user's transaction_archive.archived_through, and those before the
+    oldest attached partition (detached months). Analytics and the business
+    counters still count them.
+
+    Args:
+        db: Database session
+        user_id: Only rebuild this user's rollups (default: all users)
+
+    Returns:
+        Number of rollup rows written
+    """
+    floor = _rollup_rebuild_floor(db)
+    if user_id:
+        archived_through = transaction_archive.archived_through(user_id)
+        archived = {user_id: archived_through} if archived_through else {}
+    else:
+        archived = transaction_archive.archived_users()
+
+    written = 0
+    if user_id and not archived:
+        written += _replace_daily_rollups(db, floor, lambda column: column == user_id)
+    elif not user_id:
+        written += _replace_daily_rollups(
+            db, floor, lambda column: column.notin_(list(archived)) if archived else true()
+        )
+    for archived_user_id, archived_through in archived.items():
+        start = max(filter(None, [floor, archived_through.date()]))
+        written += _replace_daily_rollups(db, start, lambda column: column == archived_user_id)
+    db.commit()
+    return written
+
+
+# ============================================================================
+# BUSINESS COUNTERS
+# ============================================================================
+# Totals for the business metrics, kept up to date by the writes above so the
+# gauges never need a COUNT(*) over the growing tables.
+
+USERS_COUNTER = "users"
+CARDS_COUNTER = "credit_cards"
+WALLET_CARDS_COUNTER = "wallet_cards"
+TRANSACTIONS_COUNTER_PREFIX = "transactions:"  # one counter per category
+
+# Rows per counter; writers pick one at random so they rarely contend for a row lock
+COUNTER_SLOTS = 8
+
+
+def _transaction_counter_deltas(transactions: List) -> Dict[str, int]:
+    """Per-category transaction counter increments (Transaction objects or column dicts)"""
+    deltas: Dict[str, int] = {}
+    for txn in transactions:
+        category = txn.get("category") if isinstance(txn, dict) else txn.category
+        name = TRANSACTIONS_COUNTER_PREFIX + CategoryEnum(category).value
+        deltas[name] = deltas.get(name, 0) + 1
+    return deltas
+
+
+def increment_business_counters(db: Session, deltas: Dict[str, int]) -> None:
+    """
+    Add to business counters without committing, so the counts change in the
+    same database transaction as the rows they count.
+
+    Args:
+        db: Database session
+        deltas: Amount to add per counter name (negative to subtract)
+    """
+    rows = sorted(
+        # Sorted so concurrent writers lock counter rows in the same order
+        ({"name": name, "slot": random.randrange(COUNTER_SLOTS), "value": delta}
+         for name, delta in deltas.items() if delta),
+        key=lambda row: (row["name"], row["slot"])
+    )
+    if not rows:
+        return
+
+    statement = _upsert_statement(db, BusinessCounter)
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=["name", "slot"],
+            set_={"value": BusinessCounter.value + statement.excluded.value}
+        ),
+        rows
+    )
+
+
+def get_business_counters(db: Session) -> Dict[str, int]:
+    """Current value of every business counter (a scan of the small counters table)"""
+    return {
+        name: int(value)
+        for name, value in db.execute(
+            select(BusinessCounter.name, func.sum(BusinessCounter.value)).group_by(BusinessCounter.name)
+        ).all()
+    }
+
+
+def rebuild_business_counters(
+    db: Session,
+    count_cards: bool = True,
+    profiled_users_only: bool = False
+) -> Dict[str, int]:
+    """
+    Recount the business counters from the tables (backfill, or to correct drift).
+
+    Transactions are counted from the daily rollups, which still include
+    transactions moved to the archive.
+
+    Args:
+        db: Database session
+        count_cards: Count credit_cards (False on user shards, whose card
+            library is a copy counted once on the global shard)
+        profiled_users_only: Only count users with a behavior profile (with
+            user shards, card owners' users rows are copied without one)
+
+    Returns:
+        The rebuilt counters
+    """
+    users = select(func.count(User.user_id))
+    if profiled_users_only:
+        users = users.where(exists().where(UserBehavior.user_id == User.user_id))
+    counters = {
+        USERS_COUNTER: db.execute(users).scalar() or 0,
+        CARDS_COUNTER: (db.execute(select(func.count(CreditCard.card_id))).scalar() or 0) if count_cards else 0,
+        WALLET_CARDS_COUNTER: db.execute(select(func.count(UserCreditCard.user_card_id))).scalar() or 0,
+    }
+    for category, count in db.execute(
+        select(UserDailyRollup.category, func.sum(UserDailyRollup.transaction_count))
+        .group_by(UserDailyRollup.category)
+    ).all():
+        counters[TRANSACTIONS_COUNTER_PREFIX + CategoryEnum(category).value] = int(count or 0)
+
+    db.execute(delete(BusinessCounter))
+    db.execute(insert(BusinessCounter), [
+        {"name": name, "slot": 0, "value": value} for name, value in counters.items()
+    ])
+    db.commit()
+    return counters
+
+
+def ensure_business_counters(db: Session, **rebuild_options) -> Dict[str, int]:
+    """Business counters, rebuilt first (see rebuild_business_counters) if the counters table is still empty"""
+    counters = get_business_counters(db)
+    if not counters:
+        counters = rebuild_business_counters(db, **rebuild_options)
+    return counters
+
+
+# ============================================================================
+# SEED OPERATIONS
+# ============================================================================
+
+def seed_checksum(content: bytes) -> str:
+    """Content checksum of a seed file"""
+    return hashlib.sha256(content).hexdigest()
+
+
+def is_seed_current(db: Session, seed_name: str, checksum: str) -> bool:
+    """True if this exact seed content was already applied to seed_name"""
+    return db.execute(
+        select(SeedChecksum.checksum).where(SeedChecksum.seed_name == seed_name)
+    ).scalar() == checksum
+
+
+def mark_seed_applied(db: Session, seed_name: str, checksum: str, row_count: int) -> None:
+    """Record the applied seed checksum without committing (commit with the seeded rows)"""
+    statement = _upsert_statement(db, SeedChecksum).values(
+        seed_name=seed_name,
+        checksum=checksum,
+        row_count=row_count,
+        applied_at=datetime.utcnow()
+    )
+    db.execute(statement.on_conflict_do_update(
+        index_elements=["seed_name"],
+        set_={
+            "checksum": statement.excluded.checksum,
+            "row_count": statement.excluded.row_count,
+            "applied_at": statement.excluded.applied_at,
+        }
+    ))
+
+
+# ============================================================================
+# TRANSACTION FEEDBACK OPERATIONS
+# ============================================================================
+
+def create_transaction_feedback(
+    db: Session,
+    transaction_id: str,
+    accepted_recommendation: bool,
+    satisfaction_rating: Optional[int] = None,
+    feedback_text: Optional[str] = None,
+    actual_card_used: Optional[str] = None,
+    reason_for_different_card: Optional[str] = None
+) -> Optional[TransactionFeedback]:
+    """
+    Create feedback for a transaction
+
+    Returns:
+        The feedback, or None if the transaction doesn't exist. A partitioned
+        transactions table (PostgreSQL) can't be referenced by a foreign key,
+        so the transaction is looked up first there.
+    """
+    if is_partitioned(db.connection()) and get_transaction(db, transaction_id) is None:
+        return None
+    feedback = TransactionFeedback(
+        transaction_id=transaction_id,
+        accepted_recommendation=accepted_recommendation,
+        satisfaction_rating=satisfaction_rating,
+        feedback_text=feedback_text,
+        actual_card_used=actual_card_used,
         reason_for_different_card=reason_for_different_card
     )
     db.add(feedback)
     db.commit()
-    db.refresh(feedback)
     return feedback
 
 
 def get_feedback_stats(db: Session, user_id: str) -> Dict:
-    """Get feedback statistics for a user"""
-    feedbacks = db.query(TransactionFeedback).join(Transaction).filter(
-        Transaction.user_id == user_id
-    ).all()
-    
-    if not feedbacks:
+    """Get feedback statistics for a user in a single aggregate query"""
+    total_feedbacks, accepted, avg_satisfaction = db.execute(
+        select(
+            func.count(TransactionFeedback.feedback_id),
+            func.count(TransactionFeedback.feedback_id).filter(
+                TransactionFeedback.accepted_recommendation == True
+            ),
+            func.avg(TransactionFeedback.satisfaction_rating)
+        )
+        .join(Transaction, Transaction.transaction_id == TransactionFeedback.transaction_id)
+        .where(Transaction.user_id == user_id)
+    ).one()
+
+    if not total_feedbacks:
         return {
             "total_feedbacks": 0,
             "acceptance_rate": 0.0,
             "avg_satisfaction": 0.0
         }
-    
-    accepted = sum(1 for f in feedbacks if f.accepted_recommendation)
-    ratings = [f.satisfaction_rating for f in feedbacks if f.satisfaction_rating]
-    
+
     return {
-        "total_feedbacks": len(feedbacks),
-        "acceptance_rate": round((accepted / len(feedbacks)) * 100, 2),
-        "avg_satisfaction": round(sum(ratings) / len(ratings), 2) if ratings else 0.0
+        "total_feedbacks": total_feedbacks,
+        "acceptance_rate": round((accepted / total_feedbacks) * 100, 2),
+        "avg_satisfaction": round(float(avg_satisfaction), 2) if avg_satisfaction is not None else 0.0
     }
 
 
@@ -622,88 +1474,272 @@ def get_feedback_stats(db: Session, user_id: str) -> Dict:
 # USER BEHAVIOR OPERATIONS
 # ============================================================================
 
+# Days of history the behavior profile covers (today included)
+BEHAVIOR_WINDOW_DAYS = 90
+
+
+def behavior_window_start(today: Optional[date] = None) -> date:
+    """First day of the rolling behavior window ending today"""
+    return (today or datetime.utcnow().date()) - timedelta(days=BEHAVIOR_WINDOW_DAYS - 1)
+
+
+def _new_user_behavior(user_id: str) -> UserBehavior:
+    return UserBehavior(user_id=user_id, window_start=behavior_window_start())
+
+
 def create_user_behavior(db: Session, user_id: str) -> UserBehavior:
     """Create initial user behavior record"""
-    behavior = UserBehavior(user_id=user_id)
+    behavior = _new_user_behavior(user_id)
     db.add(behavior)
     db.commit()
-    db.refresh(behavior)
     return behavior
 
 
 def get_user_behavior(db: Session, user_id: str) -> Optional[UserBehavior]:
     """Get user behavior profile"""
-    return db.query(UserBehavior).filter(UserBehavior.user_id == user_id).first()
+    return db.execute(USER_BEHAVIOR_BY_USER, {"user_id": user_id}).scalars().first()
 
 
-def update_user_behavior(
-    db: Session,
-    user_id: str,
-    transactions: List[Transaction]
-) -> Optional[UserBehavior]:
-    """Update user behavior based on transaction history"""
-    behavior = get_user_behavior(db, user_id)
-    if not behavior:
-        behavior = create_user_behavior(db, user_id)
-    
-    if not transactions:
-        return behavior
-    
-    # Calculate patterns
-    category_counts = {}
-    goal_counts = {}
-    card_usage = {}
-    total_spent = 0.0
-    total_rewards = 0.0
-    total_potential = 0.0
-    
-    for txn in transactions:
-        category_counts[txn.category.value] = category_counts.get(txn.category.value, 0) + 1
-        goal_counts[txn.optimization_goal.value] = goal_counts.get(txn.optimization_goal.value, 0) + 1
-        
-        if txn.card_id:
-            card_usage[txn.card_id] = card_usage.get(txn.card_id, 0) + 1
-        
-        total_spent += txn.amount
-        if txn.total_value_earned:
-            total_rewards += txn.total_value_earned
-        if txn.optimal_value:
-            total_potential += txn.optimal_value
-    
-    # Update behavior
-    behavior.common_categories = sorted(
-        category_counts.keys(),
-        key=lambda x: category_counts[x],
-        reverse=True
-    )[:3]
-    
-    behavior.preferred_goal = max(goal_counts, key=goal_counts.get) if goal_counts else OptimizationGoalEnum.BALANCED
-    
-    behavior.avg_transaction_amount = round(total_spent / len(transactions), 2)
-    behavior.total_transactions = len(transactions)
-    behavior.total_spent = round(total_spent, 2)
-    behavior.total_rewards_earned = round(total_rewards, 2)
-    behavior.total_potential_rewards = round(total_potential, 2)
-    
-    # Calculate optimization score
-    if total_potential > 0:
-        behavior.optimization_score = round((total_rewards / total_potential) * 100, 2)
-    
-    # Card usage distribution
-    total_uses = sum(card_usage.values())
+def _refresh_behavior_profile(behavior: UserBehavior) -> None:
+    """Derive the profile fields from the window counters (a handful of keys, not transactions)"""
+    categories = behavior.category_counts or {}
+    goals = behavior.goal_counts or {}
+    cards = behavior.card_counts or {}
+    count = behavior.total_transactions or 0
+
+    behavior.common_categories = sorted(categories, key=lambda category: (-categories[category], category))[:3]
+    if goals:
+        behavior.preferred_goal = OptimizationGoalEnum(max(sorted(goals), key=goals.get))
+
+    behavior.avg_transaction_amount = round(behavior.total_spent / count, 2) if count else None
+    if behavior.total_potential_rewards:
+        behavior.optimization_score = round(
+            (behavior.total_rewards_earned / behavior.total_potential_rewards) * 100, 2
+        )
+
+    total_uses = sum(cards.values())
     if total_uses > 0:
         behavior.card_usage_distribution = {
-            card_id: round((count / total_uses) * 100, 2)
-            for card_id, count in card_usage.items()
+            card_id: round((uses / total_uses) * 100, 2)
+            for card_id, uses in cards.items()
         }
-        behavior.most_used_card_id = max(card_usage, key=card_usage.get)
-    
-    behavior.learning_data_points = len(transactions)
+        behavior.most_used_card_id = max(sorted(cards), key=cards.get)
+
+    behavior.learning_data_points = count
     behavior.last_updated = datetime.utcnow()
-    
+
+
+def record_behavior_transactions(db: Session, transactions: List) -> None:
+    """
+    Add transactions to the behavior goal buckets and the users' behavior
+    window counters without committing.
+
+    Accepts Transaction objects or dictionaries of Transaction column values.
+    Each transaction is an O(1) counter update; transactions dated before the
+    window only go to the buckets.
+    """
+    window_start = behavior_window_start()
+    buckets = {}
+    in_window = {}
+    for txn in transactions:
+        get = txn.get if isinstance(txn, dict) else lambda key, txn=txn: getattr(txn, key, None)
+        day = get("transaction_date").date()
+        key = (get("user_id"), day, OptimizationGoalEnum(get("optimization_goal")))
+        buckets[key] = buckets.get(key, 0) + 1
+        if day >= window_start:
+            in_window.setdefault(key[0], []).append(get)
+
+    if not buckets:
+        return
+
+    statement = _upsert_statement(db, UserBehaviorDay)
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=["user_id", "day", "optimization_goal"],
+            set_={"transaction_count": UserBehaviorDay.transaction_count + statement.excluded.transaction_count}
+        ),
+        [
+            {"user_id": user_id, "day": day, "optimization_goal": goal, "transaction_count": count}
+            for (user_id, day, goal), count in buckets.items()
+        ]
+    )
+
+    for user_id, rows in in_window.items():
+        # Row lock so concurrent inserts for one user don't lose counter updates
+        behavior = db.execute(USER_BEHAVIOR_FOR_UPDATE, {"user_id": user_id}).scalars().first()
+        if behavior is None:
+            behavior = UserBehavior(user_id=user_id)
+            db.add(behavior)
+        if behavior.window_start is None:
+            # Profile from before the counters existed: start counting from here
+            behavior.window_start = window_start
+            behavior.category_counts, behavior.goal_counts, behavior.card_counts = {}, {}, {}
+            behavior.total_transactions = 0
+            behavior.total_spent = behavior.total_rewards_earned = behavior.total_potential_rewards = 0.0
+
+        # Reassigned, not mutated: plain JSON columns don't track in-place changes
+        categories = dict(behavior.category_counts or {})
+        goals = dict(behavior.goal_counts or {})
+        cards = dict(behavior.card_counts or {})
+        spent = behavior.total_spent or 0.0
+        rewards = behavior.total_rewards_earned or 0.0
+        potential = behavior.total_potential_rewards or 0.0
+        for get in rows:
+            category = CategoryEnum(get("category")).value
+            goal = OptimizationGoalEnum(get("optimization_goal")).value
+            categories[category] = categories.get(category, 0) + 1
+            goals[goal] = goals.get(goal, 0) + 1
+            if get("card_id"):
+                cards[get("card_id")] = cards.get(get("card_id"), 0) + 1
+            spent += get("amount")
+            rewards += get("total_value_earned") or 0.0
+            potential += get("optimal_value") or 0.0
+
+        behavior.category_counts, behavior.goal_counts, behavior.card_counts = categories, goals, cards
+        behavior.total_transactions = (behavior.total_transactions or 0) + len(rows)
+        behavior.total_spent = round(spent, 2)
+        behavior.total_rewards_earned = round(rewards, 2)
+        behavior.total_potential_rewards = round(potential, 2)
+        _refresh_behavior_profile(behavior)
+
+
+def rebuild_user_behavior_days(db: Session, user_id: Optional[str] = None) -> int:
+    """
+    Rebuild the behavior goal buckets of the current window from the transactions table (backfill).
+
+    Args:
+        db: Database session
+        user_id: Only rebuild this user's buckets (default: all users)
+
+    Returns:
+        Number of bucket rows written
+    """
+    window_start = datetime.combine(behavior_window_start(), time.min)
+    cleanup = delete(UserBehaviorDay)
+    source = select(
+        Transaction.user_id,
+        func.date(Transaction.transaction_date),
+        Transaction.optimization_goal,
+        func.count(Transaction.transaction_id)
+    ).where(Transaction.transaction_date >= window_start)
+    if user_id:
+        cleanup = cleanup.where(UserBehaviorDay.user_id == user_id)
+        source = source.where(Transaction.user_id == user_id)
+    source = source.group_by(
+        Transaction.user_id,
+        func.date(Transaction.transaction_date),
+        Transaction.optimization_goal
+    )
+
+    db.execute(cleanup)
+    result = db.execute(
+        insert(UserBehaviorDay).from_select(
+            ["user_id", "day", "optimization_goal", "transaction_count"],
+            source
+        )
+    )
     db.commit()
-    db.refresh(behavior)
-    return behavior
+    return result.rowcount
+
+
+def compact_user_behavior(
+    db: Session,
+    user_id: Optional[str] = None,
+    today: Optional[date] = None
+) -> int:
+    """
+    Age days out of the rolling behavior window.
+
+    Rebuilds every profile's window counters and totals from the daily rollups
+    and goal buckets of the last BEHAVIOR_WINDOW_DAYS days, which also corrects
+    any drift in the incremental counters, then drops goal buckets that fell
+    out of the window. Meant to run daily (scripts/compact_user_behavior.py).
+
+    Args:
+        db: Database session
+        user_id: Only compact this user's profile (default: all users)
+        today: Last day of the window (default: today, UTC)
+
+    Returns:
+        Number of behavior profiles refreshed
+    """
+    window_start = behavior_window_start(today)
+
+    def scoped(statement, model):
+        return statement.where(model.user_id == user_id) if user_id else statement
+
+    windows = {}
+
+    def window(uid):
+        return windows.setdefault(uid, {
+            "categories": {}, "goals": {}, "cards": {},
+            "count": 0, "spent": 0.0, "rewards": 0.0, "potential": 0.0
+        })
+
+    category_totals = db.execute(scoped(
+        select(
+            UserDailyRollup.user_id,
+            UserDailyRollup.category,
+            func.sum(UserDailyRollup.transaction_count),
+            func.sum(UserDailyRollup.total_spent),
+            func.sum(UserDailyRollup.rewards_earned),
+            func.sum(UserDailyRollup.optimal_value)
+        ).where(UserDailyRollup.day >= window_start),
+        UserDailyRollup
+    ).group_by(UserDailyRollup.user_id, UserDailyRollup.category))
+    for uid, category, count, spent, rewards, potential in category_totals:
+        totals = window(uid)
+        totals["categories"][CategoryEnum(category).value] = int(count)
+        totals["count"] += int(count)
+        totals["spent"] += spent or 0.0
+        totals["rewards"] += rewards or 0.0
+        totals["potential"] += potential or 0.0
+
+    card_totals = db.execute(scoped(
+        select(
+            UserDailyRollup.user_id,
+            UserDailyRollup.card_id,
+            func.sum(UserDailyRollup.transaction_count)
+        ).where(and_(UserDailyRollup.day >= window_start, UserDailyRollup.card_id != "")),
+        UserDailyRollup
+    ).group_by(UserDailyRollup.user_id, UserDailyRollup.card_id))
+    for uid, card_id, count in card_totals:
+        window(uid)["cards"][card_id] = int(count)
+
+    goal_totals = db.execute(scoped(
+        select(
+            UserBehaviorDay.user_id,
+            UserBehaviorDay.optimization_goal,
+            func.sum(UserBehaviorDay.transaction_count)
+        ).where(UserBehaviorDay.day >= window_start),
+        UserBehaviorDay
+    ).group_by(UserBehaviorDay.user_id, UserBehaviorDay.optimization_goal))
+    for uid, goal, count in goal_totals:
+        window(uid)["goals"][OptimizationGoalEnum(goal).value] = int(count)
+
+    behaviors = {
+        behavior.user_id: behavior
+        for behavior in db.execute(scoped(select(UserBehavior), UserBehavior)).scalars()
+    }
+    for uid in windows.keys() - behaviors.keys():
+        behaviors[uid] = UserBehavior(user_id=uid)
+        db.add(behaviors[uid])
+
+    for uid, behavior in behaviors.items():
+        totals = windows.get(uid) or window(uid)
+        behavior.window_start = window_start
+        behavior.category_counts = totals["categories"]
+        behavior.goal_counts = totals["goals"]
+        behavior.card_counts = totals["cards"]
+        behavior.total_transactions = totals["count"]
+        behavior.total_spent = round(totals["spent"], 2)
+        behavior.total_rewards_earned = round(totals["rewards"], 2)
+        behavior.total_potential_rewards = round(totals["potential"], 2)
+        _refresh_behavior_profile(behavior)
+
+    db.execute(scoped(delete(UserBehaviorDay).where(UserBehaviorDay.day < window_start), UserBehaviorDay))
+    db.commit()
+    return len(behaviors)
 
 
 # ============================================================================
@@ -732,10 +1768,10 @@ def create_automation_rule(
     )
     db.add(rule)
     db.commit()
-    db.refresh(rule)
     return rule
 
 
+@cached(tags=lambda rules, user_id, active_only: [f"rules:{user_id}"])
 def get_user_automation_rules(
     db: Session,
     user_id: str,
@@ -749,15 +1785,13 @@ def get_user_automation_rules(
 
 
 def trigger_automation_rule(db: Session, rule_id: int) -> bool:
-    """Mark an automation rule as triggered"""
-    rule = db.query(AutomationRule).filter(AutomationRule.rule_id == rule_id).first()
-    if not rule:
-        return False
-    
-    rule.times_triggered += 1
-    rule.last_triggered = datetime.utcnow()
+    """Mark an automation rule as triggered (the counter is incremented in SQL, so concurrent triggers all count)"""
+    rule = _update_returning(db, AutomationRule, AutomationRule.rule_id == rule_id, {
+        "times_triggered": AutomationRule.times_triggered + 1,
+        "last_triggered": datetime.utcnow()
+    })
     db.commit()
-    return True
+    return rule is not None
 
 
 # ============================================================================
@@ -780,41 +1814,120 @@ def create_merchant(
     )
     db.add(merchant)
     db.commit()
-    db.refresh(merchant)
+    merchant_index.add(merchant)
     return merchant
 
 
-def get_merchant_by_name(db: Session, merchant_name: str) -> Optional[Merchant]:
-    """Get merchant by name"""
+def find_merchant_by_name(db: Session, merchant_name: str) -> Optional[Merchant]:
+    """
+    Get a merchant by exact (case-insensitive) name.
+
+    Known merchants are resolved through the in-memory merchant index (then a
+    primary-key fetch). Misses are confirmed against the table, since another
+    worker may have created the merchant since the index was loaded.
+    """
+    if merchant_index.loaded:
+        entry = merchant_index.resolve(merchant_name)
+        if entry:
+            return db.get(Merchant, entry.merchant_id)
     return db.query(Merchant).filter(
-        Merchant.merchant_name.ilike(f"%{merchant_name}%")
+        func.lower(Merchant.merchant_name) == (merchant_name or "").strip().lower()
     ).first()
 
 
+def get_merchant_by_name(db: Session, merchant_name: str) -> Optional[Merchant]:
+    """Get the best-matching merchant by name (see search_merchants_by_name for ranking)"""
+    matches = search_merchants_by_name(db, merchant_name, limit=1)
+    return matches[0] if matches else None
+
+
 def get_or_create_merchant(
     db: Session,
     merchant_name: str,
     category: CategoryEnum
 ) -> Merchant:
-    """Get existing merchant or create new one"""
-    merchant = get_merchant_by_name(db, merchant_name)
+    """Get existing merchant (exact name match) or create new one"""
+    merchant = find_merchant_by_name(db, merchant_name)
     if not merchant:
-        merchant = create_merchant(db, merchant_name, category)
+        try:
+            merchant = create_merchant(db, merchant_name, category)
+        except IntegrityError:
+            # Created concurrently since the lookup (merchant_name is unique)
+            db.rollback()
+            merchant = find_merchant_by_name(db, merchant_name)
     return merchant
 
 
+def bulk_upsert_merchants(db: Session, merchants: List[Dict]) -> int:
+    """
+    Insert or update merchants by name in one statement, without committing.
+
+    Args:
+        db: Database session
+        merchants: Dictionaries with merchant_name, primary_category and
+            optionally secondary_categories and logo_url
+
+    Returns:
+        Number of merchants upserted (duplicate names collapsed, last wins)
+    """
+    now = datetime.utcnow()
+    rows = {}
+    for merchant in merchants:
+        rows[merchant["merchant_name"]] = {
+            "merchant_name": merchant["merchant_name"],
+            "primary_category": CategoryEnum(merchant["primary_category"]),
+            "secondary_categories": merchant.get("secondary_categories") or [],
+            "logo_url": merchant.get("logo_url"),
+            "has_special_offers": False,
+            "special_offers": [],
+            "created_at": now,
+            "updated_at": now,
+        }
+    if not rows:
+        return 0
+
+    # Rebuilt from the table on next use (after the caller commits)
+    merchant_index.clear()
+
+    statement = _upsert_statement(db, Merchant)
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=["merchant_name"],
+            set_={
+                column: getattr(statement.excluded, column)
+                for column in ("primary_category", "secondary_categories", "logo_url", "updated_at")
+            }
+        ),
+        list(rows.values())
+    )
+    return len(rows)
+
+
+def _escape_like(value: str) -> str:
+    """Escape LIKE wildcards so user input only matches literally (use with escape='\\')"""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
 def search_merchants_by_name(
     db: Session,
     query: str,
-    limit: int = 10
+    limit: int = 10,
+    category: Optional[CategoryEnum] = None
 ) -> List[Merchant]:
     """
-    Search merchants by name (case-insensitive, partial match)
+    Search merchants by name (case-insensitive, partial match), best matches first
+    
+    On PostgreSQL the substring match is served by the pg_trgm GIN index
+    (idx_merchant_name_trgm), near-misses such as typos also match through the
+    trigram similarity operator, and results are ranked by prefix match then
+    similarity. Other databases (SQLite in tests) fall back to LIKE, ranked by
+    prefix match, then word-prefix match, then shortest name.
     
     Args:
         db: Database session
         query: Search query string
         limit: Maximum number of results
+        category: Only return merchants with this primary category
         
     Returns:
         List of matching merchants
@@ -823,12 +1936,30 @@ def search_merchants_by_name(
         merchants = search_merchants_by_name(db, "star", limit=5)
         # Returns: [Merchant(name="Starbucks", ...)]
     """
-    if not query or len(query) < 1:
+    query = (query or "").strip()
+    if not query:
         return []
-    
-    return db.query(Merchant).filter(
-        Merchant.merchant_name.ilike(f"%{query}%")
-    ).order_by(Merchant.merchant_name).limit(limit).all()
+
+    pattern = _escape_like(query)
+    name = Merchant.merchant_name
+    contains = name.ilike(f"%{pattern}%", escape="\\")
+    prefix = name.ilike(f"{pattern}%", escape="\\")
+
+    statement = select(Merchant)
+    if category:
+        statement = statement.where(Merchant.primary_category == category)
+
+    if db.get_bind().dialect.name == "postgresql":
+        statement = statement.where(or_(contains, name.op("%")(query))).order_by(
+            desc(prefix), desc(func.similarity(name, query)), name
+        )
+    else:
+        word_prefix = name.ilike(f"% {pattern}%", escape="\\")
+        statement = statement.where(contains).order_by(
+            desc(prefix), desc(word_prefix), func.length(name), name
+        )
+
+    return db.execute(statement.limit(limit)).scalars().all()
 
 
 def get_all_merchants(
@@ -853,7 +1984,8 @@ def get_all_merchants(
 def get_merchants_by_category(
     db: Session,
     category: CategoryEnum,
-    limit: int = 50
+    limit: int = 50,
+    include_secondary: bool = False
 ) -> List[Merchant]:
     """
     Get merchants by category
@@ -862,13 +1994,15 @@ def get_merchants_by_category(
         db: Database session
         category: Category enum value
         limit: Maximum number of results
+        include_secondary: Also match merchants listing the category in secondary_categories
         
     Returns:
         List of merchants in the specified category
     """
-    return db.query(Merchant).filter(
-        Merchant.primary_category == category
-    ).order_by(Merchant.merchant_name).limit(limit).all()
+    condition = Merchant.primary_category == category
+    if include_secondary:
+        condition = or_(condition, _json_array_contains(db, Merchant.secondary_categories, category.value))
+    return db.query(Merchant).filter(condition).order_by(Merchant.merchant_name).limit(limit).all()
 
 
 # ============================================================================
@@ -920,7 +2054,6 @@ def create_ai_metrics(
     )
     db.add(metrics)
     db.commit()
-    db.refresh(metrics)
     return metrics
 
 
@@ -939,6 +2072,261 @@ def get_latest_ai_metrics(
 # ANALYTICS OPERATIONS
 # ============================================================================
 
+DAY_SECONDS = 24 * 60 * 60
+WEEK_SECONDS = 7 * DAY_SECONDS
+
+
+def _week_bucket_expr(db: Session, start_date: datetime):
+    """
+    SQL expression for the zero-based week index of a transaction, counted
+    from start_date (weeks are aligned to the window start, not the calendar).
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        elapsed = extract("epoch", Transaction.transaction_date - literal(start_date, DateTime))
+        return cast(func.floor(elapsed / WEEK_SECONDS), Integer)
+    # SQLite has no interval type, so work in Julian days instead
+    elapsed_days = func.julianday(Transaction.transaction_date) - func.julianday(start_date)
+    return cast(elapsed_days / 7, Integer)
+
+
+def _days_ago_bucket_expr(db: Session, end_date: datetime):
+    """
+    SQL expression for how many days before end_date a transaction is, rounded
+    up (0 only at end_date itself); days are aligned to end_date's time of day.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        elapsed = extract("epoch", literal(end_date, DateTime) - Transaction.transaction_date)
+        return cast(func.ceil(elapsed / DAY_SECONDS), Integer)
+    # SQLite has neither an interval type nor (always) ceil()
+    elapsed_days = func.julianday(end_date) - func.julianday(Transaction.transaction_date)
+    whole_days = cast(elapsed_days, Integer)
+    return whole_days + case((elapsed_days > whole_days, 1), else_=0)
+
+
+# Best-card row shape when rankings are merged with the archive
+BestCard = namedtuple("BestCard", ["recommended_card_id", "card_name", "total_value", "transaction_count"])
+
+
+def _merge_archived_rankings(db: Session, archived, in_window, rewards, top_merchants: int) -> Tuple:
+    """
+    Best card and top merchants over SQL rows plus archived rows.
+
+    The SQL side is grouped without a LIMIT (the archive can change the order),
+    and the rankings are computed over the merged groups.
+
+    Returns:
+        (best_card or None, [(merchant, count, spent, rewards), ...])
+    """
+    card_totals = {card_id: list(values) for card_id, values in archived.cards.items()}
+    for card_id, value, count in db.execute(
+        select(Transaction.recommended_card_id, func.sum(rewards), func.count(Transaction.transaction_id))
+        .where(in_window, Transaction.recommended_card_id.isnot(None))
+        .group_by(Transaction.recommended_card_id)
+    ):
+        total = card_totals.setdefault(card_id, [0.0, 0])
+        total[0] += value or 0.0
+        total[1] += count
+
+    best_card = None
+    if card_totals:
+        card_id, (value, count) = max(card_totals.items(), key=lambda item: item[1][0])
+        card_name = db.execute(select(CreditCard.card_name).where(CreditCard.card_id == card_id)).scalar()
+        best_card = BestCard(card_id, card_name, value, count)
+
+    merchant_totals = {merchant: list(values) for merchant, values in archived.merchants.items()}
+    for merchant, count, spent, earned in db.execute(
+        select(Transaction.merchant, func.count(Transaction.transaction_id), func.sum(Transaction.amount), func.sum(rewards))
+        .where(in_window)
+        .group_by(Transaction.merchant)
+    ):
+        total = merchant_totals.setdefault(merchant, [0, 0.0, 0.0])
+        total[0] += count
+        total[1] += spent
+        total[2] += earned or 0.0
+    merchants = sorted(
+        ((merchant, *values) for merchant, values in merchant_totals.items()),
+        key=lambda row: row[2],
+        reverse=True
+    )[:top_merchants]
+    return best_card, merchants
+
+
+def _aggregates_result(summary: List, best_card, category_totals: Dict, weeks: Dict, merchants: List) -> Dict:
+    """Shape the aggregates returned by _aggregate_user_transactions"""
+    return {
+        'summary': {
+            'count': summary[0],
+            'total_spent': summary[1],
+            'total_rewards': summary[2],
+            'total_potential': summary[3],
+            'missed_value': summary[4],
+            'followed': summary[5]
+        },
+        'best_card': best_card,
+        'categories': sorted(
+            ((category, *values) for category, values in category_totals.items()),
+            key=lambda row: row[2],
+            reverse=True
+        ),
+        'weeks': {index: tuple(values) for index, values in weeks.items()},
+        'merchants': merchants
+    }
+
+
+def _aggregate_user_transactions(
+    db: Session,
+    user_id: str,
+    start_date: datetime,
+    end_date: datetime,
+    top_merchants: int = 5
+) -> Dict:
+    """
+    Aggregate a user's transactions in [start_date, end_date] inside the database.
+
+    Every query is a GROUP BY over the user's window (or over the daily rollups
+    for whole days) and returns only aggregates, so the cost on the Python side
+    is independent of the number of transactions. Transactions moved to the
+    columnar archive are aggregated from its memory-mapped columns and merged in;
+    the SQL side then only covers the days from archived_through on.
+
+    Returns:
+        Dictionary with 'summary', 'best_card', 'categories', 'weeks' and 'merchants'
+    """
+    archived = transaction_archive.aggregate(user_id, start_date, end_date)
+    in_window = and_(
+        Transaction.user_id == user_id,
+        Transaction.transaction_date >= start_date,
+        Transaction.transaction_date <= end_date
+    )
+    rollup_filters = [
+        UserDailyRollup.user_id == user_id,
+        UserDailyRollup.day > start_date.date(),
+        UserDailyRollup.day < end_date.date()
+    ]
+    if archived is not None:
+        # Rows left behind by an interrupted archive run are counted from the archive
+        in_window = and_(in_window, Transaction.transaction_date >= archived.archived_through)
+        rollup_filters.append(UserDailyRollup.day >= archived.archived_through.date())
+    rewards = func.coalesce(Transaction.total_value_earned, 0.0)
+
+    # Days cut by a window edge or a week boundary are aggregated from the raw
+    # transactions; every other day falls in exactly one week and is read from
+    # the daily rollups.
+    split_days = {end_date.date()}
+    boundary = start_date
+    while boundary <= end_date:
+        split_days.add(boundary.date())
+        boundary += timedelta(days=7)
+
+    # (category, week) -> [count, spent, rewards, potential, missed, followed]
+    totals = {}
+
+    def accumulate(category, week_index, values):
+        bucket = totals.setdefault((category, week_index), [0, 0.0, 0.0, 0.0, 0.0, 0])
+        for i, value in enumerate(values):
+            bucket[i] += value or 0
+
+    # Weeks are half-open, so a transaction exactly at end_date is not bucketed
+    week = case(
+        (Transaction.transaction_date < end_date, _week_bucket_expr(db, start_date)),
+        else_=-1
+    ).label("week")
+    split_ranges = or_(*[
+        and_(
+            Transaction.transaction_date >= datetime.combine(day, time.min),
+            Transaction.transaction_date < datetime.combine(day + timedelta(days=1), time.min)
+        )
+        for day in sorted(split_days)
+    ])
+    raw_rows = db.execute(
+        select(
+            Transaction.category,
+            week,
+            func.count(Transaction.transaction_id),
+            func.sum(Transaction.amount),
+            func.sum(rewards),
+            func.sum(Transaction.optimal_value),
+            func.sum(Transaction.missed_value),
+            func.count(Transaction.transaction_id).filter(Transaction.used_recommended_card == True)
+        )
+        .where(in_window, split_ranges)
+        .group_by(Transaction.category, week)
+    ).all()
+    for category, week_index, *values in raw_rows:
+        accumulate(category, week_index, values)
+
+    rollup_rows = db.execute(
+        select(
+            UserDailyRollup.day,
+            UserDailyRollup.category,
+            func.sum(UserDailyRollup.transaction_count),
+            func.sum(UserDailyRollup.total_spent),
+            func.sum(UserDailyRollup.rewards_earned),
+            func.sum(UserDailyRollup.optimal_value),
+            func.sum(UserDailyRollup.missed_value),
+            func.sum(UserDailyRollup.followed_count)
+        )
+        .where(*rollup_filters, UserDailyRollup.day.notin_(sorted(split_days)))
+        .group_by(UserDailyRollup.day, UserDailyRollup.category)
+    ).all()
+    for day, category, *values in rollup_rows:
+        elapsed = datetime.combine(day, time.min) - start_date
+        accumulate(category, int(elapsed.total_seconds() // WEEK_SECONDS), values)
+
+    if archived is not None:
+        for (category, week_index), values in archived.totals.items():
+            accumulate(category, week_index, values)
+
+    summary = [0, 0.0, 0.0, 0.0, 0.0, 0]
+    category_totals = {}
+    weeks = {}
+    for (category, week_index), bucket in totals.items():
+        summary = [total + value for total, value in zip(summary, bucket)]
+        category_total = category_totals.setdefault(category.value if category else 'other', [0, 0.0, 0.0])
+        for i in range(3):
+            category_total[i] += bucket[i]
+        if week_index >= 0:
+            week_total = weeks.setdefault(week_index, [0, 0.0, 0.0])
+            for i in range(3):
+                week_total[i] += bucket[i]
+
+    if archived is not None and (archived.cards or archived.merchants):
+        best_card, merchants = _merge_archived_rankings(db, archived, in_window, rewards, top_merchants)
+        return _aggregates_result(summary, best_card, category_totals, weeks, merchants)
+
+    # Best card by rewards earned on its recommendations, with its name joined in
+    card_value = func.sum(rewards)
+    best_card = db.execute(
+        select(
+            Transaction.recommended_card_id,
+            CreditCard.card_name,
+            card_value.label("total_value"),
+            func.count(Transaction.transaction_id).label("transaction_count")
+        )
+        .outerjoin(CreditCard, CreditCard.card_id == Transaction.recommended_card_id)
+        .where(in_window, Transaction.recommended_card_id.isnot(None))
+        .group_by(Transaction.recommended_card_id, CreditCard.card_name)
+        .order_by(desc(card_value))
+        .limit(1)
+    ).first()
+
+    merchant_spent = func.sum(Transaction.amount)
+    merchants = db.execute(
+        select(
+            Transaction.merchant,
+            func.count(Transaction.transaction_id),
+            merchant_spent,
+            func.sum(rewards)
+        )
+        .where(in_window)
+        .group_by(Transaction.merchant)
+        .order_by(desc(merchant_spent))
+        .limit(top_merchants)
+    ).all()
+
+    return _aggregates_result(summary, best_card, category_totals, weeks, merchants)
+
+
 def get_user_analytics(
     db: Session,
     user_id: str,
@@ -955,127 +2343,74 @@ def get_user_analytics(
     # Get date range
     end_date = datetime.utcnow()
     start_date = end_date - timedelta(days=days)
-    
-    # Get all transactions in period
-    transactions = db.query(Transaction).filter(
-        and_(
-            Transaction.user_id == user_id,
-            Transaction.transaction_date >= start_date,
-            Transaction.transaction_date <= end_date
+
+    aggregates = _aggregate_user_transactions(db, user_id, start_date, end_date)
+    return _analytics_payload(aggregates, start_date, end_date, days, _count_active_cards(db, user_id))
+
+
+def _count_active_cards(db: Session, user_id: str) -> int:
+    return db.execute(
+        select(func.count(CreditCard.card_id)).where(
+            CreditCard.user_id == user_id,
+            CreditCard.is_active == True
         )
-    ).all()
-    
-    # Get user's cards
-    cards = get_user_cards(db, user_id, active_only=True)
-    
+    ).scalar_one()
+
+
+def _analytics_payload(
+    aggregates: Dict,
+    start_date: datetime,
+    end_date: datetime,
+    days: int,
+    total_cards_owned: int
+) -> Dict:
+    """Shape one window's aggregates into the /analytics response"""
+    summary = aggregates['summary']
+
     # Calculate basic stats
-    total_transactions = len(transactions)
-    total_spent = sum(t.amount for t in transactions)
-    total_rewards = sum(t.total_value_earned or 0 for t in transactions)
-    total_potential = sum(t.optimal_value or 0 for t in transactions)
-    missed_value = sum(t.missed_value or 0 for t in transactions)
-    
-    # Calculate best performing card
-    card_performance = {}
-    for txn in transactions:
-        if txn.recommended_card_id:
-            card_id = txn.recommended_card_id
-            if card_id not in card_performance:
-                card_performance[card_id] = {
-                    'total_value': 0,
-                    'transaction_count': 0,
-                    'total_spent': 0
-                }
-            card_performance[card_id]['total_value'] += txn.total_value_earned or 0
-            card_performance[card_id]['transaction_count'] += 1
-            card_performance[card_id]['total_spent'] += txn.amount
-    
+    total_transactions = summary['count']
+    total_spent = summary['total_spent']
+    total_rewards = summary['total_rewards']
+    total_potential = summary['total_potential']
+    missed_value = summary['missed_value']
+
+    # Best performing card
     best_card = None
-    best_card_value = 0
-    if card_performance:
-        best_card_id = max(card_performance, key=lambda k: card_performance[k]['total_value'])
-        best_card_data = card_performance[best_card_id]
-        best_card_obj = get_card(db, best_card_id)
-        if best_card_obj:
-            best_card = {
-                'card_id': best_card_id,
-                'card_name': best_card_obj.card_name,
-                'total_value': round(best_card_data['total_value'], 2),
-                'transaction_count': best_card_data['transaction_count'],
-                'avg_value_per_transaction': round(
-                    best_card_data['total_value'] / best_card_data['transaction_count'], 2
-                )
-            }
-            best_card_value = best_card_data['total_value']
-    
-    # Category breakdown
-    category_breakdown = {}
-    for txn in transactions:
-        category = txn.category.value if txn.category else 'other'
-        if category not in category_breakdown:
-            category_breakdown[category] = {
-                'count': 0,
-                'total_spent': 0,
-                'total_rewards': 0
-            }
-        category_breakdown[category]['count'] += 1
-        category_breakdown[category]['total_spent'] += txn.amount
-        category_breakdown[category]['total_rewards'] += txn.total_value_earned or 0
-    
-    # Sort categories by spending
-    category_breakdown = dict(
-        sorted(
-            category_breakdown.items(),
-            key=lambda x: x[1]['total_spent'],
-            reverse=True
-        )
-    )
-    
+    best_card_row = aggregates['best_card']
+    if best_card_row is not None and best_card_row.card_name is not None:
+        best_card = {
+            'card_id': best_card_row.recommended_card_id,
+            'card_name': best_card_row.card_name,
+            'total_value': round(best_card_row.total_value, 2),
+            'transaction_count': best_card_row.transaction_count,
+            'avg_value_per_transaction': round(
+                best_card_row.total_value / best_card_row.transaction_count, 2
+            )
+        }
+
     # Monthly trend (group by week for 30-day period)
     weekly_trends = []
+    week_index = 0
     current_week_start = start_date
     while current_week_start < end_date:
         week_end = min(current_week_start + timedelta(days=7), end_date)
-        week_txns = [
-            t for t in transactions
-            if current_week_start <= t.transaction_date < week_end
-        ]
+        count, spent, earned = aggregates['weeks'].get(week_index, (0, 0.0, 0.0))
         weekly_trends.append({
             'week_start': current_week_start.isoformat(),
             'week_end': week_end.isoformat(),
-            'transaction_count': len(week_txns),
-            'total_spent': round(sum(t.amount for t in week_txns), 2),
-            'total_rewards': round(sum(t.total_value_earned or 0 for t in week_txns), 2)
+            'transaction_count': count,
+            'total_spent': round(spent, 2),
+            'total_rewards': round(earned, 2)
         })
         current_week_start = week_end
-    
+        week_index += 1
+
     # Optimization insights
-    followed_recommendations = sum(1 for t in transactions if t.used_recommended_card)
-    optimization_rate = (followed_recommendations / total_transactions * 100) if total_transactions > 0 else 0
-    
+    optimization_rate = (summary['followed'] / total_transactions * 100) if total_transactions > 0 else 0
+
     # Calculate potential additional savings if user followed all recommendations
     potential_additional_savings = missed_value
-    
-    # Top merchants
-    merchant_spending = {}
-    for txn in transactions:
-        merchant = txn.merchant
-        if merchant not in merchant_spending:
-            merchant_spending[merchant] = {
-                'count': 0,
-                'total_spent': 0,
-                'total_rewards': 0
-            }
-        merchant_spending[merchant]['count'] += 1
-        merchant_spending[merchant]['total_spent'] += txn.amount
-        merchant_spending[merchant]['total_rewards'] += txn.total_value_earned or 0
-    
-    top_merchants = sorted(
-        merchant_spending.items(),
-        key=lambda x: x[1]['total_spent'],
-        reverse=True
-    )[:5]
-    
+
     return {
         'period': {
             'start_date': start_date.isoformat(),
@@ -1094,31 +2429,234 @@ def get_user_analytics(
         },
         'best_card': best_card,
         'category_breakdown': {
-            cat: {
-                'count': data['count'],
-                'total_spent': round(data['total_spent'], 2),
-                'total_rewards': round(data['total_rewards'], 2),
+            category: {
+                'count': count,
+                'total_spent': round(spent, 2),
+                'total_rewards': round(earned, 2),
                 'avg_rewards_rate': round(
-                    (data['total_rewards'] / data['total_spent'] * 100) if data['total_spent'] > 0 else 0,
+                    (earned / spent * 100) if spent > 0 else 0,
                     2
                 )
             }
-            for cat, data in category_breakdown.items()
+            for category, count, spent, earned in aggregates['categories']
         },
         'weekly_trends': weekly_trends,
         'top_merchants': [
             {
                 'merchant': merchant,
-                'transaction_count': data['count'],
-                'total_spent': round(data['total_spent'], 2),
-                'total_rewards': round(data['total_rewards'], 2)
+                'transaction_count': count,
+                'total_spent': round(spent, 2),
+                'total_rewards': round(earned, 2)
             }
-            for merchant, data in top_merchants
+            for merchant, count, spent, earned in aggregates['merchants']
         ],
         'insights': {
             'potential_additional_savings': round(potential_additional_savings, 2),
             'recommendation_follow_rate': round(optimization_rate, 2),
-            'total_cards_owned': len(cards),
+            'total_cards_owned': total_cards_owned,
             'best_performing_card': best_card['card_name'] if best_card else None
         }
     }
+
+
+def _aggregate_user_transaction_windows(
+    db: Session,
+    user_id: str,
+    windows: List[int],
+    end_date: datetime,
+    top_merchants: int = 5
+) -> Dict[int, Dict]:
+    """
+    Aggregate several trailing windows ending at end_date in one pass.
+
+    Every window ends at end_date, so all week boundaries fall at end_date's
+    time of day. Transactions are bucketed once by (category, days ago, rounded
+    up), from the raw rows on days cut by some window's boundary and from the
+    daily rollups on every other day. Each window then sums the buckets it
+    contains: bucket m is in a window of d days when m <= d, in week
+    (d - m) // 7. Best card and merchants come from one grouped query each,
+    with a FILTER per window.
+
+    Returns:
+        Window (days) -> aggregates, shaped like _aggregate_user_transactions
+    """
+    starts = {days: end_date - timedelta(days=days) for days in windows}
+    widest_start = min(starts.values())
+    in_widest = and_(
+        Transaction.user_id == user_id,
+        Transaction.transaction_date >= widest_start,
+        Transaction.transaction_date <= end_date
+    )
+    rewards = func.coalesce(Transaction.total_value_earned, 0.0)
+
+    split_days = {end_date.date()}
+    for days, start_date in starts.items():
+        boundary = start_date
+        while boundary <= end_date:
+            split_days.add(boundary.date())
+            boundary += timedelta(days=7)
+
+    # (category, days ago) -> [count, spent, rewards, potential, missed, followed]
+    buckets = {}
+
+    def accumulate(category, days_ago, values):
+        bucket = buckets.setdefault((category, days_ago), [0, 0.0, 0.0, 0.0, 0.0, 0])
+        for i, value in enumerate(values):
+            bucket[i] += value or 0
+
+    days_ago = _days_ago_bucket_expr(db, end_date).label("days_ago")
+    split_ranges = or_(*[
+        and_(
+            Transaction.transaction_date >= datetime.combine(day, time.min),
+            Transaction.transaction_date < datetime.combine(day + timedelta(days=1), time.min)
+        )
+        for day in sorted(split_days)
+    ])
+    for category, bucket_days_ago, *values in db.execute(
+        select(
+            Transaction.category,
+            days_ago,
+            func.count(Transaction.transaction_id),
+            func.sum(Transaction.amount),
+            func.sum(rewards),
+            func.sum(Transaction.optimal_value),
+            func.sum(Transaction.missed_value),
+            func.count(Transaction.transaction_id).filter(Transaction.used_recommended_card == True)
+        )
+        .where(in_widest, split_ranges)
+        .group_by(Transaction.category, days_ago)
+    ):
+        accumulate(category, bucket_days_ago, values)
+
+    # A day with no boundary of any window is in the same week of every window
+    # it belongs to, so any point of it gives its bucket
+    for day, category, *values in db.execute(
+        select(
+            UserDailyRollup.day,
+            UserDailyRollup.category,
+            func.sum(UserDailyRollup.transaction_count),
+            func.sum(UserDailyRollup.total_spent),
+            func.sum(UserDailyRollup.rewards_earned),
+            func.sum(UserDailyRollup.optimal_value),
+            func.sum(UserDailyRollup.missed_value),
+            func.sum(UserDailyRollup.followed_count)
+        )
+        .where(
+            UserDailyRollup.user_id == user_id,
+            UserDailyRollup.day > widest_start.date(),
+            UserDailyRollup.day < end_date.date(),
+            UserDailyRollup.day.notin_(sorted(split_days))
+        )
+        .group_by(UserDailyRollup.day, UserDailyRollup.category)
+    ):
+        elapsed = end_date - datetime.combine(day, time.min)
+        accumulate(category, -(-elapsed // timedelta(days=1)), values)
+
+    in_window = {days: Transaction.transaction_date >= start_date for days, start_date in starts.items()}
+    card_rows = db.execute(
+        select(
+            Transaction.recommended_card_id,
+            CreditCard.card_name,
+            *[
+                column
+                for days in windows
+                for column in (
+                    func.sum(rewards).filter(in_window[days]),
+                    func.count(Transaction.transaction_id).filter(in_window[days])
+                )
+            ]
+        )
+        .outerjoin(CreditCard, CreditCard.card_id == Transaction.recommended_card_id)
+        .where(in_widest, Transaction.recommended_card_id.isnot(None))
+        .group_by(Transaction.recommended_card_id, CreditCard.card_name)
+    ).all()
+    merchant_rows = db.execute(
+        select(
+            Transaction.merchant,
+            *[
+                column
+                for days in windows
+                for column in (
+                    func.count(Transaction.transaction_id).filter(in_window[days]),
+                    func.sum(Transaction.amount).filter(in_window[days]),
+                    func.sum(rewards).filter(in_window[days])
+                )
+            ]
+        )
+        .where(in_widest)
+        .group_by(Transaction.merchant)
+    ).all()
+
+    results = {}
+    for position, days in enumerate(windows):
+        summary = [0, 0.0, 0.0, 0.0, 0.0, 0]
+        category_totals = {}
+        weeks = {}
+        for (category, bucket_days_ago), bucket in buckets.items():
+            if bucket_days_ago > days:
+                continue
+            summary = [total + value for total, value in zip(summary, bucket)]
+            category_total = category_totals.setdefault(category.value if category else 'other', [0, 0.0, 0.0])
+            for i in range(3):
+                category_total[i] += bucket[i]
+            if bucket_days_ago > 0:
+                week_total = weeks.setdefault((days - bucket_days_ago) // 7, [0, 0.0, 0.0])
+                for i in range(3):
+                    week_total[i] += bucket[i]
+
+        best_card = None
+        cards = [
+            BestCard(row[0], row[1], row[2 + 2 * position] or 0.0, row[3 + 2 * position])
+            for row in card_rows if row[3 + 2 * position]
+        ]
+        if cards:
+            best_card = max(cards, key=lambda card: card.total_value)
+
+        merchants = sorted(
+            (
+                (row[0], row[1 + 3 * position], row[2 + 3 * position], row[3 + 3 * position] or 0.0)
+                for row in merchant_rows if row[1 + 3 * position]
+            ),
+            key=lambda row: row[2],
+            reverse=True
+        )[:top_merchants]
+
+        results[days] = _aggregates_result(summary, best_card, category_totals, weeks, merchants)
+    return results
+
+
+def get_user_analytics_windows(db: Session, user_id: str, windows: List[int]) -> Dict[int, Dict]:
+    """
+    Analytics for several trailing windows (e.g. 7, 30, 90 and 365 days) at once
+
+    All windows end at the same moment and are computed from one pass over the
+    widest window. Each payload matches get_user_analytics for that window.
+
+    Args:
+        db: Database session
+        user_id: User's unique identifier
+        windows: Window lengths in days
+
+    Returns:
+        Window (days) -> analytics payload
+    """
+    windows = sorted(set(windows))
+    end_date = datetime.utcnow()
+    total_cards_owned = _count_active_cards(db, user_id)
+
+    # Windows reaching into the columnar archive take the merging single-window path
+    archived_through = transaction_archive.archived_through(user_id)
+    archived_windows = [
+        days for days in windows
+        if archived_through is not None and end_date - timedelta(days=days) < archived_through
+    ]
+    single_pass = [days for days in windows if days not in archived_windows]
+
+    aggregates = _aggregate_user_transaction_windows(db, user_id, single_pass, end_date) if single_pass else {}
+    for days in archived_windows:
+        aggregates[days] = _aggregate_user_transactions(db, user_id, end_date - timedelta(days=days), end_date)
+
+    return {
+        days: _analytics_payload(aggregates[days], end_date - timedelta(days=days), end_date, days, total_cards_owned)
+        for days in windows
+    }
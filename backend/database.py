@@ -3,15 +3,23 @@ Database Configuration and Connection Management
 Handles PostgreSQL connection pooling and session management
 """
 
+from fastapi import Request
 from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.pool import QueuePool
 from contextlib import contextmanager
+from contextvars import ContextVar
+from itertools import count
+import hashlib
 import os
+import sqlite3
+import threading
 import time
-from typing import Generator
+from typing import AsyncGenerator, Dict, Generator, List, Optional
 
 from models import Base
+from cache import REPLICA
 from logging_config import get_db_logger
 from metrics import (
     DB_CONNECTION_POOL_SIZE,
@@ -42,6 +50,211 @@ class DatabaseConfig:
         # Echo SQL queries (for debugging)
         self.ECHO_SQL = os.getenv("DB_ECHO_SQL", "False").lower() == "true"
 
+        # Async driver URL (derived from DATABASE_URL unless set explicitly)
+        self.ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or to_async_url(self.DATABASE_URL)
+
+        # Read replicas (comma-separated URLs); reads go to the primary when empty
+        self.REPLICA_URLS = [
+            url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()
+        ]
+
+        # After a user writes, their reads stay on the primary for this long (replica lag cover)
+        self.READ_YOUR_WRITES_SECONDS = float(os.getenv("DB_READ_YOUR_WRITES_SECONDS", "5"))
+
+        # Per-statement timeouts by route class (see STATEMENT_TIMEOUT_ROUTES), 0 disables
+        self.STATEMENT_TIMEOUTS_MS = {
+            "fast": int(os.getenv("DB_STATEMENT_TIMEOUT_FAST_MS", "2000")),
+            "default": int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "10000")),
+            "analytics": int(os.getenv("DB_STATEMENT_TIMEOUT_ANALYTICS_MS", "60000")),
+        }
+
+        # User shards (comma-separated URLs, order matters); per-user rows live on
+        # shard_for_user(user_id). Empty = unsharded, everything on DATABASE_URL
+        self.SHARD_URLS = [
+            url.strip() for url in os.getenv("DATABASE_SHARD_URLS", "").split(",") if url.strip()
+        ]
+
+
+# Statement timeout class of each route (path template); other routes use "default".
+# Tight where a slow query would hold up a card swipe, generous for analytics scans.
+STATEMENT_TIMEOUT_ROUTES = {
+    "/api/v1/recommend": "fast",
+    "/api/v1/users/{user_id}/cards": "fast",
+    "/api/v1/users/{user_id}/cards/best": "fast",
+    "/api/v1/users/{user_id}/wallet/cards": "fast",
+    "/api/v1/wallet/cards/{user_card_id}": "fast",
+    "/api/v1/users/{user_id}/transactions": "analytics",
+    "/api/v1/users/{user_id}/transactions/import": "analytics",
+    "/api/v1/users/{user_id}/stats": "analytics",
+    "/api/v1/users/{user_id}/analytics": "analytics",
+    "/api/v1/users/{user_id}/analytics/windows": "analytics",
+    "/api/v1/users/{user_id}/opportunities": "analytics",
+}
+
+# Session.info key holding the session's statement timeout in milliseconds
+STATEMENT_TIMEOUT_MS = "statement_timeout_ms"
+
+# Seconds clients are told to wait after a statement timeout (Retry-After)
+STATEMENT_TIMEOUT_RETRY_AFTER = os.getenv("DB_STATEMENT_TIMEOUT_RETRY_AFTER", "2")
+
+# Statement timeouts hit while handling the current request (see watch_statement_timeouts)
+_statement_timeouts: ContextVar[Optional[list]] = ContextVar("statement_timeouts", default=None)
+
+
+# Client-held last-write timestamp (unix seconds) that keeps a client's reads on
+# the primary in every worker, not just the one that took the write
+LAST_WRITE_COOKIE = "last_write_at"
+LAST_WRITE_HEADER = "X-Last-Write-At"
+
+# Users whose writes committed while handling the current request (see watch_writes)
+_request_writes: ContextVar[Optional[set]] = ContextVar("request_writes", default=None)
+
+
+def is_statement_timeout(error: BaseException) -> bool:
+    """Whether a DBAPI error (or the SQLAlchemy error wrapping it) is a cancelled statement"""
+    orig = getattr(error, "orig", None) or error
+    # PostgreSQL query_canceled (psycopg2 pgcode / asyncpg sqlstate)
+    if getattr(orig, "pgcode", None) == "57014" or getattr(orig, "sqlstate", None) == "57014":
+        return True
+    # SQLite progress handler abort
+    return isinstance(orig, sqlite3.OperationalError) and str(orig) == "interrupted"
+
+
+@contextmanager
+def watch_statement_timeouts() -> Generator[list, None, None]:
+    """
+    Collect the statements that time out inside this context (including work
+    run in worker threads or tasks started from it), e.g. for one request
+    """
+    timeouts: list = []
+    token = _statement_timeouts.set(timeouts)
+    try:
+        yield timeouts
+    finally:
+        _statement_timeouts.reset(token)
+
+
+@contextmanager
+def watch_writes() -> Generator[set, None, None]:
+    """
+    Collect the users whose writes commit inside this context (including work
+    run in worker threads or tasks started from it), e.g. for one request
+    """
+    written: set = set()
+    token = _request_writes.set(written)
+    try:
+        yield written
+    finally:
+        _request_writes.reset(token)
+
+
+@event.listens_for(Session, "after_begin")
+def _apply_statement_timeout(session, transaction, connection):
+    """Bound every statement of the transaction by the session's statement timeout"""
+    timeout_ms = session.info.get(STATEMENT_TIMEOUT_MS)
+    if not timeout_ms:
+        return
+    if connection.dialect.name == "postgresql":
+        # Transaction-scoped: reverts on commit/rollback, so pooled connections stay clean
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
+    else:
+        # Enforced per statement by the SQLite progress handler (_setup_statement_timeouts)
+        connection.info[STATEMENT_TIMEOUT_MS] = timeout_ms
+
+
+# Async drivers used for each sync dialect
+ASYNC_DRIVERS = {
+    "postgresql": "asyncpg",
+    "sqlite": "aiosqlite",
+}
+
+
+def to_async_url(url: str) -> str:
+    """
+    Convert a sync database URL to its async-driver equivalent
+    e.g. postgresql://... -> postgresql+asyncpg://..., sqlite:///x.db -> sqlite+aiosqlite:///x.db
+    """
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None:
+        return url
+    return parsed.set(drivername=f"{parsed.get_backend_name()}+{driver}").render_as_string(hide_password=False)
+
+
+class RecentWriters:
+    """Users who committed a write recently, so their reads can stay on the primary"""
+
+    def __init__(self, window_seconds: float):
+        self.window_seconds = window_seconds
+        self._written_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def mark(self, user_id: str) -> None:
+        with self._lock:
+            self._written_at[user_id] = time.monotonic()
+
+    def is_recent(self, user_id: Optional[str]) -> bool:
+        if not user_id:
+            return False
+        written_at = self._written_at.get(user_id)
+        if written_at is None:
+            return False
+        if time.monotonic() - written_at > self.window_seconds:
+            with self._lock:
+                self._written_at.pop(user_id, None)
+            return False
+        return True
+
+
+def _describe_statement(statement: str):
+    """Operation type and (first) table of a SQL statement, for query metrics"""
+    statement_lower = statement.lower().strip()
+    if statement_lower.startswith('select'):
+        operation = 'select'
+    elif statement_lower.startswith('insert'):
+        operation = 'insert'
+    elif statement_lower.startswith('update'):
+        operation = 'update'
+    elif statement_lower.startswith('delete'):
+        operation = 'delete'
+    else:
+        operation = 'other'
+
+    # Simple table extraction (basic approach)
+    table = 'unknown'
+    if 'from ' in statement_lower:
+        parts = statement_lower.split('from ')
+        if len(parts) > 1:
+            table = parts[1].split()[0].strip('"')
+    elif 'into ' in statement_lower:
+        parts = statement_lower.split('into ')
+        if len(parts) > 1:
+            table = parts[1].split()[0].strip('"')
+    elif 'update ' in statement_lower:
+        parts = statement_lower.split('update ')
+        if len(parts) > 1:
+            table = parts[1].split()[0].strip('"')
+    return operation, table
+
+
+def shard_for_user(user_id: str, shard_count: int) -> int:
+    """
+    Stable shard index of a user (jump consistent hash of sha256(user_id))
+    Growing from N to N+1 shards moves only ~1/(N+1) of the users, all of them
+    onto the new shard. Independent of PYTHONHASHSEED, so every process agrees.
+    """
+    key = int.from_bytes(hashlib.sha256(user_id.encode()).digest()[:8], "big")
+    bucket, candidate = -1, 0
+    while candidate < shard_count:
+        bucket = candidate
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        candidate = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def _written_user_ids(objects) -> set:
+    return {getattr(obj, "user_id", None) for obj in objects} - {None}
+
 
 class Database:
     """Database manager - handles connections and sessions"""
@@ -50,12 +263,29 @@ class Database:
         self.config = DatabaseConfig()
         self.engine = None
         self.SessionLocal = None
+        self.replica_engines: List = []
+        self.ReplicaSessionLocals: List[sessionmaker] = []
+        self._async_engine = None
+        self._AsyncSessionLocal = None
+        self._async_replica_engines: List = []
+        self._AsyncReplicaSessionLocals: List = []
+        self._replica_counter = count()
+        self.shard_engines: List = []
+        self.ShardSessionLocals: List[sessionmaker] = []
+        self._async_shard_engines: List = []
+        self._AsyncShardSessionLocals: List = []
+        self.recent_writers = RecentWriters(self.config.READ_YOUR_WRITES_SECONDS)
+
+        # Primary sessions record which users they wrote for (read-your-writes)
+        self._PrimarySession = type("PrimarySession", (Session,), {})
+        self._setup_write_tracking(self._PrimarySession)
+
         self._initialize_engine()
     
-    def _initialize_engine(self):
-        """Initialize database engine with connection pooling"""
-        self.engine = create_engine(
-            self.config.DATABASE_URL,
+    def _create_engine(self, url: str):
+        """Create a sync engine with the configured connection pooling"""
+        return create_engine(
+            url,
             poolclass=QueuePool,
             pool_size=self.config.POOL_SIZE,
             max_overflow=self.config.MAX_OVERFLOW,
@@ -64,87 +294,355 @@ class Database:
             echo=self.config.ECHO_SQL,
             future=True
         )
+
+    def _initialize_engine(self):
+        """Initialize database engine with connection pooling"""
+        self.engine = self._create_engine(self.config.DATABASE_URL)
         
         self.SessionLocal = sessionmaker(
+            class_=self._PrimarySession,
             autocommit=False,
             autoflush=False,
+            # Objects stay usable after commit: crud writes return what the
+            # INSERT/UPDATE ... RETURNING produced instead of re-SELECTing it
+            expire_on_commit=False,
             bind=self.engine
         )
 
         # Set up connection pool metrics
-        self._setup_pool_metrics()
+        self._setup_pool_metrics(self.engine, "primary")
 
         # Set up query timing
-        self._setup_query_timing()
-
-    def _setup_pool_metrics(self):
-        """Set up event listeners for connection pool metrics"""
-        @event.listens_for(self.engine, "checkout")
-        def on_checkout(dbapi_conn, connection_record, connection_proxy):
-            pool = self.engine.pool
-            DB_CONNECTION_POOL_SIZE.set(pool.size())
-            DB_CONNECTION_POOL_CHECKED_OUT.set(pool.checkedout())
-            DB_CONNECTION_POOL_OVERFLOW.set(pool.overflow())
-
-        @event.listens_for(self.engine, "checkin")
-        def on_checkin(dbapi_conn, connection_record):
-            pool = self.engine.pool
-            DB_CONNECTION_POOL_SIZE.set(pool.size())
-            DB_CONNECTION_POOL_CHECKED_OUT.set(pool.checkedout())
-            DB_CONNECTION_POOL_OVERFLOW.set(pool.overflow())
-
-    def _setup_query_timing(self):
+        self._setup_query_timing(self.engine)
+        self._setup_statement_timeouts(self.engine)
+
+        # Read replicas
+        for i, url in enumerate(self.config.REPLICA_URLS):
+            replica_engine = self._create_engine(url)
+            self.replica_engines.append(replica_engine)
+            # Marked so the read cache never fills from (possibly lagging) replica reads
+            self.ReplicaSessionLocals.append(sessionmaker(
+                autocommit=False,
+                autoflush=False,
+                bind=replica_engine,
+                info={REPLICA: True}
+            ))
+            self._setup_pool_metrics(replica_engine, f"replica_{i}")
+            self._setup_query_timing(replica_engine)
+            self._setup_statement_timeouts(replica_engine)
+
+        if self.replica_engines:
+            logger.info("Read replicas configured", extra={
+                'event': 'replicas_configured',
+                'replicas': len(self.replica_engines)
+            })
+
+        # User shards (the primary keeps the global card library and merchants)
+        for i, url in enumerate(self.config.SHARD_URLS):
+            shard_engine = self._create_engine(url)
+            self.shard_engines.append(shard_engine)
+            self.ShardSessionLocals.append(sessionmaker(
+                class_=self._PrimarySession,
+                autocommit=False,
+                autoflush=False,
+                expire_on_commit=False,
+                bind=shard_engine
+            ))
+            self._setup_pool_metrics(shard_engine, f"shard_{i}")
+            self._setup_query_timing(shard_engine)
+            self._setup_statement_timeouts(shard_engine)
+
+        if self.shard_engines:
+            logger.info("User shards configured", extra={
+                'event': 'shards_configured',
+                'shards': len(self.shard_engines)
+            })
+
+    def _initialize_async_engine(self):
+        """
+        Initialize the async engine (asyncpg / aiosqlite) on first use
+        Imported lazily so sync-only tools (scripts, migrations) don't need the async drivers
+        """
+        from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+        def create(url):
+            pool_options = {}
+            if make_url(url).get_backend_name() != "sqlite":
+                pool_options = dict(
+                    pool_size=self.config.POOL_SIZE,
+                    max_overflow=self.config.MAX_OVERFLOW,
+                    pool_timeout=self.config.POOL_TIMEOUT,
+                    pool_recycle=self.config.POOL_RECYCLE,
+                )
+            return create_async_engine(url, echo=self.config.ECHO_SQL, **pool_options)
+
+        self._async_engine = create(self.config.ASYNC_DATABASE_URL)
+
+        # expire_on_commit=False: attributes can't be lazily reloaded outside a greenlet,
+        # so objects returned from a committed session must stay readable
+        self._AsyncSessionLocal = async_sessionmaker(
+            bind=self._async_engine,
+            class_=AsyncSession,
+            sync_session_class=self._PrimarySession,
+            autoflush=False,
+            expire_on_commit=False
+        )
+
+        # Events are registered on the sync facade of the async engine
+        self._setup_pool_metrics(self._async_engine.sync_engine, "primary_async")
+        self._setup_query_timing(self._async_engine.sync_engine)
+        self._setup_statement_timeouts(self._async_engine.sync_engine)
+
+        for i, url in enumerate(self.config.REPLICA_URLS):
+            replica_engine = create(to_async_url(url))
+            self._async_replica_engines.append(replica_engine)
+            self._AsyncReplicaSessionLocals.append(async_sessionmaker(
+                bind=replica_engine,
+                class_=AsyncSession,
+                autoflush=False,
+                expire_on_commit=False,
+                info={REPLICA: True}
+            ))
+            self._setup_pool_metrics(replica_engine.sync_engine, f"replica_{i}_async")
+            self._setup_query_timing(replica_engine.sync_engine)
+            self._setup_statement_timeouts(replica_engine.sync_engine)
+
+        for i, url in enumerate(self.config.SHARD_URLS):
+            shard_engine = create(to_async_url(url))
+            self._async_shard_engines.append(shard_engine)
+            self._AsyncShardSessionLocals.append(async_sessionmaker(
+                bind=shard_engine,
+                class_=AsyncSession,
+                sync_session_class=self._PrimarySession,
+                autoflush=False,
+                expire_on_commit=False
+            ))
+            self._setup_pool_metrics(shard_engine.sync_engine, f"shard_{i}_async")
+            self._setup_query_timing(shard_engine.sync_engine)
+            self._setup_statement_timeouts(shard_engine.sync_engine)
+
+    @property
+    def async_engine(self):
+        """Async engine, created on first access"""
+        if self._async_engine is None:
+            self._initialize_async_engine()
+        return self._async_engine
+
+    @property
+    def AsyncSessionLocal(self):
+        """Async session factory, created on first access"""
+        if self._AsyncSessionLocal is None:
+            self._initialize_async_engine()
+        return self._AsyncSessionLocal
+
+    def _setup_pool_metrics(self, engine, pool_name: str):
+        """Set up event listeners for connection pool metrics, labelled by pool"""
+        if not isinstance(engine.pool, QueuePool):
+            # e.g. aiosqlite's NullPool/StaticPool - nothing meaningful to report
+            return
+
+        def report(*args):
+            pool = engine.pool
+            DB_CONNECTION_POOL_SIZE.labels(pool=pool_name).set(pool.size())
+            DB_CONNECTION_POOL_CHECKED_OUT.labels(pool=pool_name).set(pool.checkedout())
+            DB_CONNECTION_POOL_OVERFLOW.labels(pool=pool_name).set(pool.overflow())
+
+        event.listen(engine, "checkout", report)
+        event.listen(engine, "checkin", report)
+
+    def _setup_write_tracking(self, session_class):
+        """
+        Remember which users each primary session wrote for, and mark them as
+        recent writers once the transaction commits (read-your-writes routing)
+        """
+        @event.listens_for(session_class, "after_flush")
+        def after_flush(session, flush_context):
+            written = _written_user_ids(session.new) | _written_user_ids(session.dirty) | _written_user_ids(session.deleted)
+            session.info.setdefault("written_user_ids", set()).update(written)
+
+        @event.listens_for(session_class, "do_orm_execute")
+        def do_orm_execute(orm_execute_state):
+            # Bulk / Core-style ORM writes, e.g. session.execute(insert(Transaction), rows)
+            if orm_execute_state.is_select:
+                return
+            parameters = orm_execute_state.parameters
+            rows = parameters if isinstance(parameters, list) else [parameters or {}]
+            written = {row.get("user_id") for row in rows if isinstance(row, dict)} - {None}
+            orm_execute_state.session.info.setdefault("written_user_ids", set()).update(written)
+
+        @event.listens_for(session_class, "after_commit")
+        def after_commit(session):
+            written = session.info.pop("written_user_ids", set())
+            for user_id in written:
+                self.recent_writers.mark(user_id)
+            request_writes = _request_writes.get()
+            if request_writes is not None:
+                request_writes.update(written)
+
+        @event.listens_for(session_class, "after_rollback")
+        def after_rollback(session):
+            session.info.pop("written_user_ids", None)
+
+    def _setup_query_timing(self, engine):
         """Set up event listeners for query timing"""
-        @event.listens_for(self.engine, "before_cursor_execute")
+        @event.listens_for(engine, "before_cursor_execute")
         def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
             conn.info.setdefault('query_start_time', []).append(time.time())
 
-        @event.listens_for(self.engine, "after_cursor_execute")
+        @event.listens_for(engine, "after_cursor_execute")
         def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
             total = time.time() - conn.info['query_start_time'].pop()
-            # Extract operation type and table from statement
-            statement_lower = statement.lower().strip()
-            if statement_lower.startswith('select'):
-                operation = 'select'
-            elif statement_lower.startswith('insert'):
-                operation = 'insert'
-            elif statement_lower.startswith('update'):
-                operation = 'update'
-            elif statement_lower.startswith('delete'):
-                operation = 'delete'
-            else:
-                operation = 'other'
-
-            # Simple table extraction (basic approach)
-            table = 'unknown'
-            if 'from ' in statement_lower:
-                parts = statement_lower.split('from ')
-                if len(parts) > 1:
-                    table = parts[1].split()[0].strip('"')
-            elif 'into ' in statement_lower:
-                parts = statement_lower.split('into ')
-                if len(parts) > 1:
-                    table = parts[1].split()[0].strip('"')
-            elif 'update ' in statement_lower:
-                parts = statement_lower.split('update ')
-                if len(parts) > 1:
-                    table = parts[1].split()[0].strip('"')
-
+            operation, table = _describe_statement(statement)
             track_db_query(operation, table, total)
+
+        @event.listens_for(engine, "handle_error")
+        def handle_error(context):
+            connection = context.connection
+            started = connection.info.get('query_start_time') if connection is not None else None
+            total = time.time() - started.pop() if started else 0.0
+            track_db_query(*_describe_statement(context.statement or ""), total, success=False)
+
+            if is_statement_timeout(context.original_exception):
+                timeouts = _statement_timeouts.get()
+                if timeouts is not None:
+                    timeouts.append(context.statement)
+                logger.warning("Statement timed out", extra={
+                    'event': 'statement_timeout',
+                    'duration_ms': round(total * 1000, 2),
+                    'statement': (context.statement or "")[:200]
+                })
+
+    def _setup_statement_timeouts(self, engine):
+        """
+        SQLite has no statement_timeout; abort statements that run past the
+        session's timeout with a progress handler instead (sqlite3 driver only).
+        PostgreSQL timeouts are SET LOCAL when the session begins.
+        """
+        if engine.dialect.name != "sqlite":
+            return
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def start_deadline(conn, cursor, statement, parameters, context, executemany):
+            timeout_ms = conn.info.get(STATEMENT_TIMEOUT_MS)
+            dbapi_connection = conn.connection.dbapi_connection
+            if not timeout_ms or not hasattr(dbapi_connection, "set_progress_handler"):
+                return
+            deadline = time.monotonic() + timeout_ms / 1000
+            dbapi_connection.set_progress_handler(lambda: time.monotonic() > deadline, 1000)
+
+        @event.listens_for(engine, "checkin")
+        def clear_deadline(dbapi_connection, connection_record):
+            if connection_record.info.pop(STATEMENT_TIMEOUT_MS, None) and hasattr(dbapi_connection, "set_progress_handler"):
+                dbapi_connection.set_progress_handler(None, 0)
+
+    def apply_statement_timeout(self, session, request: Optional[Request]) -> None:
+        """Give a request's session the statement timeout of its route class"""
+        route = request.scope.get("route") if request is not None else None
+        route_class = STATEMENT_TIMEOUT_ROUTES.get(getattr(route, "path", None), "default")
+        timeout_ms = self.config.STATEMENT_TIMEOUTS_MS.get(route_class)
+        if timeout_ms:
+            session.info[STATEMENT_TIMEOUT_MS] = timeout_ms
     
     def create_tables(self):
-        """Create all tables in the database"""
+        """Create all tables in the database (and on every user shard)"""
         Base.metadata.create_all(bind=self.engine)
+        for shard_engine in self.shard_engines:
+            Base.metadata.create_all(bind=shard_engine)
         logger.info("All database tables created successfully", extra={'event': 'tables_created'})
 
     def drop_tables(self):
         """Drop all tables (use with caution!)"""
         Base.metadata.drop_all(bind=self.engine)
+        for shard_engine in self.shard_engines:
+            Base.metadata.drop_all(bind=shard_engine)
         logger.warning("All database tables dropped", extra={'event': 'tables_dropped'})
     
     def get_session(self) -> Session:
         """Get a new database session"""
         return self.SessionLocal()
+
+    def get_async_session(self):
+        """Get a new async database session"""
+        return self.AsyncSessionLocal()
+
+    @property
+    def sharded(self) -> bool:
+        """True when per-user data is spread over DATABASE_SHARD_URLS"""
+        return bool(self.config.SHARD_URLS)
+
+    def shard_index(self, user_id: str) -> int:
+        """Index of the shard holding user_id's rows"""
+        return shard_for_user(user_id, len(self.config.SHARD_URLS))
+
+    def get_shard_session(self, user_id: Optional[str]) -> Session:
+        """
+        Get a session on the shard that holds user_id's rows
+        Falls back to the primary when unsharded or no user is known.
+        """
+        if not self.sharded or not user_id:
+            return self.get_session()
+        return self.ShardSessionLocals[self.shard_index(user_id)]()
+
+    def get_async_shard_session(self, user_id: Optional[str]):
+        """Async counterpart of get_shard_session"""
+        if not self.sharded or not user_id:
+            return self.get_async_session()
+        if self._AsyncSessionLocal is None:
+            self._initialize_async_engine()
+        return self._AsyncShardSessionLocals[self.shard_index(user_id)]()
+
+    def user_sessionmakers(self, user_id: Optional[str] = None) -> List[sessionmaker]:
+        """
+        Session factories of every database holding user rows (fan-out queries
+        and maintenance jobs), or only user_id's shard when given
+        """
+        if self.sharded and user_id:
+            return [self.ShardSessionLocals[self.shard_index(user_id)]]
+        return self.ShardSessionLocals if self.sharded else [self.SessionLocal]
+
+    def async_user_sessionmakers(self) -> List:
+        """Async counterpart of user_sessionmakers"""
+        if self._AsyncSessionLocal is None:
+            self._initialize_async_engine()
+        return self._AsyncShardSessionLocals if self.sharded else [self._AsyncSessionLocal]
+
+    def _use_primary_for_read(self, user_id: Optional[str], last_write_at: Optional[float] = None) -> bool:
+        """
+        Reads go to the primary without replicas, or right after this user wrote:
+        in this worker (recent_writers), or in any worker per the client's last-write timestamp
+        """
+        if not self.config.REPLICA_URLS or self.recent_writers.is_recent(user_id):
+            return True
+        # abs(): tolerate clock skew between hosts, and ignore far-future timestamps
+        return last_write_at is not None and abs(time.time() - last_write_at) <= self.config.READ_YOUR_WRITES_SECONDS
+
+    def _next_replica(self) -> int:
+        """Round-robin replica index"""
+        return next(self._replica_counter) % len(self.config.REPLICA_URLS)
+
+    def get_read_session(self, user_id: Optional[str] = None, last_write_at: Optional[float] = None) -> Session:
+        """
+        Get a session for read-only work
+        Routed to the next replica (round-robin), or to the primary when no
+        replicas are configured or user_id / the client (last_write_at, unix
+        seconds) wrote within the read-your-writes window.
+        A user's reads go to their shard when sharded (shards have no replicas).
+        """
+        if self.sharded and user_id:
+            return self.get_shard_session(user_id)
+        if self._use_primary_for_read(user_id, last_write_at):
+            return self.get_session()
+        return self.ReplicaSessionLocals[self._next_replica()]()
+
+    def get_async_read_session(self, user_id: Optional[str] = None, last_write_at: Optional[float] = None):
+        """Async counterpart of get_read_session"""
+        if self.sharded and user_id:
+            return self.get_async_shard_session(user_id)
+        if self._use_primary_for_read(user_id, last_write_at):
+            return self.get_async_session()
+        if self._AsyncSessionLocal is None:
+            self._initialize_async_engine()
+        return self._AsyncReplicaSessionLocals[self._next_replica()]()
     
     @contextmanager
     def session_scope(self) -> Generator[Session, None, None]:
@@ -183,29 +681,136 @@ class Database:
         """Close all database connections"""
         if self.engine:
             self.engine.dispose()
+            for other_engine in self.replica_engines + self.shard_engines:
+                other_engine.dispose()
             logger.info("Database connections closed", extra={'event': 'connections_closed'})
 
+    async def close_async(self):
+        """Close all async database connections"""
+        if self._async_engine:
+            await self._async_engine.dispose()
+            for other_engine in self._async_replica_engines + self._async_shard_engines:
+                await other_engine.dispose()
+            logger.info("Async database connections closed", extra={'event': 'async_connections_closed'})
+
 
 # Global database instance
 db = Database()
 
 
 # Dependency for FastAPI
-def get_db() -> Generator[Session, None, None]:
+def get_db(request: Request = None) -> Generator[Session, None, None]:
     """
     FastAPI dependency to get database session
+    Statements are bounded by the route's timeout (STATEMENT_TIMEOUT_ROUTES).
     Usage in FastAPI:
         @app.get("/users")
         def get_users(db: Session = Depends(get_db)):
             return db.query(User).all()
     """
     session = db.get_session()
+    db.apply_statement_timeout(session, request)
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+# Async dependency for FastAPI
+async def get_async_db(request: Request = None) -> AsyncGenerator:
+    """
+    FastAPI dependency to get an async database session
+    Queries are awaited instead of blocking the event loop.
+    Usage in FastAPI:
+        @app.get("/users/{user_id}")
+        async def read_user(user_id: str, db: AsyncSession = Depends(get_async_db)):
+            return await async_crud.get_user(db, user_id)
+    """
+    session = db.get_async_session()
+    db.apply_statement_timeout(session, request)
+    try:
+        yield session
+    finally:
+        await session.close()
+
+
+def _path_user_id(request) -> Optional[str]:
+    return request.path_params.get("user_id") if request is not None else None
+
+
+# Read-only dependencies for FastAPI (replica routing)
+def _last_write_at(request: Request) -> Optional[float]:
+    """The client's last-write timestamp (cookie, or header for clients without cookies)"""
+    value = request.cookies.get(LAST_WRITE_COOKIE) or request.headers.get(LAST_WRITE_HEADER)
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def get_read_db(request: Request) -> Generator[Session, None, None]:
+    """
+    FastAPI dependency for read-only endpoints
+    Uses a read replica unless the path's {user_id} or the client wrote recently
+    (read-your-writes). Never write through this session.
+    """
+    session = db.get_read_session(_path_user_id(request), _last_write_at(request))
+    db.apply_statement_timeout(session, request)
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+async def get_async_read_db(request: Request) -> AsyncGenerator:
+    """Async counterpart of get_read_db"""
+    session = db.get_async_read_session(_path_user_id(request), _last_write_at(request))
+    db.apply_statement_timeout(session, request)
+    try:
+        yield session
+    finally:
+        await session.close()
+
+
+async def _request_user_id(request: Request) -> Optional[str]:
+    """The user a request acts for: path {user_id}, then ?user_id=, then a JSON body's user_id"""
+    user_id = request.path_params.get("user_id") or request.query_params.get("user_id")
+    if user_id is None and "json" in request.headers.get("content-type", ""):
+        try:
+            # Starlette caches the parsed body, so the endpoint doesn't read it twice
+            body = await request.json()
+        except ValueError:
+            body = None
+        if isinstance(body, dict) and isinstance(body.get("user_id"), str):
+            user_id = body["user_id"]
+    return user_id
+
+
+# Per-user dependencies for FastAPI (shard routing)
+async def get_user_db(request: Request) -> AsyncGenerator:
+    """
+    FastAPI dependency for endpoints that read and write one user's rows
+    The session is on that user's shard (see _request_user_id); on the primary
+    when unsharded. Yields a sync Session, like get_db.
+    """
+    session = db.get_shard_session(await _request_user_id(request))
+    db.apply_statement_timeout(session, request)
     try:
         yield session
     finally:
         session.close()
 
 
+async def get_async_user_db(request: Request) -> AsyncGenerator:
+    """Async counterpart of get_user_db"""
+    session = db.get_async_shard_session(await _request_user_id(request))
+    db.apply_statement_timeout(session, request)
+    try:
+        yield session
+    finally:
+        await session.close()
+
+
 # Initialize database tables (call this on startup)
 def init_db():
     """Initialize database - create all tables"""
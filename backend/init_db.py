@@ -8,6 +8,7 @@ from crud import create_user, create_credit_cards_from_library
 from models import Base, OptimizationGoalEnum
 from auth import hash_password
 from scripts.seed_merchants import seed_merchants
+from sharding import sync_card_library, move_user
 
 
 def init_and_seed_database():
@@ -49,6 +50,15 @@ def init_and_seed_database():
 
         session.commit()
 
+        # With user shards the library stays on the global shard (copied to
+        # every shard) and the test user's own rows go to their shard
+        if db.sharded:
+            print(f"\n🧩 Copying the card library to {len(db.shard_engines)} user shards...")
+            sync_card_library(db)
+            with db.get_shard_session(user.user_id) as shard_session:
+                move_user(session, shard_session, user.user_id)
+            print(f"   ✅ Test user stored on shard {db.shard_index(user.user_id)}")
+
         # Seed merchants from merchants.json
         print(f"\n🏪 Seeding merchants from merchants.json...")
         try:
@@ -0,0 +1,382 @@
+"""
+Cross-Worker Cache Invalidation
+Each API worker keeps its own read cache and merchant index. This bus sends
+the tags of every committed write (see ReadCache.add_publisher) to the other
+workers, which drop the matching local entries:
+
+- PostgreSQL: NOTIFY on the cache_invalidation channel, received by a LISTEN
+  connection watched by the event loop (no polling)
+- Other databases (SQLite): rows in cache_invalidations, polled every
+  CACHE_INVALIDATION_POLL_MS and deleted after CACHE_INVALIDATION_RETENTION_SECONDS
+
+If the LISTEN connection is lost (e.g. PostgreSQL restarted or failed over)
+the worker drops its whole local cache, falls back to sending NOTIFY through
+the pool plus cache_invalidations rows and polling the rows ("degraded"), and
+reconnects with backoff; it drops its cache again once it is listening.
+
+Tags are batched: writes only add to an outbox and wake the sender, so the
+request path never waits on the bus. A worker ignores its own messages (it
+invalidated locally at commit). With the bus running, the read cache TTL only
+covers messages lost to a crashed worker, so it can be long.
+"""
+
+import asyncio
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional, Set
+
+from sqlalchemy import delete, func, insert, select
+
+from cache import read_cache, ALL, MERCHANTS
+from logging_config import get_logger
+from merchant_index import merchant_index
+from metrics import CACHE_INVALIDATION_MESSAGES_TOTAL, CACHE_INVALIDATION_LAG
+from models import CacheInvalidation
+
+logger = get_logger(__name__)
+
+BUS_ENABLED = os.getenv("CACHE_INVALIDATION_ENABLED", "true").lower() == "true"
+POLL_SECONDS = int(os.getenv("CACHE_INVALIDATION_POLL_MS", "500")) / 1000
+RETENTION_SECONDS = float(os.getenv("CACHE_INVALIDATION_RETENTION_SECONDS", "300"))
+
+CHANNEL = "cache_invalidation"
+
+# NOTIFY payloads must stay under 8000 bytes; larger tag sets are split
+MAX_PAYLOAD_BYTES = 7000
+
+# Backoff between attempts to re-open a lost LISTEN connection (seconds)
+RECONNECT_MIN_SECONDS = 1.0
+RECONNECT_MAX_SECONDS = 30.0
+
+
+def apply_remote_tags(tags: Set[str]) -> None:
+    """Drop another worker's committed tags from this worker's caches"""
+    read_cache.invalidate(tags)
+    if MERCHANTS in tags or ALL in tags:
+        # Rebuilt from the table on next use
+        merchant_index.clear()
+
+
+class InvalidationBus:
+    """Publishes committed cache tags to the other workers and applies theirs"""
+
+    def __init__(
+        self,
+        poll_seconds: float = POLL_SECONDS,
+        retention_seconds: float = RETENTION_SECONDS,
+        apply: Callable[[Set[str]], None] = apply_remote_tags
+    ):
+        self.poll_seconds = poll_seconds
+        self.retention_seconds = retention_seconds
+        self.origin = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._apply = apply
+        self._outbox: Set[str] = set()
+        self._lock = threading.Lock()
+        self._engine = None
+        self._postgres = False
+        self._listener = None  # Detached DBAPI connection holding the LISTEN (PostgreSQL)
+        self._listener_fd: Optional[int] = None  # Its socket, kept: fileno() fails once it is closed
+        self._reconnect_at = 0.0
+        self._reconnect_delay = RECONNECT_MIN_SECONDS
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._last_id: Optional[int] = 0  # None: start from the latest row on the next poll
+        self._pruned_at = 0.0
+
+    @property
+    def mode(self) -> Optional[str]:
+        """
+        "notify", "poll", "degraded" (PostgreSQL without its LISTEN connection,
+        polling until it reconnects), or None when stopped
+        """
+        if self._engine is None:
+            return None
+        if self._listener is not None:
+            return "notify"
+        return "degraded" if self._postgres else "poll"
+
+    # ------------------------------------------------------------------
+    # Publishing
+    # ------------------------------------------------------------------
+
+    def publish(self, tags: Set[str]) -> None:
+        """Queue tags for the other workers (safe from any thread; a no-op when stopped)"""
+        loop = self._loop
+        if loop is None or not tags:
+            return
+        with self._lock:
+            self._outbox.update(tags)
+        loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _messages(self, tags: Set[str]) -> List[List[str]]:
+        """Tags split into messages that fit a NOTIFY payload"""
+        if ALL in tags:
+            return [[ALL]]
+        messages, message, size = [], [], 0
+        for tag in sorted(tags):
+            if message and size + len(tag) > MAX_PAYLOAD_BYTES:
+                messages.append(message)
+                message, size = [], 0
+            message.append(tag)
+            size += len(tag) + 4  # quotes, comma and space in the JSON array
+        if message:
+            messages.append(message)
+        return messages
+
+    async def flush(self) -> int:
+        """
+        Send the queued tags
+
+        Returns:
+            Number of messages sent (tags stay queued if sending fails)
+        """
+        with self._lock:
+            tags, self._outbox = self._outbox, set()
+        if not tags or self._engine is None:
+            return 0
+        messages = self._messages(tags)
+        try:
+            if self._listener is not None:
+                # On the event loop thread, the only user of the LISTEN connection
+                try:
+                    self._notify(messages)
+                except Exception as e:
+                    self._lose_listener(e)
+                    raise
+            else:
+                await asyncio.to_thread(self._insert, messages)
+        except Exception:
+            with self._lock:
+                self._outbox.update(tags)
+            raise
+        CACHE_INVALIDATION_MESSAGES_TOTAL.labels(direction="sent").inc(len(messages))
+        return len(messages)
+
+    def _payload(self, tags: List[str]) -> str:
+        return json.dumps({"origin": self.origin, "tags": tags, "sent_at": time.time()})
+
+    def _notify(self, messages: List[List[str]]) -> None:
+        with self._listener.dbapi_connection.cursor() as cursor:
+            for tags in messages:
+                cursor.execute("SELECT pg_notify(%s, %s)", (CHANNEL, self._payload(tags)))
+
+    def _insert(self, messages: List[List[str]]) -> None:
+        now = datetime.utcnow()
+        with self._engine.begin() as connection:
+            connection.execute(insert(CacheInvalidation), [
+                {"origin": self.origin, "tags": tags, "created_at": now} for tags in messages
+            ])
+            if self._postgres:
+                # Degraded: listening workers still get a NOTIFY (sent on commit)
+                for tags in messages:
+                    connection.execute(select(func.pg_notify(CHANNEL, self._payload(tags))))
+            # Every worker prunes now and then; readers only look a poll interval back
+            if time.monotonic() - self._pruned_at > self.retention_seconds / 10:
+                connection.execute(delete(CacheInvalidation).where(
+                    CacheInvalidation.created_at < now - timedelta(seconds=self.retention_seconds)
+                ))
+                self._pruned_at = time.monotonic()
+
+    # ------------------------------------------------------------------
+    # Receiving
+    # ------------------------------------------------------------------
+
+    def receive(self, origin: str, tags: List[str], lag_seconds: Optional[float] = None) -> bool:
+        """Apply one message; returns False for this worker's own messages"""
+        if origin == self.origin:
+            return False
+        self._apply(set(tags))
+        CACHE_INVALIDATION_MESSAGES_TOTAL.labels(direction="received").inc()
+        if lag_seconds is not None:
+            CACHE_INVALIDATION_LAG.observe(max(0.0, lag_seconds))
+        return True
+
+    def _drain_notifies(self) -> None:
+        """Event loop reader callback for the LISTEN connection"""
+        connection = self._listener.dbapi_connection
+        try:
+            connection.poll()
+        except Exception as e:
+            self._lose_listener(e)
+            return
+        while connection.notifies:
+            notify = connection.notifies.pop(0)
+            try:
+                message = json.loads(notify.payload)
+                self.receive(message["origin"], message["tags"], time.time() - message["sent_at"])
+            except (ValueError, KeyError, TypeError) as e:
+                logger.warning(f"Ignoring malformed cache invalidation: {e}")
+
+    async def poll(self) -> int:
+        """
+        Apply the rows other workers added since the last poll (polling mode)
+
+        Returns:
+            Number of messages applied
+        """
+        if self._last_id is None:
+            self._last_id = await asyncio.to_thread(self._latest_id)
+            return 0
+        rows = await asyncio.to_thread(self._read_new)
+        applied = 0
+        now = datetime.utcnow()
+        for invalidation_id, origin, tags, created_at in rows:
+            self._last_id = max(self._last_id, invalidation_id)
+            applied += self.receive(origin, tags, (now - created_at).total_seconds())
+        return applied
+
+    def _read_new(self):
+        with self._engine.connect() as connection:
+            return connection.execute(
+                select(
+                    CacheInvalidation.invalidation_id, CacheInvalidation.origin,
+                    CacheInvalidation.tags, CacheInvalidation.created_at
+                )
+                .where(CacheInvalidation.invalidation_id > self._last_id)
+                .order_by(CacheInvalidation.invalidation_id)
+            ).all()
+
+    def _latest_id(self) -> int:
+        with self._engine.connect() as connection:
+            return connection.execute(select(func.max(CacheInvalidation.invalidation_id))).scalar() or 0
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def _connect_listener(self):
+        """Open a LISTEN connection (blocking)"""
+        connection = self._engine.raw_connection()
+        # Held for the worker's lifetime, so it shouldn't count against the pool
+        connection.detach()
+        try:
+            dbapi_connection = connection.dbapi_connection
+            dbapi_connection.autocommit = True
+            with dbapi_connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {CHANNEL}")
+        except Exception:
+            connection.close()
+            raise
+        return connection
+
+    def _watch(self, connection) -> None:
+        """Watch a LISTEN connection from the event loop"""
+        self._listener = connection
+        self._listener_fd = connection.dbapi_connection.fileno()
+        self._loop.add_reader(self._listener_fd, self._drain_notifies)
+
+    def _unwatch(self) -> None:
+        """Stop watching the LISTEN connection and close it"""
+        listener, self._listener = self._listener, None
+        if listener is None:
+            return
+        self._loop.remove_reader(self._listener_fd)
+        self._listener_fd = None
+        try:
+            listener.close()
+        except Exception:
+            pass
+
+    def _lose_listener(self, error: Exception) -> None:
+        """
+        The LISTEN connection failed: close it and poll until _run reconnects.
+        Messages sent in the meantime may be missed, so the local caches are dropped.
+        """
+        if self._listener is None:
+            return
+        self._unwatch()
+        logger.warning(f"Cache invalidation LISTEN connection lost, polling until it reconnects: {error}")
+        self._last_id = None
+        self._reconnect_delay = RECONNECT_MIN_SECONDS
+        self._reconnect_at = time.monotonic()
+        self._apply({ALL})
+        self._wakeup.set()
+
+    async def _reconnect(self) -> None:
+        """Re-open the LISTEN connection, backing off while it keeps failing"""
+        try:
+            connection = await asyncio.to_thread(self._connect_listener)
+        except Exception as e:
+            self._reconnect_at = time.monotonic() + self._reconnect_delay
+            logger.warning(f"Could not re-open the cache invalidation LISTEN connection, retrying in {self._reconnect_delay:.0f}s: {e}")
+            self._reconnect_delay = min(self._reconnect_delay * 2, RECONNECT_MAX_SECONDS)
+            return
+        self._watch(connection)
+        self._reconnect_delay = RECONNECT_MIN_SECONDS
+        # Whatever was sent while we weren't listening
+        self._apply({ALL})
+        logger.info("Cache invalidation LISTEN connection restored", extra={
+            'event': 'invalidation_bus_reconnected'
+        })
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._postgres and self._listener is None and time.monotonic() >= self._reconnect_at:
+                await self._reconnect()
+            try:
+                await self.flush()
+                if self._listener is None:
+                    await self.poll()
+            except Exception as e:
+                logger.warning(f"Cache invalidation bus error, will retry: {e}")
+
+    async def start(self, engine) -> str:
+        """
+        Start publishing this worker's committed tags and applying the others'
+
+        Args:
+            engine: Sync engine of the primary database (database.engine)
+
+        Returns:
+            The mode: "notify" (PostgreSQL LISTEN/NOTIFY), "poll", or
+            "degraded" when the LISTEN connection could not be opened yet
+        """
+        self._engine = engine
+        self._postgres = engine.dialect.name == "postgresql"
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        if self._postgres:
+            try:
+                self._watch(await asyncio.to_thread(self._connect_listener))
+            except Exception as e:
+                logger.warning(f"Could not open the cache invalidation LISTEN connection, polling until it does: {e}")
+                self._last_id = None
+        else:
+            # Only messages published from now on
+            self._last_id = await asyncio.to_thread(self._latest_id)
+        read_cache.add_publisher(self.publish)
+        self._task = asyncio.create_task(self._run())
+        return self.mode
+
+    async def stop(self) -> None:
+        """Send what is still queued and stop listening"""
+        read_cache.remove_publisher(self.publish)
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.warning(f"Could not send the last cache invalidations: {e}")
+        self._unwatch()
+        self._loop = None
+        self._engine = None
+
+
+# Global bus instance
+invalidation_bus = InvalidationBus()
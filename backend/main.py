@@ -9,39 +9,47 @@ import os
 # Load environment variables from .env file
 load_dotenv()
 
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict
 from enum import Enum
 from datetime import datetime
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from prometheus_client import make_asgi_app
 
 # Import observability components
 from logging_config import get_api_logger, get_correlation_id
-from middleware import ObservabilityMiddleware
-from metrics import (
-    track_recommendation, update_business_metrics,
-    USERS_TOTAL, CARDS_REGISTERED, TRANSACTIONS_TOTAL
-)
+from middleware import ObservabilityMiddleware, ReadYourWritesMiddleware, StatementTimeoutMiddleware
+from metrics import track_recommendation
+from business_metrics import business_metrics
 
 # Configure structured logging
 logger = get_api_logger()
 
 # Import database and CRUD operations
-from database import get_db, init_db, db as database
+from database import (
+    get_db, get_read_db, get_async_read_db, get_user_db, get_async_user_db,
+    init_db, db as database
+)
+import async_crud
 from crud import (
-    get_user, get_user_cards, create_transaction,
+    create_user, get_user, get_user_by_email, get_user_cards, create_transaction,
     get_user_transactions, get_recent_transactions,
     calculate_transaction_stats, create_transaction_feedback,
-    get_user_behavior, update_user_behavior, create_automation_rule,
-    get_user_automation_rules, get_or_create_merchant, create_credit_card, update_card, deactivate_card, get_card,
+    get_user_behavior, create_automation_rule,
+    get_user_automation_rules, get_or_create_merchant, search_merchants_by_name,
+    find_merchant_by_name, create_merchant as create_merchant_record,
+    get_all_merchants, get_merchants_by_category, create_credit_card, update_card, deactivate_card, get_card,
     get_user_analytics, update_user,
     # New UserCreditCard CRUD operations
     add_user_credit_card, get_user_credit_cards, get_user_credit_card,
     update_user_credit_card, delete_user_credit_card, deactivate_user_credit_card,
-    get_user_cards_with_details
+    get_user_cards_with_details, get_best_cards, get_card_library as get_card_library_records,
+    ensure_business_counters, USERS_COUNTER, CARDS_COUNTER, MAX_TRANSACTIONS_PAGE_SIZE
 )
 from models import (
     User as UserModel, CreditCard as CreditCardModel,
@@ -62,12 +70,38 @@ from auth import hash_password, verify_password, generate_user_id
 # Import location service
 from location_service import location_service
 
+# Import in-memory merchant catalog index
+from merchant_index import merchant_index
+from cache import read_cache
+from invalidation import invalidation_bus, BUS_ENABLED as INVALIDATION_BUS_ENABLED
+
+# Import user shard maintenance (card library replication)
+from sharding import sync_card_library, ensure_card_owner
+
+# Import write-behind transaction queue
+from transaction_queue import transaction_queue, QueueFullError
+
+# Import transaction table partition maintenance
+from partitions import ensure_partitions
+
+# Import bulk transaction import
+from transaction_import import (
+    detect_format, iter_records, import_transactions,
+    DEFAULT_BATCH_SIZE, MAX_BATCH_SIZE
+)
+
 app = FastAPI(
     title="Agentic Wallet API",
     version="2.0.0",
     description="AI-Powered Credit Card Rewards Optimizer with PostgreSQL"
 )
 
+# Statement timeouts become 503 + Retry-After (inside observability, so it records the 503)
+app.add_middleware(StatementTimeoutMiddleware)
+
+# Last-write cookie/header so every worker keeps a writer's reads on the primary
+app.add_middleware(ReadYourWritesMiddleware)
+
 # Add observability middleware (must be added before CORS)
 app.add_middleware(ObservabilityMiddleware)
 
@@ -355,29 +389,96 @@ async def startup_event():
         logger.error("Database connection failed", extra={'event': 'db_health_check', 'status': 'failed'})
         raise Exception("Database connection failed")
 
-    # Update business metrics
+    # Business metrics come from the incrementally maintained counters table
+    # (rebuilt with one recount the first time it is empty)
     try:
-        from sqlalchemy import func
-        from models import User as UserModel, CreditCard as CreditCardModel
-        db = next(get_db())
-        user_count = db.query(func.count(UserModel.user_id)).scalar() or 0
-        card_count = db.query(func.count(CreditCardModel.card_id)).scalar() or 0
-        update_business_metrics(users=user_count, cards=card_count)
+        with database.session_scope() as session:
+            # With user shards, the global shard's users rows are only card owners' copies
+            counters = ensure_business_counters(session, profiled_users_only=database.sharded)
+        business_metrics.update(counters)
+        # Each user shard counts its own users, wallets and transactions
+        business_metrics.start(database.get_async_session, *(
+            database.async_user_sessionmakers() if database.sharded else []
+        ))
         logger.info("Business metrics initialized", extra={
             'event': 'metrics_init',
-            'users': user_count,
-            'cards': card_count
+            'users': counters.get(USERS_COUNTER, 0),
+            'cards': counters.get(CARDS_COUNTER, 0)
         })
     except Exception as e:
         logger.warning(f"Could not initialize business metrics: {e}")
 
+    # Keep monthly transaction partitions created ahead of time (PostgreSQL)
+    try:
+        created_partitions = []
+        for engine in [database.engine, *database.shard_engines]:
+            with engine.begin() as connection:
+                created_partitions += ensure_partitions(connection)
+        if created_partitions:
+            logger.info("Transaction partitions created", extra={
+                'event': 'partitions_created',
+                'partitions': created_partitions
+            })
+    except Exception as e:
+        logger.warning(f"Could not create transaction partitions: {e}")
+
+    # Load the merchant catalog for autocomplete
+    try:
+        with database.session_scope() as session:
+            merchant_count = merchant_index.load(session)
+        logger.info("Merchant index loaded", extra={
+            'event': 'merchant_index_loaded',
+            'merchants': merchant_count
+        })
+    except Exception as e:
+        logger.warning(f"Could not load merchant index, search will query the database: {e}")
+
+    # Share cache invalidations with the other workers (LISTEN/NOTIFY, or polling on SQLite)
+    if INVALIDATION_BUS_ENABLED:
+        try:
+            mode = await invalidation_bus.start(database.engine)
+            logger.info("Cache invalidation bus started", extra={
+                'event': 'invalidation_bus_started',
+                'mode': mode
+            })
+        except Exception as e:
+            logger.warning(f"Could not start the cache invalidation bus, other workers' writes show after the cache TTL: {e}")
+
+    # Copy the global card library to the user shards
+    if database.sharded:
+        try:
+            copied = sync_card_library(database)
+            logger.info("Card library copied to user shards", extra={
+                'event': 'card_library_synced',
+                'shards': len(database.shard_engines),
+                'cards': copied
+            })
+        except Exception as e:
+            logger.warning(f"Could not copy the card library to the user shards: {e}")
+
+    # Start the write-behind transaction flusher (replays any unflushed journal rows)
+    if transaction_queue.enabled:
+        if database.sharded:
+            replayed = await transaction_queue.start(database.get_async_shard_session, shard_of=database.shard_index)
+        else:
+            replayed = await transaction_queue.start(database.get_async_session)
+        logger.info("Transaction write-behind queue started", extra={
+            'event': 'transaction_queue_started',
+            'replayed': replayed
+        })
+
     logger.info("API ready to accept requests", extra={'event': 'startup_complete'})
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    """Close database connections on shutdown"""
+    """Drain the transaction queue, stop the metrics refresh and invalidation bus, then close database connections on shutdown"""
+    if transaction_queue.enabled:
+        await transaction_queue.stop()
+    await business_metrics.stop()
+    await invalidation_bus.stop()
     database.close()
+    await database.close_async()
     logger.info("Shutting down API", extra={'event': 'shutdown'})
 
 
@@ -406,7 +507,9 @@ async def health_check():
             "ai_service": {
                 "status": "healthy" if groq_available else "unavailable",
                 "provider": "groq"
-            }
+            },
+            "read_cache": {**read_cache.stats(), "invalidation_bus": invalidation_bus.mode},
+            "transaction_queue": transaction_queue.stats()
         },
         "version": "2.0.0",
         "timestamp": datetime.utcnow().isoformat() + 'Z'
@@ -422,38 +525,39 @@ async def signup(request: SignupRequest, db: Session = Depends(get_db)):
     """
     Create a new user account
     """
+    shard_session = None
     try:
-        # Check if user already exists
-        existing_user = db.query(UserModel).filter(UserModel.email == request.email).first()
-        if existing_user:
+        # The user's id picks their shard. Each shard's unique email index only
+        # sees its own users, so sharded signups look the email up everywhere first
+        user_id = generate_user_id()
+        if database.sharded:
+            if find_user_by_email(request.email):
+                raise HTTPException(
+                    status_code=400,
+                    detail="Email already registered"
+                )
+            db = shard_session = database.get_shard_session(user_id)
+
+        # User and behavior record are written in one commit; the unique
+        # email index rejects duplicates, so no lookup round trip beforehand
+        try:
+            new_user = create_user(
+                db,
+                user_id=user_id,
+                email=request.email,
+                full_name=request.full_name,
+                password_hash=hash_password(request.password),
+                phone=request.phone,
+                default_optimization_goal=OptimizationGoalEnum[request.optimization_goal.value.upper()]
+            )
+        except IntegrityError:
+            db.rollback()
             raise HTTPException(
                 status_code=400,
                 detail="Email already registered"
             )
 
-        # Generate user ID and hash password
-        user_id = generate_user_id()
-        password_hash = hash_password(request.password)
-
-        # Create new user
-        new_user = UserModel(
-            user_id=user_id,
-            email=request.email,
-            password_hash=password_hash,
-            full_name=request.full_name,
-            phone=request.phone,
-            default_optimization_goal=OptimizationGoalEnum[request.optimization_goal.value.upper()]
-        )
-
-        db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
-
-        # Initialize user behavior record
-        from crud import create_user_behavior
-        create_user_behavior(db, user_id)
-
-        logger.info(f"New user created: {user_id} - {request.email}")
+        logger.info(f"New user created: {new_user.user_id} - {request.email}")
 
         return AuthResponse(
             user_id=new_user.user_id,
@@ -471,6 +575,19 @@ async def signup(request: SignupRequest, db: Session = Depends(get_db)):
             status_code=500,
             detail=f"Error creating account: {str(e)}"
         )
+    finally:
+        if shard_session is not None:
+            shard_session.close()
+
+
+def find_user_by_email(email: str) -> Optional[UserModel]:
+    """Look a user up by email on every user shard"""
+    for session_factory in database.user_sessionmakers():
+        with session_factory() as session:
+            user = get_user_by_email(session, email)
+        if user:
+            return user
+    return None
 
 
 @app.post("/api/v1/auth/signin", response_model=AuthResponse)
@@ -479,8 +596,8 @@ async def signin(request: SigninRequest, db: Session = Depends(get_db)):
     Sign in an existing user
     """
     try:
-        # Find user by email
-        user = db.query(UserModel).filter(UserModel.email == request.email).first()
+        # Find user by email (on every shard: emails don't say where a user lives)
+        user = find_user_by_email(request.email) if database.sharded else get_user_by_email(db, request.email)
 
         if not user:
             raise HTTPException(
@@ -524,17 +641,17 @@ async def signin(request: SigninRequest, db: Session = Depends(get_db)):
 @app.post("/api/v1/recommend", response_model=SimpleRecommendationResponse)
 async def get_card_recommendation(
     request: TransactionRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_user_db)
 ):
     """Get AI-powered credit card recommendation using PostgreSQL data"""
     try:
         # Get user from database
-        user = get_user(db, request.user_id)
+        user = await async_crud.get_user(db, request.user_id)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
 
         # Get user's active credit cards from wallet (UserCreditCard + CreditCard details)
-        user_cards_with_details = get_user_cards_with_details(db, request.user_id, active_only=True)
+        user_cards_with_details = await async_crud.get_user_cards_with_details(db, request.user_id, active_only=True)
         if not user_cards_with_details:
             raise HTTPException(
                 status_code=404,
@@ -574,8 +691,10 @@ async def get_card_recommendation(
         }
         
         # Get AI recommendation - will raise RuntimeError if Groq unavailable
+        # (blocking HTTP client, so run it off the event loop)
         try:
-            result = agentic_system.get_recommendation(
+            result = await run_in_threadpool(
+                agentic_system.get_recommendation,
                 transaction_data,
                 user_cards_dict
             )
@@ -641,7 +760,8 @@ async def get_card_recommendation(
 async def search_merchants(
     q: str = "",
     limit: int = 10,
-    db: Session = Depends(get_db)
+    category: Optional[Category] = None,
+    db: Session = Depends(get_read_db)
 ):
     """
     Search merchants by name with autocomplete
@@ -649,27 +769,40 @@ async def search_merchants(
     Args:
         q: Search query (empty string returns all merchants)
         limit: Maximum number of results (default: 10)
+        category: Only return merchants in this primary category
         
     Returns:
-        List of merchants with name, category, and logo
+        List of merchants with name, category, and logo, best matches first
         
     Example:
         GET /api/v1/merchants/search?q=star&limit=5
         GET /api/v1/merchants/search?q=&limit=50  (all merchants)
+        GET /api/v1/merchants/search?q=&category=dining  (all dining merchants)
     """
     try:
-        from models import Merchant
-        
+        category_enum = CategoryEnum(category.value) if category else None
+
+        # Served from the in-memory index (reloaded from the database only when stale)
+        merchant_index.refresh_if_stale(db)
+        if merchant_index.loaded:
+            if not q.strip():
+                if category_enum:
+                    entries = merchant_index.by_category(category_enum, limit=limit)
+                else:
+                    entries = merchant_index.all(limit=limit)
+            else:
+                entries = merchant_index.search(q, limit=limit, category=category_enum)
+            return [entry.to_dict() for entry in entries]
+
         # If query is empty, return all merchants (up to limit)
-        if not q or len(q) == 0:
-            merchants = db.query(Merchant).order_by(
-                Merchant.merchant_name
-            ).limit(limit).all()
+        if not q.strip():
+            if category_enum:
+                merchants = get_merchants_by_category(db, category_enum, limit=limit)
+            else:
+                merchants = get_all_merchants(db, limit=limit)
         else:
-            # Search merchants by name (case-insensitive)
-            merchants = db.query(Merchant).filter(
-                Merchant.merchant_name.ilike(f"%{q}%")
-            ).order_by(Merchant.merchant_name).limit(limit).all()
+            # Ranked search (trigram index on PostgreSQL)
+            merchants = search_merchants_by_name(db, q, limit=limit, category=category_enum)
         
         return [
             {
@@ -705,12 +838,8 @@ async def create_merchant(
         logo_url: Optional logo URL
     """
     try:
-        from models import Merchant, CategoryEnum
-        
-        # Check if merchant already exists
-        existing = db.query(Merchant).filter(
-            Merchant.merchant_name.ilike(merchant_name)
-        ).first()
+        # Check if merchant already exists (exact name, via the merchant index)
+        existing = find_merchant_by_name(db, merchant_name)
         
         if existing:
             return {
@@ -724,18 +853,26 @@ async def create_merchant(
         # Convert Category enum to CategoryEnum
         category_enum = CategoryEnum(primary_category.value)
         
-        # Create new merchant
-        new_merchant = Merchant(
-            merchant_name=merchant_name,
-            primary_category=category_enum,
-            logo_url=logo_url,
-            secondary_categories=[],
-            has_special_offers=False
-        )
-        
-        db.add(new_merchant)
-        db.commit()
-        db.refresh(new_merchant)
+        # Create new merchant (also adds it to the merchant index)
+        try:
+            new_merchant = create_merchant_record(
+                db,
+                merchant_name=merchant_name,
+                primary_category=category_enum,
+                logo_url=logo_url,
+                has_special_offers=False
+            )
+        except IntegrityError:
+            # Created concurrently since the lookup above
+            db.rollback()
+            existing = find_merchant_by_name(db, merchant_name)
+            return {
+                "merchant_id": existing.merchant_id,
+                "merchant_name": existing.merchant_name,
+                "primary_category": existing.primary_category.value,
+                "logo_url": existing.logo_url,
+                "message": "Merchant already exists"
+            }
         
         return {
             "merchant_id": new_merchant.merchant_id,
@@ -771,30 +908,81 @@ async def get_user_credit_cards(user_id: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/v1/users/{user_id}/cards/best")
+async def get_best_wallet_cards(
+    user_id: str,
+    category: Category,
+    goal: OptimizationGoal = OptimizationGoal.BALANCED,
+    limit: int = 3,
+    db: Session = Depends(get_read_db)
+):
+    """
+    Rank the user's active wallet cards for a category and goal by reward rates.
+
+    Answered by one SQL query over the normalized card_reward_rates table
+    (no LLM call, benefits not scored); use /api/v1/recommend for the full
+    agentic recommendation.
+    """
+    try:
+        if limit < 1 or limit > 50:
+            raise HTTPException(status_code=400, detail="limit must be between 1 and 50")
+
+        return {
+            "user_id": user_id,
+            "category": category.value,
+            "goal": goal.value,
+            "cards": get_best_cards(db, user_id, category.value, goal.value, limit=limit)
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.get("/api/v1/users/{user_id}/transactions")
 async def get_user_transaction_history(
     user_id: str,
-    limit: int = 50,
-    db: Session = Depends(get_db)
+    limit: int = Query(50, ge=1, le=MAX_TRANSACTIONS_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    category: Optional[Category] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    """Get transaction history for a user"""
+    """
+    Get transaction history for a user, newest first.
+
+    Pages with keyset pagination: pass the returned next_cursor as `cursor`
+    to fetch the following page (next_cursor is null on the last page).
+    """
     try:
-        user = get_user(db, user_id)
+        user = await async_crud.get_user(db, user_id)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
+
+        try:
+            transactions, next_cursor = await async_crud.get_user_transactions_page(
+                db,
+                user_id,
+                limit=limit,
+                cursor=cursor,
+                category=CategoryEnum(category.value) if category else None,
+                start_date=start_date,
+                end_date=end_date
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
-        transactions = get_user_transactions(db, user_id, limit=limit)
-        
-        # Calculate recommended card name from card_id
-        def get_card_name(card_id):
-            if not card_id:
-                return None
-            card = db.query(CreditCardModel).filter(CreditCardModel.card_id == card_id).first()
-            return card.card_name if card else None
+        # Resolve recommended card names for the whole page in one query
+        recommended_names = await async_crud.get_card_names(
+            db, (t.recommended_card_id for t in transactions)
+        )
 
         return {
             "user_id": user_id,
             "total_transactions": len(transactions),
+            "next_cursor": next_cursor,
             "transactions": [
                 {
                     "transaction_id": t.transaction_id,
@@ -803,7 +991,7 @@ async def get_user_transaction_history(
                     "category": t.category.value,
                     "card_used": t.card.card_name if t.card else None,
                     "card_used_id": t.card_id,
-                    "card_recommended": get_card_name(t.recommended_card_id),
+                    "card_recommended": recommended_names.get(t.recommended_card_id),
                     "card_recommended_id": t.recommended_card_id,
                     "used_recommended_card": t.used_recommended_card,
                     "rewards_earned": t.total_value_earned or 0,
@@ -825,19 +1013,24 @@ async def get_user_transaction_history(
 @app.post("/api/v1/transactions", response_model=CreateTransactionResponse)
 async def create_new_transaction(
     request: CreateTransactionRequest,
-    db: Session = Depends(get_db)
+    response: Response,
+    db: AsyncSession = Depends(get_async_user_db)
 ):
-    """Create a new transaction record"""
+    """
+    Create a new transaction record
+
+    With TRANSACTION_WRITE_BEHIND=true the validated transaction is queued for
+    the background flusher and the endpoint answers 202 Accepted with the
+    generated transaction_id (503 with Retry-After while the queue is full).
+    """
     try:
         # Verify user exists
-        user = get_user(db, request.user_id)
+        user = await async_crud.get_user(db, request.user_id)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
 
         # Verify card exists and get card name
-        card = db.query(CreditCardModel).filter(
-            CreditCardModel.card_id == request.card_used_id
-        ).first()
+        card = await async_crud.get_card(db, request.card_used_id)
         if not card:
             raise HTTPException(status_code=404, detail="Card not found")
 
@@ -852,9 +1045,7 @@ async def create_new_transaction(
         if request.optimal_value is not None and request.total_value_earned is not None:
             missed_value = request.optimal_value - request.total_value_earned
 
-        # Create the transaction
-        transaction = create_transaction(
-            db=db,
+        values = dict(
             user_id=request.user_id,
             merchant=request.merchant,
             amount=request.amount,
@@ -874,6 +1065,29 @@ async def create_new_transaction(
             confidence_score=request.confidence_score
         )
 
+        if transaction_queue.enabled:
+            try:
+                queued = await run_in_threadpool(transaction_queue.enqueue, values)
+            except QueueFullError as e:
+                raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
+            response.status_code = 202
+            return CreateTransactionResponse(
+                transaction_id=queued["transaction_id"],
+                user_id=queued["user_id"],
+                merchant=queued["merchant"],
+                amount=queued["amount"],
+                category=queued["category"].value,
+                card_used=card.card_name,
+                card_used_id=queued["card_id"],
+                rewards_earned=queued["total_value_earned"],
+                date=queued["transaction_date"].isoformat(),
+                message="Transaction queued"
+            )
+
+        # Create the transaction
+        transaction = await async_crud.create_transaction(db, **values)
+
         return CreateTransactionResponse(
             transaction_id=transaction.transaction_id,
             user_id=transaction.user_id,
@@ -894,8 +1108,60 @@ async def create_new_transaction(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/v1/users/{user_id}/transactions/import")
+async def import_user_transactions(
+    user_id: str,
+    request: Request,
+    format: Optional[str] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    db: AsyncSession = Depends(get_async_user_db)
+):
+    """
+    Bulk-import transaction history from a streamed CSV or NDJSON body.
+
+    The format comes from `format` (csv / ndjson) or the Content-Type header
+    (text/csv, application/x-ndjson). Rows are scored against the user's wallet
+    and inserted in batches of `batch_size`; invalid rows are reported per line
+    and skipped.
+    """
+    try:
+        user = await async_crud.get_user(db, user_id)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+
+        upload_format = detect_format(request.headers.get("content-type"), format)
+        if upload_format is None:
+            raise HTTPException(
+                status_code=415,
+                detail="Upload must be CSV (text/csv) or NDJSON (application/x-ndjson)"
+            )
+
+        if batch_size < 1 or batch_size > MAX_BATCH_SIZE:
+            raise HTTPException(
+                status_code=400,
+                detail=f"batch_size must be between 1 and {MAX_BATCH_SIZE}"
+            )
+
+        wallet_cards = await async_crud.get_user_cards_with_details(db, user_id, active_only=False)
+
+        return await import_transactions(
+            db,
+            user_id=user_id,
+            default_goal=user.default_optimization_goal or OptimizationGoalEnum.BALANCED,
+            wallet_cards=wallet_cards,
+            records=iter_records(request.stream(), upload_format),
+            batch_size=batch_size
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error importing transactions for user {user_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.get("/api/v1/users/{user_id}/profile")
-async def get_user_profile(user_id: str, db: Session = Depends(get_db)):
+async def get_user_profile(user_id: str, db: Session = Depends(get_user_db)):
     """Get user profile information"""
     try:
         user = get_user(db, user_id)
@@ -929,7 +1195,7 @@ class UserProfileUpdate(BaseModel):
 async def update_user_profile(
     user_id: str,
     profile_update: UserProfileUpdate,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_user_db)
 ):
     """Update user profile information"""
     try:
@@ -973,7 +1239,7 @@ async def update_user_profile(
 
 
 @app.get("/api/v1/users/{user_id}/stats", response_model=UserStats)
-async def get_user_statistics(user_id: str, db: Session = Depends(get_db)):
+async def get_user_statistics(user_id: str, db: Session = Depends(get_user_db)):
     """Get user statistics and optimization metrics"""
     try:
         user = get_user(db, user_id)
@@ -993,7 +1259,7 @@ async def get_user_statistics(user_id: str, db: Session = Depends(get_db)):
 async def get_user_analytics_endpoint(
     user_id: str,
     days: int = 30,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """
     Get comprehensive analytics for a user
@@ -1011,7 +1277,7 @@ async def get_user_analytics_endpoint(
         days: Number of days to analyze (default: 30, max: 365)
     """
     try:
-        user = get_user(db, user_id)
+        user = await async_crud.get_user(db, user_id)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
@@ -1022,7 +1288,7 @@ async def get_user_analytics_endpoint(
                 detail="Days parameter must be between 1 and 365"
             )
         
-        analytics = get_user_analytics(db, user_id, days=days)
+        analytics = await async_crud.get_user_analytics(db, user_id, days=days)
         return analytics
         
     except HTTPException:
@@ -1032,22 +1298,75 @@ async def get_user_analytics_endpoint(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Default windows of the multi-window analytics endpoint, and how many one call may ask for
+ANALYTICS_WINDOWS = "7,30,90,365"
+MAX_ANALYTICS_WINDOWS = 8
+
+
+@app.get("/api/v1/users/{user_id}/analytics/windows")
+async def get_user_analytics_windows_endpoint(
+    user_id: str,
+    days: str = ANALYTICS_WINDOWS,
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """
+    Get analytics for several time windows in one call
+
+    Every window is computed from a single pass over the widest one, and each
+    payload has the same shape as /analytics for that number of days.
+
+    Args:
+        user_id: User's unique identifier
+        days: Comma-separated window lengths in days (default: 7,30,90,365; each 1-365)
+    """
+    try:
+        try:
+            windows = [int(value) for value in days.split(",") if value.strip()]
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Days parameter must be a comma-separated list of integers")
+        if not windows or len(windows) > MAX_ANALYTICS_WINDOWS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Days parameter must list between 1 and {MAX_ANALYTICS_WINDOWS} windows"
+            )
+        if any(window < 1 or window > 365 for window in windows):
+            raise HTTPException(
+                status_code=400,
+                detail="Days parameter must be between 1 and 365"
+            )
+
+        user = await async_crud.get_user(db, user_id)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+
+        analytics = await async_crud.get_user_analytics_windows(db, user_id, windows)
+        return {
+            "user_id": user_id,
+            "windows": {str(window): payload for window, payload in analytics.items()}
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting windowed analytics for user {user_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.get("/api/v1/users/{user_id}/behavior")
-async def get_user_behavior_profile(user_id: str, db: Session = Depends(get_db)):
-    """Get learned user preferences and patterns"""
+async def get_user_behavior_profile(user_id: str, db: Session = Depends(get_read_db)):
+    """
+    Get learned user preferences and patterns (last 90 days)
+
+    A pure read: the profile is kept up to date as transactions are recorded
+    and aged daily by scripts/compact_user_behavior.py.
+    """
     try:
         user = get_user(db, user_id)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
-        # Get or create behavior profile
         behavior = get_user_behavior(db, user_id)
         
-        # Update behavior with recent transactions
-        recent_txns = get_recent_transactions(db, user_id, days=90)
-        if recent_txns:
-            behavior = update_user_behavior(db, user_id, recent_txns)
-        
         if not behavior:
             return {
                 "user_id": user_id,
@@ -1074,7 +1393,7 @@ async def get_user_behavior_profile(user_id: str, db: Session = Depends(get_db))
 
 
 @app.get("/api/v1/users/{user_id}/opportunities")
-async def get_missed_opportunities(user_id: str, db: Session = Depends(get_db)):
+async def get_missed_opportunities(user_id: str, db: Session = Depends(get_user_db)):
     """Get proactive suggestions for missed optimizations"""
     try:
         user = get_user(db, user_id)
@@ -1122,11 +1441,12 @@ async def record_user_feedback(
     transaction_id: str,
     accepted: bool,
     card_used: str,
+    user_id: str,
     rating: Optional[int] = None,
     feedback_text: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_user_db)
 ):
-    """Record user feedback for learning"""
+    """Record user feedback for learning (user_id, the transaction's owner, picks its shard)"""
     try:
         # Create feedback in database
         feedback = create_transaction_feedback(
@@ -1137,6 +1457,8 @@ async def record_user_feedback(
             feedback_text=feedback_text,
             actual_card_used=card_used
         )
+        if feedback is None:
+            raise HTTPException(status_code=404, detail="Transaction not found")
         
         # Also record in learning agent
         learning_agent.record_feedback(
@@ -1156,6 +1478,8 @@ async def record_user_feedback(
             "learning_status": adjustments
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1168,7 +1492,7 @@ async def create_automation_rule_endpoint(
     condition_value: Dict,
     action_card_id: str,
     rule_description: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_user_db)
 ):
     """Create an automation rule"""
     try:
@@ -1201,7 +1525,7 @@ async def create_automation_rule_endpoint(
 @app.get("/api/v1/users/{user_id}/rules")
 async def get_automation_rules_endpoint(
     user_id: str,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_user_db)
 ):
     """Get automation rules for a user"""
     try:
@@ -1257,7 +1581,9 @@ async def add_credit_card(
 ):
     """Add a new credit card for a user"""
     try:
-        user = get_user(db, user_id)
+        # With user shards the card goes into the global library; its owner's
+        # users row is copied there first
+        user = ensure_card_owner(database, user_id) if database.sharded else get_user(db, user_id)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
@@ -1267,18 +1593,24 @@ async def add_credit_card(
         except ValueError:
             issuer_enum = CardIssuerEnum.OTHER
         
-        new_card = create_credit_card(
-            db,
-            user_id=user_id,
-            card_name=card.card_name,
-            issuer=issuer_enum,
-            cash_back_rate=card.cash_back_rate,
-            points_multiplier=card.points_multiplier,
-            annual_fee=card.annual_fee,
-            benefits=card.benefits,
-            last_four_digits=card.last_four_digits,
-            credit_limit=card.credit_limit
-        )
+        try:
+            new_card = create_credit_card(
+                db,
+                user_id=user_id,
+                card_name=card.card_name,
+                issuer=issuer_enum,
+                cash_back_rate=card.cash_back_rate,
+                points_multiplier=card.points_multiplier,
+                annual_fee=card.annual_fee,
+                benefits=card.benefits,
+                last_four_digits=card.last_four_digits,
+                credit_limit=card.credit_limit
+            )
+        except IntegrityError:
+            # idx_card_user_name_issuer: one card per name and issuer per user
+            db.rollback()
+            raise HTTPException(status_code=400, detail="Card already exists for this user")
+        sync_card_library(database, [new_card.card_id])
         
         return CreditCard(
             card_id=new_card.card_id,
@@ -1310,10 +1642,17 @@ async def update_credit_card(
             raise HTTPException(status_code=404, detail="Card not found")
         
         update_data = card_update.dict(exclude_unset=True)
-        updated_card = update_card(db, card_id, **update_data)
+        try:
+            updated_card = update_card(db, card_id, **update_data)
+        except IntegrityError:
+            db.rollback()
+            raise HTTPException(status_code=400, detail="Card already exists for this user")
         
         if not updated_card:
             raise HTTPException(status_code=404, detail="Card not found")
+
+        # Replace the shards' copies of the card
+        sync_card_library(database, [card_id])
         
         return CreditCard(
             card_id=updated_card.card_id,
@@ -1344,6 +1683,9 @@ async def delete_credit_card(
         if not success:
             raise HTTPException(status_code=404, detail="Card not found")
 
+        # Replace the shards' copies of the card
+        sync_card_library(database, [card_id])
+
         return {
             "status": "success",
             "message": f"Card {card_id} has been deactivated",
@@ -1364,18 +1706,18 @@ async def delete_credit_card(
 async def get_user_wallet_cards(
     user_id: str,
     active_only: bool = True,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """
     Get all credit cards in user's wallet with full details.
     This combines user-specific data (nickname, last 4 digits) with card library data.
     """
     try:
-        user = get_user(db, user_id)
+        user = await async_crud.get_user(db, user_id)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
 
-        cards_with_details = get_user_cards_with_details(db, user_id, active_only)
+        cards_with_details = await async_crud.get_user_cards_with_details(db, user_id, active_only)
         return cards_with_details
 
     except HTTPException:
@@ -1388,19 +1730,19 @@ async def get_user_wallet_cards(
 async def add_card_to_wallet(
     user_id: str,
     card_request: UserCreditCardCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_user_db)
 ):
     """
     Add a credit card from the library to user's wallet.
     This creates a user-card association with optional custom details.
     """
     try:
-        user = get_user(db, user_id)
+        user = await async_crud.get_user(db, user_id)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
 
         # Add the card to user's wallet
-        user_card = add_user_credit_card(
+        user_card = await async_crud.add_user_credit_card(
             db,
             user_id=user_id,
             card_id=card_request.card_id,
@@ -1444,15 +1786,17 @@ async def add_card_to_wallet(
 async def update_wallet_card(
     user_card_id: int,
     card_update: UserCreditCardUpdate,
-    db: Session = Depends(get_db)
+    user_id: str,
+    db: AsyncSession = Depends(get_async_user_db)
 ):
     """
     Update user-specific details of a credit card in their wallet.
     Can update nickname, last 4 digits, credit limit, balance, or active status.
+    user_id (the wallet's owner) picks the user's shard; other users' cards are not found.
     """
     try:
         update_data = card_update.dict(exclude_unset=True)
-        updated_user_card = update_user_credit_card(db, user_card_id, **update_data)
+        updated_user_card = await async_crud.update_user_credit_card(db, user_card_id, user_id, **update_data)
 
         if not updated_user_card:
             raise HTTPException(status_code=404, detail="User card not found")
@@ -1485,20 +1829,22 @@ async def update_wallet_card(
 @app.delete("/api/v1/wallet/cards/{user_card_id}", status_code=200)
 async def remove_card_from_wallet(
     user_card_id: int,
+    user_id: str,
     permanent: bool = False,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_user_db)
 ):
     """
     Remove a credit card from user's wallet.
     If permanent=False (default), the card is deactivated (soft delete).
     If permanent=True, the card is completely removed from the wallet.
+    user_id (the wallet's owner) picks the user's shard; other users' cards are not found.
     """
     try:
         if permanent:
-            success = delete_user_credit_card(db, user_card_id)
+            success = await async_crud.delete_user_credit_card(db, user_card_id, user_id)
             message = f"Card {user_card_id} permanently removed from wallet"
         else:
-            success = deactivate_user_credit_card(db, user_card_id)
+            success = await async_crud.deactivate_user_credit_card(db, user_card_id, user_id)
             message = f"Card {user_card_id} deactivated in wallet"
 
         if not success:
@@ -1520,11 +1866,15 @@ async def remove_card_from_wallet(
 @app.get("/api/v1/wallet/cards/{user_card_id}", response_model=UserCreditCardResponse)
 async def get_wallet_card_details(
     user_card_id: int,
-    db: Session = Depends(get_db)
+    user_id: str,
+    db: AsyncSession = Depends(get_async_user_db)
 ):
-    """Get detailed information about a specific card in user's wallet"""
+    """
+    Get detailed information about a specific card in user's wallet
+    user_id (the wallet's owner) picks the user's shard; other users' cards are not found.
+    """
     try:
-        user_card = get_user_credit_card(db, user_card_id)
+        user_card = await async_crud.get_user_credit_card(db, user_card_id, user_id)
         if not user_card:
             raise HTTPException(status_code=404, detail="User card not found")
 
@@ -1561,52 +1911,28 @@ async def get_card_library(
     issuer: Optional[str] = None,
     min_fee: Optional[float] = None,
     max_fee: Optional[float] = None,
+    benefit: Optional[str] = None,
+    category: Optional[Category] = None,
+    min_points_multiplier: Optional[float] = None,
+    min_cash_back_rate: Optional[float] = None,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Get available credit cards from the library.
     Users can browse and add these cards to their wallet.
+
+    benefit matches cards with a benefit mentioning it (case-insensitive). The reward
+    minimums apply to category (or the "other" rate when no category is given).
     """
     try:
-        from sqlalchemy import and_
-
-        query = db.query(CreditCardModel)
-
-        # Apply filters
-        filters = []
-        if issuer:
-            from models import CardIssuerEnum
-            try:
-                issuer_enum = CardIssuerEnum(issuer)
-                filters.append(CreditCardModel.issuer == issuer_enum)
-            except ValueError:
-                pass
-
-        if min_fee is not None:
-            filters.append(CreditCardModel.annual_fee >= min_fee)
-
-        if max_fee is not None:
-            filters.append(CreditCardModel.annual_fee <= max_fee)
-
-        if filters:
-            query = query.filter(and_(*filters))
-
-        cards = query.limit(limit).all()
-
-        return [
-            CreditCard(
-                card_id=card.card_id,
-                card_name=card.card_name,
-                issuer=card.issuer.value,
-                cash_back_rate=card.cash_back_rate,
-                points_multiplier=card.points_multiplier,
-                annual_fee=card.annual_fee,
-                benefits=card.benefits or [],
-                is_active=card.is_active
-            )
-            for card in cards
-        ]
+        cards = get_card_library_records(
+            db, issuer=issuer, min_fee=min_fee, max_fee=max_fee, benefit=benefit,
+            category=category.value if category else None,
+            min_points_multiplier=min_points_multiplier, min_cash_back_rate=min_cash_back_rate,
+            limit=limit
+        )
+        return [CreditCard(**card) for card in cards]
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1664,7 +1990,7 @@ async def get_nearby_places(request: LocationRequest):
 @app.post("/api/v1/location/recommendations", response_model=LocationBasedRecommendationResponse)
 async def get_location_based_recommendations(
     request: LocationBasedRecommendationRequest,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_user_db)
 ):
     """
     Get credit card recommendations for nearby places
@@ -0,0 +1,218 @@
+"""
+In-Process Merchant Index
+Keeps the (small, rarely changing) merchant catalog in memory so autocomplete
+and name resolution don't query the database on every keystroke.
+
+- Prefix trie over every word start of each normalized name, for autocomplete
+  ("who" and "foo" both reach "Whole Foods")
+- Normalized-name hash map for exact resolution ("mcdonald's" -> "McDonald's")
+- Category buckets for category browsing and filtering
+
+Loaded at startup, updated when merchants are created, and reloaded when older
+than MERCHANT_INDEX_TTL seconds so other workers' writes show up. Every change
+builds a new immutable snapshot and publishes it with one attribute swap, so
+lock-free readers never see a half-built index.
+"""
+
+import os
+import re
+import threading
+import time
+import unicodedata
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models import Merchant, CategoryEnum
+
+
+@dataclass(frozen=True)
+class MerchantEntry:
+    """Snapshot of the merchant columns served by search"""
+    merchant_id: int
+    merchant_name: str
+    primary_category: CategoryEnum
+    logo_url: Optional[str]
+    normalized: str
+
+    def to_dict(self) -> Dict:
+        return {
+            "merchant_id": self.merchant_id,
+            "merchant_name": self.merchant_name,
+            "primary_category": self.primary_category.value,
+            "logo_url": self.logo_url,
+        }
+
+
+def normalize_name(name: str) -> str:
+    """Lowercase, strip accents and punctuation, collapse whitespace"""
+    text = unicodedata.normalize("NFKD", name or "")
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    text = re.sub(r"['’]", "", text)  # mcdonald's -> mcdonalds
+    text = re.sub(r"[^a-z0-9]+", " ", text)
+    return text.strip()
+
+
+class _TrieNode:
+    __slots__ = ("children", "ids")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.ids: Set[int] = set()  # every merchant with a key passing through this node
+
+
+class _Snapshot:
+    """One version of the index; never modified once published"""
+    __slots__ = ("entries", "by_normalized", "by_category", "trie")
+
+    def __init__(self, entries: Iterable[MerchantEntry] = ()):
+        self.entries: Dict[int, MerchantEntry] = {}
+        self.by_normalized: Dict[str, int] = {}
+        self.by_category: Dict[CategoryEnum, Set[int]] = {}
+        self.trie = _TrieNode()
+        for entry in entries:
+            self._insert(entry)
+
+    def _insert(self, entry: MerchantEntry) -> None:
+        merchant_id = entry.merchant_id
+        self.entries[merchant_id] = entry
+        self.by_normalized.setdefault(entry.normalized, merchant_id)
+        self.by_category.setdefault(entry.primary_category, set()).add(merchant_id)
+
+        # Key every word start: "whole foods market", "foods market", "market"
+        words = entry.normalized.split(" ")
+        for start in range(len(words)):
+            node = self.trie
+            node.ids.add(merchant_id)
+            for char in " ".join(words[start:]):
+                node = node.children.setdefault(char, _TrieNode())
+                node.ids.add(merchant_id)
+
+
+def _entry(merchant_id, merchant_name, primary_category, logo_url) -> MerchantEntry:
+    return MerchantEntry(
+        merchant_id=merchant_id,
+        merchant_name=merchant_name,
+        primary_category=CategoryEnum(primary_category),
+        logo_url=logo_url,
+        normalized=normalize_name(merchant_name),
+    )
+
+
+class MerchantIndex:
+    """Autocomplete / exact-match / category index over the merchant catalog"""
+
+    def __init__(self, ttl_seconds: Optional[float] = None):
+        self.ttl_seconds = float(ttl_seconds if ttl_seconds is not None else os.getenv("MERCHANT_INDEX_TTL", "300"))
+        self._lock = threading.Lock()  # Serializes writers; readers take self._snapshot once per call
+        self._snapshot = _Snapshot()
+        self.loaded_at: Optional[float] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self.loaded_at is not None
+
+    def __len__(self) -> int:
+        return len(self._snapshot.entries)
+
+    # ------------------------------------------------------------------
+    # Loading and updates
+    # ------------------------------------------------------------------
+
+    def load(self, db: Session) -> int:
+        """(Re)build the index from the merchants table; returns the merchant count"""
+        rows = db.execute(select(
+            Merchant.merchant_id, Merchant.merchant_name, Merchant.primary_category, Merchant.logo_url
+        )).all()
+        snapshot = _Snapshot(_entry(*row) for row in rows)
+
+        with self._lock:
+            self._snapshot = snapshot
+            self.loaded_at = time.monotonic()
+        return len(rows)
+
+    def refresh_if_stale(self, db: Session) -> None:
+        """Reload when never loaded or older than the TTL"""
+        if not self.loaded or time.monotonic() - self.loaded_at > self.ttl_seconds:
+            self.load(db)
+
+    def add(self, merchant: Merchant) -> None:
+        """Add or replace one merchant (call after it is committed)"""
+        if not self.loaded:
+            return
+        entry = _entry(merchant.merchant_id, merchant.merchant_name, merchant.primary_category, merchant.logo_url)
+        with self._lock:
+            # Rebuilt rather than patched: the catalog is small and readers may hold the current one
+            entries = {**self._snapshot.entries, entry.merchant_id: entry}
+            self._snapshot = _Snapshot(entries.values())
+
+    def clear(self) -> None:
+        """Drop all entries and mark the index as not loaded"""
+        with self._lock:
+            self._snapshot = _Snapshot()
+            self.loaded_at = None
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def resolve(self, name: str) -> Optional[MerchantEntry]:
+        """Exact match on the normalized name"""
+        snapshot = self._snapshot
+        merchant_id = snapshot.by_normalized.get(normalize_name(name))
+        return snapshot.entries.get(merchant_id) if merchant_id is not None else None
+
+    def search(self, query: str, limit: int = 10, category: Optional[CategoryEnum] = None) -> List[MerchantEntry]:
+        """
+        Autocomplete, best matches first.
+
+        Ranking: whole-name prefix, then word prefix (both from the trie), then
+        substring matches elsewhere in a word; shorter names first within a tier.
+        """
+        prefix = normalize_name(query)
+        if not prefix:
+            return []
+
+        snapshot = self._snapshot
+        entries = snapshot.entries
+        allowed = snapshot.by_category.get(category, set()) if category else None
+
+        node = snapshot.trie
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                break
+        word_matches = set(node.ids) if node is not None else set()
+        if allowed is not None:
+            word_matches &= set(allowed)
+
+        def rank(entry: MerchantEntry):
+            return (not entry.normalized.startswith(prefix), len(entry.merchant_name), entry.merchant_name)
+
+        results = sorted((entries[i] for i in word_matches), key=rank)[:limit]
+
+        if len(results) < limit:
+            candidates = allowed if allowed is not None else entries
+            substring = [
+                entries[i] for i in candidates
+                if i not in word_matches and prefix in entries[i].normalized
+            ]
+            results += sorted(substring, key=rank)[:limit - len(results)]
+
+        return results
+
+    def by_category(self, category: CategoryEnum, limit: int = 50) -> List[MerchantEntry]:
+        """Merchants in a category, ordered by name"""
+        snapshot = self._snapshot
+        entries = [snapshot.entries[i] for i in snapshot.by_category.get(category, ())]
+        return sorted(entries, key=lambda e: e.merchant_name)[:limit]
+
+    def all(self, limit: int = 100) -> List[MerchantEntry]:
+        """All merchants, ordered by name"""
+        return sorted(self._snapshot.entries.values(), key=lambda e: e.merchant_name)[:limit]
+
+
+# Singleton instance
+merchant_index = MerchantIndex()
@@ -4,6 +4,7 @@ Prometheus metrics for the Credit Card Rewards Maximizer.
 This module defines all application metrics for monitoring:
 - HTTP request metrics
 - Database metrics
+- Read cache metrics
 - AI/Groq API metrics
 - Business metrics
 """
@@ -65,17 +66,94 @@ DB_QUERIES_TOTAL = Counter(
 
 DB_CONNECTION_POOL_SIZE = Gauge(
     'db_connection_pool_size',
-    'Current size of the database connection pool'
+    'Current size of the database connection pool',
+    ['pool']  # primary, replica_0, ... (async engines: primary_async, replica_0_async, ...)
 )
 
 DB_CONNECTION_POOL_CHECKED_OUT = Gauge(
     'db_connection_pool_checked_out',
-    'Number of connections currently checked out from the pool'
+    'Number of connections currently checked out from the pool',
+    ['pool']  # primary, replica_0, ... (async engines: primary_async, replica_0_async, ...)
 )
 
 DB_CONNECTION_POOL_OVERFLOW = Gauge(
     'db_connection_pool_overflow',
-    'Number of overflow connections in use'
+    'Number of overflow connections in use',
+    ['pool']  # primary, replica_0, ... (async engines: primary_async, replica_0_async, ...)
+)
+
+# =============================================================================
+# Read Cache Metrics
+# =============================================================================
+
+READ_CACHE_REQUESTS_TOTAL = Counter(
+    'read_cache_requests_total',
+    'Cached crud reads by outcome',
+    ['function', 'result']  # result: hit, miss, bypass
+)
+
+READ_CACHE_INVALIDATIONS_TOTAL = Counter(
+    'read_cache_invalidations_total',
+    'Cache entries dropped because a committed write touched one of their tags',
+    ['tag']  # tag type: user, wallet, card, rules, library
+)
+
+READ_CACHE_EVICTIONS_TOTAL = Counter(
+    'read_cache_evictions_total',
+    'Cache entries evicted to stay within the size bound'
+)
+
+READ_CACHE_ENTRIES = Gauge(
+    'read_cache_entries',
+    'Number of entries currently in the read cache'
+)
+
+CACHE_INVALIDATION_MESSAGES_TOTAL = Counter(
+    'cache_invalidation_messages_total',
+    'Cross-worker cache invalidation messages',
+    ['direction']  # sent, received
+)
+
+CACHE_INVALIDATION_LAG = Histogram(
+    'cache_invalidation_lag_seconds',
+    'Time from another worker publishing an invalidation to this worker applying it',
+    buckets=[0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5]
+)
+
+# =============================================================================
+# Write-Behind Transaction Queue Metrics
+# =============================================================================
+
+TRANSACTION_QUEUE_DEPTH = Gauge(
+    'transaction_queue_depth',
+    'Transactions accepted but not yet flushed to the database'
+)
+
+TRANSACTION_QUEUE_REJECTED_TOTAL = Counter(
+    'transaction_queue_rejected_total',
+    'Transactions rejected with 503 because the queue was full'
+)
+
+TRANSACTION_FLUSH_SIZE = Histogram(
+    'transaction_flush_size_rows',
+    'Rows inserted per write-behind flush batch',
+    buckets=[1, 5, 10, 25, 50, 100, 250, 500, 1000]
+)
+
+TRANSACTION_FLUSH_LAG = Histogram(
+    'transaction_flush_lag_seconds',
+    'Time from enqueue of the oldest row in a batch to its commit',
+    buckets=[0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+)
+
+TRANSACTION_FLUSH_FAILURES_TOTAL = Counter(
+    'transaction_flush_failures_total',
+    'Write-behind flush batches that failed and were kept for retry'
+)
+
+TRANSACTION_DEAD_LETTERED_TOTAL = Counter(
+    'transaction_dead_lettered_total',
+    'Queued transactions moved to the dead-letter file after repeated flush failures'
 )
 
 # =============================================================================
@@ -137,6 +215,11 @@ USERS_TOTAL = Gauge(
     'Total number of registered users'
 )
 
+WALLET_CARDS_TOTAL = Gauge(
+    'wallet_cards_total',
+    'Total number of library cards in user wallets'
+)
+
 TRANSACTIONS_TOTAL = Counter(
     'transactions_total',
     'Total number of transactions processed',
@@ -261,15 +344,18 @@ def track_recommendation(success: bool, accepted: bool = None, savings: float =
         ESTIMATED_SAVINGS.inc(savings)
 
 
-def update_business_metrics(users: int = None, cards: int = None):
+def update_business_metrics(users: int = None, cards: int = None, wallet_cards: int = None):
     """
     Update business gauge metrics.
 
     Args:
         users: Total number of users
         cards: Total number of cards
+        wallet_cards: Total number of cards in user wallets
     """
     if users is not None:
         USERS_TOTAL.set(users)
     if cards is not None:
         CARDS_REGISTERED.set(cards)
+    if wallet_cards is not None:
+        WALLET_CARDS_TOTAL.set(wallet_cards)
@@ -5,15 +5,27 @@ This module provides:
 - Request/response logging with timing
 - Correlation ID injection and propagation
 - Error tracking and categorization
+- Statement timeouts mapped to 503 responses
+- Last-write stamps for read-your-writes across workers
 """
 
+import math
 import time
 import uuid
 from typing import Callable
 from fastapi import Request, Response
+from fastapi.responses import JSONResponse
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.types import ASGIApp
 
+from database import (
+    db,
+    watch_statement_timeouts,
+    watch_writes,
+    STATEMENT_TIMEOUT_RETRY_AFTER,
+    LAST_WRITE_COOKIE,
+    LAST_WRITE_HEADER
+)
 from logging_config import get_api_logger, set_correlation_id, get_correlation_id
 from metrics import (
     HTTP_REQUEST_DURATION,
@@ -189,3 +201,48 @@ class ErrorTrackingMiddleware(BaseHTTPMiddleware):
                 exc_info=True
             )
             raise
+
+
+class StatementTimeoutMiddleware(BaseHTTPMiddleware):
+    """
+    Answer 503 with a Retry-After hint when a database statement timed out
+    while handling the request, instead of the generic 500 the endpoint's
+    error handling produces.
+    """
+
+    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+        with watch_statement_timeouts() as timeouts:
+            try:
+                response = await call_next(request)
+            except Exception:
+                if not timeouts:
+                    raise
+                response = None
+
+        if timeouts and (response is None or response.status_code >= 500):
+            return JSONResponse(
+                status_code=503,
+                content={"detail": "Database query timed out, please retry"},
+                headers={"Retry-After": STATEMENT_TIMEOUT_RETRY_AFTER}
+            )
+        return response
+
+
+class ReadYourWritesMiddleware(BaseHTTPMiddleware):
+    """
+    Stamp responses to requests that committed user writes with a last-write
+    timestamp (cookie and header). Clients send it back, so whichever worker
+    serves their next reads keeps them on the primary for the read-your-writes
+    window instead of a lagging replica.
+    """
+
+    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+        with watch_writes() as written:
+            response = await call_next(request)
+
+        if written and db.config.REPLICA_URLS:
+            last_write_at = f"{time.time():.3f}"
+            window = max(1, math.ceil(db.config.READ_YOUR_WRITES_SECONDS))
+            response.set_cookie(LAST_WRITE_COOKIE, last_write_at, max_age=window, httponly=True, samesite="lax")
+            response.headers[LAST_WRITE_HEADER] = last_write_at
+        return response
@@ -4,17 +4,46 @@ PostgreSQL Database Schema
 """
 
 from sqlalchemy import (
-    Column, String, Float, Integer, DateTime, Boolean, 
-    ForeignKey, JSON, Enum as SQLEnum, Text, Index, CheckConstraint
+    Column, String, Float, Integer, DateTime, Date, Boolean,
+    ForeignKey, ForeignKeyConstraint, PrimaryKeyConstraint, JSON, Enum as SQLEnum, Text, Index,
+    CheckConstraint, DDL, event
 )
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
 
+from partitions import create_initial_partitions, unpartitioned
+
 Base = declarative_base()
 
 
+def covering_index(name, *columns, include=(), **kw):
+    """
+    Index that answers a query without touching the table: the extra columns
+    are INCLUDEd on PostgreSQL and appended as trailing key columns on SQLite
+    (which has no INCLUDE). Extra keyword arguments (e.g. partial *_where
+    clauses) apply to both variants.
+    """
+    return (
+        Index(name, *columns, postgresql_include=list(include), **kw).ddl_if(dialect='postgresql'),
+        Index(name, *columns, *include, **kw).ddl_if(dialect='sqlite'),
+    )
+
+
+# JSON that is filtered on: binary JSONB on PostgreSQL (containment operators,
+# GIN-indexable), plain JSON text elsewhere
+JSONDocument = JSON().with_variant(JSONB(), 'postgresql')
+
+
+def json_gin_index(name, column):
+    """GIN index for JSONB containment (@>) filters on a JSONDocument column (PostgreSQL only)"""
+    return Index(
+        name, column, postgresql_using='gin', postgresql_ops={column: 'jsonb_path_ops'}
+    ).ddl_if(dialect='postgresql')
+
+
 # Enums
 class OptimizationGoalEnum(str, enum.Enum):
     CASH_BACK = "cash_back"
@@ -92,12 +121,12 @@ class CreditCard(Base):
     last_four_digits = Column(String(4))
     
     # Rewards Structure (stored as JSON for flexibility)
-    cash_back_rate = Column(JSON, nullable=False)  # {"dining": 0.03, "travel": 0.03, "other": 0.01}
-    points_multiplier = Column(JSON, nullable=False)  # {"dining": 3.0, "travel": 3.0, "other": 1.0}
+    cash_back_rate = Column(JSONDocument, nullable=False)  # {"dining": 0.03, "travel": 0.03, "other": 0.01}
+    points_multiplier = Column(JSONDocument, nullable=False)  # {"dining": 3.0, "travel": 3.0, "other": 1.0}
     
     # Card Details
     annual_fee = Column(Float, default=0.0)
-    benefits = Column(JSON)  # Array of benefit strings
+    benefits = Column(JSONDocument)  # Array of benefit strings
     sign_up_bonus = Column(Float)
     foreign_transaction_fee = Column(Float)
     
@@ -116,17 +145,41 @@ class CreditCard(Base):
     user = relationship("User", back_populates="credit_cards")
     transactions = relationship("Transaction", back_populates="card")
     card_benefits = relationship("CardBenefit", back_populates="card", cascade="all, delete-orphan")
+    reward_rates = relationship("CardRewardRate", back_populates="card", cascade="all, delete-orphan", passive_deletes=True)
     
     # Indexes
     __table_args__ = (
         Index('idx_card_user_id', 'user_id'),
         Index('idx_card_issuer', 'issuer'),
-        Index('idx_card_is_active', 'is_active'),
+        # Conflict target of the library seed upsert (crud.bulk_upsert_credit_cards)
+        Index('idx_card_user_name_issuer', 'user_id', 'card_name', 'issuer', unique=True),
+        # Active cards only (get_user_cards)
+        Index('idx_card_user_active', 'user_id', postgresql_where=is_active == True, sqlite_where=is_active == True),
+        # Card library containment filters (get_card_library)
+        json_gin_index('idx_card_benefits_gin', 'benefits'),
         CheckConstraint('annual_fee >= 0', name='check_annual_fee_positive'),
         CheckConstraint('credit_limit >= 0', name='check_credit_limit_positive'),
     )
 
 
+class CardRewardRate(Base):
+    """
+    Normalized copy of a card's cash_back_rate / points_multiplier JSON, one row
+    per category key, kept in sync by the crud card writes (see crud.get_best_cards)
+    A NULL rate means the category key is absent for that reward type, so the
+    card's "other" rate applies, exactly as when reading the JSON.
+    """
+    __tablename__ = "card_reward_rates"
+
+    card_id = Column(String(50), ForeignKey('credit_cards.card_id', ondelete='CASCADE'), primary_key=True)
+    category = Column(String(50), primary_key=True)  # JSON key: "dining", "travel", ..., "other"
+    cash_back_rate = Column(Float)
+    points_multiplier = Column(Float)
+
+    # Relationships
+    card = relationship("CreditCard", back_populates="reward_rates")
+
+
 class UserCreditCard(Base):
     """Junction table linking users to their owned credit cards from the library"""
     __tablename__ = "user_credit_cards"
@@ -155,10 +208,10 @@ class UserCreditCard(Base):
 
     # Indexes
     __table_args__ = (
-        Index('idx_user_card_user_id', 'user_id'),
         Index('idx_user_card_card_id', 'card_id'),
-        Index('idx_user_card_is_active', 'is_active'),
-        # Ensure a user can't add the same card twice
+        # Active wallet rows only (wallet listing, recommendations)
+        Index('idx_user_card_user_active', 'user_id', postgresql_where=is_active == True, sqlite_where=is_active == True),
+        # Ensure a user can't add the same card twice (also serves lookups by user_id)
         Index('idx_user_card_unique', 'user_id', 'card_id', unique=True),
         CheckConstraint('credit_limit >= 0', name='check_user_card_credit_limit_positive'),
     )
@@ -201,10 +254,16 @@ class CardBenefit(Base):
 
 
 class Transaction(Base):
-    """Transaction history and recommendations"""
+    """
+    Transaction history and recommendations
+    On PostgreSQL the table is range-partitioned by month on transaction_date
+    (see partitions.py), so there its primary key is (transaction_id,
+    transaction_date), added by the partitioning hook. Other databases keep
+    transaction_id as the primary key.
+    """
     __tablename__ = "transactions"
     
-    transaction_id = Column(String(50), primary_key=True)
+    transaction_id = Column(String(50), nullable=False)
     user_id = Column(String(50), ForeignKey('users.user_id', ondelete='CASCADE'), nullable=False)
     card_id = Column(String(50), ForeignKey('credit_cards.card_id', ondelete='SET NULL'))
     
@@ -242,26 +301,54 @@ class Transaction(Base):
     # Relationships
     user = relationship("User", back_populates="transactions")
     card = relationship("CreditCard", back_populates="transactions")
-    feedback = relationship("TransactionFeedback", back_populates="transaction", uselist=False, cascade="all, delete-orphan")
+    feedback = relationship(
+        "TransactionFeedback",
+        primaryjoin="Transaction.transaction_id == foreign(TransactionFeedback.transaction_id)",
+        back_populates="transaction",
+        uselist=False,
+        cascade="all, delete-orphan"
+    )
     
     # Indexes
     __table_args__ = (
-        Index('idx_transaction_user_id', 'user_id'),
+        PrimaryKeyConstraint('transaction_id').ddl_if(callable_=unpartitioned),
         Index('idx_transaction_date', 'transaction_date'),
         Index('idx_transaction_category', 'category'),
         Index('idx_transaction_merchant', 'merchant'),
         Index('idx_transaction_card_id', 'card_id'),
+        # User + date range: keyset pagination of history (scanned backwards for
+        # newest first) and every analytics aggregate, answered from the index alone
+        *covering_index(
+            'idx_transaction_user_date_covering', 'user_id', 'transaction_date', 'transaction_id',
+            include=(
+                'category', 'merchant', 'recommended_card_id', 'amount',
+                'total_value_earned', 'optimal_value', 'missed_value', 'used_recommended_card'
+            )
+        ),
+        Index('idx_transaction_user_category_date_id', 'user_id', 'category', 'transaction_date', 'transaction_id'),
+        # Best-card analytics: grouped by recommended card, recommended rows only
+        *covering_index(
+            'idx_transaction_user_recommended', 'user_id', 'recommended_card_id', 'transaction_date',
+            include=('transaction_id', 'total_value_earned'),
+            postgresql_where=recommended_card_id.isnot(None),
+            sqlite_where=recommended_card_id.isnot(None)
+        ),
         CheckConstraint('amount > 0', name='check_amount_positive'),
         CheckConstraint('confidence_score >= 0 AND confidence_score <= 1', name='check_confidence_range'),
+        {'postgresql_partition_by': 'RANGE (transaction_date)'},
     )
 
 
+# Monthly partitions (and the default partition) are created with the table
+event.listen(Transaction.__table__, 'after_create', create_initial_partitions)
+
+
 class TransactionFeedback(Base):
     """User feedback on AI recommendations"""
     __tablename__ = "transaction_feedback"
     
     feedback_id = Column(Integer, primary_key=True, autoincrement=True)
-    transaction_id = Column(String(50), ForeignKey('transactions.transaction_id', ondelete='CASCADE'), unique=True, nullable=False)
+    transaction_id = Column(String(50), unique=True, nullable=False)
     
     # Feedback
     accepted_recommendation = Column(Boolean, nullable=False)
@@ -276,16 +363,61 @@ class TransactionFeedback(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
-    transaction = relationship("Transaction", back_populates="feedback")
+    transaction = relationship(
+        "Transaction",
+        primaryjoin="foreign(TransactionFeedback.transaction_id) == Transaction.transaction_id",
+        back_populates="feedback"
+    )
     
     # Indexes
     __table_args__ = (
+        # Not on PostgreSQL: transaction_id alone isn't unique across the
+        # partitions of transactions (crud.create_transaction_feedback checks
+        # the transaction instead; the ORM relationship cascades deletes)
+        ForeignKeyConstraint(
+            ['transaction_id'], ['transactions.transaction_id'], ondelete='CASCADE'
+        ).ddl_if(callable_=unpartitioned),
         Index('idx_feedback_transaction_id', 'transaction_id'),
         Index('idx_feedback_accepted', 'accepted_recommendation'),
         CheckConstraint('satisfaction_rating >= 1 AND satisfaction_rating <= 5', name='check_rating_range'),
     )
 
 
+class UserDailyRollup(Base):
+    """Per-user daily transaction aggregates, maintained as transactions are recorded"""
+    __tablename__ = "user_daily_rollups"
+
+    user_id = Column(String(50), ForeignKey('users.user_id', ondelete='CASCADE'), primary_key=True)
+    day = Column(Date, primary_key=True)
+    category = Column(SQLEnum(CategoryEnum), primary_key=True)
+    card_id = Column(String(50), primary_key=True, default='')  # Card used, '' when unknown
+
+    # Aggregates
+    transaction_count = Column(Integer, default=0, nullable=False)
+    followed_count = Column(Integer, default=0, nullable=False)  # Transactions that used the recommended card
+    total_spent = Column(Float, default=0.0, nullable=False)
+    rewards_earned = Column(Float, default=0.0, nullable=False)
+    optimal_value = Column(Float, default=0.0, nullable=False)
+    missed_value = Column(Float, default=0.0, nullable=False)
+
+    # Metadata
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class UserBehaviorDay(Base):
+    """
+    Per-user daily transaction counts by optimization goal, the one behavior
+    dimension the daily rollups don't carry; lets compaction age goals out of
+    the rolling behavior window
+    """
+    __tablename__ = "user_behavior_days"
+
+    user_id = Column(String(50), ForeignKey('users.user_id', ondelete='CASCADE'), primary_key=True)
+    day = Column(Date, primary_key=True)
+    optimization_goal = Column(SQLEnum(OptimizationGoalEnum), primary_key=True)
+    transaction_count = Column(Integer, default=0, nullable=False)
+
+
 class UserBehavior(Base):
     """Learned user preferences and spending patterns"""
     __tablename__ = "user_behavior"
@@ -318,6 +450,13 @@ class UserBehavior(Base):
     total_potential_rewards = Column(Float, default=0.0)
     optimization_score = Column(Float)  # How well user is optimizing (0-100)
     
+    # Rolling window counters: incremented per transaction, rebuilt from the daily
+    # buckets by compaction. The spending and optimization totals above cover the same window.
+    window_start = Column(Date)  # First day counted
+    category_counts = Column(JSON)  # {"dining": 12, "travel": 3}
+    goal_counts = Column(JSON)  # {"balanced": 10, "cash_back": 5}
+    card_counts = Column(JSON)  # {"card_id": 7}
+
     # Metadata
     last_updated = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     learning_data_points = Column(Integer, default=0)
@@ -367,8 +506,11 @@ class AutomationRule(Base):
     # Indexes
     __table_args__ = (
         Index('idx_rule_user_id', 'user_id'),
-        Index('idx_rule_is_active', 'is_active'),
-        Index('idx_rule_priority', 'priority'),
+        # Active rules in priority order (get_user_automation_rules)
+        Index(
+            'idx_rule_user_active_priority', 'user_id', priority.desc(),
+            postgresql_where=is_active == True, sqlite_where=is_active == True
+        ),
     )
 
 
@@ -381,7 +523,7 @@ class Merchant(Base):
     
     # Category Information
     primary_category = Column(SQLEnum(CategoryEnum), nullable=False)
-    secondary_categories = Column(JSON)  # Array of other applicable categories
+    secondary_categories = Column(JSONDocument)  # Array of other applicable categories
     
     # Merchant Details
     website = Column(String(255))
@@ -399,9 +541,24 @@ class Merchant(Base):
     __table_args__ = (
         Index('idx_merchant_name', 'merchant_name'),
         Index('idx_merchant_category', 'primary_category'),
+        json_gin_index('idx_merchant_secondary_categories_gin', 'secondary_categories'),
+        # Trigram index for substring / fuzzy name search (PostgreSQL only)
+        Index(
+            'idx_merchant_name_trgm', 'merchant_name',
+            postgresql_using='gin',
+            postgresql_ops={'merchant_name': 'gin_trgm_ops'}
+        ).ddl_if(dialect='postgresql'),
     )
 
 
+# gin_trgm_ops comes from the pg_trgm extension, which must exist before the index
+event.listen(
+    Merchant.__table__,
+    'before_create',
+    DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql')
+)
+
+
 class Offer(Base):
     """Special offers and promotions"""
     __tablename__ = "offers"
@@ -435,8 +592,9 @@ class Offer(Base):
     # Indexes
     __table_args__ = (
         Index('idx_offer_card_id', 'card_id'),
-        Index('idx_offer_is_active', 'is_active'),
         Index('idx_offer_dates', 'start_date', 'end_date'),
+        # Offers that are active and not yet expired (get_active_offers)
+        Index('idx_offer_active_end', 'end_date', postgresql_where=is_active == True, sqlite_where=is_active == True),
     )
 
 
@@ -472,3 +630,44 @@ class AIModelMetrics(Base):
         Index('idx_metrics_date', 'metric_date'),
         Index('idx_metrics_version', 'model_version'),
     )
+
+
+class SeedChecksum(Base):
+    """Content checksum of the last seed file applied to each seed target"""
+    __tablename__ = "seed_checksums"
+
+    seed_name = Column(String(150), primary_key=True)  # e.g. "merchants", "card_library:user_abc"
+    checksum = Column(String(64), nullable=False)  # sha256 of the seed file
+    row_count = Column(Integer, default=0)
+    applied_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class BusinessCounter(Base):
+    """
+    Running totals behind the business metrics (users, cards, wallet cards,
+    transactions per category), incremented by the crud writes in their own
+    transaction. Each counter is spread over a few slots so concurrent writers
+    rarely wait on the same row; its value is the sum over its slots.
+    """
+    __tablename__ = "business_counters"
+
+    name = Column(String(100), primary_key=True)  # e.g. "users", "transactions:dining"
+    slot = Column(Integer, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+
+class CacheInvalidation(Base):
+    """
+    Cache tags written by committed sessions, for workers to pick up when the
+    database has no LISTEN/NOTIFY (SQLite). Rows are deleted after a few minutes.
+    """
+    __tablename__ = "cache_invalidations"
+
+    invalidation_id = Column(Integer, primary_key=True, autoincrement=True)
+    origin = Column(String(100), nullable=False)  # Publishing worker, e.g. "host:1234:ab12cd"
+    tags = Column(JSON, nullable=False)  # e.g. ["user:user_abc", "wallet:user_abc"]
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index('idx_cache_invalidations_created', 'created_at'),
+    )
@@ -0,0 +1,208 @@
+"""
+Monthly Range Partitioning of the Transactions Table (PostgreSQL only)
+
+`transactions` is declared PARTITION BY RANGE (transaction_date). Each month
+lives in its own partition (transactions_y2026m01, ...), so queries over a
+recent date window only touch one or two small partitions, and old months can
+be detached (kept as standalone tables for archiving) without a bulk DELETE.
+
+- Partitions for the current month plus TRANSACTION_PARTITION_MONTHS_AHEAD
+  future months are created with the table and again on every API startup
+- transactions_default catches rows outside every monthly range; rows in it
+  are moved out when their month's partition is created
+- Partitions older than TRANSACTION_PARTITION_RETENTION_MONTHS are detached by
+  scripts/manage_transaction_partitions.py (nothing is detached when unset)
+
+Other databases (SQLite in tests) get a plain table; every function here is a
+no-op there.
+"""
+
+import os
+import re
+from datetime import date, datetime
+from typing import List, Optional
+
+from sqlalchemy import text
+
+from logging_config import get_db_logger
+
+logger = get_db_logger()
+
+TABLE_NAME = "transactions"
+DEFAULT_PARTITION = f"{TABLE_NAME}_default"
+MONTHS_AHEAD = int(os.getenv("TRANSACTION_PARTITION_MONTHS_AHEAD", "3"))
+RETENTION_MONTHS = (
+    int(os.environ["TRANSACTION_PARTITION_RETENTION_MONTHS"])
+    if os.getenv("TRANSACTION_PARTITION_RETENTION_MONTHS") else None
+)
+
+_PARTITION_NAME = re.compile(rf"^{TABLE_NAME}_y(\d{{4}})m(\d{{2}})$")
+
+
+def month_start(value) -> date:
+    """First day of the month containing value"""
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    """Shift a month start by a number of months"""
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    """Partition table name for a month, e.g. transactions_y2026m10"""
+    return f"{TABLE_NAME}_y{month.year:04d}m{month.month:02d}"
+
+
+def partition_month(name: str) -> Optional[date]:
+    """Month covered by a monthly partition name (None for other tables)"""
+    match = _PARTITION_NAME.match(name)
+    return date(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+
+def _is_postgresql(connection) -> bool:
+    return connection.dialect.name == "postgresql"
+
+
+def is_partitioned(connection) -> bool:
+    """Whether the transactions table is a partitioned table"""
+    if not _is_postgresql(connection):
+        return False
+    return connection.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table))"
+    ), {"table": TABLE_NAME}).scalar()
+
+
+def list_partitions(connection) -> List[str]:
+    """Names of the partitions currently attached to transactions"""
+    if not is_partitioned(connection):
+        return []
+    return list(connection.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:table) ORDER BY c.relname"
+    ), {"table": TABLE_NAME}).scalars())
+
+
+def _create_month_partition(connection, month: date) -> None:
+    """
+    Create one monthly partition. If the default partition already holds rows
+    for that month, they are moved into the new partition (PostgreSQL refuses
+    to create a partition that would overlap rows in the default one).
+    """
+    name = partition_name(month)
+    bounds = {"start": month, "end": add_months(month, 1)}
+    range_filter = "transaction_date >= :start AND transaction_date < :end"
+
+    stranded = connection.execute(text(
+        f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE {range_filter})"
+    ), bounds).scalar()
+
+    if stranded:
+        connection.execute(text(f"ALTER TABLE {TABLE_NAME} DETACH PARTITION {DEFAULT_PARTITION}"))
+
+    connection.execute(text(
+        f"CREATE TABLE {name} PARTITION OF {TABLE_NAME} "
+        f"FOR VALUES FROM ('{bounds['start'].isoformat()}') TO ('{bounds['end'].isoformat()}')"
+    ))
+
+    if stranded:
+        connection.execute(text(
+            f"INSERT INTO {TABLE_NAME} SELECT * FROM {DEFAULT_PARTITION} WHERE {range_filter}"
+        ), bounds)
+        connection.execute(text(f"DELETE FROM {DEFAULT_PARTITION} WHERE {range_filter}"), bounds)
+        connection.execute(text(f"ALTER TABLE {TABLE_NAME} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT"))
+
+    logger.info("Transaction partition created", extra={
+        'event': 'partition_created',
+        'partition': name,
+        'moved_from_default': bool(stranded)
+    })
+
+
+def ensure_partitions(
+    connection,
+    start: Optional[date] = None,
+    months_ahead: int = MONTHS_AHEAD,
+    today: Optional[date] = None
+) -> List[str]:
+    """
+    Create any missing monthly partitions from start (default: this month)
+    through months_ahead months after this month, plus the default partition.
+
+    Returns:
+        Names of the partitions that were created
+    """
+    if not is_partitioned(connection):
+        return []
+
+    # Serialize concurrent callers (e.g. several API workers starting at once)
+    connection.execute(text("SELECT pg_advisory_xact_lock(hashtext(:table))"), {"table": TABLE_NAME})
+
+    current = month_start(today or datetime.utcnow())
+    existing = set(list_partitions(connection))
+    created = []
+
+    if DEFAULT_PARTITION not in existing:
+        connection.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {TABLE_NAME} DEFAULT"))
+        created.append(DEFAULT_PARTITION)
+
+    month = month_start(start) if start else current
+    last = add_months(current, months_ahead)
+    while month <= last:
+        if partition_name(month) not in existing:
+            _create_month_partition(connection, month)
+            created.append(partition_name(month))
+        month = add_months(month, 1)
+
+    return created
+
+
+def detach_partitions_older_than(
+    connection,
+    months: int,
+    today: Optional[date] = None
+) -> List[str]:
+    """
+    Detach monthly partitions more than `months` months older than the current
+    month (months=12 in October 2026 detaches September 2025 and earlier). Detached partitions stay as ordinary tables (archive or drop
+    them separately); they no longer appear in transactions queries.
+
+    Returns:
+        Names of the detached partitions
+    """
+    if not is_partitioned(connection):
+        return []
+
+    cutoff = add_months(month_start(today or datetime.utcnow()), -months)
+    detached = []
+    for name in list_partitions(connection):
+        month = partition_month(name)
+        if month is not None and month < cutoff:
+            connection.execute(text(f"ALTER TABLE {TABLE_NAME} DETACH PARTITION {name}"))
+            detached.append(name)
+            logger.info("Transaction partition detached", extra={
+                'event': 'partition_detached',
+                'partition': name
+            })
+    return detached
+
+
+def unpartitioned(ddl, target, bind, tables=None, state=None, *, dialect, **kw) -> bool:
+    """
+    ddl_if condition for the constraints a partitioned transactions table
+    can't have: the primary key on transaction_id alone and foreign keys
+    referencing it. Only PostgreSQL partitions the table.
+    """
+    return dialect.name != "postgresql"
+
+
+def create_initial_partitions(target, connection, **kw) -> None:
+    """after_create hook on the transactions table"""
+    if _is_postgresql(connection):
+        # The primary key of a partitioned table must include the partition key
+        connection.execute(text(
+            f"ALTER TABLE {TABLE_NAME} ADD CONSTRAINT {TABLE_NAME}_pkey "
+            "PRIMARY KEY (transaction_id, transaction_date)"
+        ))
+        ensure_partitions(connection)
@@ -0,0 +1,23 @@
+"""
+Reward Valuation Constants
+Shared by the recommendation agent (agents.py) and the SQL-side card ranking
+(crud.get_best_cards), so both score cards the same way.
+"""
+
+# 1 point = $0.015
+POINT_VALUE = 0.015
+
+# Weights of cash back, points value and benefits value per optimization goal.
+# Strong differentiation to ensure the goal drives card selection.
+GOAL_WEIGHTS = {
+    # Heavily favor cash back cards, almost ignore points
+    "cash_back": {"cash": 1.0, "points": 0.05, "benefits": 0.2},
+    # Heavily favor points cards, almost ignore cash back
+    "travel_points": {"cash": 0.05, "points": 1.0, "benefits": 0.2},
+    # Focus on benefits/discounts
+    "specific_discounts": {"cash": 0.3, "points": 0.3, "benefits": 1.5},
+    # Equal weight to both cash and points
+    "balanced": {"cash": 0.5, "points": 0.5, "benefits": 0.2},
+}
+
+DEFAULT_GOAL = "balanced"
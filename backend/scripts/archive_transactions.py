@@ -0,0 +1,52 @@
+"""
+Move old transactions into the per-user columnar archive (run daily from cron).
+
+Transactions dated before midnight TRANSACTION_ARCHIVE_AFTER_DAYS ago (default
+365) are written to TRANSACTION_ARCHIVE_DIR and deleted from the transactions
+table. Analytics keeps counting them from the archive. With user shards
+(DATABASE_SHARD_URLS) every shard is archived. Safe to re-run after an
+interruption.
+
+Usage:
+    python scripts/archive_transactions.py
+    python scripts/archive_transactions.py --older-than-days 540
+    python scripts/archive_transactions.py --user-id user_96b619142f87
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import db
+from transaction_archive import transaction_archive, archive_cutoff, ARCHIVE_AFTER_DAYS
+
+
+def archive(older_than_days: int = ARCHIVE_AFTER_DAYS, user_id: str = None) -> None:
+    cutoff = archive_cutoff(after_days=older_than_days)
+
+    print("\n" + "=" * 60)
+    print(f"🗄️  Archiving transactions before {cutoff.date().isoformat()}")
+    print(f"   Archive: {os.path.abspath(transaction_archive.root)}")
+    print("=" * 60)
+
+    moved = {}
+    for shard_sessionmaker in db.user_sessionmakers(user_id):
+        with shard_sessionmaker() as session:
+            moved.update(transaction_archive.archive(session, cutoff=cutoff, user_id=user_id))
+            session.commit()
+
+    for archived_user_id, count in moved.items():
+        print(f"   📦 {archived_user_id}: {count} transactions")
+    print(f"✨ Archived {sum(moved.values())} transactions for {len(moved)} users")
+    print("=" * 60 + "\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move old transactions into the columnar archive")
+    parser.add_argument("--older-than-days", type=int, default=ARCHIVE_AFTER_DAYS,
+                        help=f"Archive transactions older than this many days (default: {ARCHIVE_AFTER_DAYS})")
+    parser.add_argument("--user-id", help="Only archive this user's transactions")
+    args = parser.parse_args()
+    archive(older_than_days=args.older_than_days, user_id=args.user_id)
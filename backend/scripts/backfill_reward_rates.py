@@ -0,0 +1,45 @@
+"""
+Rebuild the card_reward_rates table from the credit cards' JSON rewards columns.
+
+Usage:
+    python scripts/backfill_reward_rates.py              # all cards
+    python scripts/backfill_reward_rates.py --if-empty   # only when no rates exist yet
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select
+
+from database import db
+from crud import rebuild_card_reward_rates
+from models import CardRewardRate
+
+
+def backfill_reward_rates(if_empty: bool = False) -> None:
+    print("\n" + "=" * 60)
+    print("💳 Backfilling card reward rates")
+    print("=" * 60)
+
+    # Creates card_reward_rates on databases initialized before it existed
+    db.create_tables()
+
+    with db.session_scope() as session:
+        if if_empty and session.execute(select(CardRewardRate.card_id).limit(1)).first():
+            print("   ⏭️  Reward rates already populated, skipping")
+            return
+
+        written = rebuild_card_reward_rates(session)
+
+    print(f"✨ Rebuilt {written} reward rate rows")
+    print("=" * 60 + "\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild card reward rates from the cards' JSON columns")
+    parser.add_argument("--if-empty", action="store_true", help="Skip when reward rates already exist")
+    args = parser.parse_args()
+    backfill_reward_rates(if_empty=args.if_empty)
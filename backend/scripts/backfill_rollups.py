@@ -0,0 +1,56 @@
+"""
+Rebuild the user_daily_rollups table from transaction history.
+
+Days whose transactions are no longer in the transactions table (archived by
+scripts/archive_transactions.py, or in detached partitions) keep their
+existing rollups, since there is nothing left to rebuild them from. With user
+shards (DATABASE_SHARD_URLS) every shard is rebuilt.
+
+Usage:
+    python scripts/backfill_rollups.py                  # all users
+    python scripts/backfill_rollups.py --user-id user_96b619142f87
+    python scripts/backfill_rollups.py --if-empty       # only when no rollups exist yet
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select
+
+from database import db
+from crud import rebuild_user_daily_rollups
+from models import UserDailyRollup
+
+
+def backfill_rollups(user_id: str = None, if_empty: bool = False) -> None:
+    print("\n" + "=" * 60)
+    print("📈 Backfilling daily rollups")
+    print("=" * 60)
+
+    # Creates user_daily_rollups on databases initialized before it existed
+    db.create_tables()
+
+    written = 0
+    for shard_sessionmaker in db.user_sessionmakers(user_id):
+        shard = f" on shard {db.ShardSessionLocals.index(shard_sessionmaker)}" if db.sharded else ""
+        with shard_sessionmaker() as session:
+            if if_empty and session.execute(select(UserDailyRollup.user_id).limit(1)).first():
+                print(f"   ⏭️  Rollups already populated{shard}, skipping")
+                continue
+
+            written += rebuild_user_daily_rollups(session, user_id)
+
+    scope = f"user {user_id}" if user_id else "all users"
+    print(f"✨ Rebuilt {written} rollup rows for {scope}")
+    print("=" * 60 + "\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild daily rollups from transactions")
+    parser.add_argument("--user-id", help="Only rebuild this user's rollups")
+    parser.add_argument("--if-empty", action="store_true", help="Skip when rollups already exist")
+    args = parser.parse_args()
+    backfill_rollups(user_id=args.user_id, if_empty=args.if_empty)
@@ -0,0 +1,115 @@
+"""
+Benchmark API throughput under concurrent clients.
+
+Fires requests at a running API from 1, 10 and 100 concurrent clients and
+reports throughput and latency per endpoint. Run it before and after a change
+to the request path (e.g. sync vs async database sessions) against the same
+server configuration and data.
+
+The recommend endpoint calls the LLM provider, so it is only included when
+asked for with --endpoints.
+
+Usage:
+    uvicorn main:app --port 8000 &
+    python scripts/benchmark_concurrency.py --user-id user_96b619142f87
+    python scripts/benchmark_concurrency.py --user-id user_96b619142f87 --clients 1 10 100 --requests 500
+    python scripts/benchmark_concurrency.py --user-id user_96b619142f87 --endpoints wallet recommend
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+ENDPOINTS = {
+    "wallet": ("GET", "/api/v1/users/{user_id}/wallet/cards", None),
+    "transactions": ("GET", "/api/v1/users/{user_id}/transactions?limit=50", None),
+    "analytics": ("GET", "/api/v1/users/{user_id}/analytics?days=90", None),
+    "recommend": ("POST", "/api/v1/recommend", {
+        "merchant": "Whole Foods",
+        "amount": 82.5,
+        "category": "groceries",
+        "optimization_goal": "cash_back"
+    }),
+}
+DEFAULT_ENDPOINTS = ["wallet", "transactions", "analytics"]
+
+
+async def run_level(client: httpx.AsyncClient, endpoint: str, user_id: str, clients: int, total_requests: int):
+    """Issue total_requests requests from `clients` concurrent workers"""
+    method, path, body = ENDPOINTS[endpoint]
+    url = path.format(user_id=user_id)
+    payload = {**body, "user_id": user_id} if body else None
+
+    latencies = []
+    errors = 0
+    remaining = total_requests
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, url, json=payload)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(clients)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(len(latencies) * 0.95) - 1] if len(latencies) > 1 else latencies[0],
+        "errors": errors,
+    }
+
+
+async def main_async(args):
+    limits = httpx.Limits(max_connections=max(args.clients), max_keepalive_connections=max(args.clients))
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout) as client:
+        health = await client.get("/health")
+        print(f"\n🩺 {args.base_url}/health -> {health.status_code}")
+
+        print("\n" + "=" * 72)
+        print(f"📊 Concurrency benchmark ({args.requests} requests per level)")
+        print("=" * 72)
+        print(f"{'endpoint':>14} {'clients':>8} {'req/s':>10} {'p50 (ms)':>10} {'p95 (ms)':>10} {'errors':>8}")
+
+        for endpoint in args.endpoints:
+            # Warm the connection pools before measuring
+            await run_level(client, endpoint, args.user_id, min(args.clients), min(10, args.requests))
+            for clients in args.clients:
+                result = await run_level(client, endpoint, args.user_id, clients, args.requests)
+                print(
+                    f"{endpoint:>14} {clients:>8} {result['rps']:>10.1f} "
+                    f"{result['p50']:>10.1f} {result['p95']:>10.1f} {result['errors']:>8}"
+                )
+
+        print("=" * 72 + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--user-id", required=True, help="Existing user with cards and transactions")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--requests", type=int, default=300, help="Requests per concurrency level")
+    parser.add_argument("--endpoints", nargs="+", choices=sorted(ENDPOINTS), default=DEFAULT_ENDPOINTS)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    args = parser.parse_args()
+
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Compact the rolling 90-day user behavior profiles (run daily from cron).
+
+Behavior counters are updated as each transaction is recorded; this ages out
+the days that left the window by rebuilding every profile from the daily
+rollups and goal buckets, and drops the expired goal buckets.
+
+- Runs on every user shard when DATABASE_SHARD_URLS is set
+- Adds the window counter columns to a user_behavior table created before
+  they existed (safe to re-run)
+- --backfill first rebuilds the goal buckets from transactions; with --if-empty
+  only when no buckets exist yet (used at startup)
+
+Usage:
+    python scripts/compact_user_behavior.py
+    python scripts/compact_user_behavior.py --user-id user_96b619142f87
+    python scripts/compact_user_behavior.py --backfill --if-empty
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import inspect, select, text
+
+from database import db
+from crud import compact_user_behavior, rebuild_user_behavior_days, BEHAVIOR_WINDOW_DAYS
+from models import UserBehavior, UserBehaviorDay
+
+# Columns added to user_behavior with the incremental counters
+COUNTER_COLUMNS = ["window_start", "category_counts", "goal_counts", "card_counts"]
+
+
+def add_counter_columns(engine) -> list:
+    """ALTER TABLE user_behavior for any counter column it is missing"""
+    table = UserBehavior.__table__
+    existing = {column["name"] for column in inspect(engine).get_columns(table.name)}
+    missing = [name for name in COUNTER_COLUMNS if name not in existing]
+    with engine.begin() as connection:
+        for name in missing:
+            column_type = table.c[name].type.compile(dialect=engine.dialect)
+            connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {name} {column_type}"))
+    return missing
+
+
+def compact(user_id: str = None, backfill: bool = False, if_empty: bool = False) -> None:
+    print("\n" + "=" * 60)
+    print(f"🧠 Compacting user behavior ({BEHAVIOR_WINDOW_DAYS}-day window)")
+    print("=" * 60)
+
+    # Creates user_behavior_days on databases initialized before it existed
+    db.create_tables()
+    added = []
+    for engine in [db.engine, *db.shard_engines]:
+        added = add_counter_columns(engine) or added
+    if added:
+        print(f"   🧱 Added columns to user_behavior: {', '.join(added)}")
+        backfill = True
+
+    refreshed = 0
+    for shard_sessionmaker in db.user_sessionmakers(user_id):
+        shard = f" on shard {db.ShardSessionLocals.index(shard_sessionmaker)}" if db.sharded else ""
+        with shard_sessionmaker() as session:
+            if backfill:
+                if if_empty and not added and session.execute(select(UserBehaviorDay.user_id).limit(1)).first():
+                    print(f"   ⏭️  Goal buckets already populated{shard}, skipping backfill")
+                else:
+                    written = rebuild_user_behavior_days(session, user_id)
+                    print(f"   📥 Rebuilt {written} goal bucket rows from transactions{shard}")
+
+            refreshed += compact_user_behavior(session, user_id)
+
+    scope = f"user {user_id}" if user_id else "all users"
+    print(f"✨ Refreshed {refreshed} behavior profiles for {scope}")
+    print("=" * 60 + "\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Age the rolling behavior window and refresh profiles")
+    parser.add_argument("--user-id", help="Only compact this user's profile")
+    parser.add_argument("--backfill", action="store_true", help="Rebuild goal buckets from transactions first")
+    parser.add_argument("--if-empty", action="store_true", help="With --backfill: skip when buckets already exist")
+    args = parser.parse_args()
+    compact(user_id=args.user_id, backfill=args.backfill, if_empty=args.if_empty)
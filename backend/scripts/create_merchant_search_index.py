@@ -0,0 +1,42 @@
+"""
+Create the pg_trgm merchant name index on an existing PostgreSQL database.
+
+New databases get it from create_all; this adds it to databases created
+before the index existed. Safe to re-run (no-op when the index exists).
+
+Usage:
+    python scripts/create_merchant_search_index.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+
+from database import db
+from models import Merchant
+
+
+def create_merchant_search_index() -> None:
+    print("\n" + "=" * 60)
+    print("🔎 Ensuring merchant name trigram index")
+    print("=" * 60)
+
+    if db.engine.dialect.name != "postgresql":
+        print(f"   ⏭️  {db.engine.dialect.name} has no pg_trgm, search uses the LIKE fallback")
+        print("=" * 60 + "\n")
+        return
+
+    index = next(i for i in Merchant.__table__.indexes if i.name == "idx_merchant_name_trgm")
+    with db.engine.begin() as connection:
+        connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        index.create(connection, checkfirst=True)
+
+    print(f"✨ {index.name} ready")
+    print("=" * 60 + "\n")
+
+
+if __name__ == "__main__":
+    create_merchant_search_index()
@@ -0,0 +1,135 @@
+"""
+Maintain the monthly partitions of the transactions table (PostgreSQL only).
+
+- Creates missing partitions for the current month and the next
+  TRANSACTION_PARTITION_MONTHS_AHEAD months (run daily from cron to stay ahead)
+- Detaches partitions older than --detach-older-than months
+  (default: TRANSACTION_PARTITION_RETENTION_MONTHS; nothing detached when unset)
+- Runs on the primary and every user shard (DATABASE_SHARD_URLS)
+- --migrate converts a transactions table created before partitioning,
+  copying every row into monthly partitions (takes an exclusive lock; run it
+  during a maintenance window)
+
+Usage:
+    python scripts/manage_transaction_partitions.py
+    python scripts/manage_transaction_partitions.py --months-ahead 6 --detach-older-than 24
+    python scripts/manage_transaction_partitions.py --migrate
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import inspect, text
+
+from database import db
+from models import Transaction
+from partitions import (
+    TABLE_NAME, MONTHS_AHEAD, RETENTION_MONTHS,
+    is_partitioned, ensure_partitions, detach_partitions_older_than, list_partitions
+)
+
+LEGACY_TABLE = f"{TABLE_NAME}_unpartitioned"
+
+
+def migrate_to_partitioned(connection) -> int:
+    """
+    Rebuild an unpartitioned transactions table as a partitioned one.
+
+    Returns:
+        Number of rows copied
+    """
+    connection.execute(text(f"ALTER TABLE {TABLE_NAME} RENAME TO {LEGACY_TABLE}"))
+    connection.execute(text(
+        f"ALTER TABLE {LEGACY_TABLE} RENAME CONSTRAINT {TABLE_NAME}_pkey TO {LEGACY_TABLE}_pkey"
+    ))
+    # Index names are schema-wide; the partitioned table recreates them
+    for index in Transaction.__table__.indexes:
+        connection.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+    # transaction_id alone can't be referenced once the table is partitioned
+    connection.execute(text(
+        "ALTER TABLE transaction_feedback DROP CONSTRAINT IF EXISTS transaction_feedback_transaction_id_fkey"
+    ))
+
+    Transaction.__table__.create(connection, checkfirst=True)
+
+    oldest = connection.execute(text(f"SELECT MIN(transaction_date) FROM {LEGACY_TABLE}")).scalar()
+    if oldest is not None:
+        ensure_partitions(connection, start=oldest)
+
+    columns = ", ".join(column.name for column in Transaction.__table__.columns)
+    copied = connection.execute(text(
+        f"INSERT INTO {TABLE_NAME} ({columns}) SELECT {columns} FROM {LEGACY_TABLE}"
+    )).rowcount
+    connection.execute(text(f"DROP TABLE {LEGACY_TABLE}"))
+    return copied
+
+
+def manage_database_partitions(engine, months_ahead: int, detach_older_than, migrate: bool) -> None:
+    """Create, detach and (with migrate) convert the partitions of one database"""
+    if engine.dialect.name != "postgresql":
+        print(f"   ⏭️  {engine.dialect.name} has no table partitioning, transactions is a plain table")
+        return
+
+    if not inspect(engine).has_table(TABLE_NAME):
+        print("   ⏭️  transactions table does not exist yet (create_all partitions it)")
+        return
+
+    with engine.begin() as connection:
+        if not is_partitioned(connection):
+            if not migrate:
+                print("   ⚠️  transactions is not partitioned; re-run with --migrate to convert it")
+                return
+            print("🔄 Converting transactions to a partitioned table...")
+            copied = migrate_to_partitioned(connection)
+            print(f"   ✅ Copied {copied} transactions into monthly partitions")
+
+    with engine.begin() as connection:
+        created = ensure_partitions(connection, months_ahead=months_ahead)
+        print(f"➕ Created {len(created)} partition(s){': ' + ', '.join(created) if created else ''}")
+
+    if detach_older_than is not None:
+        with engine.begin() as connection:
+            detached = detach_partitions_older_than(connection, detach_older_than)
+        print(f"📦 Detached {len(detached)} partition(s){': ' + ', '.join(detached) if detached else ''}")
+        if detached:
+            print("   Detached partitions are standalone tables now; archive or DROP them when ready")
+
+    with engine.connect() as connection:
+        partitions = list_partitions(connection)
+    print(f"✨ {len(partitions)} attached partition(s)")
+
+
+def manage_partitions(months_ahead: int, detach_older_than, migrate: bool) -> None:
+    print("\n" + "=" * 60)
+    print("🗂️  Maintaining transaction partitions")
+    print("=" * 60)
+
+    # User shards hold the transactions once DATABASE_SHARD_URLS is set
+    for i, engine in enumerate([db.engine, *db.shard_engines]):
+        if db.sharded:
+            print(f"\n🧩 {'Global shard' if i == 0 else f'Shard {i - 1}'}")
+        manage_database_partitions(engine, months_ahead, detach_older_than, migrate)
+    print("=" * 60 + "\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain monthly transaction partitions")
+    parser.add_argument(
+        "--months-ahead", type=int, default=MONTHS_AHEAD,
+        help=f"Future months to pre-create (default: {MONTHS_AHEAD})"
+    )
+    parser.add_argument(
+        "--detach-older-than", type=int, default=RETENTION_MONTHS, metavar="MONTHS",
+        help="Detach partitions more than this many months old "
+             "(default: TRANSACTION_PARTITION_RETENTION_MONTHS, unset = keep all)"
+    )
+    parser.add_argument(
+        "--migrate", action="store_true",
+        help="Convert an existing unpartitioned transactions table"
+    )
+    args = parser.parse_args()
+
+    manage_partitions(args.months_ahead, args.detach_older_than, args.migrate)
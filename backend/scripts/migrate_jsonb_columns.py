@@ -0,0 +1,83 @@
+"""
+Convert the filtered JSON columns of an existing PostgreSQL database to JSONB
+and create their GIN indexes.
+
+New databases get JSONB and the indexes from create_all; this converts
+databases created when these columns were plain JSON. Safe to re-run
+(columns already of type jsonb and existing indexes are skipped).
+
+ALTER COLUMN ... TYPE rewrites the table under an ACCESS EXCLUSIVE lock, so
+run it during a maintenance window on large card or merchant tables.
+
+Usage:
+    python scripts/migrate_jsonb_columns.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+
+from database import db
+from models import CreditCard, Merchant
+
+
+# Columns declared as JSONDocument in models.py
+JSONB_COLUMNS = [
+    (CreditCard.__table__, "cash_back_rate"),
+    (CreditCard.__table__, "points_multiplier"),
+    (CreditCard.__table__, "benefits"),
+    (Merchant.__table__, "secondary_categories"),
+]
+
+GIN_INDEXES = [
+    "idx_card_benefits_gin",
+    "idx_merchant_secondary_categories_gin",
+]
+
+
+def migrate_jsonb_columns() -> None:
+    print("\n" + "=" * 60)
+    print("🧬 Migrating JSON columns to JSONB")
+    print("=" * 60)
+
+    if db.engine.dialect.name != "postgresql":
+        print(f"   ⏭️  {db.engine.dialect.name} keeps JSON text, library filters use json_each")
+        print("=" * 60 + "\n")
+        return
+
+    with db.engine.begin() as connection:
+        converted = 0
+        for table, column in JSONB_COLUMNS:
+            data_type = connection.execute(
+                text(
+                    "SELECT data_type FROM information_schema.columns "
+                    "WHERE table_schema = current_schema() AND table_name = :table AND column_name = :column"
+                ),
+                {"table": table.name, "column": column}
+            ).scalar()
+            if data_type == "json":
+                connection.execute(text(
+                    f"ALTER TABLE {table.name} ALTER COLUMN {column} TYPE jsonb USING {column}::jsonb"
+                ))
+                converted += 1
+                print(f"   ✅ {table.name}.{column} -> jsonb")
+        print(f"   🔁 Converted {converted} of {len(JSONB_COLUMNS)} columns")
+
+        tables = {table for table, _ in JSONB_COLUMNS}
+        for table in tables:
+            for index in table.indexes:
+                if index.name in GIN_INDEXES:
+                    index.create(connection, checkfirst=True)
+        print(f"   ✅ Ensured {len(GIN_INDEXES)} GIN indexes")
+
+        connection.execute(text("ANALYZE credit_cards, merchants"))
+
+    print("✨ JSONB columns up to date")
+    print("=" * 60 + "\n")
+
+
+if __name__ == "__main__":
+    migrate_jsonb_columns()
@@ -0,0 +1,149 @@
+"""
+Bring an existing database's indexes up to the crud hot-query index set.
+
+New databases get these from create_all; this adds them to databases created
+before they existed and drops the single-column indexes they replace. Safe to
+re-run (existing indexes are skipped, missing ones are not dropped twice).
+
+Before the unique idx_card_user_name_issuer is added, cards a user has twice
+(same name and issuer, e.g. from concurrent seed runs) are merged into the
+oldest one: wallets, transactions, rules, offers, behavior profiles and daily
+rollups are pointed at it and the other copies are deleted.
+
+Plans and timings behind this set: docs/query_plans/ (scripts/explain_crud_queries.py)
+
+Usage:
+    python scripts/migrate_query_indexes.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import inspect, select, text, update, delete
+from sqlalchemy.orm import Session
+
+from crud import increment_business_counters, CARDS_COUNTER, WALLET_CARDS_COUNTER
+from database import db
+from models import (
+    Base, CreditCard, UserCreditCard, Transaction, AutomationRule, Offer, UserBehavior, UserDailyRollup
+)
+
+
+# Composite, covering and partial indexes (defined in models.py)
+NEW_INDEXES = [
+    "idx_transaction_user_date_covering",
+    "idx_transaction_user_recommended",
+    "idx_user_card_user_active",
+    "idx_card_user_active",
+    "idx_rule_user_active_priority",
+    "idx_offer_active_end",
+    "idx_card_user_name_issuer",
+]
+
+ROLLUP_SUMS = ("transaction_count", "followed_count", "total_spent", "rewards_earned", "optimal_value", "missed_value")
+
+# Superseded: leading-column duplicates of a composite, or single boolean columns
+DROPPED_INDEXES = [
+    "idx_transaction_user_id",        # idx_transaction_user_date_covering
+    "idx_transaction_user_date_id",   # idx_transaction_user_date_covering
+    "idx_user_card_user_id",          # idx_user_card_unique (user_id, card_id)
+    "idx_user_card_is_active",        # idx_user_card_user_active
+    "idx_card_is_active",             # idx_card_user_active
+    "idx_rule_is_active",             # idx_rule_user_active_priority
+    "idx_rule_priority",              # idx_rule_user_active_priority
+    "idx_offer_is_active",            # idx_offer_active_end
+]
+
+
+def merge_duplicate_cards(session: Session) -> int:
+    """
+    Merge each user's cards sharing a name and issuer into the oldest one
+
+    Returns:
+        Number of duplicate cards deleted
+    """
+    kept, duplicates = {}, {}
+    for card_id, user_id, card_name, issuer in session.execute(
+        select(CreditCard.card_id, CreditCard.user_id, CreditCard.card_name, CreditCard.issuer)
+        .order_by(CreditCard.created_at, CreditCard.card_id)
+    ):
+        key = (user_id, card_name, issuer)
+        if key in kept:
+            duplicates[card_id] = kept[key]
+        else:
+            kept[key] = card_id
+
+    wallet_rows_removed = 0
+    for duplicate, keep in duplicates.items():
+        # A wallet holding both copies keeps the one of the surviving card
+        holders = select(UserCreditCard.user_id).where(UserCreditCard.card_id == keep)
+        wallet_rows_removed += session.execute(
+            delete(UserCreditCard).where(UserCreditCard.card_id == duplicate, UserCreditCard.user_id.in_(holders))
+        ).rowcount
+        for column in (
+            UserCreditCard.card_id, Transaction.card_id, Transaction.recommended_card_id,
+            AutomationRule.action_card_id, Offer.card_id, UserBehavior.most_used_card_id
+        ):
+            session.execute(update(column.class_).where(column == duplicate).values({column.key: keep}))
+
+        for rollup in session.execute(
+            select(UserDailyRollup).where(UserDailyRollup.card_id == duplicate)
+        ).scalars().all():
+            target = session.get(UserDailyRollup, (rollup.user_id, rollup.day, rollup.category, keep))
+            if target is None:
+                rollup.card_id = keep
+                continue
+            for column in ROLLUP_SUMS:
+                setattr(target, column, getattr(target, column) + getattr(rollup, column))
+            session.delete(rollup)
+        session.flush()
+
+        session.execute(delete(CreditCard).where(CreditCard.card_id == duplicate))
+
+    if duplicates:
+        increment_business_counters(session, {
+            CARDS_COUNTER: -len(duplicates), WALLET_CARDS_COUNTER: -wallet_rows_removed
+        })
+    session.commit()
+    return len(duplicates)
+
+
+def migrate_query_indexes() -> None:
+    print("\n" + "=" * 60)
+    print("🗂️  Migrating crud query indexes")
+    print("=" * 60)
+
+    existing_tables = set(inspect(db.engine).get_table_names())
+
+    if CreditCard.__tablename__ in existing_tables:
+        with db.session_scope() as session:
+            merged = merge_duplicate_cards(session)
+        if merged:
+            print(f"   🔗 Merged {merged} duplicate cards")
+
+    with db.engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            # Dialect variants share a name; create() skips the ones for other dialects
+            for index in table.indexes:
+                if index.name in NEW_INDEXES:
+                    index.create(connection, checkfirst=True)
+        print(f"   ✅ Ensured {len(NEW_INDEXES)} indexes")
+
+        for name in DROPPED_INDEXES:
+            connection.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        print(f"   🧹 Dropped {len(DROPPED_INDEXES)} superseded indexes (where present)")
+
+        if db.engine.dialect.name == "postgresql":
+            # Refresh planner statistics so the new indexes are picked up right away
+            connection.execute(text("ANALYZE transactions, user_credit_cards, credit_cards, automation_rules, offers"))
+
+    print("✨ Query indexes up to date")
+    print("=" * 60 + "\n")
+
+
+if __name__ == "__main__":
+    migrate_query_indexes()
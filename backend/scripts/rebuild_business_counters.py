@@ -0,0 +1,48 @@
+"""
+Recount the business_counters table behind the business metrics.
+
+The API keeps the counters up to date and rebuilds them on startup when the
+table is empty. With user shards (DATABASE_SHARD_URLS) every shard is
+recounted as well. Run this after loading or deleting rows outside the API (bulk
+imports, restores, manual cleanup) to correct the totals.
+
+Usage:
+    python scripts/rebuild_business_counters.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import db
+from crud import rebuild_business_counters, USERS_COUNTER
+
+
+def rebuild_counters() -> None:
+    print("\n" + "=" * 60)
+    print("🔢 Rebuilding business counters")
+    print("=" * 60)
+
+    # Creates business_counters on databases initialized before it existed
+    db.create_tables()
+
+    with db.session_scope() as session:
+        counters = rebuild_business_counters(session, profiled_users_only=db.sharded)
+
+    # User shards count their own rows; the card library is counted on the global shard
+    for i, shard_sessionmaker in enumerate(db.ShardSessionLocals):
+        with shard_sessionmaker() as session:
+            shard_counters = rebuild_business_counters(session, count_cards=False, profiled_users_only=True)
+        print(f"   🧩 Shard {i}: {shard_counters.get(USERS_COUNTER, 0)} users")
+        for name, value in shard_counters.items():
+            counters[name] = counters.get(name, 0) + value
+
+    for name, value in sorted(counters.items()):
+        print(f"   {name}: {value}")
+    print(f"✨ Rebuilt {len(counters)} counters")
+    print("=" * 60 + "\n")
+
+
+if __name__ == "__main__":
+    rebuild_counters()
@@ -0,0 +1,88 @@
+"""
+Move users between databases for a new list of user shards.
+
+Reads the current layout from DATABASE_SHARD_URLS (or the single DATABASE_URL
+database when unsharded), copies the card library from the global shard to
+every new shard, then moves each user whose shard changes under the new list.
+Shards are chosen with a jump consistent hash, so appending one shard to N
+only moves about 1/(N+1) of the users, all onto the new shard.
+
+Stop the API (or put it in maintenance) while this runs: writes to a user
+being moved can land on the old shard. Each user is committed on the new
+shard before it is deleted from the old one, and a user already copied is
+not copied again, so the script can be re-run after a failure. Afterwards set DATABASE_SHARD_URLS to the new list and
+restart.
+
+Usage:
+    python scripts/reshard.py --to sqlite:///./shard_0.db sqlite:///./shard_1.db
+    python scripts/reshard.py --to <url> <url> <url> --dry-run
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import db, shard_for_user
+from models import Base
+from sharding import copy_card_library, move_user, resident_users
+
+
+def reshard(target_urls, dry_run: bool = False) -> int:
+    print("\n" + "=" * 60)
+    print(f"🧩 Resharding users onto {len(target_urls)} shards")
+    print("=" * 60)
+
+    source_urls = db.config.SHARD_URLS or [db.config.DATABASE_URL]
+    engines = {url: create_engine(url) for url in dict.fromkeys(source_urls + target_urls)}
+    sessions = {url: sessionmaker(bind=engine, autoflush=False, expire_on_commit=False) for url, engine in engines.items()}
+
+    if not dry_run:
+        for url in target_urls:
+            Base.metadata.create_all(bind=engines[url])
+        with db.session_scope() as library:
+            for url in target_urls:
+                with sessions[url]() as target:
+                    copied = copy_card_library(library, target)
+            print(f"   📚 Copied {copied} library cards to every shard")
+
+    moved = 0
+    for source_url in source_urls:
+        with sessions[source_url]() as source:
+            user_ids = resident_users(source)
+            moving = [
+                (user_id, target_urls[shard_for_user(user_id, len(target_urls))])
+                for user_id in user_ids
+            ]
+            moving = [(user_id, target_url) for user_id, target_url in moving if target_url != source_url]
+            print(f"   🔍 {source_url}: {len(user_ids)} users, {len(moving)} to move")
+            if dry_run:
+                moved += len(moving)
+                continue
+            for user_id, target_url in moving:
+                with sessions[target_url]() as target:
+                    move_user(source, target, user_id)
+                moved += 1
+
+    for engine in engines.values():
+        engine.dispose()
+
+    verb = "Would move" if dry_run else "Moved"
+    print(f"✨ {verb} {moved} users")
+    if not dry_run:
+        print(f"   Now set DATABASE_SHARD_URLS={','.join(target_urls)} and restart the API")
+    print("=" * 60 + "\n")
+    return moved
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move users onto a new list of user shards")
+    parser.add_argument("--to", nargs="+", required=True, dest="target_urls",
+                        help="Database URLs of the new shards, in order")
+    parser.add_argument("--dry-run", action="store_true", help="Only count the users that would move")
+    args = parser.parse_args()
+    reshard(args.target_urls, dry_run=args.dry_run)
@@ -1,10 +1,15 @@
 import json
 import os
+import sys
+import time
 from typing import Any, Dict
 
 from database import db
-from crud import create_user, create_credit_card, get_user_by_email
-from models import CardIssuerEnum, OptimizationGoalEnum, CreditCard
+from crud import (
+    create_user, get_user_by_email, bulk_upsert_credit_cards,
+    seed_checksum, is_seed_current, mark_seed_applied
+)
+from models import CardIssuerEnum, OptimizationGoalEnum
 from auth import hash_password
 
 
@@ -31,15 +36,19 @@ def _map_issuer(issuer_name: str) -> CardIssuerEnum:
     return CardIssuerEnum.OTHER
 
 
-def load_card_library_from_json() -> Any:
+def load_card_library_raw() -> bytes:
     base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     json_path = os.path.join(base_dir, "seed_data", "card_library.json")
 
     if not os.path.exists(json_path):
         raise FileNotFoundError(f"card_library.json not found at {json_path}")
 
-    with open(json_path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    with open(json_path, "rb") as f:
+        return f.read()
+
+
+def load_card_library_from_json() -> Any:
+    return json.loads(load_card_library_raw())
 
 
 def ensure_library_user(session) -> Any:
@@ -58,63 +67,48 @@ def ensure_library_user(session) -> Any:
     return user
 
 
-def seed_card_library() -> None:
+def seed_card_library(force: bool = False) -> None:
     print("\n" + "=" * 60)
     print("🌱 Seeding card library from JSON")
     print("=" * 60)
 
-    cards_data = load_card_library_from_json()
+    started = time.perf_counter()
+    raw = load_card_library_raw()
+    checksum = seed_checksum(raw)
 
     with db.session_scope() as session:
         user = ensure_library_user(session)
         print(f"Using library user: {user.email} (user_id={user.user_id})")
 
-        created_count = 0
-        skipped_count = 0
-
-        for card in cards_data:
-            try:
-                issuer_enum = _map_issuer(card.get("issuer", "Other"))
-
-                # Skip if this card already exists for the library user
-                existing = (
-                    session.query(CreditCard)
-                    .filter(
-                        CreditCard.user_id == user.user_id,
-                        CreditCard.card_name == card["card_name"],
-                        CreditCard.issuer == issuer_enum,
-                    )
-                    .first()
-                )
-                if existing:
-                    skipped_count += 1
-                    print(
-                        f"   ⏭️  Skipping existing card: {card['card_name']} ({card.get('issuer')})"
-                    )
-                    continue
-
-                create_credit_card(
-                    session,
-                    user_id=user.user_id,
-                    card_name=card["card_name"],
-                    issuer=issuer_enum,
-                    cash_back_rate=card.get("cash_back_rate", {}),
-                    points_multiplier=card.get("points_multiplier", {}),
-                    annual_fee=card.get("annual_fee", 0.0),
-                    benefits=card.get("benefits", []),
-                )
-                created_count += 1
-                print(f"   ✅ Created library card: {card['card_name']} ({card.get('issuer')})")
-
-            except Exception as exc:
-                print(f"   ⚠️  Failed to create card '{card.get('card_name')}': {exc}")
-
-        print("\n" + "=" * 60)
-        print(
-            f"✨ Card library seeding complete. Created: {created_count}, Skipped existing: {skipped_count}"
-        )
-        print("=" * 60 + "\n")
+        seed_name = f"card_library:{user.user_id}"
+        if not force and is_seed_current(session, seed_name, checksum):
+            print(f"⏭️  card_library.json unchanged ({checksum[:12]}), skipping")
+            print("=" * 60 + "\n")
+            return
+
+        cards = [
+            {
+                "card_name": card["card_name"],
+                "issuer": _map_issuer(card.get("issuer", "Other")),
+                "cash_back_rate": card.get("cash_back_rate", {}),
+                "points_multiplier": card.get("points_multiplier", {}),
+                "annual_fee": card.get("annual_fee", 0.0),
+                "benefits": card.get("benefits", []),
+            }
+            for card in json.loads(raw)
+        ]
+
+        # One INSERT ... ON CONFLICT for every card, committed with the checksum
+        card_ids = bulk_upsert_credit_cards(session, user.user_id, cards)
+        mark_seed_applied(session, seed_name, checksum, len(card_ids))
+
+    print("\n" + "=" * 60)
+    print(
+        f"✨ Card library seeding complete. Upserted: {len(card_ids)} "
+        f"in {(time.perf_counter() - started) * 1000:.0f} ms"
+    )
+    print("=" * 60 + "\n")
 
 
 if __name__ == "__main__":
-    seed_card_library()
+    seed_card_library(force="--force" in sys.argv)
@@ -1,35 +1,46 @@
 import json
 import os
+import sys
+import time
 from typing import Any
 
 from database import db
-from models import Merchant, CategoryEnum
+from crud import bulk_upsert_merchants, seed_checksum, is_seed_current, mark_seed_applied
+from models import CategoryEnum
 
 
-def load_merchants_from_json() -> Any:
+def load_merchants_raw() -> bytes:
     base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     json_path = os.path.join(base_dir, "seed_data", "merchants.json")
 
     if not os.path.exists(json_path):
         raise FileNotFoundError(f"merchants.json not found at {json_path}")
 
-    with open(json_path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    with open(json_path, "rb") as f:
+        return f.read()
+
+
+def load_merchants_from_json() -> Any:
+    return json.loads(load_merchants_raw())
 
 
-def seed_merchants() -> None:
+def seed_merchants(force: bool = False) -> None:
     print("\n" + "=" * 60)
     print("🌱 Seeding merchants from JSON")
     print("=" * 60)
 
-    merchants_data = load_merchants_from_json()
+    started = time.perf_counter()
+    raw = load_merchants_raw()
+    checksum = seed_checksum(raw)
 
     with db.session_scope() as session:
-        created_count = 0
-        skipped_count = 0
+        if not force and is_seed_current(session, "merchants", checksum):
+            print(f"⏭️  merchants.json unchanged ({checksum[:12]}), skipping")
+            print("=" * 60 + "\n")
+            return
 
-        for m in merchants_data:
-            name = m["merchant_name"]
+        merchants = []
+        for m in json.loads(raw):
             primary_category = m.get("primary_category", "other")
 
             # Ensure category is valid
@@ -38,35 +49,24 @@ def seed_merchants() -> None:
             except ValueError:
                 category_enum = CategoryEnum.OTHER
 
-            existing = (
-                session.query(Merchant)
-                .filter(Merchant.merchant_name == name)
-                .first()
-            )
-            if existing:
-                skipped_count += 1
-                print(f"   ⏭️  Skipping existing merchant: {name}")
-                continue
-
-            merchant = Merchant(
-                merchant_name=name,
-                primary_category=category_enum,
-                secondary_categories=m.get("secondary_categories", []),
-                website=None,
-                logo_url=m.get("logo_url"),
-                has_special_offers=False,
-                special_offers=[],
-            )
-            session.add(merchant)
-            created_count += 1
-            print(f"   ✅ Created merchant: {name} ({primary_category})")
-
-        print("\n" + "=" * 60)
-        print(
-            f"✨ Merchant seeding complete. Created: {created_count}, Skipped existing: {skipped_count}"
-        )
-        print("=" * 60 + "\n")
+            merchants.append({
+                "merchant_name": m["merchant_name"],
+                "primary_category": category_enum,
+                "secondary_categories": m.get("secondary_categories", []),
+                "logo_url": m.get("logo_url"),
+            })
+
+        # One INSERT ... ON CONFLICT (merchant_name) for every merchant, committed with the checksum
+        upserted = bulk_upsert_merchants(session, merchants)
+        mark_seed_applied(session, "merchants", checksum, upserted)
+
+    print("\n" + "=" * 60)
+    print(
+        f"✨ Merchant seeding complete. Upserted: {upserted} "
+        f"in {(time.perf_counter() - started) * 1000:.0f} ms"
+    )
+    print("=" * 60 + "\n")
 
 
 if __name__ == "__main__":
-    seed_merchants()
+    seed_merchants(force="--force" in sys.argv)
@@ -0,0 +1,250 @@
+"""
+User Sharding
+Per-user rows live on the shard picked by database.shard_for_user(user_id);
+the primary (DATABASE_URL) is the global shard holding the card library,
+merchants and offers. The library is replicated to every shard so wallet and
+transaction joins (and their foreign keys) stay local to one database.
+"""
+
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+
+from crud import (
+    _upsert_statement, _transaction_counter_deltas, increment_business_counters,
+    USERS_COUNTER, WALLET_CARDS_COUNTER
+)
+from logging_config import get_logger
+from models import (
+    User, CreditCard, CardRewardRate, CardBenefit, UserCreditCard, Transaction, TransactionFeedback,
+    UserDailyRollup, UserBehaviorDay, UserBehavior, AutomationRule
+)
+
+logger = get_logger(__name__)
+
+
+# Per-user tables in foreign key order (parents first); transaction_feedback
+# follows the user's transactions by transaction_id. The integer keys in
+# REASSIGNED_KEYS come from per-database sequences and are reassigned on a move.
+USER_TABLES = [
+    User, UserBehavior, UserBehaviorDay, UserDailyRollup, Transaction, UserCreditCard, AutomationRule
+]
+REASSIGNED_KEYS = {
+    UserBehavior: "behavior_id",
+    UserCreditCard: "user_card_id",
+    AutomationRule: "rule_id",
+    TransactionFeedback: "feedback_id",
+}
+
+
+def _rows(session: Session, model, *criteria) -> List[Dict]:
+    """Column values of model's rows matching criteria"""
+    columns = model.__table__.columns
+    return [dict(row._mapping) for row in session.execute(select(*columns).where(*criteria))]
+
+
+# ============================================================================
+# CARD LIBRARY REPLICATION
+# ============================================================================
+
+def copy_card_library(source: Session, target: Session, card_ids: Optional[Iterable[str]] = None) -> int:
+    """
+    Copy library cards, their reward rates and benefits, and the users owning
+    them from the global shard to a user shard, then commit the target.
+
+    Cards are upserted (edits replace the shard's copy); owners that already
+    exist on the target are left alone, since the target may be their home shard.
+
+    Args:
+        source: Session on the global shard
+        target: Session on a user shard
+        card_ids: Only copy these cards (default: the whole library)
+
+    Returns:
+        Number of cards copied
+    """
+    criteria = [CreditCard.card_id.in_(list(card_ids))] if card_ids is not None else []
+    cards = _rows(source, CreditCard, *criteria)
+    if not cards:
+        return 0
+    copied_ids = [card["card_id"] for card in cards]
+
+    owners = _rows(source, User, User.user_id.in_({card["user_id"] for card in cards}))
+    if owners:
+        target.execute(_upsert_statement(target, User).on_conflict_do_nothing(index_elements=["user_id"]), owners)
+
+    statement = _upsert_statement(target, CreditCard)
+    target.execute(
+        statement.on_conflict_do_update(
+            index_elements=["card_id"],
+            set_={
+                column.name: getattr(statement.excluded, column.name)
+                for column in CreditCard.__table__.columns if column.name != "card_id"
+            }
+        ),
+        cards
+    )
+
+    for model in (CardRewardRate, CardBenefit):
+        rows = _rows(source, model, model.card_id.in_(copied_ids))
+        target.execute(delete(model).where(model.card_id.in_(copied_ids)))
+        if rows:
+            target.execute(insert(model), rows)
+
+    target.commit()
+    return len(cards)
+
+
+def sync_card_library(database, card_ids: Optional[Iterable[str]] = None) -> int:
+    """
+    Copy the card library from the global shard to every user shard
+
+    Args:
+        database: database.Database (a no-op when it has no shards)
+        card_ids: Only copy these cards, e.g. after one was created or edited
+
+    Returns:
+        Number of cards copied to each shard
+    """
+    if not database.sharded:
+        return 0
+    card_ids = list(card_ids) if card_ids is not None else None
+    copied = 0
+    with database.session_scope() as source:
+        for shard_sessionmaker in database.ShardSessionLocals:
+            with shard_sessionmaker() as target:
+                copied = copy_card_library(source, target, card_ids)
+    return copied
+
+
+def ensure_card_owner(database, user_id: str) -> Optional[User]:
+    """
+    Copy a user's users row from their shard to the global shard, so they can
+    own a card in the library (credit_cards.user_id references users)
+
+    Returns:
+        The user as stored on their shard, or None if they don't exist
+    """
+    with database.get_shard_session(user_id) as shard_session:
+        user = shard_session.get(User, user_id)
+        owner = _rows(shard_session, User, User.user_id == user_id)
+    if owner:
+        with database.session_scope() as session:
+            session.execute(_upsert_statement(session, User).on_conflict_do_nothing(index_elements=["user_id"]), owner)
+    return user
+
+
+# ============================================================================
+# MOVING USERS BETWEEN SHARDS
+# ============================================================================
+
+def move_user(source: Session, target: Session, user_id: str) -> Dict[str, int]:
+    """
+    Move one user's rows from their current shard to another.
+
+    The rows are written and committed on the target before they are deleted
+    from the source, so a failure part-way leaves a copy to retry from rather
+    than a lost user. Re-running after such a failure is safe: a user already
+    resident on the target was copied in full (one commit), so only the source
+    delete is redone. The card library must already be on the target
+    (copy_card_library). A user owning library cards keeps their users row on
+    the source as part of its library copy.
+
+    Wallet card, automation rule, behavior profile and feedback ids are
+    reassigned by the target (they are per-database sequences); user,
+    transaction and card ids are kept.
+
+    Args:
+        source: Session on the shard holding the user
+        target: Session on the user's new shard
+        user_id: User to move
+
+    Returns:
+        Number of rows moved per table
+    """
+    if not _is_resident(source, user_id):
+        return {}
+    rows = {model: _rows(source, model, model.user_id == user_id) for model in USER_TABLES}
+    transaction_ids = [txn["transaction_id"] for txn in rows[Transaction]]
+    rows[TransactionFeedback] = _rows(
+        source, TransactionFeedback, TransactionFeedback.transaction_id.in_(transaction_ids)
+    ) if transaction_ids else []
+
+    moved = {model.__tablename__: len(rows[model]) for model in USER_TABLES + [TransactionFeedback]}
+    # The business counters follow the rows (each shard counts what it holds)
+    deltas = {USERS_COUNTER: 1, WALLET_CARDS_COUNTER: len(rows[UserCreditCard])}
+    deltas.update(_transaction_counter_deltas(rows[Transaction]))
+
+    if _is_resident(target, user_id):
+        # An earlier run committed the copy but failed before the source delete
+        logger.warning("User already on target shard, finishing the move", extra={
+            'event': 'user_move_resumed',
+            'user_id': user_id
+        })
+    else:
+        for model in USER_TABLES + [TransactionFeedback]:
+            model_rows = rows[model]
+            key = REASSIGNED_KEYS.get(model)
+            if key:
+                model_rows = [{column: value for column, value in row.items() if column != key} for row in model_rows]
+            if model is User:
+                # A library owner already has a copy of their users row on every shard
+                target.execute(_upsert_statement(target, User).on_conflict_do_nothing(index_elements=["user_id"]), model_rows)
+            elif model_rows:
+                target.execute(insert(model), model_rows)
+        increment_business_counters(target, deltas)
+        target.commit()
+
+    if transaction_ids:
+        source.execute(delete(TransactionFeedback).where(TransactionFeedback.transaction_id.in_(transaction_ids)))
+    owns_library_cards = source.execute(
+        select(CreditCard.card_id).where(CreditCard.user_id == user_id).limit(1)
+    ).first() is not None
+    for model in reversed(USER_TABLES):
+        if model is User and owns_library_cards:
+            # Kept as the source's library copy (deleting it would cascade to the cards)
+            continue
+        source.execute(delete(model).where(model.user_id == user_id))
+    increment_business_counters(source, {name: -delta for name, delta in deltas.items()})
+    source.commit()
+
+    logger.info("User moved between shards", extra={
+        'event': 'user_moved',
+        'user_id': user_id,
+        'rows': sum(moved.values())
+    })
+    return moved
+
+
+def resident_users(session: Session) -> List[str]:
+    """
+    Users whose rows live on this database
+
+    Card owners present only as part of the library copy (a users row
+    without any per-user rows) are left out.
+    """
+    user_ids = session.execute(select(User.user_id)).scalars().all()
+    library_owners = set(session.execute(select(CreditCard.user_id).distinct()).scalars().all())
+    return [
+        user_id for user_id in user_ids
+        if user_id not in library_owners or _has_user_rows(session, user_id)
+    ]
+
+
+def _is_resident(session: Session, user_id: str) -> bool:
+    """Whether the user lives on this database (see resident_users)"""
+    if session.get(User, user_id) is None:
+        return False
+    owns_library_cards = session.execute(
+        select(CreditCard.card_id).where(CreditCard.user_id == user_id).limit(1)
+    ).first() is not None
+    return not owns_library_cards or _has_user_rows(session, user_id)
+
+
+def _has_user_rows(session: Session, user_id: str) -> bool:
+    """Whether the user has any per-user rows besides the users row itself"""
+    return any(
+        session.execute(select(model.user_id).where(model.user_id == user_id).limit(1)).first()
+        for model in USER_TABLES[1:]
+    )
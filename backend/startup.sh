@@ -29,9 +29,19 @@ if [ "$TABLES_EXIST" = "no" ]; then
     python3 init_db.py
 else
     echo "✅ Database already initialized."
-    echo "🌱 Ensuring seed data is loaded (will skip existing records)..."
+
+    # Create tables introduced after the database was created (seed_checksums,
+    # business_counters, ... are written by the seeds below)
+    python3 -c "from database import db; db.create_tables()"
+
+    # Add indexes introduced after the database was created; the card library
+    # seed upserts on idx_card_user_name_issuer
+    python3 scripts/create_merchant_search_index.py
+    python3 scripts/migrate_query_indexes.py
+
+    echo "🌱 Ensuring seed data is loaded (skipped when seed files are unchanged)..."
     # Run seeding scripts to ensure card_library.json and merchants.json are loaded
-    # These scripts are idempotent and will skip existing records
+    # Each seed is one bulk upsert, skipped entirely when the file checksum matches the last run
     python3 -c "
 from scripts.seed_merchants import seed_merchants
 from database import db
@@ -58,6 +68,19 @@ try:
 except Exception as e:
     print(f'⚠️  Warning: {e}')
 "
+
+    # Populate daily rollups once for databases created before they existed
+    python3 scripts/backfill_rollups.py --if-empty
+
+    # Populate normalized card reward rates once for databases created before they existed
+    python3 scripts/backfill_reward_rates.py --if-empty
+
+    # Age the rolling behavior window (backfills the goal buckets on first run)
+    python3 scripts/compact_user_behavior.py --backfill --if-empty
+
+    # Pre-create upcoming transaction partitions and detach expired ones
+    # (an unpartitioned table from before partitioning needs a one-off --migrate)
+    python3 scripts/manage_transaction_partitions.py
 fi
 
 # Start the FastAPI application
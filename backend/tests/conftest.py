@@ -10,15 +10,18 @@ import time
 from collections import deque
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import NullPool
 from fastapi.testclient import TestClient
 
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from database import Base, get_db
+from database import Base, get_db, get_async_db, get_read_db, get_async_read_db, get_user_db, get_async_user_db, to_async_url
 from main import app
 from models import User, CreditCard, OptimizationGoalEnum, CardIssuerEnum
 from crud import create_user, create_credit_card
+from cache import read_cache
 import uuid
 
 
@@ -140,6 +143,14 @@ def test_engine():
     Base.metadata.drop_all(bind=engine)
 
 
+@pytest.fixture(autouse=True)
+def clear_read_cache():
+    """Start each test with an empty read cache (test data is written outside tracked sessions too)"""
+    read_cache.clear()
+    yield
+    read_cache.clear()
+
+
 @pytest.fixture(scope="function")
 def test_db(test_engine):
     """Create a new database session for each test"""
@@ -152,16 +163,40 @@ def test_db(test_engine):
         db.close()
 
 
+@pytest.fixture(scope="session")
+def test_async_sessionmaker(test_engine):
+    """
+    Async (aiosqlite) sessions on the same test database file
+    NullPool: TestClient may run each request on its own event loop, so connections aren't reused
+    """
+    engine = create_async_engine(to_async_url(TEST_DATABASE_URL), poolclass=NullPool)
+    return async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+
 @pytest.fixture(scope="function")
-def test_client(test_db):
+def test_client(test_db, test_async_sessionmaker):
     """Create FastAPI test client with test database"""
     def override_get_db():
         try:
             yield test_db
         finally:
             pass
+
+    async def override_get_async_db():
+        session = test_async_sessionmaker()
+        try:
+            yield session
+        finally:
+            await session.close()
     
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    # No replicas under test: read-only dependencies share the same sessions
+    app.dependency_overrides[get_read_db] = override_get_db
+    app.dependency_overrides[get_async_read_db] = override_get_async_db
+    # Unsharded under test: per-user dependencies too
+    app.dependency_overrides[get_user_db] = override_get_db
+    app.dependency_overrides[get_async_user_db] = override_get_async_db
     client = TestClient(app)
     yield client
     app.dependency_overrides.clear()
@@ -225,6 +260,18 @@ def test_user(test_db):
     return user
 
 
+@pytest.fixture(scope="function")
+def db_user(test_db):
+    """Create a user without cards directly through the CRUD layer"""
+    return create_user(
+        test_db,
+        email=f"db_{uuid.uuid4().hex[:8]}@example.com",
+        full_name="DB Test User",
+        password_hash="not-a-real-hash",
+        default_optimization_goal=OptimizationGoalEnum.CASH_BACK
+    )
+
+
 @pytest.fixture(scope="function")
 def sample_transaction_data():
     """Sample transaction data for testing"""
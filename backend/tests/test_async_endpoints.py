@@ -0,0 +1,101 @@
+"""
+Tests for endpoints served through the async session (database.get_async_db)
+"""
+
+import pytest
+
+from crud import create_credit_card
+from models import Transaction, CardIssuerEnum
+
+
+@pytest.fixture
+def library_card(test_db, db_user):
+    """A card the test user can add to their wallet"""
+    return create_credit_card(
+        test_db,
+        user_id=db_user.user_id,
+        card_name="Async Test Card",
+        issuer=CardIssuerEnum.CHASE,
+        cash_back_rate={"dining": 0.03, "other": 0.01},
+        points_multiplier={"dining": 3.0, "other": 1.0},
+        annual_fee=95.0,
+        benefits=["Async Benefit"]
+    )
+
+
+class TestAsyncWalletEndpoints:
+
+    def test_wallet_lifecycle(self, test_client, db_user, library_card):
+        base = f"/api/v1/users/{db_user.user_id}/wallet/cards"
+        owner = {"user_id": db_user.user_id}
+
+        added = test_client.post(base, json={"card_id": library_card.card_id, "nickname": "Daily"})
+        assert added.status_code == 201
+        user_card_id = added.json()["user_card_id"]
+        assert added.json()["card_name"] == "Async Test Card"
+
+        listed = test_client.get(base).json()
+        assert [c["user_card_id"] for c in listed] == [user_card_id]
+        assert listed[0]["benefits"] == ["Async Benefit"]
+
+        updated = test_client.put(
+            f"/api/v1/wallet/cards/{user_card_id}", params=owner, json={"nickname": "Groceries"}
+        )
+        assert updated.status_code == 200
+        assert updated.json()["nickname"] == "Groceries"
+
+        assert test_client.get(f"/api/v1/wallet/cards/{user_card_id}", params=owner).json()["nickname"] == "Groceries"
+
+        # Without its owner the card can't be located (or belongs to someone else)
+        assert test_client.get(f"/api/v1/wallet/cards/{user_card_id}").status_code == 422
+        assert test_client.get(
+            f"/api/v1/wallet/cards/{user_card_id}", params={"user_id": "user_someone_else"}
+        ).status_code == 404
+
+        removed = test_client.delete(f"/api/v1/wallet/cards/{user_card_id}", params=owner)
+        assert removed.status_code == 200
+        assert test_client.get(base).json() == []
+
+    def test_duplicate_card_is_400(self, test_client, db_user, library_card):
+        base = f"/api/v1/users/{db_user.user_id}/wallet/cards"
+        test_client.post(base, json={"card_id": library_card.card_id})
+
+        assert test_client.post(base, json={"card_id": library_card.card_id}).status_code == 400
+
+    def test_unknown_user_is_404(self, test_client):
+        assert test_client.get("/api/v1/users/user_missing/wallet/cards").status_code == 404
+
+
+class TestAsyncTransactionEndpoints:
+
+    def test_create_transaction_then_read_back(self, test_client, test_db, db_user, library_card):
+        response = test_client.post("/api/v1/transactions", json={
+            "user_id": db_user.user_id,
+            "merchant": "Chipotle",
+            "amount": 40.0,
+            "category": "dining",
+            "card_used_id": library_card.card_id,
+            "recommended_card_id": library_card.card_id,
+            "total_value_earned": 1.2,
+            "optimal_value": 1.2
+        })
+        assert response.status_code == 200
+        assert response.json()["card_used"] == "Async Test Card"
+
+        history = test_client.get(f"/api/v1/users/{db_user.user_id}/transactions").json()
+        assert history["total_transactions"] == 1
+        assert history["transactions"][0]["card_recommended"] == "Async Test Card"
+        assert test_db.get(Transaction, response.json()["transaction_id"]) is not None
+
+        analytics = test_client.get(f"/api/v1/users/{db_user.user_id}/analytics").json()
+        assert analytics["summary"]["total_transactions"] == 1
+
+    def test_unknown_card_is_404(self, test_client, db_user):
+        response = test_client.post("/api/v1/transactions", json={
+            "user_id": db_user.user_id,
+            "merchant": "Chipotle",
+            "amount": 40.0,
+            "category": "dining",
+            "card_used_id": "card_missing"
+        })
+        assert response.status_code == 404
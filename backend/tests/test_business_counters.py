@@ -0,0 +1,77 @@
+"""
+Tests for the incrementally maintained business counters and the metrics refresher
+"""
+
+import asyncio
+import uuid
+
+from prometheus_client import REGISTRY
+from sqlalchemy import select, func
+
+from business_metrics import BusinessMetricsRefresher
+from crud import (
+    create_user, create_credit_card, add_user_credit_card, delete_user_credit_card,
+    create_transaction, bulk_create_transactions, get_business_counters, rebuild_business_counters,
+    USERS_COUNTER, CARDS_COUNTER, WALLET_CARDS_COUNTER
+)
+from models import User, CreditCard, UserCreditCard, CardIssuerEnum, CategoryEnum, OptimizationGoalEnum
+
+
+def changes(before, after):
+    return {name: after.get(name, 0) - before.get(name, 0) for name in set(before) | set(after)
+            if after.get(name, 0) != before.get(name, 0)}
+
+
+def test_writes_update_counters_in_their_transaction(test_db):
+    before = get_business_counters(test_db)
+
+    user = create_user(test_db, email=f"count_{uuid.uuid4().hex[:8]}@example.com", full_name="Counter", password_hash="h")
+    card = create_credit_card(
+        test_db, user_id=user.user_id, card_name="Counted Card", issuer=CardIssuerEnum.OTHER,
+        cash_back_rate={"other": 0.01}, points_multiplier={"other": 1.0}
+    )
+    user_card = add_user_credit_card(test_db, user.user_id, card.card_id)
+    assert add_user_credit_card(test_db, user.user_id, card.card_id) is None  # rolled back, not counted
+    create_transaction(
+        test_db, user_id=user.user_id, merchant="Cafe", amount=12.0, category=CategoryEnum.DINING,
+        optimization_goal=OptimizationGoalEnum.BALANCED, card_id=card.card_id
+    )
+    bulk_create_transactions(test_db, [
+        {"user_id": user.user_id, "merchant": "Grocer", "amount": 40.0, "category": CategoryEnum.GROCERIES,
+         "optimization_goal": OptimizationGoalEnum.BALANCED, "card_id": card.card_id}
+        for _ in range(3)
+    ])
+
+    assert changes(before, get_business_counters(test_db)) == {
+        USERS_COUNTER: 1, CARDS_COUNTER: 1, WALLET_CARDS_COUNTER: 1,
+        "transactions:dining": 1, "transactions:groceries": 3,
+    }
+
+    assert delete_user_credit_card(test_db, user_card.user_card_id)
+    assert WALLET_CARDS_COUNTER not in changes(before, get_business_counters(test_db))
+
+
+def test_rebuild_matches_table_counts(test_db, db_user):
+    counters = rebuild_business_counters(test_db)
+
+    assert counters[USERS_COUNTER] == test_db.execute(select(func.count(User.user_id))).scalar()
+    assert counters[CARDS_COUNTER] == test_db.execute(select(func.count(CreditCard.card_id))).scalar()
+    assert counters[WALLET_CARDS_COUNTER] == test_db.execute(select(func.count(UserCreditCard.user_card_id))).scalar()
+    assert get_business_counters(test_db) == counters
+
+
+def test_refresher_sets_gauges_and_advances_transactions_total(test_async_sessionmaker):
+    refresher = BusinessMetricsRefresher()
+    refresher._session_factories = [test_async_sessionmaker]
+    sample = lambda: REGISTRY.get_sample_value("transactions_total", {"category": "travel"}) or 0
+
+    counters = asyncio.run(refresher.refresh())
+    reported = sample()
+    refresher.update({**counters, "transactions:travel": counters.get("transactions:travel", 0) + 5})
+
+    assert REGISTRY.get_sample_value("users_total") == counters[USERS_COUNTER]
+    assert REGISTRY.get_sample_value("wallet_cards_total") == counters.get(WALLET_CARDS_COUNTER, 0)
+    assert sample() == reported + 5
+    # Re-reporting the same totals doesn't count them twice
+    refresher.update({**counters, "transactions:travel": counters.get("transactions:travel", 0) + 5})
+    assert sample() == reported + 5
@@ -195,3 +195,78 @@ class TestCardCRUD:
         response = test_client.delete("/api/v1/cards/nonexistent_card_id")
         
         assert response.status_code == 404
+
+
+class TestCardLibraryFilters:
+    """Test the benefit and reward rate filters of the card library"""
+
+    @pytest.fixture
+    def library_cards(self, test_db, db_user):
+        from crud import create_credit_card
+        from models import CardIssuerEnum
+        marker = f"Lounge access {db_user.user_id}"
+        lounge = create_credit_card(
+            test_db, user_id=db_user.user_id, card_name="Lounge Diner", issuer=CardIssuerEnum.OTHER,
+            cash_back_rate={"other": 0.0}, points_multiplier={"dining": 4.0, "other": 1.0},
+            benefits=[marker, "Travel insurance"]
+        )
+        flat = create_credit_card(
+            test_db, user_id=db_user.user_id, card_name="Flat Three", issuer=CardIssuerEnum.OTHER,
+            cash_back_rate={"other": 0.0}, points_multiplier={"other": 3.0},
+            benefits=["Travel insurance"]
+        )
+        return marker, lounge.card_id, flat.card_id
+
+    def library_ids(self, test_client, **params):
+        response = test_client.get("/api/v1/cards/library", params={"limit": 1000, **params})
+        assert response.status_code == 200
+        return {card["card_id"] for card in response.json()}
+
+    def test_benefit_containment(self, test_client, library_cards):
+        """
+        Scenario: Filter the library by an exact benefit entry
+        Expected: Only cards listing that benefit are returned
+        """
+        marker, lounge, flat = library_cards
+
+        ids = self.library_ids(test_client, benefit=marker)
+
+        assert ids == {lounge}
+
+    def test_benefit_mentions(self, test_db, test_client, db_user, library_cards):
+        """
+        Scenario: Filter the library by text the benefit entries mention
+        Expected: Cards with any benefit containing it match, regardless of case
+        """
+        from crud import create_credit_card
+        from models import CardIssuerEnum
+        marker, lounge, flat = library_cards
+        priority_pass = create_credit_card(
+            test_db, user_id=db_user.user_id, card_name="Priority Traveler", issuer=CardIssuerEnum.OTHER,
+            cash_back_rate={"other": 0.0}, points_multiplier={"other": 1.0},
+            benefits=["Priority Pass airport lounge access"]
+        )
+
+        ids = self.library_ids(test_client, benefit="lounge access")
+
+        assert {lounge, priority_pass.card_id} <= ids
+        assert flat not in ids
+        assert self.library_ids(test_client, benefit="LOUNGE ACCESS " + db_user.user_id) == {lounge}
+        # LIKE wildcards in the query are literal
+        assert flat not in self.library_ids(test_client, benefit="travel%")
+
+    def test_min_points_multiplier_falls_back_to_other_rate(self, test_client, library_cards):
+        """
+        Scenario: Cards earning at least 3x (or 4x) on dining
+        Expected: A card without a dining rate qualifies through its "other" rate
+        """
+        marker, lounge, flat = library_cards
+
+        at_least_3 = self.library_ids(test_client, category="dining", min_points_multiplier=3)
+        at_least_4 = self.library_ids(test_client, category="dining", min_points_multiplier=4)
+        combined = self.library_ids(test_client, category="dining", min_points_multiplier=3, benefit="Travel insurance")
+
+        assert {lounge, flat} <= at_least_3
+        assert lounge in at_least_4 and flat not in at_least_4
+        assert {lounge, flat} <= combined
+        assert self.library_ids(test_client, category="dining", min_points_multiplier=3, benefit=marker) == {lounge}
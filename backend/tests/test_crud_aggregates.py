@@ -0,0 +1,254 @@
+"""
+Tests for the SQL-side aggregations in crud
+Transactions are inserted directly with fixed dates so results are deterministic
+"""
+
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from crud import (
+    create_credit_card, get_user_analytics, get_user_analytics_windows, calculate_transaction_stats,
+    create_transaction_feedback, get_feedback_stats, rebuild_user_daily_rollups
+)
+from models import (
+    Transaction, CategoryEnum, OptimizationGoalEnum, CardIssuerEnum
+)
+
+
+def add_transaction(db, user_id, days_ago, merchant, amount, category,
+                    rewards=0.0, optimal=None, card_id=None, recommended_card_id=None):
+    """Insert a transaction dated `days_ago` days in the past"""
+    txn = Transaction(
+        transaction_id=f"txn_{uuid.uuid4().hex[:12]}",
+        user_id=user_id,
+        card_id=card_id,
+        merchant=merchant,
+        amount=amount,
+        category=category,
+        optimization_goal=OptimizationGoalEnum.CASH_BACK,
+        recommended_card_id=recommended_card_id,
+        used_recommended_card=(card_id == recommended_card_id) if recommended_card_id else None,
+        total_value_earned=rewards,
+        optimal_value=optimal,
+        missed_value=(optimal - rewards) if optimal is not None else None,
+        transaction_date=datetime.utcnow() - timedelta(days=days_ago)
+    )
+    db.add(txn)
+    return txn
+
+
+@pytest.fixture
+def user_with_history(test_db, db_user):
+    """User with two cards and a small, known transaction history"""
+    gold = create_credit_card(
+        test_db, user_id=db_user.user_id, card_name="Gold", issuer=CardIssuerEnum.AMEX,
+        cash_back_rate={"dining": 0.04, "other": 0.01},
+        points_multiplier={"dining": 4.0, "other": 1.0}
+    )
+    cash = create_credit_card(
+        test_db, user_id=db_user.user_id, card_name="Cash", issuer=CardIssuerEnum.CITI,
+        cash_back_rate={"other": 0.02}, points_multiplier={"other": 0.0}
+    )
+    uid = db_user.user_id
+    add_transaction(test_db, uid, 1, "Chipotle", 40.0, CategoryEnum.DINING, 1.6, 1.6, gold.card_id, gold.card_id)
+    add_transaction(test_db, uid, 3, "Chipotle", 60.0, CategoryEnum.DINING, 1.2, 2.4, cash.card_id, gold.card_id)
+    add_transaction(test_db, uid, 10, "Whole Foods", 80.0, CategoryEnum.GROCERIES, 2.0, 2.0, cash.card_id, cash.card_id)
+    add_transaction(test_db, uid, 20, "Shell", 30.0, CategoryEnum.GAS, 0.3)
+    # Outside the default 30 day window
+    add_transaction(test_db, uid, 45, "Delta", 500.0, CategoryEnum.TRAVEL, 5.0)
+    test_db.commit()
+    rebuild_user_daily_rollups(test_db, uid)
+    return db_user, gold, cash
+
+
+class TestUserAnalyticsAggregation:
+    """get_user_analytics computed with GROUP BY queries"""
+
+    def test_empty_history(self, test_db, db_user):
+        analytics = get_user_analytics(test_db, db_user.user_id, days=30)
+
+        assert analytics['summary']['total_transactions'] == 0
+        assert analytics['summary']['total_spent'] == 0
+        assert analytics['best_card'] is None
+        assert analytics['category_breakdown'] == {}
+        assert analytics['top_merchants'] == []
+        assert len(analytics['weekly_trends']) == 5
+        assert all(w['transaction_count'] == 0 for w in analytics['weekly_trends'])
+
+    def test_summary_and_insights(self, test_db, user_with_history):
+        user, _, _ = user_with_history
+        analytics = get_user_analytics(test_db, user.user_id, days=30)
+
+        summary = analytics['summary']
+        assert summary['total_transactions'] == 4
+        assert summary['total_spent'] == 210.0
+        assert summary['total_rewards_earned'] == 5.1
+        assert summary['total_potential_rewards'] == 6.0
+        assert summary['missed_value'] == 1.2
+        assert summary['optimization_rate'] == 50.0
+        assert summary['avg_transaction_amount'] == 52.5
+        assert analytics['insights']['total_cards_owned'] == 2
+        assert analytics['insights']['potential_additional_savings'] == 1.2
+
+    def test_best_card_uses_recommended_card(self, test_db, user_with_history):
+        user, gold, _ = user_with_history
+        best = get_user_analytics(test_db, user.user_id, days=30)['best_card']
+
+        assert best['card_id'] == gold.card_id
+        assert best['card_name'] == "Gold"
+        assert best['transaction_count'] == 2
+        assert best['total_value'] == 2.8
+        assert best['avg_value_per_transaction'] == 1.4
+
+    def test_category_breakdown_sorted_by_spend(self, test_db, user_with_history):
+        user, _, _ = user_with_history
+        breakdown = get_user_analytics(test_db, user.user_id, days=30)['category_breakdown']
+
+        assert list(breakdown) == ['dining', 'groceries', 'gas']
+        assert breakdown['dining'] == {
+            'count': 2, 'total_spent': 100.0, 'total_rewards': 2.8, 'avg_rewards_rate': 2.8
+        }
+
+    def test_weekly_trends_and_top_merchants(self, test_db, user_with_history):
+        user, _, _ = user_with_history
+        analytics = get_user_analytics(test_db, user.user_id, days=30)
+
+        counts = [w['transaction_count'] for w in analytics['weekly_trends']]
+        assert counts == [0, 1, 1, 1, 1]
+        assert analytics['weekly_trends'][-1]['total_spent'] == 40.0
+
+        merchants = analytics['top_merchants']
+        assert [m['merchant'] for m in merchants] == ['Chipotle', 'Whole Foods', 'Shell']
+        assert merchants[0]['transaction_count'] == 2
+
+    def test_longer_window_includes_older_transactions(self, test_db, user_with_history):
+        user, _, _ = user_with_history
+        analytics = get_user_analytics(test_db, user.user_id, days=90)
+
+        assert analytics['summary']['total_transactions'] == 5
+        assert analytics['top_merchants'][0]['merchant'] == 'Delta'
+        assert len(analytics['weekly_trends']) == 13
+
+
+def without_timestamps(analytics):
+    """Analytics minus the fields that depend on the exact call time"""
+    trimmed = {key: value for key, value in analytics.items() if key != 'period'}
+    trimmed['weekly_trends'] = [
+        (w['transaction_count'], w['total_spent'], w['total_rewards']) for w in analytics['weekly_trends']
+    ]
+    return trimmed
+
+
+class TestAnalyticsWindows:
+    """get_user_analytics_windows: several windows from one pass"""
+
+    @pytest.fixture
+    def long_history(self, test_db, user_with_history):
+        user, gold, cash = user_with_history
+        uid = user.user_id
+        for days_ago, merchant, amount, category, rewards in [
+            (0.2, "Chipotle", 12.0, CategoryEnum.DINING, 0.45),
+            (6.6, "Shell", 45.0, CategoryEnum.GAS, 0.9),
+            (7.4, "Shell", 25.0, CategoryEnum.GAS, 0.5),
+            (29.8, "Costco", 220.0, CategoryEnum.GROCERIES, 4.4),
+            (89.5, "Delta", 640.0, CategoryEnum.TRAVEL, 12.8),
+            (200.3, "Hilton", 300.0, CategoryEnum.TRAVEL, 9.0),
+            (364.7, "Costco", 150.0, CategoryEnum.GROCERIES, 3.0),
+            (380.0, "Delta", 900.0, CategoryEnum.TRAVEL, 18.0),
+        ]:
+            add_transaction(test_db, uid, days_ago, merchant, amount, category, rewards,
+                            rewards * 1.5, cash.card_id, gold.card_id)
+        test_db.commit()
+        rebuild_user_daily_rollups(test_db, uid)
+        return user
+
+    def test_each_window_matches_single_window_analytics(self, test_db, long_history):
+        windows = get_user_analytics_windows(test_db, long_history.user_id, [7, 30, 90, 365])
+
+        assert list(windows) == [7, 30, 90, 365]
+        for days, analytics in windows.items():
+            assert analytics['period']['days'] == days
+            assert without_timestamps(analytics) == without_timestamps(
+                get_user_analytics(test_db, long_history.user_id, days=days)
+            )
+
+    def test_windows_share_one_end_date(self, test_db, long_history):
+        windows = get_user_analytics_windows(test_db, long_history.user_id, [30, 7, 30])
+
+        assert list(windows) == [7, 30]
+        assert windows[7]['period']['end_date'] == windows[30]['period']['end_date']
+        assert windows[7]['summary']['total_transactions'] == 4
+        assert windows[30]['summary']['total_transactions'] == 8
+
+    def test_endpoint(self, test_client, long_history):
+        response = test_client.get(f"/api/v1/users/{long_history.user_id}/analytics/windows?days=7,90")
+
+        assert response.status_code == 200
+        assert list(response.json()['windows']) == ['7', '90']
+        assert test_client.get(f"/api/v1/users/{long_history.user_id}/analytics/windows?days=7,400").status_code == 400
+        assert test_client.get(f"/api/v1/users/{long_history.user_id}/analytics/windows?days=week").status_code == 400
+
+
+class TestTransactionStats:
+    """calculate_transaction_stats as a single aggregate statement"""
+
+    def test_no_transactions(self, test_db, db_user):
+        stats = calculate_transaction_stats(test_db, db_user.user_id)
+
+        assert stats == {
+            "total_transactions": 0,
+            "total_spent": 0.0,
+            "total_rewards": 0.0,
+            "total_potential_rewards": 0.0,
+            "missed_value": 0.0,
+            "optimization_rate": 0.0
+        }
+
+    def test_all_time_stats(self, test_db, user_with_history):
+        user, _, _ = user_with_history
+        stats = calculate_transaction_stats(test_db, user.user_id)
+
+        assert stats["total_transactions"] == 5
+        assert stats["total_spent"] == 710.0
+        assert stats["total_rewards"] == 10.1
+        assert stats["total_potential_rewards"] == 6.0
+        assert stats["missed_value"] == 1.2
+        assert stats["optimization_rate"] == 40.0
+
+    def test_date_bounds(self, test_db, user_with_history):
+        user, _, _ = user_with_history
+        now = datetime.utcnow()
+        stats = calculate_transaction_stats(
+            test_db, user.user_id,
+            start_date=now - timedelta(days=15),
+            end_date=now - timedelta(days=2)
+        )
+
+        assert stats["total_transactions"] == 2
+        assert stats["total_spent"] == 140.0
+
+
+class TestFeedbackStats:
+    """get_feedback_stats as a single aggregate statement"""
+
+    def test_no_feedback(self, test_db, db_user):
+        assert get_feedback_stats(test_db, db_user.user_id) == {
+            "total_feedbacks": 0,
+            "acceptance_rate": 0.0,
+            "avg_satisfaction": 0.0
+        }
+
+    def test_acceptance_and_satisfaction(self, test_db, user_with_history):
+        user, _, _ = user_with_history
+        transactions = test_db.query(Transaction).filter(Transaction.user_id == user.user_id).all()
+        create_transaction_feedback(test_db, transactions[0].transaction_id, True, satisfaction_rating=5)
+        create_transaction_feedback(test_db, transactions[1].transaction_id, False, satisfaction_rating=2)
+        create_transaction_feedback(test_db, transactions[2].transaction_id, True)
+
+        stats = get_feedback_stats(test_db, user.user_id)
+
+        assert stats["total_feedbacks"] == 3
+        assert stats["acceptance_rate"] == 66.67
+        assert stats["avg_satisfaction"] == 3.5
@@ -0,0 +1,110 @@
+"""
+Tests for the incrementally maintained user_daily_rollups table
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from crud import (
+    create_transaction, create_credit_card, rebuild_user_daily_rollups,
+    get_user_analytics, calculate_transaction_stats
+)
+from models import UserDailyRollup, CategoryEnum, OptimizationGoalEnum, CardIssuerEnum
+
+
+def rollup_rows(db, user_id):
+    """Rollup rows for a user as comparable tuples"""
+    rows = db.query(UserDailyRollup).filter(UserDailyRollup.user_id == user_id).all()
+    return sorted(
+        (r.day, r.category.value, r.card_id, r.transaction_count, r.followed_count,
+         round(r.total_spent, 2), round(r.rewards_earned, 2),
+         round(r.optimal_value, 2), round(r.missed_value, 2))
+        for r in rows
+    )
+
+
+@pytest.fixture
+def card(test_db, db_user):
+    return create_credit_card(
+        test_db, user_id=db_user.user_id, card_name="Rollup Card", issuer=CardIssuerEnum.CHASE,
+        cash_back_rate={"other": 0.02}, points_multiplier={"other": 1.0}
+    )
+
+
+def record(db, user_id, card_id, amount, category=CategoryEnum.DINING, days_ago=0, **kwargs):
+    return create_transaction(
+        db,
+        user_id=user_id,
+        merchant="Rollup Merchant",
+        amount=amount,
+        category=category,
+        optimization_goal=OptimizationGoalEnum.CASH_BACK,
+        card_id=card_id,
+        transaction_date=datetime.utcnow() - timedelta(days=days_ago),
+        **kwargs
+    )
+
+
+class TestIncrementalRollups:
+    """create_transaction keeps the rollups current"""
+
+    def test_same_key_is_incremented(self, test_db, db_user, card):
+        record(test_db, db_user.user_id, card.card_id, 10.0, days_ago=3,
+               recommended_card_id=card.card_id, total_value_earned=0.2, optimal_value=0.3, missed_value=0.1)
+        record(test_db, db_user.user_id, card.card_id, 15.0, days_ago=3,
+               recommended_card_id="card_other", total_value_earned=0.3)
+
+        rows = rollup_rows(test_db, db_user.user_id)
+        assert len(rows) == 1
+        _, category, card_id, count, followed, spent, rewards, optimal, missed = rows[0]
+        assert (category, card_id) == ("dining", card.card_id)
+        assert (count, followed, spent, rewards, optimal, missed) == (2, 1, 25.0, 0.5, 0.3, 0.1)
+
+    def test_separate_keys(self, test_db, db_user, card):
+        record(test_db, db_user.user_id, card.card_id, 10.0, days_ago=1)
+        record(test_db, db_user.user_id, card.card_id, 10.0, category=CategoryEnum.GAS, days_ago=1)
+        record(test_db, db_user.user_id, None, 10.0, days_ago=1)
+        record(test_db, db_user.user_id, card.card_id, 10.0, days_ago=2)
+
+        rows = rollup_rows(test_db, db_user.user_id)
+        assert len(rows) == 4
+        assert "" in {row[2] for row in rows}
+
+    def test_rebuild_matches_incremental(self, test_db, db_user, card):
+        for days_ago, amount in [(0, 12.5), (0, 7.5), (5, 20.0), (40, 99.0)]:
+            record(test_db, db_user.user_id, card.card_id, amount, days_ago=days_ago, total_value_earned=amount / 100)
+        incremental = rollup_rows(test_db, db_user.user_id)
+
+        written = rebuild_user_daily_rollups(test_db, db_user.user_id)
+
+        assert written == 3
+        assert rollup_rows(test_db, db_user.user_id) == incremental
+
+
+class TestRollupReads:
+    """Readers combine rollups with raw transactions for partial days"""
+
+    def test_stats_read_rollups(self, test_db, db_user, card):
+        record(test_db, db_user.user_id, card.card_id, 30.0, days_ago=100, total_value_earned=0.6)
+        record(test_db, db_user.user_id, card.card_id, 20.0, days_ago=1, total_value_earned=0.4)
+
+        stats = calculate_transaction_stats(test_db, db_user.user_id)
+
+        assert stats["total_transactions"] == 2
+        assert stats["total_spent"] == 50.0
+        assert stats["total_rewards"] == 1.0
+
+    def test_analytics_counts_each_transaction_once(self, test_db, db_user, card):
+        # One transaction per day over the whole window hits both split days
+        # (week boundaries) and whole days served from the rollups
+        for days_ago in range(30):
+            record(test_db, db_user.user_id, card.card_id, 10.0, days_ago=days_ago + 0.5, total_value_earned=0.1)
+
+        analytics = get_user_analytics(test_db, db_user.user_id, days=30)
+
+        assert analytics['summary']['total_transactions'] == 30
+        assert analytics['summary']['total_spent'] == 300.0
+        assert analytics['category_breakdown']['dining']['count'] == 30
+        assert sum(w['transaction_count'] for w in analytics['weekly_trends']) == 30
+        assert [w['transaction_count'] for w in analytics['weekly_trends']] == [7, 7, 7, 7, 2]
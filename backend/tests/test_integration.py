@@ -189,7 +189,7 @@ class TestFullFlowIntegration:
             
             # Record feedback - using query parameters instead of JSON body
             feedback_response = test_client.post(
-                f"/api/v1/feedback?transaction_id={transaction_id}&accepted=true&card_used=Citi+Double+Cash&rating=5&feedback_text=Great+recommendation"
+                f"/api/v1/feedback?transaction_id={transaction_id}&accepted=true&card_used=Citi+Double+Cash&rating=5&feedback_text=Great+recommendation&user_id={test_user.user_id}"
             )
             
             # May return 200 or 422 depending on implementation
@@ -0,0 +1,188 @@
+"""
+Tests for the cross-worker cache invalidation bus (SQLite polling mode: two
+bus instances on one database file stand in for two workers)
+"""
+
+import asyncio
+import socket
+import time
+import uuid
+
+import pytest
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+from cache import read_cache, ALL, MERCHANTS
+from crud import create_user, get_user
+from invalidation import InvalidationBus, apply_remote_tags
+from merchant_index import merchant_index
+from models import Base, CacheInvalidation, OptimizationGoalEnum
+
+
+@pytest.fixture
+def bus_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'bus.db'}")
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+def worker(received):
+    """A bus whose remote tags are recorded instead of applied"""
+    return InvalidationBus(poll_seconds=60, apply=received.append)
+
+
+def test_tags_reach_other_workers_once(bus_engine):
+    received_a, received_b = [], []
+    bus_a, bus_b = worker(received_a), worker(received_b)
+
+    async def scenario():
+        await bus_a.start(bus_engine)
+        await bus_b.start(bus_engine)
+        bus_a.publish({"wallet:user_1", "user:user_1"})
+        bus_a.publish({"library"})
+        assert await bus_a.flush() == 1  # batched into one message
+        applied = (await bus_a.poll(), await bus_b.poll(), await bus_b.poll())
+        await bus_a.stop()
+        await bus_b.stop()
+        return applied
+
+    assert asyncio.run(scenario()) == (0, 1, 0)
+    assert received_a == []
+    assert received_b == [{"wallet:user_1", "user:user_1", "library"}]
+    # Stopped buses ignore publishes
+    bus_a.publish({"user:user_2"})
+    assert asyncio.run(bus_a.flush()) == 0
+
+
+def test_committed_session_writes_are_published(bus_engine):
+    received = []
+    bus_a, bus_b = worker([]), worker(received)
+    session = sessionmaker(bind=bus_engine, expire_on_commit=False)()
+
+    async def scenario():
+        await bus_a.start(bus_engine)
+        await bus_b.start(bus_engine)
+        user = create_user(
+            session, email=f"bus_{uuid.uuid4().hex[:8]}@example.com", full_name="Bus Test User",
+            password_hash="hashed", default_optimization_goal=OptimizationGoalEnum.CASH_BACK
+        )
+        await bus_a.flush()
+        await bus_b.poll()
+        await bus_a.stop()
+        await bus_b.stop()
+        return user
+
+    user = asyncio.run(scenario())
+    session.close()
+
+    assert any(f"user:{user.user_id}" in tags for tags in received)
+
+
+def test_large_tag_sets_are_split_and_all_collapses():
+    bus = InvalidationBus()
+    tags = {f"wallet:user_{i:08d}{'x' * 40}" for i in range(500)}
+
+    messages = bus._messages(tags)
+
+    assert len(messages) > 1
+    assert {tag for message in messages for tag in message} == tags
+    assert bus._messages(tags | {ALL}) == [[ALL]]
+
+
+def test_remote_tags_drop_local_entries(test_db, db_user, monkeypatch):
+    cleared = []
+    monkeypatch.setattr(merchant_index, "clear", lambda: cleared.append(True))
+    get_user(test_db, db_user.user_id)
+    entries = read_cache.stats()["entries"]
+
+    apply_remote_tags({f"user:{db_user.user_id}"})
+    assert read_cache.stats()["entries"] == entries - 1
+    assert cleared == []
+
+    apply_remote_tags({MERCHANTS})
+    assert cleared == [True]
+
+
+def test_old_rows_are_pruned(bus_engine):
+    bus = InvalidationBus(retention_seconds=0)
+
+    async def scenario():
+        await bus.start(bus_engine)
+        bus.publish({"user:user_1"})
+        await bus.flush()
+        bus._pruned_at = 0.0
+        bus.publish({"user:user_2"})
+        await bus.flush()
+        await bus.stop()
+
+    asyncio.run(scenario())
+    with bus_engine.connect() as connection:
+        assert connection.execute(select(func.count(CacheInvalidation.invalidation_id))).scalar() <= 1
+
+
+class FakeListener:
+    """Stands in for the detached LISTEN connection (a socket pair for the event loop to watch)"""
+
+    def __init__(self, fail=False):
+        self.socket, self.peer = socket.socketpair()
+        self.closed = False
+        self.dbapi_connection = self
+        self.notifies = []
+        self.fail = fail
+
+    def fileno(self):
+        return self.socket.fileno()
+
+    def poll(self):
+        self.peer_data = self.socket.recv(1024)
+        if self.fail:
+            raise OSError("server closed the connection unexpectedly")
+
+    def close(self):
+        self.closed = True
+        self.socket.close()
+        self.peer.close()
+
+
+def test_lost_listen_connection_degrades_and_reconnects(bus_engine):
+    received = []
+    bus = worker(received)
+    lost, restored = FakeListener(fail=True), FakeListener()
+
+    async def scenario():
+        await bus.start(bus_engine)
+        # Pretend this is PostgreSQL with a LISTEN connection
+        bus._postgres = True
+        bus._watch(lost)
+        attempts = []
+
+        def connect_listener():
+            attempts.append(time.monotonic())
+            if len(attempts) == 1:
+                raise OSError("connection refused")
+            return restored
+
+        bus._connect_listener = connect_listener
+        modes = [bus.mode]
+
+        lost.peer.send(b"x")  # readable, and poll() fails
+        await asyncio.sleep(0.1)
+        # The first reconnect failed and backed off
+        modes.append(bus.mode)
+        assert len(attempts) == 1 and bus._reconnect_at > time.monotonic()
+
+        bus._reconnect_at = 0.0
+        bus._wakeup.set()
+        await asyncio.sleep(0.1)
+        modes.append(bus.mode)
+        listener = bus._listener
+        await bus.stop()
+        return modes, listener
+
+    modes, listener = asyncio.run(scenario())
+
+    assert modes[0] == "notify" and modes[1] == "degraded" and modes[2] == "notify"
+    assert lost.closed and listener is restored and restored.closed
+    # Dropped everything when the connection was lost and again once restored
+    assert received == [{ALL}, {ALL}]
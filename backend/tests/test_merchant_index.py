@@ -0,0 +1,135 @@
+"""
+Tests for the in-memory merchant index (trie autocomplete, exact resolution, category buckets)
+"""
+
+import threading
+import time
+import uuid
+
+import pytest
+from sqlalchemy import select
+
+from crud import create_merchant, get_or_create_merchant, bulk_upsert_merchants
+from merchant_index import MerchantIndex, merchant_index, normalize_name
+from models import Merchant, CategoryEnum
+
+
+@pytest.fixture
+def catalog(test_db):
+    """A private index over a few merchants sharing a unique token"""
+    token = f"qx{uuid.uuid4().hex[:6]}"
+    bulk_upsert_merchants(test_db, [
+        {"merchant_name": f"{token} Whole Foods", "primary_category": "groceries"},
+        {"merchant_name": f"{token}'s Diner", "primary_category": "dining"},
+        {"merchant_name": f"Big{token} Outlet", "primary_category": "shopping"},
+    ])
+    test_db.commit()
+    index = MerchantIndex()
+    index.load(test_db)
+    return token, index
+
+
+class TestNormalization:
+
+    def test_case_accents_and_punctuation(self):
+        assert normalize_name("  McDonald's ") == "mcdonalds"
+        assert normalize_name("Café-Rouge") == "cafe rouge"
+
+
+class TestMerchantIndex:
+
+    def test_word_prefix_autocomplete(self, catalog):
+        token, index = catalog
+
+        assert [e.merchant_name for e in index.search(f"{token} wh")] == [f"{token} Whole Foods"]
+        assert f"{token} Whole Foods" in [e.merchant_name for e in index.search("foods", limit=500)]
+
+    def test_prefix_ranks_before_substring(self, catalog):
+        token, index = catalog
+        results = [e.merchant_name for e in index.search(token, limit=10)]
+
+        assert results == [f"{token}'s Diner", f"{token} Whole Foods", f"Big{token} Outlet"]
+
+    def test_category_filter(self, catalog):
+        token, index = catalog
+
+        assert [e.merchant_name for e in index.search(token, category=CategoryEnum.SHOPPING)] == [f"Big{token} Outlet"]
+        assert f"{token}'s Diner" in [e.merchant_name for e in index.by_category(CategoryEnum.DINING, limit=500)]
+
+    def test_exact_resolution_is_normalized(self, catalog):
+        token, index = catalog
+
+        assert index.resolve(f"{token.upper()}S DINER").merchant_name == f"{token}'s Diner"
+        assert index.resolve(f"{token}s") is None
+
+    def test_add_replaces_entry(self, test_db, catalog):
+        token, index = catalog
+        merchant = index.resolve(f"{token}'s diner")
+        renamed = Merchant(
+            merchant_id=merchant.merchant_id, merchant_name=f"{token} Bistro",
+            primary_category=CategoryEnum.DINING, logo_url=None
+        )
+        index.add(renamed)
+
+        assert index.resolve(f"{token}'s diner") is None
+        assert [e.merchant_id for e in index.search(f"{token} bis")] == [merchant.merchant_id]
+
+    def test_search_during_reload(self, test_db, catalog):
+        """Readers never see a half-built index while another thread reloads it"""
+        token, index = catalog
+        rows = test_db.execute(select(
+            Merchant.merchant_id, Merchant.merchant_name, Merchant.primary_category, Merchant.logo_url
+        )).all()
+
+        class Source:
+            def execute(self, statement):
+                return self
+
+            def all(self):
+                return rows
+
+        stop = threading.Event()
+
+        def reload():
+            while not stop.is_set():
+                index.clear()
+                index.load(Source())
+
+        reloader = threading.Thread(target=reload)
+        reloader.start()
+        try:
+            deadline = time.monotonic() + 0.5
+            while time.monotonic() < deadline:
+                index.search(token, limit=50)
+                index.search("a", limit=50)
+                index.by_category(CategoryEnum.DINING)
+        finally:
+            stop.set()
+            reloader.join()
+
+class TestMerchantIndexIntegration:
+
+    def test_create_merchant_updates_loaded_index(self, test_db):
+        merchant_index.load(test_db)
+        name = f"Fresh {uuid.uuid4().hex[:6]} Market"
+
+        create_merchant(test_db, name, CategoryEnum.GROCERIES)
+
+        assert merchant_index.resolve(name.lower()).merchant_name == name
+
+    def test_get_or_create_resolves_exact_name_only(self, test_db):
+        merchant_index.load(test_db)
+        name = f"Corner {uuid.uuid4().hex[:6]} Cafe"
+        created = get_or_create_merchant(test_db, name, CategoryEnum.DINING)
+
+        assert get_or_create_merchant(test_db, name.upper(), CategoryEnum.DINING).merchant_id == created.merchant_id
+        assert get_or_create_merchant(test_db, name[:-5], CategoryEnum.DINING).merchant_id != created.merchant_id
+
+    def test_search_endpoint_serves_from_index(self, test_client, test_db):
+        name = f"Endpoint {uuid.uuid4().hex[:6]} Books"
+        test_client.post("/api/v1/merchants", params={"merchant_name": name, "primary_category": "shopping"})
+
+        response = test_client.get("/api/v1/merchants/search", params={"q": name.split()[1]})
+
+        assert merchant_index.loaded
+        assert [m["merchant_name"] for m in response.json()] == [name]
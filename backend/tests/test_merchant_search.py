@@ -0,0 +1,81 @@
+"""
+Tests for ranked merchant search (SQLite LIKE fallback of the trigram search)
+"""
+
+import uuid
+
+import pytest
+
+from crud import search_merchants_by_name, get_merchant_by_name, bulk_upsert_merchants
+from models import CategoryEnum
+
+
+@pytest.fixture
+def merchants(test_db):
+    """Merchants sharing a unique token so results are isolated from other tests"""
+    token = f"zq{uuid.uuid4().hex[:6]}"
+    names = {
+        "prefix": (f"{token} Coffee", "dining"),
+        "word_prefix": (f"Blue {token} Market", "groceries"),
+        "contains": (f"Mega{token}mart", "shopping"),
+        "wildcard": (f"{token}_100% Fuel", "gas"),
+    }
+    bulk_upsert_merchants(test_db, [
+        {"merchant_name": name, "primary_category": category} for name, category in names.values()
+    ])
+    test_db.commit()
+    return token, {key: name for key, (name, _) in names.items()}
+
+
+def names(results):
+    return [m.merchant_name for m in results]
+
+
+class TestMerchantSearch:
+
+    def test_ranks_prefix_then_word_prefix_then_substring(self, test_db, merchants):
+        token, expected = merchants
+        results = names(search_merchants_by_name(test_db, token.upper(), limit=10))
+
+        assert results[:2] == sorted([expected["prefix"], expected["wildcard"]], key=len)
+        assert results[2:] == [expected["word_prefix"], expected["contains"]]
+
+    def test_category_filter(self, test_db, merchants):
+        token, expected = merchants
+        results = search_merchants_by_name(test_db, token, category=CategoryEnum.GROCERIES)
+
+        assert names(results) == [expected["word_prefix"]]
+
+    def test_like_wildcards_match_literally(self, test_db, merchants):
+        token, expected = merchants
+
+        assert names(search_merchants_by_name(test_db, f"{token}_100%")) == [expected["wildcard"]]
+        assert search_merchants_by_name(test_db, f"{token}%Coffee") == []
+
+    def test_blank_query_returns_nothing(self, test_db, merchants):
+        assert search_merchants_by_name(test_db, "   ") == []
+
+    def test_get_merchant_by_name_returns_best_match(self, test_db, merchants):
+        token, expected = merchants
+
+        assert get_merchant_by_name(test_db, f"{token} coffee").merchant_name == expected["prefix"]
+
+
+class TestMerchantSearchEndpoint:
+
+    def test_category_query_param(self, test_client, merchants):
+        token, expected = merchants
+        response = test_client.get(
+            "/api/v1/merchants/search", params={"q": token, "category": "shopping"}
+        )
+
+        assert response.status_code == 200
+        assert [m["merchant_name"] for m in response.json()] == [expected["contains"]]
+
+    def test_category_without_query_lists_category(self, test_client, merchants):
+        response = test_client.get(
+            "/api/v1/merchants/search", params={"category": "gas", "limit": 500}
+        )
+
+        assert response.status_code == 200
+        assert {m["primary_category"] for m in response.json()} == {"gas"}
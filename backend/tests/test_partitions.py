@@ -0,0 +1,83 @@
+"""
+Tests for monthly partitioning of the transactions table
+(partition DDL is PostgreSQL-only; SQLite keeps a plain table)
+"""
+
+from datetime import date, datetime
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.schema import CreateTable
+
+import crud
+from crud import create_transaction, create_transaction_feedback, get_transaction
+from models import Transaction, TransactionFeedback, CategoryEnum, OptimizationGoalEnum
+from partitions import (
+    add_months, month_start, partition_name, partition_month,
+    ensure_partitions, detach_partitions_older_than, list_partitions
+)
+
+
+class TestPartitionNaming:
+
+    def test_month_arithmetic(self):
+        assert month_start(datetime(2026, 10, 19, 13, 5)) == date(2026, 10, 1)
+        assert add_months(date(2026, 11, 1), 2) == date(2027, 1, 1)
+        assert add_months(date(2026, 1, 1), -1) == date(2025, 12, 1)
+
+    def test_partition_name_round_trip(self):
+        assert partition_name(date(2026, 3, 1)) == "transactions_y2026m03"
+        assert partition_month("transactions_y2026m03") == date(2026, 3, 1)
+        assert partition_month("transactions_default") is None
+
+
+class TestPartitionedTable:
+
+    def test_postgresql_ddl_is_range_partitioned(self):
+        ddl = str(CreateTable(Transaction.__table__).compile(dialect=postgresql.dialect()))
+
+        assert "PARTITION BY RANGE (transaction_date)" in ddl
+        # (transaction_id, transaction_date) is added by the after_create hook
+        assert "PRIMARY KEY" not in ddl
+        assert "REFERENCES transactions" not in str(
+            CreateTable(TransactionFeedback.__table__).compile(dialect=postgresql.dialect())
+        )
+
+    def test_sqlite_keeps_primary_and_foreign_keys(self):
+        ddl = str(CreateTable(Transaction.__table__).compile(dialect=sqlite.dialect()))
+
+        assert "PRIMARY KEY (transaction_id)" in ddl
+        assert "REFERENCES transactions (transaction_id) ON DELETE CASCADE" in str(
+            CreateTable(TransactionFeedback.__table__).compile(dialect=sqlite.dialect())
+        )
+
+    def test_maintenance_is_a_no_op_on_sqlite(self, test_db):
+        connection = test_db.connection()
+
+        assert ensure_partitions(connection) == []
+        assert detach_partitions_older_than(connection, 0) == []
+        assert list_partitions(connection) == []
+
+    def test_transactions_and_feedback_still_work(self, test_db, db_user):
+        transaction = create_transaction(
+            test_db,
+            user_id=db_user.user_id,
+            merchant="Partitioned Cafe",
+            amount=12.5,
+            category=CategoryEnum.DINING,
+            optimization_goal=OptimizationGoalEnum.CASH_BACK
+        )
+        create_transaction_feedback(test_db, transaction.transaction_id, True)
+        test_db.expire_all()
+
+        loaded = get_transaction(test_db, transaction.transaction_id)
+        assert loaded.feedback.accepted_recommendation is True
+        assert loaded.feedback.transaction is loaded
+
+    def test_feedback_for_missing_transaction_is_404_when_partitioned(self, test_client, db_user, monkeypatch):
+        monkeypatch.setattr(crud, "is_partitioned", lambda connection: True)
+
+        response = test_client.post("/api/v1/feedback", params={
+            "transaction_id": "txn_missing", "accepted": True, "card_used": "card_1", "user_id": db_user.user_id
+        })
+
+        assert response.status_code == 404
@@ -0,0 +1,60 @@
+"""
+Tests that the crud hot queries are planned on the composite / covering /
+partial indexes (SQLite plans; see docs/query_plans/)
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from crud import get_user_credit_cards, get_user_automation_rules, calculate_transaction_stats
+
+
+@pytest.fixture
+def plans(test_db):
+    """Run a crud call and return the EXPLAIN QUERY PLAN text of each SELECT it sent"""
+    def explain(fn):
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith("SELECT"):
+                statements.append((statement, parameters))
+
+        engine = test_db.get_bind()
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            fn()
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+
+        connection = test_db.connection()
+        return [
+            "\n".join(row[-1] for row in connection.exec_driver_sql("EXPLAIN QUERY PLAN " + sql, params))
+            for sql, params in statements
+        ]
+    return explain
+
+
+class TestHotQueryPlans:
+
+    def test_active_wallet_uses_partial_index(self, test_db, db_user, plans):
+        user_id = db_user.user_id
+        [plan] = plans(lambda: get_user_credit_cards(test_db, user_id))
+
+        assert "idx_user_card_user_active" in plan
+
+    def test_active_rules_need_no_sort(self, test_db, db_user, plans):
+        user_id = db_user.user_id
+        [plan] = plans(lambda: get_user_automation_rules(test_db, user_id))
+
+        assert "idx_rule_user_active_priority" in plan
+        assert "TEMP B-TREE" not in plan
+
+    def test_range_stats_are_index_only(self, test_db, db_user, plans):
+        user_id, now = db_user.user_id, datetime.utcnow()
+        [plan] = plans(lambda: calculate_transaction_stats(
+            test_db, user_id, start_date=now - timedelta(days=90), end_date=now
+        ))
+
+        assert "COVERING INDEX idx_transaction_user_date_covering" in plan
@@ -0,0 +1,181 @@
+"""
+Tests for the read-through cache over crud reads (cache.py)
+"""
+
+import threading
+import time
+
+import pytest
+from sqlalchemy import event
+
+from cache import ReadCache, read_cache
+from crud import (
+    get_user, update_user, get_card, update_card, create_credit_card, add_user_credit_card,
+    get_user_cards_with_details, get_card_library
+)
+from models import User, CardIssuerEnum
+
+
+@pytest.fixture
+def selects(test_db):
+    """Count the SELECT statements sent while the fixture's context is open"""
+    class Counter:
+        count = 0
+
+        def __enter__(self):
+            self.count = 0
+            event.listen(test_db.get_bind(), "before_cursor_execute", self.record)
+            return self
+
+        def __exit__(self, *exc):
+            event.remove(test_db.get_bind(), "before_cursor_execute", self.record)
+
+        def record(self, conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith("SELECT"):
+                self.count += 1
+    return Counter()
+
+
+@pytest.fixture
+def wallet_card(test_db, db_user):
+    card = create_credit_card(
+        test_db, user_id=db_user.user_id, card_name="Cached Card", issuer=CardIssuerEnum.OTHER,
+        cash_back_rate={"other": 0.02}, points_multiplier={"other": 1.0}, annual_fee=95.0
+    )
+    add_user_credit_card(test_db, db_user.user_id, card.card_id)
+    return card
+
+
+class TestReadThrough:
+
+    def test_second_lookup_is_served_from_cache(self, test_db, db_user, selects):
+        user_id = db_user.user_id
+        test_db.expunge_all()
+        get_user(test_db, user_id)
+        test_db.expunge_all()
+
+        with selects:
+            user = get_user(test_db, user_id)
+
+        assert selects.count == 0
+        assert user.user_id == user_id and user in test_db
+        assert read_cache.stats()["functions"]["get_user"] == {
+            "hits": 1, "misses": 1, "bypassed": 0, "hit_rate": 0.5
+        }
+
+    def test_cached_results_are_copies(self, test_db, db_user, wallet_card):
+        get_user_cards_with_details(test_db, db_user.user_id)[0]["cash_back_rate"]["other"] = 9.9
+
+        assert get_user_cards_with_details(test_db, db_user.user_id)[0]["cash_back_rate"] == {"other": 0.02}
+
+    def test_missing_rows_are_cached_until_created(self, test_db):
+        assert get_user(test_db, "user_not_yet") is None
+
+        test_db.add(User(user_id="user_not_yet", email="not_yet@example.com", password_hash="x", full_name="Later"))
+        test_db.commit()
+
+        assert get_user(test_db, "user_not_yet").full_name == "Later"
+        test_db.delete(test_db.get(User, "user_not_yet"))
+        test_db.commit()
+
+
+class TestInvalidation:
+
+    def test_commit_invalidates_user(self, test_db, db_user):
+        user_id = db_user.user_id
+        get_user(test_db, user_id)
+        update_user(test_db, user_id, full_name="Renamed")
+        test_db.expunge_all()
+
+        assert get_user(test_db, user_id).full_name == "Renamed"
+
+    def test_card_update_invalidates_wallet_details(self, test_db, db_user, wallet_card):
+        assert get_user_cards_with_details(test_db, db_user.user_id)[0]["annual_fee"] == 95.0
+        get_card_library(test_db)
+
+        update_card(test_db, wallet_card.card_id, annual_fee=0.0)
+
+        assert read_cache.stats()["entries"] == 0
+        assert get_user_cards_with_details(test_db, db_user.user_id)[0]["annual_fee"] == 0.0
+
+    def test_rollback_keeps_entries(self, test_db, db_user, wallet_card):
+        card_id = wallet_card.card_id
+        get_card(test_db, card_id)
+        wallet_card.annual_fee = 1.0
+        test_db.flush()
+        test_db.rollback()
+        hits = read_cache.stats()["functions"]["get_card"]["hits"]
+
+        assert get_card(test_db, card_id).annual_fee == 95.0
+        assert read_cache.stats()["functions"]["get_card"]["hits"] == hits + 1
+
+    def test_uncommitted_writes_bypass_the_cache(self, test_db, db_user):
+        user_id = db_user.user_id
+        get_user(test_db, user_id)
+        db_user.full_name = "Uncommitted"
+        test_db.flush()
+
+        assert get_user(test_db, user_id).full_name == "Uncommitted"
+        test_db.rollback()
+        assert get_user(test_db, user_id).full_name == "DB Test User"
+        assert read_cache.stats()["functions"]["get_user"]["bypassed"] == 1
+
+
+class TestBoundsAndStampede:
+
+    def test_lru_and_ttl_bounds(self, test_db):
+        cache = ReadCache(max_entries=2, ttl_seconds=60)
+        calls = []
+
+        @cache.cached(tags=lambda result, n: [f"n:{n}"])
+        def load(db, n):
+            calls.append(n)
+            return n
+
+        for n in (1, 2, 1, 3, 1, 2):
+            load(test_db, n)
+        assert calls == [1, 2, 3, 2]  # 2 was least recently used when 3 arrived
+
+        cache.ttl_seconds = 0
+        load(test_db, 5)
+        load(test_db, 5)
+        assert calls[-2:] == [5, 5]
+
+    def test_concurrent_misses_load_once(self, test_db):
+        cache = ReadCache()
+        calls = []
+
+        @cache.cached(tags=lambda result: ["slow"])
+        def slow(db):
+            calls.append(1)
+            time.sleep(0.2)
+            return "value"
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(slow(test_db))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert results == ["value"] * 5
+        assert len(calls) == 1
+
+
+def test_health_reports_cache_stats(test_client):
+    response = test_client.get("/health")
+
+    assert "read_cache" in response.json()["components"]
+
+
+def test_card_library_endpoint_is_served_from_cache(test_client, wallet_card):
+    assert read_cache.enabled
+    params = {"limit": 1000}
+
+    first = test_client.get("/api/v1/cards/library", params=params)
+    second = test_client.get("/api/v1/cards/library", params=params)
+
+    assert first.status_code == 200 and second.status_code == 200
+    assert wallet_card.card_id in {card["card_id"] for card in first.json()}
+    assert second.json() == first.json()
+    assert read_cache.stats()["functions"]["get_card_library"]["hits"] >= 1
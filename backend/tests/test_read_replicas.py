@@ -0,0 +1,184 @@
+"""
+Tests for read-replica routing in database.Database (two SQLite files stand in
+for a primary and its replicas)
+"""
+
+import time
+import uuid
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from sqlalchemy import insert, text
+
+from crud import create_user
+import middleware
+from database import Base, Database, LAST_WRITE_COOKIE, LAST_WRITE_HEADER, watch_writes
+from middleware import ReadYourWritesMiddleware
+from models import User, OptimizationGoalEnum
+
+
+@pytest.fixture
+def replicated_db(tmp_path, monkeypatch):
+    """A Database with one primary and two replica SQLite files"""
+    primary = f"sqlite:///{tmp_path / 'primary.db'}"
+    replicas = [f"sqlite:///{tmp_path / name}" for name in ("replica_0.db", "replica_1.db")]
+    monkeypatch.setenv("DATABASE_URL", primary)
+    monkeypatch.delenv("ASYNC_DATABASE_URL", raising=False)
+    monkeypatch.setenv("DATABASE_REPLICA_URLS", ",".join(replicas))
+    monkeypatch.setenv("DB_READ_YOUR_WRITES_SECONDS", "60")
+
+    database = Database()
+    for engine in [database.engine, *database.replica_engines]:
+        Base.metadata.create_all(bind=engine)
+    yield database
+    database.close()
+
+
+def bound_url(session):
+    return str(session.get_bind().url)
+
+
+def write_user(database):
+    session = database.get_session()
+    try:
+        return create_user(
+            session,
+            email=f"replica_{uuid.uuid4().hex[:8]}@example.com",
+            full_name="Replica Test User",
+            password_hash="not-a-real-hash",
+            default_optimization_goal=OptimizationGoalEnum.CASH_BACK
+        ).user_id
+    finally:
+        session.close()
+
+
+class TestReadRouting:
+
+    def test_reads_round_robin_across_replicas(self, replicated_db):
+        replica_urls = replicated_db.config.REPLICA_URLS
+
+        urls = []
+        for _ in range(4):
+            session = replicated_db.get_read_session()
+            urls.append(bound_url(session))
+            session.close()
+
+        assert urls == [replica_urls[0], replica_urls[1], replica_urls[0], replica_urls[1]]
+
+    def test_reads_use_primary_without_replicas(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'solo.db'}")
+        monkeypatch.delenv("DATABASE_REPLICA_URLS", raising=False)
+        database = Database()
+
+        session = database.get_read_session("any-user")
+        assert bound_url(session) == database.config.DATABASE_URL
+        session.close()
+        database.close()
+
+
+class TestReadYourWrites:
+
+    def test_writer_sticks_to_primary(self, replicated_db):
+        user_id = write_user(replicated_db)
+
+        session = replicated_db.get_read_session(user_id)
+        assert bound_url(session) == replicated_db.config.DATABASE_URL
+        session.close()
+
+        other = replicated_db.get_read_session("someone-else")
+        assert bound_url(other) in replicated_db.config.REPLICA_URLS
+        other.close()
+
+    def test_bulk_insert_marks_writer(self, replicated_db):
+        user_id = str(uuid.uuid4())
+        session = replicated_db.get_session()
+        session.execute(insert(User), [{
+            "user_id": user_id,
+            "email": f"bulk_{user_id[:8]}@example.com",
+            "full_name": "Bulk User",
+            "password_hash": "not-a-real-hash",
+        }])
+        session.commit()
+        session.close()
+
+        assert replicated_db.recent_writers.is_recent(user_id)
+
+    def test_rolled_back_write_does_not_stick(self, replicated_db):
+        user_id = str(uuid.uuid4())
+        session = replicated_db.get_session()
+        session.add(User(
+            user_id=user_id,
+            email=f"rollback_{user_id[:8]}@example.com",
+            full_name="Rollback User",
+            password_hash="not-a-real-hash"
+        ))
+        session.flush()
+        session.rollback()
+        session.close()
+
+        assert not replicated_db.recent_writers.is_recent(user_id)
+
+    def test_stickiness_expires(self, replicated_db):
+        replicated_db.recent_writers.window_seconds = 0
+        user_id = write_user(replicated_db)
+
+        session = replicated_db.get_read_session(user_id)
+        assert bound_url(session) in replicated_db.config.REPLICA_URLS
+        session.close()
+
+
+class TestReadYourWritesAcrossWorkers:
+
+    def test_client_last_write_sticks_to_primary_in_any_worker(self, replicated_db):
+        # A fresh worker: nothing in its recent_writers
+        user_id = str(uuid.uuid4())
+
+        session = replicated_db.get_read_session(user_id, last_write_at=time.time())
+        assert bound_url(session) == replicated_db.config.DATABASE_URL
+        session.close()
+
+        stale = replicated_db.get_read_session(user_id, last_write_at=time.time() - 120)
+        assert bound_url(stale) in replicated_db.config.REPLICA_URLS
+        stale.close()
+
+    def test_watch_writes_collects_committed_users(self, replicated_db):
+        with watch_writes() as written:
+            user_id = write_user(replicated_db)
+
+        assert written == {user_id}
+
+    def test_middleware_stamps_responses_to_writes(self, replicated_db, monkeypatch):
+        monkeypatch.setattr(middleware, "db", replicated_db)
+        app = FastAPI()
+        app.add_middleware(ReadYourWritesMiddleware)
+
+        @app.post("/write")
+        def write():
+            return {"user_id": write_user(replicated_db)}
+
+        @app.get("/read")
+        def read():
+            return {}
+
+        client = TestClient(app)
+        written = client.post("/write")
+        read = client.get("/read")
+
+        assert LAST_WRITE_COOKIE in written.cookies
+        assert abs(float(written.headers[LAST_WRITE_HEADER]) - time.time()) < 60
+        assert LAST_WRITE_HEADER not in read.headers
+
+
+class TestReplicaPoolMetrics:
+
+    def test_pool_gauges_are_labelled_per_replica(self, replicated_db):
+        for _ in range(2):
+            session = replicated_db.get_read_session()
+            session.execute(text("SELECT 1"))
+            session.close()
+
+        for pool in ("replica_0", "replica_1"):
+            for gauge in ("db_connection_pool_size", "db_connection_pool_checked_out", "db_connection_pool_overflow"):
+                assert REGISTRY.get_sample_value(gauge, {"pool": pool}) is not None
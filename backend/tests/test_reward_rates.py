@@ -0,0 +1,109 @@
+"""
+Tests for the normalized card_reward_rates table and SQL-side best-card ranking
+"""
+
+import pytest
+
+from agents import agentic_system
+from crud import (
+    create_credit_card, update_card, bulk_upsert_credit_cards, add_user_credit_card,
+    deactivate_user_credit_card, rebuild_card_reward_rates, get_best_cards
+)
+from models import CardRewardRate, CardIssuerEnum
+
+
+def rates_of(db, card_id):
+    return {
+        rate.category: (rate.cash_back_rate, rate.points_multiplier)
+        for rate in db.query(CardRewardRate).filter(CardRewardRate.card_id == card_id)
+    }
+
+
+@pytest.fixture
+def wallet(test_db, db_user):
+    """Three wallet cards: cash back, travel points, and a flat card"""
+    specs = [
+        ("Cash Card", {"dining": 0.04, "other": 0.01}, {"other": 1.0}),
+        ("Points Card", {"other": 0.0}, {"travel": 5.0, "dining": 3.0, "other": 1.0}),
+        ("Flat Card", {"other": 0.02}, {"other": 0.0}),
+    ]
+    cards = {}
+    for name, cash_back_rate, points_multiplier in specs:
+        card = create_credit_card(
+            test_db, user_id=db_user.user_id, card_name=name, issuer=CardIssuerEnum.OTHER,
+            cash_back_rate=cash_back_rate, points_multiplier=points_multiplier
+        )
+        add_user_credit_card(test_db, db_user.user_id, card.card_id)
+        cards[name] = card
+    return cards
+
+
+class TestRewardRateSync:
+
+    def test_create_writes_one_row_per_category(self, test_db, wallet):
+        assert rates_of(test_db, wallet["Cash Card"].card_id) == {
+            "dining": (0.04, None),
+            "other": (0.01, 1.0),
+        }
+
+    def test_update_replaces_rows(self, test_db, wallet):
+        card_id = wallet["Flat Card"].card_id
+        update_card(test_db, card_id, cash_back_rate={"gas": 0.05, "other": 0.015})
+
+        assert rates_of(test_db, card_id) == {"gas": (0.05, None), "other": (0.015, 0.0)}
+
+    def test_bulk_upsert_keeps_rates_in_sync(self, test_db, db_user):
+        card = {"card_name": "Bulk Card", "issuer": CardIssuerEnum.CITI,
+                "cash_back_rate": {"other": 0.01}, "points_multiplier": {"other": 1.0}}
+        [card_id] = bulk_upsert_credit_cards(test_db, db_user.user_id, [card])
+        bulk_upsert_credit_cards(test_db, db_user.user_id, [{**card, "cash_back_rate": {"groceries": 0.03}}])
+        test_db.commit()
+
+        assert rates_of(test_db, card_id) == {"groceries": (0.03, None), "other": (None, 1.0)}
+
+    def test_rebuild_matches_incremental_sync(self, test_db, wallet):
+        before = {name: rates_of(test_db, card.card_id) for name, card in wallet.items()}
+        rebuild_card_reward_rates(test_db)
+
+        assert {name: rates_of(test_db, card.card_id) for name, card in wallet.items()} == before
+
+
+class TestBestCards:
+
+    @pytest.mark.parametrize("category,goal", [
+        ("dining", "cash_back"), ("travel", "travel_points"), ("gas", "cash_back"), ("dining", "balanced"),
+    ])
+    def test_ranking_matches_agent_scoring(self, test_db, db_user, wallet, category, goal):
+        ranked = get_best_cards(test_db, db_user.user_id, category, goal, limit=3)
+
+        def agent_value(card):
+            card_dict = {"card_name": card.card_name, "cash_back_rate": card.cash_back_rate,
+                         "points_multiplier": card.points_multiplier, "benefits": []}
+            return agentic_system.calculate_card_value(card_dict, 100.0, category, goal)[0]
+
+        expected = sorted(wallet.values(), key=lambda c: (-agent_value(c), c.card_name))
+        assert [row["card_name"] for row in ranked] == [card.card_name for card in expected]
+        assert ranked[0]["score"] * 100 == pytest.approx(agent_value(expected[0]))
+
+    def test_missing_category_falls_back_to_other(self, test_db, db_user, wallet):
+        rows = get_best_cards(test_db, db_user.user_id, "gas", "cash_back", limit=3)
+        by_name = {row["card_name"]: row for row in rows}
+
+        assert by_name["Cash Card"]["cash_back_rate"] == 0.01
+        assert by_name["Points Card"]["points_multiplier"] == 1.0
+
+    def test_inactive_wallet_cards_are_excluded(self, test_db, db_user, wallet):
+        [best] = get_best_cards(test_db, db_user.user_id, "dining", "cash_back")
+        deactivate_user_credit_card(test_db, best["user_card_id"])
+
+        [next_best] = get_best_cards(test_db, db_user.user_id, "dining", "cash_back")
+        assert next_best["card_id"] != best["card_id"]
+
+    def test_endpoint(self, test_client, db_user, wallet):
+        response = test_client.get(
+            f"/api/v1/users/{db_user.user_id}/cards/best",
+            params={"category": "travel", "goal": "travel_points", "limit": 2}
+        )
+
+        assert response.status_code == 200
+        assert [card["card_name"] for card in response.json()["cards"]] == ["Points Card", "Cash Card"]
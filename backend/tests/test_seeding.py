@@ -0,0 +1,153 @@
+"""
+Tests for bulk, idempotent seeding of the card library and merchants
+"""
+
+import json
+import os
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+from crud import (
+    create_user, create_credit_card, add_user_credit_card, create_credit_cards_from_library,
+    bulk_upsert_credit_cards, bulk_upsert_merchants, seed_checksum, is_seed_current, mark_seed_applied
+)
+from models import Base, CreditCard, UserCreditCard, Merchant, CardIssuerEnum, CategoryEnum, OptimizationGoalEnum
+from scripts.migrate_query_indexes import merge_duplicate_cards
+
+
+LIBRARY_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "seed_data", "card_library.json"
+)
+
+
+def user_card_count(db, user_id):
+    return db.query(CreditCard).filter(CreditCard.user_id == user_id).count()
+
+
+class TestCardLibrarySeeding:
+
+    def test_seeds_every_library_card_once(self, test_db, db_user):
+        with open(LIBRARY_PATH, encoding="utf-8") as f:
+            library_size = len({(c["card_name"], c.get("issuer")) for c in json.load(f)})
+
+        cards = create_credit_cards_from_library(test_db, db_user.user_id)
+
+        assert len(cards) == library_size
+        assert user_card_count(test_db, db_user.user_id) == library_size
+
+    def test_unchanged_file_is_skipped(self, test_db, db_user):
+        create_credit_cards_from_library(test_db, db_user.user_id)
+
+        assert create_credit_cards_from_library(test_db, db_user.user_id) == []
+
+    def test_forced_reseed_does_not_duplicate(self, test_db, db_user):
+        first = {c.card_id for c in create_credit_cards_from_library(test_db, db_user.user_id)}
+        second = {c.card_id for c in create_credit_cards_from_library(test_db, db_user.user_id, force=True)}
+
+        assert first == second
+        assert user_card_count(test_db, db_user.user_id) == len(first)
+
+    def test_upsert_keeps_card_id_and_updates_rates(self, test_db, db_user):
+        card = {
+            "card_name": "Seed Card", "issuer": CardIssuerEnum.CITI,
+            "cash_back_rate": {"other": 0.01}, "points_multiplier": {"other": 1.0}
+        }
+        [card_id] = bulk_upsert_credit_cards(test_db, db_user.user_id, [card])
+        test_db.commit()
+
+        [again] = bulk_upsert_credit_cards(
+            test_db, db_user.user_id, [{**card, "cash_back_rate": {"other": 0.02}}]
+        )
+        test_db.commit()
+        test_db.expire_all()
+
+        assert again == card_id
+        assert test_db.get(CreditCard, card_id).cash_back_rate == {"other": 0.02}
+
+
+    def test_conflicts_on_name_and_issuer_not_a_preselect(self, test_db, db_user):
+        existing = create_credit_card(
+            test_db, user_id=db_user.user_id, card_name="Raced Card", issuer=CardIssuerEnum.CHASE,
+            cash_back_rate={"other": 0.01}, points_multiplier={"other": 1.0}
+        )
+        card = {
+            "card_name": "Raced Card", "issuer": CardIssuerEnum.CHASE,
+            "cash_back_rate": {"other": 0.02}, "points_multiplier": {"other": 1.0}
+        }
+
+        # Inserted after any lookup a concurrent seed run could have made
+        assert bulk_upsert_credit_cards(test_db, db_user.user_id, [card, card]) == [existing.card_id]
+        test_db.commit()
+        assert user_card_count(test_db, db_user.user_id) == 1
+
+        with pytest.raises(IntegrityError):
+            create_credit_card(
+                test_db, user_id=db_user.user_id, card_name="Raced Card", issuer=CardIssuerEnum.CHASE,
+                cash_back_rate={}, points_multiplier={}
+            )
+        test_db.rollback()
+
+    def test_duplicates_from_before_the_unique_index_are_merged(self, tmp_path):
+        engine = create_engine(f"sqlite:///{tmp_path / 'duplicates.db'}")
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as connection:
+            connection.execute(text("DROP INDEX idx_card_user_name_issuer"))
+        session = sessionmaker(bind=engine, expire_on_commit=False)()
+        owner = create_user(
+            session, email="owner@example.com", full_name="Owner", password_hash="hashed",
+            default_optimization_goal=OptimizationGoalEnum.CASH_BACK
+        )
+        oldest, *copies = [
+            create_credit_card(
+                session, user_id=owner.user_id, card_name="Seeded Twice", issuer=CardIssuerEnum.CITI,
+                cash_back_rate={}, points_multiplier={}, created_at=datetime(2026, 1, 1) + timedelta(days=i)
+            ).card_id
+            for i in range(3)
+        ]
+        add_user_credit_card(session, owner.user_id, copies[0])
+        add_user_credit_card(session, owner.user_id, copies[1])  # Already holds a copy: dropped
+
+        assert merge_duplicate_cards(session) == 2
+        assert [card.card_id for card in session.query(CreditCard).all()] == [oldest]
+        assert [row.card_id for row in session.query(UserCreditCard).all()] == [oldest]
+        session.close()
+        engine.dispose()
+
+
+class TestMerchantSeeding:
+
+    def test_upsert_inserts_then_updates_by_name(self, test_db):
+        name = f"Seed Merchant {uuid.uuid4().hex[:8]}"
+        bulk_upsert_merchants(test_db, [{"merchant_name": name, "primary_category": "dining"}])
+        test_db.commit()
+
+        count = bulk_upsert_merchants(test_db, [
+            {"merchant_name": name, "primary_category": "groceries", "secondary_categories": ["organic"]},
+            {"merchant_name": name, "primary_category": "shopping"},
+        ])
+        test_db.commit()
+        test_db.expire_all()
+
+        merchants = test_db.query(Merchant).filter(Merchant.merchant_name == name).all()
+        assert count == 1
+        assert len(merchants) == 1
+        assert merchants[0].primary_category == CategoryEnum.SHOPPING
+
+
+class TestSeedChecksums:
+
+    def test_checksum_round_trip(self, test_db):
+        seed_name = f"test_seed:{uuid.uuid4().hex[:8]}"
+        checksum = seed_checksum(b"[1, 2, 3]")
+
+        assert not is_seed_current(test_db, seed_name, checksum)
+        mark_seed_applied(test_db, seed_name, checksum, 3)
+        test_db.commit()
+
+        assert is_seed_current(test_db, seed_name, checksum)
+        assert not is_seed_current(test_db, seed_name, seed_checksum(b"[1, 2]"))
@@ -0,0 +1,252 @@
+"""
+Tests for user-sharded routing in database.Database and the sharding helpers
+(SQLite files stand in for the global shard and three user shards)
+"""
+
+import asyncio
+import json
+import uuid
+
+import pytest
+from fastapi import Request
+from sqlalchemy import delete, func, select
+
+from crud import (
+    create_user, create_credit_card, add_user_credit_card, create_transaction, get_business_counters,
+    USERS_COUNTER, WALLET_CARDS_COUNTER
+)
+from database import Database, get_user_db, shard_for_user
+import database as database_module
+from models import (
+    User, CreditCard, CardRewardRate, UserCreditCard, Transaction, UserBehavior, UserDailyRollup,
+    CardIssuerEnum, CategoryEnum, OptimizationGoalEnum
+)
+from scripts import backfill_rollups
+from sharding import copy_card_library, move_user, resident_users
+
+
+@pytest.fixture
+def sharded_db(tmp_path, monkeypatch):
+    """A Database with a global shard and three user shard SQLite files"""
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'global.db'}")
+    monkeypatch.delenv("ASYNC_DATABASE_URL", raising=False)
+    monkeypatch.delenv("DATABASE_REPLICA_URLS", raising=False)
+    monkeypatch.setenv("DATABASE_SHARD_URLS", ",".join(
+        f"sqlite:///{tmp_path / f'shard_{i}.db'}" for i in range(3)
+    ))
+
+    database = Database()
+    database.create_tables()
+    yield database
+    database.close()
+
+
+def bound_url(session):
+    return str(session.get_bind().url)
+
+
+def new_user(session):
+    return create_user(
+        session,
+        user_id=f"user_{uuid.uuid4().hex[:12]}",
+        email=f"shard_{uuid.uuid4().hex[:8]}@example.com",
+        full_name="Shard Test User",
+        password_hash="not-a-real-hash",
+        default_optimization_goal=OptimizationGoalEnum.CASH_BACK
+    )
+
+
+def library_card(database):
+    """A card in the global library, owned by a user of the global shard"""
+    with database.session_scope() as session:
+        owner = new_user(session)
+        return create_credit_card(
+            session, user_id=owner.user_id, card_name="Shared Card", issuer=CardIssuerEnum.OTHER,
+            cash_back_rate={"dining": 0.03, "other": 0.01}, points_multiplier={"other": 1.0}
+        )
+
+
+def resolve_user_db(database, monkeypatch, scope):
+    """Run the get_user_db dependency for a request scope and return the bound URL"""
+    monkeypatch.setattr(database_module, "db", database)
+    body = scope.pop("body", b"")
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def resolve():
+        dependency = get_user_db(Request({"type": "http", "query_string": b"", "headers": [], **scope}, receive))
+        session = await dependency.__anext__()
+        url = bound_url(session)
+        await dependency.aclose()
+        return url
+
+    return asyncio.run(resolve())
+
+
+class TestShardHash:
+
+    def test_hash_is_stable_and_spread(self):
+        user_ids = [f"user_{i:012x}" for i in range(3000)]
+        shards = [shard_for_user(user_id, 3) for user_id in user_ids]
+
+        assert shards == [shard_for_user(user_id, 3) for user_id in user_ids]
+        for shard in range(3):
+            assert 800 < shards.count(shard) < 1200
+
+    def test_adding_a_shard_only_moves_users_onto_it(self):
+        user_ids = [f"user_{i:012x}" for i in range(3000)]
+        moved = [user_id for user_id in user_ids if shard_for_user(user_id, 3) != shard_for_user(user_id, 4)]
+
+        assert all(shard_for_user(user_id, 4) == 3 for user_id in moved)
+        assert 600 < len(moved) < 900
+
+
+class TestShardRouting:
+
+    def test_sessions_route_by_user(self, sharded_db):
+        user_id = "user_0123456789ab"
+        shard_url = sharded_db.config.SHARD_URLS[sharded_db.shard_index(user_id)]
+
+        for session in (sharded_db.get_shard_session(user_id), sharded_db.get_read_session(user_id)):
+            assert bound_url(session) == shard_url
+            session.close()
+        # Without a user (card library, merchants) the global shard answers
+        session = sharded_db.get_read_session()
+        assert bound_url(session) == sharded_db.config.DATABASE_URL
+        session.close()
+
+    def test_dependency_reads_user_from_path_query_and_body(self, sharded_db, monkeypatch):
+        user_id = "user_ba9876543210"
+        shard_url = sharded_db.config.SHARD_URLS[sharded_db.shard_index(user_id)]
+
+        assert resolve_user_db(sharded_db, monkeypatch, {"path_params": {"user_id": user_id}}) == shard_url
+        assert resolve_user_db(sharded_db, monkeypatch, {
+            "path_params": {"user_card_id": "7"}, "query_string": f"user_id={user_id}".encode()
+        }) == shard_url
+        assert resolve_user_db(sharded_db, monkeypatch, {
+            "method": "POST", "headers": [(b"content-type", b"application/json")],
+            "body": json.dumps({"user_id": user_id, "amount": 12.5}).encode()
+        }) == shard_url
+        assert resolve_user_db(sharded_db, monkeypatch, {}) == sharded_db.config.DATABASE_URL
+
+    def test_tables_exist_on_every_shard(self, sharded_db):
+        for engine in sharded_db.shard_engines:
+            with engine.connect() as connection:
+                assert engine.dialect.has_table(connection, "user_credit_cards")
+
+
+class TestShardMaintenance:
+
+    def test_library_is_copied_to_shards(self, sharded_db):
+        card = library_card(sharded_db)
+
+        with sharded_db.session_scope() as source:
+            for shard_sessionmaker in sharded_db.ShardSessionLocals:
+                with shard_sessionmaker() as target:
+                    assert copy_card_library(source, target) == 1
+                    # Re-copying replaces instead of duplicating
+                    assert copy_card_library(source, target, [card.card_id]) == 1
+                    assert target.get(CreditCard, card.card_id).card_name == "Shared Card"
+                    assert target.execute(
+                        select(func.count()).where(CardRewardRate.card_id == card.card_id)
+                    ).scalar() == 2
+                    # The owner is a library copy, not a resident of the shard
+                    assert resident_users(target) == []
+
+    def test_move_user_takes_all_rows_and_counters(self, sharded_db):
+        card = library_card(sharded_db)
+        source_session, target_session = (session() for session in sharded_db.ShardSessionLocals[:2])
+        with sharded_db.session_scope() as library:
+            for target in (source_session, target_session):
+                copy_card_library(library, target)
+
+        user = new_user(source_session)
+        add_user_credit_card(source_session, user.user_id, card.card_id, nickname="Daily")
+        create_transaction(
+            source_session, user_id=user.user_id, merchant="Cafe", amount=9.5,
+            category=CategoryEnum.DINING, optimization_goal=OptimizationGoalEnum.CASH_BACK, card_id=card.card_id
+        )
+
+        moved = move_user(source_session, target_session, user.user_id)
+
+        assert moved["users"] == 1 and moved["transactions"] == 1 and moved["user_credit_cards"] == 1
+        for model in (User, UserBehavior, UserCreditCard, Transaction):
+            assert source_session.execute(select(model).where(model.user_id == user.user_id)).first() is None
+            assert target_session.execute(select(model).where(model.user_id == user.user_id)).first() is not None
+        assert target_session.execute(
+            select(UserCreditCard.nickname).where(UserCreditCard.user_id == user.user_id)
+        ).scalar() == "Daily"
+        assert resident_users(target_session) == [user.user_id]
+
+        source_counters, target_counters = get_business_counters(source_session), get_business_counters(target_session)
+        assert source_counters[USERS_COUNTER] == 0 and target_counters[USERS_COUNTER] == 1
+        assert target_counters[WALLET_CARDS_COUNTER] == 1
+        assert target_counters["transactions:dining"] == 1
+
+        source_session.close()
+        target_session.close()
+
+    def test_interrupted_move_can_be_re_run(self, sharded_db):
+        card = library_card(sharded_db)
+        source_session, target_session = (session() for session in sharded_db.ShardSessionLocals[:2])
+        with sharded_db.session_scope() as library:
+            for target in (source_session, target_session):
+                copy_card_library(library, target)
+
+        user = new_user(source_session)
+        add_user_credit_card(source_session, user.user_id, card.card_id, nickname="Daily")
+        create_transaction(
+            source_session, user_id=user.user_id, merchant="Cafe", amount=9.5,
+            category=CategoryEnum.DINING, optimization_goal=OptimizationGoalEnum.CASH_BACK, card_id=card.card_id
+        )
+
+        # The target commits, then the source delete fails
+        def fail_commit():
+            raise RuntimeError("source shard went away")
+
+        source_session.commit = fail_commit
+        with pytest.raises(RuntimeError):
+            move_user(source_session, target_session, user.user_id)
+        del source_session.commit
+        source_session.rollback()
+
+        moved = move_user(source_session, target_session, user.user_id)
+
+        assert moved["users"] == 1 and moved["user_credit_cards"] == 1
+        for model in (User, UserBehavior, UserCreditCard, Transaction):
+            assert source_session.execute(select(model).where(model.user_id == user.user_id)).first() is None
+            assert target_session.execute(
+                select(func.count()).select_from(model).where(model.user_id == user.user_id)
+            ).scalar() == 1
+        source_counters, target_counters = get_business_counters(source_session), get_business_counters(target_session)
+        assert source_counters[USERS_COUNTER] == 0 and target_counters[USERS_COUNTER] == 1
+        assert target_counters[WALLET_CARDS_COUNTER] == 1
+
+        # Nothing left to move
+        assert move_user(source_session, target_session, user.user_id) == {}
+
+        source_session.close()
+        target_session.close()
+
+    def test_maintenance_scripts_run_on_every_shard(self, sharded_db, monkeypatch):
+        monkeypatch.setattr(backfill_rollups, "db", sharded_db)
+        user_ids = []
+        for shard_sessionmaker in sharded_db.ShardSessionLocals:
+            with shard_sessionmaker() as session:
+                user = new_user(session)
+                create_transaction(
+                    session, user_id=user.user_id, merchant="Cafe", amount=9.5,
+                    category=CategoryEnum.DINING, optimization_goal=OptimizationGoalEnum.CASH_BACK
+                )
+                session.execute(delete(UserDailyRollup))
+                session.commit()
+                user_ids.append(user.user_id)
+
+        backfill_rollups.backfill_rollups()
+
+        for shard_sessionmaker, user_id in zip(sharded_db.ShardSessionLocals, user_ids):
+            with shard_sessionmaker() as session:
+                assert session.execute(
+                    select(func.count()).select_from(UserDailyRollup).where(UserDailyRollup.user_id == user_id)
+                ).scalar() == 1
@@ -0,0 +1,79 @@
+"""
+Tests for per-route statement timeouts and their mapping to 503 responses
+"""
+
+import pytest
+from fastapi import Request
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+import main
+from database import db, get_user_db, is_statement_timeout, STATEMENT_TIMEOUT_MS
+
+
+# Counts to 50 million: seconds of work, well past the test timeouts
+SLOW_QUERY = text(
+    "WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n WHERE x < 50000000) "
+    "SELECT count(*) FROM n"
+)
+
+
+@pytest.fixture
+def timed_sessions(test_engine):
+    """Sessions on the test database with the application's timeout listeners"""
+    engine = create_engine(test_engine.url)
+    db._setup_query_timing(engine)
+    db._setup_statement_timeouts(engine)
+    yield sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    engine.dispose()
+
+
+def timeout_errors():
+    return REGISTRY.get_sample_value(
+        "db_queries_total", {"operation": "other", "table": "n", "status": "error"}
+    ) or 0
+
+
+def test_slow_statement_is_cancelled_and_counted(timed_sessions):
+    errors_before = timeout_errors()
+
+    session = timed_sessions(info={STATEMENT_TIMEOUT_MS: 50})
+    with pytest.raises(OperationalError) as error:
+        session.execute(SLOW_QUERY)
+    session.close()
+
+    assert is_statement_timeout(error.value)
+    assert timeout_errors() == errors_before + 1
+
+    # The connection goes back to the pool without the deadline
+    with timed_sessions() as session:
+        assert session.execute(text("SELECT count(*) FROM (SELECT 1 UNION ALL SELECT 2)")).scalar() == 2
+
+
+def test_route_timeout_maps_to_503(test_client, db_user, timed_sessions, monkeypatch):
+    monkeypatch.setitem(db.config.STATEMENT_TIMEOUTS_MS, "analytics", 50)
+    monkeypatch.setitem(db.config.STATEMENT_TIMEOUTS_MS, "default", 0)
+
+    def timed_db(request: Request):
+        session = timed_sessions()
+        db.apply_statement_timeout(session, request)
+        try:
+            yield session
+        finally:
+            session.close()
+
+    def slow_stats(session, user_id):
+        assert session.info[STATEMENT_TIMEOUT_MS] == 50
+        return session.execute(SLOW_QUERY).scalar()
+
+    main.app.dependency_overrides[get_user_db] = timed_db
+    monkeypatch.setattr(main, "calculate_transaction_stats", slow_stats)
+
+    response = test_client.get(f"/api/v1/users/{db_user.user_id}/stats")
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "2"
+    # A route without a timeout class keeps the (disabled) default
+    assert test_client.get(f"/api/v1/users/{db_user.user_id}/profile").status_code == 200
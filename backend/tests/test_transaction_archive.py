@@ -0,0 +1,130 @@
+"""
+Tests for the columnar transaction archive and its merge into get_user_analytics
+"""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from sqlalchemy import select, func
+
+from crud import (
+    create_credit_card, create_transaction, get_user_analytics, calculate_transaction_stats,
+    rebuild_user_daily_rollups
+)
+from models import Transaction, CategoryEnum, OptimizationGoalEnum, CardIssuerEnum
+from transaction_archive import transaction_archive, archive_cutoff
+
+
+@pytest.fixture
+def archive_root(tmp_path, monkeypatch):
+    monkeypatch.setattr(transaction_archive, "root", str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def history(test_db, db_user):
+    """Transactions spread over two years: half of them older than the archive cutoff"""
+    cards = [
+        create_credit_card(
+            test_db, user_id=db_user.user_id, card_name=name, issuer=CardIssuerEnum.OTHER,
+            cash_back_rate={"other": 0.01}, points_multiplier={"other": 1.0}
+        ).card_id
+        for name in ("Archive Card A", "Archive Card B")
+    ]
+    specs = [
+        ("Old Grocer", CategoryEnum.GROCERIES, cards[0], 120.25, 600),
+        ("Old Grocer", CategoryEnum.GROCERIES, cards[0], 80.50, 500),
+        ("Old Airline", CategoryEnum.TRAVEL, cards[1], 450.00, 400),
+        ("Old Diner", CategoryEnum.DINING, None, 35.75, 380),
+        ("New Diner", CategoryEnum.DINING, cards[1], 42.10, 200),
+        ("Old Grocer", CategoryEnum.GROCERIES, cards[0], 66.40, 100),
+        ("New Airline", CategoryEnum.TRAVEL, cards[1], 310.00, 10),
+    ]
+    for merchant, category, card_id, amount, days_ago in specs:
+        create_transaction(
+            test_db, user_id=db_user.user_id, merchant=merchant, amount=amount,
+            category=category, optimization_goal=OptimizationGoalEnum.CASH_BACK,
+            card_id=card_id, recommended_card_id=card_id,
+            total_value_earned=round(amount * 0.02, 2), optimal_value=round(amount * 0.03, 2),
+            missed_value=round(amount * 0.01, 2),
+            transaction_date=datetime.utcnow() - timedelta(days=days_ago, hours=5)
+        )
+
+
+def comparable(analytics):
+    """Analytics without the fields that depend on the exact call time"""
+    return {
+        "summary": analytics["summary"],
+        "best_card": analytics["best_card"],
+        "category_breakdown": analytics["category_breakdown"],
+        "top_merchants": analytics["top_merchants"],
+        "weeks": [(week["transaction_count"], week["total_spent"]) for week in analytics["weekly_trends"]],
+    }
+
+
+def count_transactions(db, user_id):
+    db.expire_all()
+    return db.execute(select(func.count(Transaction.transaction_id)).where(Transaction.user_id == user_id)).scalar()
+
+
+def test_analytics_unchanged_after_archiving(test_db, db_user, history, archive_root):
+    user_id = db_user.user_id
+    before = {days: comparable(get_user_analytics(test_db, user_id, days=days)) for days in (30, 450, 730)}
+
+    moved = transaction_archive.archive(test_db, cutoff=archive_cutoff(), user_id=user_id)
+
+    assert moved == {user_id: 4}
+    assert count_transactions(test_db, user_id) == 3
+    for days, expected in before.items():
+        assert comparable(get_user_analytics(test_db, user_id, days=days)) == expected
+
+
+def test_archive_columns_are_memory_mapped_and_sorted(test_db, db_user, history, archive_root):
+    user_id = db_user.user_id
+    transaction_archive.archive(test_db, cutoff=archive_cutoff(), user_id=user_id)
+
+    manifest = transaction_archive.read_manifest(user_id)
+    columns = transaction_archive.open_columns(user_id, manifest["generation"])
+
+    assert manifest["rows"] == 4
+    assert isinstance(columns["amount"], np.memmap)
+    assert np.all(np.diff(columns["transaction_date"]) >= 0)
+    assert columns["merchant"].dtype == np.int32
+
+
+def test_interrupted_run_is_repeated_without_duplicates(test_db, db_user, history, archive_root):
+    user_id = db_user.user_id
+    expected = comparable(get_user_analytics(test_db, user_id, days=730))
+    old_row = test_db.execute(
+        select(Transaction).where(Transaction.user_id == user_id).order_by(Transaction.transaction_date).limit(1)
+    ).scalar_one()
+    leftover = {column.name: getattr(old_row, column.name) for column in Transaction.__table__.columns}
+
+    transaction_archive.archive(test_db, cutoff=archive_cutoff(), user_id=user_id)
+    # Crash between the manifest switch and the DELETE: the row is in both places
+    test_db.add(Transaction(**leftover))
+    test_db.commit()
+
+    assert comparable(get_user_analytics(test_db, user_id, days=730)) == expected
+    assert transaction_archive.archive(test_db, cutoff=archive_cutoff(), user_id=user_id) == {user_id: 1}
+    assert transaction_archive.read_manifest(user_id)["rows"] == 4
+    assert comparable(get_user_analytics(test_db, user_id, days=730)) == expected
+
+
+def test_users_without_archive_are_unaffected(test_db, db_user, archive_root):
+    assert transaction_archive.aggregate(db_user.user_id, datetime.utcnow() - timedelta(days=30), datetime.utcnow()) is None
+    assert transaction_archive.archive(test_db, cutoff=archive_cutoff(), user_id=db_user.user_id) == {}
+
+
+def test_rollup_rebuild_keeps_archived_days(test_db, db_user, history, archive_root):
+    user_id = db_user.user_id
+    expected = calculate_transaction_stats(test_db, user_id)
+
+    transaction_archive.archive(test_db, cutoff=archive_cutoff(), user_id=user_id)
+    rebuild_user_daily_rollups(test_db, user_id)
+    assert calculate_transaction_stats(test_db, user_id) == expected
+
+    rebuild_user_daily_rollups(test_db)
+    assert calculate_transaction_stats(test_db, user_id) == expected
+    assert expected["total_transactions"] == 7
@@ -0,0 +1,112 @@
+"""
+Tests for bulk CSV / NDJSON transaction import
+"""
+
+import json
+
+import pytest
+
+from crud import create_credit_card, add_user_credit_card, calculate_transaction_stats
+from models import Transaction, UserDailyRollup, CardIssuerEnum, CategoryEnum
+
+
+@pytest.fixture
+def wallet_user(test_db, db_user):
+    """User holding a flat 1% card and a 3% dining card"""
+    flat = create_credit_card(
+        test_db, user_id=db_user.user_id, card_name="Flat Card", issuer=CardIssuerEnum.CITI,
+        cash_back_rate={"other": 0.01}, points_multiplier={"other": 0.0}
+    )
+    dining = create_credit_card(
+        test_db, user_id=db_user.user_id, card_name="Dining Card", issuer=CardIssuerEnum.CHASE,
+        cash_back_rate={"dining": 0.03, "other": 0.01}, points_multiplier={"other": 0.0}
+    )
+    add_user_credit_card(test_db, db_user.user_id, flat.card_id, nickname="Everyday")
+    add_user_credit_card(test_db, db_user.user_id, dining.card_id)
+    db_user.flat_card_id = flat.card_id
+    db_user.dining_card_id = dining.card_id
+    return db_user
+
+
+def imported(test_db, user_id):
+    return test_db.query(Transaction).filter(Transaction.user_id == user_id).order_by(Transaction.amount).all()
+
+
+class TestTransactionImport:
+
+    def test_csv_import_scores_rows(self, test_client, test_db, wallet_user):
+        body = (
+            "date,merchant,amount,category,card\n"
+            "2026-01-05,Chipotle,100.00,dining,Everyday\n"
+            "2026-01-06T09:30:00,Shell,40,gas,Dining Card\n"
+        )
+        response = test_client.post(
+            f"/api/v1/users/{wallet_user.user_id}/transactions/import",
+            content=body, headers={"Content-Type": "text/csv"}
+        )
+
+        assert response.status_code == 200
+        report = response.json()
+        assert report["rows_imported"] == 2
+        assert report["rows_failed"] == 0
+        assert report["rows_per_second"] > 0
+
+        shell, chipotle = imported(test_db, wallet_user.user_id)
+        assert chipotle.card_id == wallet_user.flat_card_id
+        assert chipotle.recommended_card_id == wallet_user.dining_card_id
+        assert chipotle.used_recommended_card is False
+        assert chipotle.total_value_earned == pytest.approx(1.0)
+        assert chipotle.optimal_value == pytest.approx(3.0)
+        assert chipotle.missed_value == pytest.approx(2.0)
+        assert shell.missed_value == pytest.approx(0.0)
+
+    def test_ndjson_reports_bad_rows_and_keeps_good_ones(self, test_client, test_db, wallet_user):
+        lines = [
+            {"merchant": "Target", "amount": 25, "category": "shopping", "card_id": wallet_user.flat_card_id},
+            {"merchant": "Nowhere", "amount": -5},
+            "not json",
+            {"merchant": "Delta", "amount": 300, "category": "space travel"},
+            {"merchant": "Stolen", "amount": 10, "card_id": "card_missing"},
+        ]
+        body = "\n".join(line if isinstance(line, str) else json.dumps(line) for line in lines)
+
+        response = test_client.post(
+            f"/api/v1/users/{wallet_user.user_id}/transactions/import",
+            content=body, headers={"Content-Type": "application/x-ndjson"}
+        )
+
+        report = response.json()
+        assert report["rows_received"] == 5
+        assert report["rows_imported"] == 1
+        assert [e["line"] for e in report["errors"]] == [2, 3, 4, 5]
+        assert [t.merchant for t in imported(test_db, wallet_user.user_id)] == ["Target"]
+
+    def test_small_batches_update_rollups(self, test_client, test_db, wallet_user):
+        body = "merchant,amount,category\n" + "".join(f"Store {i},10,groceries\n" for i in range(7))
+
+        report = test_client.post(
+            f"/api/v1/users/{wallet_user.user_id}/transactions/import",
+            params={"format": "csv", "batch_size": 3}, content=body
+        ).json()
+
+        assert report["batches"] == 3
+        rollup_count = test_db.query(UserDailyRollup.transaction_count).filter(
+            UserDailyRollup.user_id == wallet_user.user_id,
+            UserDailyRollup.category == CategoryEnum.GROCERIES
+        ).scalar()
+        assert rollup_count == 7
+        assert calculate_transaction_stats(test_db, wallet_user.user_id)["total_spent"] == pytest.approx(70.0)
+
+    def test_unsupported_format_is_415(self, test_client, wallet_user):
+        response = test_client.post(
+            f"/api/v1/users/{wallet_user.user_id}/transactions/import",
+            content="<xml/>", headers={"Content-Type": "application/xml"}
+        )
+        assert response.status_code == 415
+
+    def test_unknown_user_is_404(self, test_client):
+        response = test_client.post(
+            "/api/v1/users/user_missing/transactions/import",
+            content="merchant,amount\n", headers={"Content-Type": "text/csv"}
+        )
+        assert response.status_code == 404
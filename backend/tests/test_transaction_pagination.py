@@ -0,0 +1,124 @@
+"""
+Tests for keyset (cursor) pagination of transaction history
+"""
+
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from crud import (
+    get_user_transactions_page, encode_transaction_cursor, decode_transaction_cursor, MAX_TRANSACTIONS_PAGE_SIZE
+)
+from models import Transaction, CategoryEnum, OptimizationGoalEnum
+
+
+@pytest.fixture
+def history(test_db, db_user):
+    """25 transactions; pairs share a timestamp to exercise the id tie-breaker"""
+    base = datetime(2026, 1, 31, 12, 0, 0)
+    for i in range(25):
+        test_db.add(Transaction(
+            transaction_id=f"txn_{uuid.uuid4().hex[:12]}",
+            user_id=db_user.user_id,
+            merchant=f"Store {i}",
+            amount=10.0 + i,
+            category=CategoryEnum.DINING if i % 2 else CategoryEnum.GAS,
+            optimization_goal=OptimizationGoalEnum.CASH_BACK,
+            transaction_date=base - timedelta(days=i // 2)
+        ))
+    test_db.commit()
+    return db_user
+
+
+def ordered_ids(db, user_id, **filters):
+    query = db.query(Transaction).filter(Transaction.user_id == user_id)
+    if 'category' in filters:
+        query = query.filter(Transaction.category == filters['category'])
+    rows = query.all()
+    rows.sort(key=lambda t: (t.transaction_date, t.transaction_id), reverse=True)
+    return [t.transaction_id for t in rows]
+
+
+def collect_pages(db, user_id, limit, **filters):
+    pages, cursor = [], None
+    while True:
+        page, cursor = get_user_transactions_page(db, user_id, limit=limit, cursor=cursor, **filters)
+        pages.append([t.transaction_id for t in page])
+        if cursor is None:
+            return pages
+
+
+class TestKeysetPagination:
+
+    def test_pages_cover_history_in_order(self, test_db, history):
+        pages = collect_pages(test_db, history.user_id, limit=10)
+
+        assert [len(p) for p in pages] == [10, 10, 5]
+        assert sum(pages, []) == ordered_ids(test_db, history.user_id)
+
+    def test_exact_multiple_has_no_trailing_empty_page(self, test_db, history):
+        pages = collect_pages(test_db, history.user_id, limit=25)
+        assert [len(p) for p in pages] == [25]
+
+    def test_category_filter(self, test_db, history):
+        pages = collect_pages(test_db, history.user_id, limit=4, category=CategoryEnum.DINING)
+
+        assert sum(pages, []) == ordered_ids(test_db, history.user_id, category=CategoryEnum.DINING)
+
+    def test_date_filter(self, test_db, history):
+        page, cursor = get_user_transactions_page(
+            test_db, history.user_id, limit=50,
+            start_date=datetime(2026, 1, 29), end_date=datetime(2026, 1, 30, 23, 59)
+        )
+        assert len(page) == 4
+        assert cursor is None
+
+    def test_cursor_round_trip(self, test_db, history):
+        txn = test_db.query(Transaction).filter(Transaction.user_id == history.user_id).first()
+        assert decode_transaction_cursor(encode_transaction_cursor(txn)) == (
+            txn.transaction_date, txn.transaction_id
+        )
+
+    def test_invalid_cursor(self, test_db, history):
+        with pytest.raises(ValueError):
+            get_user_transactions_page(test_db, history.user_id, cursor="not-a-cursor")
+
+    @pytest.mark.parametrize("limit", [0, -1, -5, MAX_TRANSACTIONS_PAGE_SIZE + 1])
+    def test_invalid_limit(self, test_db, history, limit):
+        with pytest.raises(ValueError):
+            get_user_transactions_page(test_db, history.user_id, limit=limit)
+
+
+class TestTransactionHistoryEndpoint:
+
+    def test_next_cursor_pages(self, test_client, history):
+        url = f"/api/v1/users/{history.user_id}/transactions"
+        first = test_client.get(url, params={"limit": 20}).json()
+        second = test_client.get(url, params={"limit": 20, "cursor": first["next_cursor"]}).json()
+
+        assert first["total_transactions"] == 20
+        assert second["total_transactions"] == 5
+        assert second["next_cursor"] is None
+        ids = [t["transaction_id"] for t in first["transactions"] + second["transactions"]]
+        assert len(set(ids)) == 25
+
+    def test_category_query_param(self, test_client, history):
+        response = test_client.get(
+            f"/api/v1/users/{history.user_id}/transactions", params={"category": "gas"}
+        )
+        assert response.status_code == 200
+        assert {t["category"] for t in response.json()["transactions"]} == {"gas"}
+
+    def test_bad_cursor_is_400(self, test_client, history):
+        response = test_client.get(
+            f"/api/v1/users/{history.user_id}/transactions", params={"cursor": "%%%"}
+        )
+        assert response.status_code == 400
+
+    @pytest.mark.parametrize("limit", [0, -1, -5, MAX_TRANSACTIONS_PAGE_SIZE + 1])
+    def test_out_of_range_limit_is_422(self, test_client, history, limit):
+        response = test_client.get(
+            f"/api/v1/users/{history.user_id}/transactions", params={"limit": limit}
+        )
+        assert response.status_code == 422
@@ -0,0 +1,187 @@
+"""
+Tests for the write-behind transaction queue (journal, batched flush, replay, backpressure)
+"""
+
+import asyncio
+import json
+import os
+
+import pytest
+from sqlalchemy import select, func
+
+from crud import create_credit_card
+from models import Transaction, CategoryEnum, OptimizationGoalEnum, CardIssuerEnum
+import main
+from transaction_queue import TransactionQueue, QueueFullError, encode_row
+
+
+@pytest.fixture
+def card_id(test_db, db_user):
+    return create_credit_card(
+        test_db, user_id=db_user.user_id, card_name="Queue Card", issuer=CardIssuerEnum.OTHER,
+        cash_back_rate={"other": 0.01}, points_multiplier={"other": 1.0}
+    ).card_id
+
+
+@pytest.fixture
+def journal_path(tmp_path):
+    return str(tmp_path / "transaction_journal.jsonl")
+
+
+def values(user_id, card_id, amount=10.0):
+    return {
+        "user_id": user_id, "merchant": "Queued Merchant", "amount": amount,
+        "category": CategoryEnum.DINING, "optimization_goal": OptimizationGoalEnum.CASH_BACK,
+        "card_id": card_id, "total_value_earned": amount * 0.01
+    }
+
+
+def count_transactions(db, user_id):
+    db.expire_all()
+    return db.execute(
+        select(func.count(Transaction.transaction_id)).where(Transaction.user_id == user_id)
+    ).scalar()
+
+
+def test_flush_inserts_in_batches_and_clears_journal(test_db, db_user, card_id, journal_path, test_async_sessionmaker):
+    queue = TransactionQueue(journal_path=journal_path, flush_max_rows=2, enabled=True)
+
+    async def run():
+        await queue.start(test_async_sessionmaker)
+        for i in range(5):
+            queue.enqueue(values(db_user.user_id, card_id, amount=10.0 + i))
+        inserted = await queue.flush()
+        assert os.path.getsize(queue.path) == 0
+        await queue.stop()
+        return inserted
+
+    assert asyncio.run(run()) == 5
+    assert queue.depth == 0
+    assert count_transactions(test_db, db_user.user_id) == 5
+    assert queue.path != journal_path and not os.path.exists(queue.path)
+
+
+def test_stop_drains_queue(test_db, db_user, card_id, journal_path, test_async_sessionmaker):
+    queue = TransactionQueue(journal_path=journal_path, flush_interval_ms=60000, enabled=True)
+
+    async def run():
+        await queue.start(test_async_sessionmaker)
+        queue.enqueue(values(db_user.user_id, card_id))
+        return await queue.stop()
+
+    assert asyncio.run(run()) == 0
+    assert count_transactions(test_db, db_user.user_id) == 1
+
+
+def test_replay_skips_rows_already_inserted(test_db, db_user, card_id, journal_path, test_async_sessionmaker):
+    # Crash after the first row's batch committed but before it was marked done
+    crashed = TransactionQueue(journal_path=journal_path, enabled=True, worker_id="crashed")
+    first = crashed.enqueue(values(db_user.user_id, card_id))
+    crashed.enqueue(values(db_user.user_id, card_id))
+    crashed._journal.close()  # The process died: its journal lock is released
+
+    async def commit_first_only():
+        async with test_async_sessionmaker() as session:
+            session.add(Transaction(**first))
+            await session.commit()
+
+    async def restart():
+        queue = TransactionQueue(journal_path=journal_path, flush_interval_ms=60000, enabled=True)
+        replayed = await queue.start(test_async_sessionmaker)
+        await queue.stop()
+        return replayed
+
+    asyncio.run(commit_first_only())
+    assert asyncio.run(restart()) == 2
+    assert count_transactions(test_db, db_user.user_id) == 2
+    assert not os.path.exists(crashed.path)
+
+
+def test_journals_are_per_process_and_live_ones_are_left_alone(journal_path, test_async_sessionmaker, db_user, card_id):
+    live = TransactionQueue(journal_path=journal_path, enabled=True, worker_id="live")
+    live.enqueue(values(db_user.user_id, card_id))
+    # A journal from before journals were per process
+    with open(journal_path, "w") as legacy:
+        legacy.write(json.dumps({"row": encode_row({**values(db_user.user_id, card_id), "transaction_id": "txn_legacy"})}) + "\n")
+
+    async def start():
+        queue = TransactionQueue(journal_path=journal_path, flush_interval_ms=60000, enabled=True, worker_id="new")
+        replayed = await queue.start(test_async_sessionmaker)
+        await queue.stop()
+        return replayed
+
+    assert live.path != journal_path
+    assert asyncio.run(start()) == 1
+    assert not os.path.exists(journal_path)
+    assert len(live._read_pending()) == 1
+
+
+def test_failing_rows_are_dead_lettered(test_db, db_user, card_id, tmp_path, journal_path, test_async_sessionmaker):
+    dead_letter_path = str(tmp_path / "dead_letter.jsonl")
+    queue = TransactionQueue(
+        journal_path=journal_path, flush_interval_ms=60000, enabled=True,
+        dead_letter_path=dead_letter_path, flush_max_attempts=2
+    )
+
+    async def run():
+        await queue.start(test_async_sessionmaker)
+        queue.enqueue(values(db_user.user_id, card_id))
+        # Violates check_amount_positive: the whole batch fails every time
+        bad = queue.enqueue(values(db_user.user_id, card_id, amount=-1.0))
+        queue.enqueue(values(db_user.user_id, card_id))
+        attempts = [await queue.flush(), await queue.flush()]
+        await queue.stop()
+        return bad, attempts
+
+    bad, attempts = asyncio.run(run())
+
+    assert attempts == [0, 2]
+    assert queue.depth == 0
+    assert count_transactions(test_db, db_user.user_id) == 2
+    with open(dead_letter_path) as dead_letters:
+        records = [json.loads(line) for line in dead_letters]
+    assert [record["row"]["transaction_id"] for record in records] == [bad["transaction_id"]]
+
+
+def test_journal_round_trips_enums_and_dates(journal_path):
+    queue = TransactionQueue(journal_path=journal_path, enabled=True)
+    row = queue.enqueue(values("user_x", "card_x"))
+
+    with open(queue.path) as journal:
+        assert json.loads(journal.readline())["row"]["category"] == "dining"
+    assert queue._read_pending() == [row]
+
+
+def test_full_queue_rejects(journal_path):
+    queue = TransactionQueue(journal_path=journal_path, max_size=1, enabled=True)
+    queue.enqueue(values("user_x", "card_x"))
+
+    with pytest.raises(QueueFullError):
+        queue.enqueue(values("user_x", "card_x"))
+    assert queue.depth == 1
+
+
+def test_endpoint_accepts_with_202_when_enabled(test_client, db_user, card_id, journal_path, monkeypatch):
+    queue = TransactionQueue(journal_path=journal_path, enabled=True)
+    monkeypatch.setattr(main, "transaction_queue", queue)
+
+    response = test_client.post("/api/v1/transactions", json={
+        "user_id": db_user.user_id, "merchant": "Queued Merchant", "amount": 12.5,
+        "category": "dining", "card_used_id": card_id
+    })
+
+    assert response.status_code == 202
+    assert response.json()["message"] == "Transaction queued"
+    assert [row["transaction_id"] for row in queue._read_pending()] == [response.json()["transaction_id"]]
+
+
+def test_endpoint_returns_503_when_full(test_client, db_user, card_id, journal_path, monkeypatch):
+    monkeypatch.setattr(main, "transaction_queue", TransactionQueue(journal_path=journal_path, max_size=0, enabled=True))
+
+    response = test_client.post("/api/v1/transactions", json={
+        "user_id": db_user.user_id, "merchant": "Queued Merchant", "amount": 12.5,
+        "category": "dining", "card_used_id": card_id
+    })
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
@@ -0,0 +1,139 @@
+"""
+Tests for the incrementally maintained UserBehavior profile and its compaction
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event, select
+
+from crud import (
+    create_credit_card, create_transaction, bulk_create_transactions, get_user_behavior,
+    compact_user_behavior, rebuild_user_behavior_days
+)
+from models import UserBehaviorDay, CategoryEnum, OptimizationGoalEnum, CardIssuerEnum
+
+
+PROFILE_FIELDS = [
+    "common_categories", "preferred_goal", "avg_transaction_amount", "total_transactions",
+    "total_spent", "total_rewards_earned", "total_potential_rewards", "optimization_score",
+    "card_usage_distribution", "most_used_card_id", "category_counts", "goal_counts", "card_counts"
+]
+
+
+def profile(behavior):
+    return {field: getattr(behavior, field) for field in PROFILE_FIELDS}
+
+
+def goal_buckets(db, user_id):
+    rows = db.execute(
+        select(UserBehaviorDay.day, UserBehaviorDay.optimization_goal, UserBehaviorDay.transaction_count)
+        .where(UserBehaviorDay.user_id == user_id)
+    )
+    return sorted(rows, key=lambda row: (row[0], row[1].value))
+
+
+@pytest.fixture
+def cards(test_db, db_user):
+    return [
+        create_credit_card(
+            test_db, user_id=db_user.user_id, card_name=name, issuer=CardIssuerEnum.OTHER,
+            cash_back_rate={"other": 0.01}, points_multiplier={"other": 1.0}
+        ).card_id
+        for name in ("Behavior Card A", "Behavior Card B")
+    ]
+
+
+@pytest.fixture
+def history(test_db, db_user, cards):
+    """Four transactions in the window: dining x2, travel, groceries"""
+    specs = [
+        (CategoryEnum.DINING, OptimizationGoalEnum.CASH_BACK, cards[0], 40.0, 0),
+        (CategoryEnum.DINING, OptimizationGoalEnum.CASH_BACK, cards[0], 60.0, 1),
+        (CategoryEnum.TRAVEL, OptimizationGoalEnum.TRAVEL_POINTS, cards[1], 300.0, 30),
+        (CategoryEnum.GROCERIES, OptimizationGoalEnum.CASH_BACK, None, 25.0, 85),
+    ]
+    for category, goal, card_id, amount, days_ago in specs:
+        create_transaction(
+            test_db, user_id=db_user.user_id, merchant="Somewhere", amount=amount,
+            category=category, optimization_goal=goal, card_id=card_id,
+            total_value_earned=amount * 0.02, optimal_value=amount * 0.03,
+            transaction_date=datetime.utcnow() - timedelta(days=days_ago)
+        )
+
+
+class TestIncrementalCounters:
+
+    def test_transactions_update_profile(self, test_db, db_user, cards, history):
+        behavior = get_user_behavior(test_db, db_user.user_id)
+
+        assert behavior.total_transactions == 4
+        assert behavior.category_counts == {"dining": 2, "travel": 1, "groceries": 1}
+        assert behavior.common_categories == ["dining", "groceries", "travel"]
+        assert behavior.preferred_goal == OptimizationGoalEnum.CASH_BACK
+        assert behavior.card_counts == {cards[0]: 2, cards[1]: 1}
+        assert behavior.most_used_card_id == cards[0]
+        assert behavior.total_spent == 425.0
+        assert behavior.avg_transaction_amount == 106.25
+        assert behavior.optimization_score == pytest.approx(66.67)
+
+    def test_bulk_insert_updates_profile(self, test_db, db_user, cards):
+        bulk_create_transactions(test_db, [
+            {"user_id": db_user.user_id, "merchant": "Bulk", "amount": 10.0, "category": CategoryEnum.GAS,
+             "optimization_goal": OptimizationGoalEnum.BALANCED, "card_id": cards[1]}
+            for _ in range(3)
+        ])
+        behavior = get_user_behavior(test_db, db_user.user_id)
+
+        assert behavior.category_counts == {"gas": 3}
+        assert behavior.preferred_goal == OptimizationGoalEnum.BALANCED
+        assert behavior.card_usage_distribution == {cards[1]: 100.0}
+
+    def test_transactions_before_window_are_not_counted(self, test_db, db_user):
+        create_transaction(
+            test_db, user_id=db_user.user_id, merchant="Old", amount=10.0,
+            category=CategoryEnum.GAS, optimization_goal=OptimizationGoalEnum.BALANCED,
+            transaction_date=datetime.utcnow() - timedelta(days=200)
+        )
+
+        assert get_user_behavior(test_db, db_user.user_id).total_transactions == 0
+
+
+class TestCompaction:
+
+    def test_compaction_matches_incremental_profile(self, test_db, db_user, history):
+        user_id = db_user.user_id
+        incremental = profile(get_user_behavior(test_db, user_id))
+        buckets = goal_buckets(test_db, user_id)
+
+        rebuild_user_behavior_days(test_db, user_id)
+        compact_user_behavior(test_db, user_id)
+
+        assert profile(get_user_behavior(test_db, user_id)) == incremental
+        assert goal_buckets(test_db, user_id) == buckets
+
+    def test_compaction_ages_out_old_days(self, test_db, db_user, history):
+        user_id = db_user.user_id
+        compact_user_behavior(test_db, user_id, today=datetime.utcnow().date() + timedelta(days=10))
+        behavior = get_user_behavior(test_db, user_id)
+
+        assert behavior.total_transactions == 3
+        assert "groceries" not in behavior.category_counts
+        assert len(goal_buckets(test_db, user_id)) == 3
+
+
+def test_behavior_endpoint_is_a_pure_read(test_client, test_db, db_user, history):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement.lstrip().split()[0].upper())
+
+    event.listen(test_db.get_bind(), "before_cursor_execute", record)
+    try:
+        response = test_client.get(f"/api/v1/users/{db_user.user_id}/behavior")
+    finally:
+        event.remove(test_db.get_bind(), "before_cursor_execute", record)
+
+    assert response.status_code == 200
+    assert response.json()["total_transactions"] == 4
+    assert set(statements) <= {"SELECT"}
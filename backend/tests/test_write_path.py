@@ -0,0 +1,130 @@
+"""
+Tests for the single-round-trip crud write path (RETURNING, no refresh, merged commits)
+"""
+
+import uuid
+
+import pytest
+from sqlalchemy import event, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+from crud import (
+    create_user, get_user, update_user, create_credit_card, get_card, deactivate_card,
+    add_user_credit_card, update_user_credit_card, delete_user_credit_card, trigger_automation_rule,
+    create_automation_rule
+)
+from models import User, UserBehavior, UserCreditCard, CardIssuerEnum, OptimizationGoalEnum
+
+
+@pytest.fixture
+def write_db(test_engine):
+    """A session configured like the application's (objects survive commit)"""
+    session = sessionmaker(autoflush=False, expire_on_commit=False, bind=test_engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def statements(write_db):
+    """Record the SQL statements sent while the fixture's context is open"""
+    class Recorder:
+        def __enter__(self):
+            self.sent = []
+            event.listen(write_db.get_bind(), "before_cursor_execute", self.record)
+            return self
+
+        def __exit__(self, *exc):
+            event.remove(write_db.get_bind(), "before_cursor_execute", self.record)
+
+        def record(self, conn, cursor, statement, parameters, context, executemany):
+            self.sent.append(statement.lstrip().split(None, 1)[0].upper())
+    return Recorder()
+
+
+def new_user(db):
+    return create_user(
+        db, email=f"write_{uuid.uuid4().hex[:8]}@example.com", full_name="Write Path",
+        password_hash="hashed", default_optimization_goal=OptimizationGoalEnum.CASH_BACK
+    )
+
+
+def test_create_user_writes_user_and_behavior_together(write_db, statements):
+    with statements:
+        user = new_user(write_db)
+
+    assert statements.sent.count("SELECT") == 0
+    assert user.created_at is not None
+    behavior = write_db.execute(select(UserBehavior).where(UserBehavior.user_id == user.user_id)).scalar_one()
+    assert behavior.total_transactions == 0
+
+
+def test_create_user_duplicate_email_raises_integrity_error(write_db):
+    user = new_user(write_db)
+
+    with pytest.raises(IntegrityError):
+        create_user(write_db, email=user.email, full_name="Duplicate", password_hash="hashed")
+    write_db.rollback()
+    assert write_db.execute(select(User).where(User.email == user.email)).scalars().all() == [user]
+
+
+def test_update_user_returns_new_values_without_select(write_db, statements):
+    user = new_user(write_db)
+    assert get_user(write_db, user.user_id).full_name == "Write Path"
+
+    with statements:
+        updated = update_user(write_db, user.user_id, full_name="Renamed", phone="555-0100")
+
+    assert statements.sent.count("SELECT") == 0
+    assert (updated.full_name, updated.phone) == ("Renamed", "555-0100")
+    # The cached read was invalidated by the UPDATE ... RETURNING
+    assert get_user(write_db, user.user_id).full_name == "Renamed"
+    assert update_user(write_db, "user_missing", full_name="Nobody") is None
+
+
+def test_card_updates_invalidate_cache(write_db):
+    user = new_user(write_db)
+    card = create_credit_card(
+        write_db, user_id=user.user_id, card_name="Write Path Card", issuer=CardIssuerEnum.OTHER,
+        cash_back_rate={"other": 0.01}, points_multiplier={"other": 1.0}
+    )
+    assert get_card(write_db, card.card_id).is_active
+
+    assert deactivate_card(write_db, card.card_id)
+    assert not get_card(write_db, card.card_id).is_active
+    assert not deactivate_card(write_db, 10 ** 9)
+
+
+def test_user_credit_card_lifecycle(write_db):
+    user = new_user(write_db)
+    card = create_credit_card(
+        write_db, user_id=user.user_id, card_name="Wallet Card", issuer=CardIssuerEnum.OTHER,
+        cash_back_rate={"other": 0.01}, points_multiplier={"other": 1.0}
+    )
+
+    added = add_user_credit_card(write_db, user.user_id, card.card_id, nickname="Daily")
+    assert added.user_card_id is not None
+    # The unique (user, card) index rejects the second add; no pre-check query
+    assert add_user_credit_card(write_db, user.user_id, card.card_id) is None
+
+    updated = update_user_credit_card(write_db, added.user_card_id, nickname="Groceries")
+    assert updated.nickname == "Groceries"
+    assert delete_user_credit_card(write_db, added.user_card_id)
+    assert not delete_user_credit_card(write_db, added.user_card_id)
+    assert write_db.execute(select(UserCreditCard).where(UserCreditCard.user_id == user.user_id)).first() is None
+
+
+def test_trigger_automation_rule_increments_in_sql(write_db):
+    user = new_user(write_db)
+    rule = create_automation_rule(
+        write_db, user_id=user.user_id, rule_name="Coffee", condition_type="merchant",
+        condition_value={"merchant": "Coffee Shop"}, action_card_id="card_coffee"
+    )
+
+    assert trigger_automation_rule(write_db, rule.rule_id)
+    assert trigger_automation_rule(write_db, rule.rule_id)
+    write_db.refresh(rule)
+    assert rule.times_triggered == 2
+    assert not trigger_automation_rule(write_db, 10 ** 9)
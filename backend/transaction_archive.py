@@ -0,0 +1,358 @@
+"""
+Columnar Archive of Old Transactions
+After TRANSACTION_ARCHIVE_AFTER_DAYS, transactions are only read by long-window
+analytics, so scripts/archive_transactions.py moves them out of the hot table
+into per-user column files that analytics reads through memory maps.
+
+Layout under TRANSACTION_ARCHIVE_DIR/<user_id>/:
+- manifest.json: generation, archived_through (midnight; every transaction of
+  the user before it is in the archive) and row count
+- <column>.<generation>.npy: one array per column, sorted by transaction_date
+  (int64 microseconds since the epoch)
+- dictionaries.<generation>.json: category, merchant and recommended card
+  values; the matching columns hold int codes into these lists (-1 for NULL)
+
+Columns are stored uncompressed (np.savez_compressed members can't be memory
+mapped); narrow dtypes and the dictionary-encoded strings keep them small.
+Readers binary-search the sorted dates, so a window only pages in its slice.
+
+Writes are atomic per user: new column files are written under the next
+generation and manifest.json is replaced last. The previous generation is kept
+for readers that loaded the old manifest. Rows are deleted from the database
+only after the manifest is replaced, and a re-run skips rows already archived,
+so an interrupted run is simply repeated.
+"""
+
+import json
+import os
+import re
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select, delete
+from sqlalchemy.orm import Session
+
+from models import Transaction, CategoryEnum
+
+ARCHIVE_DIR = os.getenv("TRANSACTION_ARCHIVE_DIR", "./transaction_archive")
+ARCHIVE_AFTER_DAYS = int(os.getenv("TRANSACTION_ARCHIVE_AFTER_DAYS", "365"))
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+WEEK_MICROSECONDS = 7 * 24 * 60 * 60 * 1_000_000
+
+# Rows deleted from transactions per statement
+DELETE_CHUNK_SIZE = 1000
+
+COLUMN_DTYPES = {
+    "transaction_date": np.int64,
+    "transaction_id": np.str_,
+    "amount": np.float64,
+    "rewards": np.float64,        # total_value_earned, NULL as 0
+    "optimal_value": np.float64,  # NaN for NULL
+    "missed_value": np.float64,   # NaN for NULL
+    "followed": np.bool_,
+    "category": np.int16,         # code into dictionaries["categories"]
+    "merchant": np.int32,         # code into dictionaries["merchants"]
+    "recommended_card": np.int32, # code into dictionaries["cards"], -1 for NULL
+}
+
+DICTIONARIES = ("categories", "merchants", "cards")
+
+_SAFE_USER_ID = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+
+def to_microseconds(value: datetime) -> int:
+    """Naive UTC datetime -> int64 microseconds since the epoch"""
+    return (value - EPOCH) // MICROSECOND
+
+
+def archive_cutoff(today: Optional[datetime] = None, after_days: int = ARCHIVE_AFTER_DAYS) -> datetime:
+    """Midnight TRANSACTION_ARCHIVE_AFTER_DAYS before today; older transactions are archived"""
+    today = today or datetime.utcnow()
+    return datetime.combine(today.date() - timedelta(days=after_days), time.min)
+
+
+@dataclass
+class ArchivedAggregates:
+    """Aggregates of a user's archived transactions in an analytics window"""
+    archived_through: datetime
+    # (category, week) -> [count, spent, rewards, potential, missed, followed]
+    totals: Dict[Tuple[Optional[CategoryEnum], int], List] = field(default_factory=dict)
+    # recommended card_id -> [rewards, count]
+    cards: Dict[str, List] = field(default_factory=dict)
+    # merchant -> [count, spent, rewards]
+    merchants: Dict[str, List] = field(default_factory=dict)
+
+
+def _group(keys: np.ndarray, *weights: np.ndarray) -> Tuple[np.ndarray, List[np.ndarray]]:
+    """Unique keys and the per-key sum of each weight column"""
+    unique, inverse = np.unique(keys, return_inverse=True)
+    return unique, [np.bincount(inverse, weights=weight, minlength=len(unique)) for weight in weights]
+
+
+class TransactionArchive:
+    """Per-user columnar files of archived transactions"""
+
+    def __init__(self, root: str = ARCHIVE_DIR):
+        self.root = root
+
+    def _user_dir(self, user_id: str) -> str:
+        if not _SAFE_USER_ID.match(user_id or ""):
+            raise ValueError(f"Invalid user_id for archive path: {user_id!r}")
+        return os.path.join(self.root, user_id)
+
+    def _path(self, user_id: str, name: str) -> str:
+        return os.path.join(self._user_dir(user_id), name)
+
+    def read_manifest(self, user_id: str) -> Optional[Dict]:
+        """The user's manifest, or None when nothing is archived"""
+        try:
+            with open(self._path(user_id, "manifest.json"), encoding="utf-8") as manifest:
+                return json.load(manifest)
+        except FileNotFoundError:
+            return None
+
+    def archived_through(self, user_id: str) -> Optional[datetime]:
+        """Every transaction of the user before this is archived (None without an archive)"""
+        manifest = self.read_manifest(user_id)
+        return datetime.fromisoformat(manifest["archived_through"]) if manifest else None
+
+    def archived_users(self) -> Dict[str, datetime]:
+        """archived_through of every user with an archive"""
+        if not os.path.isdir(self.root):
+            return {}
+        archived = {}
+        for user_id in sorted(os.listdir(self.root)):
+            if _SAFE_USER_ID.match(user_id):
+                archived_through = self.archived_through(user_id)
+                if archived_through:
+                    archived[user_id] = archived_through
+        return archived
+
+    def _read_dictionaries(self, user_id: str, generation: int) -> Dict[str, List]:
+        with open(self._path(user_id, f"dictionaries.{generation}.json"), encoding="utf-8") as dictionaries:
+            return json.load(dictionaries)
+
+    def open_columns(self, user_id: str, generation: int) -> Dict[str, np.ndarray]:
+        """Memory-map every column of one generation (read-only)"""
+        return {
+            column: np.load(self._path(user_id, f"{column}.{generation}.npy"), mmap_mode="r")
+            for column in COLUMN_DTYPES
+        }
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def aggregate(self, user_id: str, start_date: datetime, end_date: datetime) -> Optional[ArchivedAggregates]:
+        """
+        Aggregate a user's archived transactions in [start_date, end_date]
+
+        Weeks are counted from start_date and half-open, as in
+        crud._aggregate_user_transactions.
+
+        Returns:
+            None when the user has no archive; otherwise the aggregates (empty
+            when the window starts after archived_through)
+        """
+        manifest = self.read_manifest(user_id)
+        if manifest is None:
+            return None
+        result = ArchivedAggregates(archived_through=datetime.fromisoformat(manifest["archived_through"]))
+        if start_date >= result.archived_through:
+            return result
+
+        generation = manifest["generation"]
+        columns = self.open_columns(user_id, generation)
+        start, end = to_microseconds(start_date), to_microseconds(end_date)
+        dates = columns["transaction_date"]
+        lo = int(np.searchsorted(dates, start, side="left"))
+        hi = int(np.searchsorted(dates, end, side="right"))
+        if lo >= hi:
+            return result
+
+        window = {
+            column: np.asarray(values[lo:hi])
+            for column, values in columns.items() if column != "transaction_id"
+        }
+        dictionaries = self._read_dictionaries(user_id, generation)
+        dates = window["transaction_date"]
+        amount, rewards = window["amount"], window["rewards"]
+        ones = np.ones(len(dates))
+
+        # (category, week) buckets; a transaction exactly at end_date is in no week
+        categories = [CategoryEnum(value) for value in dictionaries["categories"]]
+        width = len(categories) + 1
+        week = np.where(dates < end, (dates - start) // WEEK_MICROSECONDS, -1)
+        keys, sums = _group(
+            (week + 1) * width + window["category"] + 1,
+            ones, amount, rewards,
+            np.nan_to_num(window["optimal_value"]), np.nan_to_num(window["missed_value"]),
+            window["followed"].astype(np.float64)
+        )
+        for i, key in enumerate(keys.tolist()):
+            code, week_index = key % width - 1, key // width - 1
+            count, spent, earned, potential, missed, followed = (values[i] for values in sums)
+            result.totals[(categories[code] if code >= 0 else None, week_index)] = [
+                int(count), float(spent), float(earned), float(potential), float(missed), int(followed)
+            ]
+
+        recommended = window["recommended_card"] >= 0
+        if recommended.any():
+            keys, (value, count) = _group(window["recommended_card"][recommended], rewards[recommended], ones[recommended])
+            for i, code in enumerate(keys.tolist()):
+                result.cards[dictionaries["cards"][code]] = [float(value[i]), int(count[i])]
+
+        keys, (count, spent, earned) = _group(window["merchant"], ones, amount, rewards)
+        for i, code in enumerate(keys.tolist()):
+            result.merchants[dictionaries["merchants"][code]] = [int(count[i]), float(spent[i]), float(earned[i])]
+        return result
+
+    # ------------------------------------------------------------------
+    # Archiving
+    # ------------------------------------------------------------------
+
+    def archive_user(self, db: Session, user_id: str, cutoff: datetime) -> int:
+        """
+        Move a user's transactions before cutoff into the archive
+
+        Args:
+            db: Database session
+            user_id: User whose transactions are archived
+            cutoff: Transactions before this are moved (floored to midnight)
+
+        Returns:
+            Number of transactions removed from the database
+        """
+        cutoff = datetime.combine(cutoff.date(), time.min)
+        rows = db.execute(
+            select(
+                Transaction.transaction_id,
+                Transaction.transaction_date,
+                Transaction.amount,
+                Transaction.total_value_earned,
+                Transaction.optimal_value,
+                Transaction.missed_value,
+                Transaction.used_recommended_card,
+                Transaction.category,
+                Transaction.merchant,
+                Transaction.recommended_card_id
+            )
+            .where(Transaction.user_id == user_id, Transaction.transaction_date < cutoff)
+            .order_by(Transaction.transaction_date)
+        ).all()
+        if not rows:
+            return 0
+
+        manifest = self.read_manifest(user_id)
+        if manifest:
+            generation = manifest["generation"]
+            existing = {column: np.asarray(values) for column, values in self.open_columns(user_id, generation).items()}
+            dictionaries = self._read_dictionaries(user_id, generation)
+            archived_through = max(cutoff, datetime.fromisoformat(manifest["archived_through"]))
+        else:
+            generation = 0
+            existing = {column: np.empty(0, dtype=dtype) for column, dtype in COLUMN_DTYPES.items()}
+            dictionaries = {name: [] for name in DICTIONARIES}
+            archived_through = cutoff
+
+        # Rows left behind by an interrupted run are archived already
+        already_archived = set(existing["transaction_id"].tolist())
+        new_rows = [row for row in rows if row.transaction_id not in already_archived]
+
+        codes = {name: {value: code for code, value in enumerate(dictionaries[name])} for name in DICTIONARIES}
+
+        def encode(name: str, value) -> int:
+            if value is None:
+                return -1
+            if value not in codes[name]:
+                codes[name][value] = len(dictionaries[name])
+                dictionaries[name].append(value)
+            return codes[name][value]
+
+        added = {
+            "transaction_date": [to_microseconds(row.transaction_date) for row in new_rows],
+            "transaction_id": [row.transaction_id for row in new_rows],
+            "amount": [row.amount for row in new_rows],
+            "rewards": [row.total_value_earned or 0.0 for row in new_rows],
+            "optimal_value": [np.nan if row.optimal_value is None else row.optimal_value for row in new_rows],
+            "missed_value": [np.nan if row.missed_value is None else row.missed_value for row in new_rows],
+            "followed": [row.used_recommended_card is True for row in new_rows],
+            "category": [encode("categories", row.category.value if row.category else None) for row in new_rows],
+            "merchant": [encode("merchants", row.merchant) for row in new_rows],
+            "recommended_card": [encode("cards", row.recommended_card_id) for row in new_rows],
+        }
+        merged = {
+            column: np.concatenate([existing[column], np.asarray(added[column], dtype=dtype)])
+            for column, dtype in COLUMN_DTYPES.items()
+        }
+        order = np.argsort(merged["transaction_date"], kind="stable")
+
+        self._write(user_id, generation + 1, {column: values[order] for column, values in merged.items()},
+                    dictionaries, archived_through)
+
+        ids = [row.transaction_id for row in rows]
+        for i in range(0, len(ids), DELETE_CHUNK_SIZE):
+            db.execute(
+                delete(Transaction).where(
+                    Transaction.user_id == user_id,
+                    Transaction.transaction_date < cutoff,
+                    Transaction.transaction_id.in_(ids[i:i + DELETE_CHUNK_SIZE])
+                )
+            )
+        db.commit()
+        return len(rows)
+
+    def _write(self, user_id: str, generation: int, columns: Dict[str, np.ndarray],
+               dictionaries: Dict[str, List], archived_through: datetime) -> None:
+        """Write a new generation and switch the manifest to it"""
+        user_dir = self._user_dir(user_id)
+        os.makedirs(user_dir, exist_ok=True)
+        for column, values in columns.items():
+            np.save(os.path.join(user_dir, f"{column}.{generation}.npy"), values)
+        with open(os.path.join(user_dir, f"dictionaries.{generation}.json"), "w", encoding="utf-8") as out:
+            json.dump(dictionaries, out)
+
+        manifest_tmp = os.path.join(user_dir, "manifest.json.tmp")
+        with open(manifest_tmp, "w", encoding="utf-8") as out:
+            json.dump({
+                "generation": generation,
+                "archived_through": archived_through.isoformat(),
+                "rows": int(len(columns["transaction_date"]))
+            }, out)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(manifest_tmp, os.path.join(user_dir, "manifest.json"))
+
+        # Keep the previous generation for readers that loaded the old manifest
+        for name in os.listdir(user_dir):
+            parts = name.split(".")
+            if len(parts) == 3 and parts[1].isdigit() and int(parts[1]) < generation - 1:
+                os.remove(os.path.join(user_dir, name))
+
+    def archive(self, db: Session, cutoff: Optional[datetime] = None, user_id: Optional[str] = None) -> Dict[str, int]:
+        """
+        Archive every user's (or one user's) transactions before cutoff
+
+        Returns:
+            Transactions moved per user
+        """
+        cutoff = cutoff or archive_cutoff()
+        if user_id:
+            user_ids = [user_id]
+        else:
+            user_ids = db.execute(
+                select(Transaction.user_id).where(Transaction.transaction_date < cutoff).distinct()
+            ).scalars().all()
+        moved = {}
+        for archived_user_id in user_ids:
+            count = self.archive_user(db, archived_user_id, cutoff)
+            if count:
+                moved[archived_user_id] = count
+        return moved
+
+
+transaction_archive = TransactionArchive()
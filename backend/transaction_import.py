@@ -0,0 +1,342 @@
+"""
+Bulk Transaction Import
+Streams CSV / NDJSON bank-statement uploads into the transactions table.
+
+Records are parsed incrementally from the request body, scored against the
+user's wallet with the rule engine (agents.calculate_card_value) and inserted
+in batches, each batch in its own database transaction. Bad rows are reported
+individually and never abort the rest of the import.
+
+Supported columns (CSV header names or NDJSON keys):
+    merchant (required), amount (required), date, category, card_id, card,
+    optimization_goal, location, total_value_earned, cash_back_earned, points_earned
+
+`card` matches a wallet card's nickname or name; `card_id` must be in the wallet.
+"""
+
+import codecs
+import csv
+import json
+import time
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import async_crud
+from agents import agentic_system
+from logging_config import get_logger
+from models import CategoryEnum, OptimizationGoalEnum
+
+logger = get_logger("transaction_import")
+
+SUPPORTED_FORMATS = ("csv", "ndjson")
+DEFAULT_BATCH_SIZE = 1000
+MAX_BATCH_SIZE = 10000
+MAX_REPORTED_ERRORS = 100
+
+
+def detect_format(content_type: Optional[str], requested: Optional[str] = None) -> Optional[str]:
+    """
+    Pick the upload format from an explicit ?format= or the Content-Type header
+
+    Returns:
+        "csv", "ndjson" or None if the format can't be determined
+    """
+    if requested:
+        requested = requested.lower()
+        return requested if requested in SUPPORTED_FORMATS else None
+
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    if media_type in ("text/csv", "application/csv"):
+        return "csv"
+    if media_type in ("application/x-ndjson", "application/ndjson", "application/jsonl", "application/x-jsonlines"):
+        return "ndjson"
+    return None
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Decode a byte stream into lines without buffering the whole body"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+
+async def iter_records(chunks: AsyncIterator[bytes], fmt: str) -> AsyncIterator[Tuple[int, object]]:
+    """
+    Parse an upload into (line number, record) pairs.
+
+    Records are dictionaries, or the ValueError that made the line unreadable.
+    CSV uploads need a header row and one record per line.
+    """
+    header = None
+    line_number = 0
+    async for line in iter_lines(chunks):
+        line_number += 1
+        if not line.strip():
+            continue
+
+        if fmt == "ndjson":
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_number, ValueError(f"Invalid JSON: {e.msg}")
+                continue
+            if not isinstance(record, dict):
+                yield line_number, ValueError("Each line must be a JSON object")
+                continue
+            yield line_number, record
+            continue
+
+        values = next(csv.reader([line]))
+        if header is None:
+            header = [name.strip().lower() for name in values]
+            continue
+        if len(values) != len(header):
+            yield line_number, ValueError(f"Expected {len(header)} columns, got {len(values)}")
+            continue
+        yield line_number, {name: value for name, value in zip(header, values) if value != ""}
+
+
+class RewardsScorer:
+    """
+    Rule-engine scoring for a user's wallet, computed once per import.
+
+    calculate_card_value is affine in the amount (rate * amount + benefits), so
+    each (card, category, goal) is evaluated twice and every row after that is
+    plain arithmetic instead of a full rule-engine call.
+    """
+
+    def __init__(self, wallet_cards: List[Dict]):
+        self.cards = [{**card, "benefits": card.get("benefits") or []} for card in wallet_cards]
+        self.card_ids = {card["card_id"] for card in wallet_cards}
+        self.cards_by_name = {}
+        for card in wallet_cards:
+            for name in (card.get("nickname"), card.get("card_name")):
+                if name:
+                    self.cards_by_name.setdefault(name.strip().lower(), card["card_id"])
+        self._coefficients = {}
+
+    def resolve_card(self, card_id: Optional[str], card_name: Optional[str]) -> Optional[str]:
+        """Map a card_id / card name column to a wallet card_id"""
+        if card_id:
+            if card_id not in self.card_ids:
+                raise ValueError(f"Card {card_id} is not in the user's wallet")
+            return card_id
+        if card_name:
+            resolved = self.cards_by_name.get(card_name.strip().lower())
+            if resolved is None:
+                raise ValueError(f"Card '{card_name}' is not in the user's wallet")
+            return resolved
+        return None
+
+    def _coefficients_for(self, category: str, goal: str) -> List[Tuple[str, float, float]]:
+        """(card_id, per-dollar value, fixed value) for every wallet card"""
+        key = (category, goal)
+        if key not in self._coefficients:
+            coefficients = []
+            for card in self.cards:
+                fixed, _ = agentic_system.calculate_card_value(card, 0.0, category, goal)
+                one_dollar, _ = agentic_system.calculate_card_value(card, 1.0, category, goal)
+                coefficients.append((card["card_id"], one_dollar - fixed, fixed))
+            self._coefficients[key] = coefficients
+        return self._coefficients[key]
+
+    def score(self, amount: float, category: str, goal: str, card_id: Optional[str]) -> Dict:
+        """
+        Score one transaction.
+
+        Returns:
+            Dictionary with recommended_card_id, optimal_value and (when the card
+            used is known) the value earned with it
+        """
+        values = {
+            scored_card_id: per_dollar * amount + fixed
+            for scored_card_id, per_dollar, fixed in self._coefficients_for(category, goal)
+        }
+        if not values:
+            return {"recommended_card_id": None, "optimal_value": None, "earned_value": None}
+
+        recommended_card_id = max(values, key=values.get)
+        return {
+            "recommended_card_id": recommended_card_id,
+            "optimal_value": round(values[recommended_card_id], 2),
+            "earned_value": round(values[card_id], 2) if card_id else None,
+        }
+
+
+def _parse_float(record: Dict, field: str) -> Optional[float]:
+    value = record.get(field)
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid {field}: {value!r}")
+
+
+def _parse_date(value) -> Optional[datetime]:
+    if value is None or value == "":
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        raise ValueError(f"Invalid date: {value!r} (expected ISO 8601)")
+    return parsed.astimezone(timezone.utc).replace(tzinfo=None) if parsed.tzinfo else parsed
+
+
+def build_transaction_row(
+    record: Dict,
+    user_id: str,
+    default_goal: OptimizationGoalEnum,
+    scorer: RewardsScorer
+) -> Dict:
+    """
+    Validate one record and turn it into Transaction column values.
+
+    Raises:
+        ValueError: If the record is invalid
+    """
+    merchant = str(record.get("merchant") or "").strip()
+    if not merchant:
+        raise ValueError("merchant is required")
+
+    amount = _parse_float(record, "amount")
+    if amount is None:
+        raise ValueError("amount is required")
+    if amount <= 0:
+        raise ValueError("amount must be greater than 0")
+
+    try:
+        category = CategoryEnum(str(record.get("category") or "other").strip().lower())
+    except ValueError:
+        raise ValueError(f"Invalid category: {record.get('category')!r}")
+
+    try:
+        goal = OptimizationGoalEnum(record["optimization_goal"]) if record.get("optimization_goal") else default_goal
+    except ValueError:
+        raise ValueError(f"Invalid optimization_goal: {record.get('optimization_goal')!r}")
+
+    card_id = scorer.resolve_card(record.get("card_id"), record.get("card"))
+    scores = scorer.score(amount, category.value, goal.value, card_id)
+
+    earned = _parse_float(record, "total_value_earned")
+    if earned is None:
+        earned = scores["earned_value"]
+    optimal = scores["optimal_value"]
+    if optimal is not None and earned is not None:
+        optimal = max(optimal, earned)
+
+    return {
+        "user_id": user_id,
+        "card_id": card_id,
+        "merchant": merchant[:255],
+        "amount": amount,
+        "category": category,
+        "optimization_goal": goal,
+        "location": record.get("location"),
+        "transaction_date": _parse_date(record.get("date") or record.get("transaction_date")),
+        "recommended_card_id": scores["recommended_card_id"],
+        "used_recommended_card": (
+            card_id == scores["recommended_card_id"]
+            if card_id and scores["recommended_card_id"] else None
+        ),
+        "cash_back_earned": _parse_float(record, "cash_back_earned") or 0.0,
+        "points_earned": _parse_float(record, "points_earned") or 0.0,
+        "total_value_earned": earned,
+        "optimal_value": optimal,
+        "missed_value": round(optimal - earned, 2) if optimal is not None and earned is not None else None,
+    }
+
+
+async def import_transactions(
+    db: AsyncSession,
+    user_id: str,
+    default_goal: OptimizationGoalEnum,
+    wallet_cards: List[Dict],
+    records: AsyncIterator[Tuple[int, object]],
+    batch_size: int = DEFAULT_BATCH_SIZE
+) -> Dict:
+    """
+    Score and insert streamed records in batches.
+
+    Args:
+        db: Async database session
+        user_id: Owner of the imported transactions
+        default_goal: Goal used for rows without an optimization_goal
+        wallet_cards: The user's cards (async_crud.get_user_cards_with_details)
+        records: (line number, record) pairs from iter_records
+        batch_size: Rows per insert / database transaction
+
+    Returns:
+        Import report with row counts, throughput and per-row errors
+    """
+    scorer = RewardsScorer(wallet_cards)
+    started = time.perf_counter()
+    received = imported = failed = batches = 0
+    errors = []
+    batch, batch_lines = [], []
+
+    def record_error(line_number: int, message: str):
+        nonlocal failed
+        failed += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({"line": line_number, "error": message})
+
+    async def flush():
+        nonlocal imported, batches
+        if not batch:
+            return
+        try:
+            imported += await async_crud.bulk_create_transactions(db, batch)
+            batches += 1
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Import batch failed for user {user_id}: {e}")
+            for line_number in batch_lines:
+                record_error(line_number, f"Batch insert failed: {e}")
+        batch.clear()
+        batch_lines.clear()
+
+    async for line_number, record in records:
+        received += 1
+        if isinstance(record, Exception):
+            record_error(line_number, str(record))
+            continue
+        try:
+            batch.append(build_transaction_row(record, user_id, default_goal, scorer))
+            batch_lines.append(line_number)
+        except ValueError as e:
+            record_error(line_number, str(e))
+            continue
+        if len(batch) >= batch_size:
+            await flush()
+    await flush()
+
+    elapsed = time.perf_counter() - started
+    logger.info(f"Imported {imported}/{received} transactions for user {user_id}", extra={
+        'event': 'transactions_imported',
+        'user_id': user_id,
+        'rows_imported': imported,
+        'rows_failed': failed,
+        'duration_seconds': round(elapsed, 3)
+    })
+
+    return {
+        "user_id": user_id,
+        "rows_received": received,
+        "rows_imported": imported,
+        "rows_failed": failed,
+        "batches": batches,
+        "elapsed_seconds": round(elapsed, 3),
+        "rows_per_second": round(imported / elapsed, 1) if elapsed > 0 else 0.0,
+        "errors": errors,
+        "errors_truncated": failed > len(errors),
+    }
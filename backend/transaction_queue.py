@@ -0,0 +1,530 @@
+"""
+Write-Behind Transaction Queue
+Optional ingestion mode for POST /api/v1/transactions: validated transactions
+are journaled and queued in memory, the endpoint answers 202 with the
+generated transaction_id, and a background flusher batch-inserts the queue
+(crud.bulk_create_transactions) every TRANSACTION_FLUSH_INTERVAL_MS or as soon
+as TRANSACTION_FLUSH_MAX_ROWS rows are waiting.
+
+- Bounded: enqueue raises QueueFullError beyond TRANSACTION_QUEUE_MAX_SIZE
+  (the endpoint answers 503 so clients back off)
+- Durable: every row is appended (and fsynced) to a local JSONL journal before
+  it is acknowledged; flushed batches are marked done, and rows not marked done
+  are replayed on the next start. Replayed rows already in the database are
+  skipped, so a crash between commit and marking done doesn't duplicate them.
+- One journal per process (transaction_journal.<pid>.jsonl next to
+  TRANSACTION_JOURNAL_PATH), locked for the process's lifetime and truncated
+  whenever its queue drains. On start, a worker takes over the journals whose
+  lock is free (their process died): their pending rows are copied into its
+  own journal and the orphaned file is deleted.
+- A batch failing TRANSACTION_FLUSH_MAX_ATTEMPTS times in a row (connection
+  errors aside) is retried one row at a time; rows that still fail are moved
+  to TRANSACTION_DEAD_LETTER_PATH so the rest of the queue keeps flowing
+- Graceful shutdown drains the queue before the connection pools close
+
+Enabled with TRANSACTION_WRITE_BEHIND=true; otherwise the endpoint inserts
+synchronously as before. Queued transactions show up in history, analytics
+and behavior once flushed.
+"""
+
+import asyncio
+import fcntl
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.exc import DisconnectionError, InterfaceError, TimeoutError as PoolTimeoutError
+
+import async_crud
+from logging_config import get_logger
+from metrics import (
+    TRANSACTION_QUEUE_DEPTH,
+    TRANSACTION_QUEUE_REJECTED_TOTAL,
+    TRANSACTION_FLUSH_SIZE,
+    TRANSACTION_FLUSH_LAG,
+    TRANSACTION_FLUSH_FAILURES_TOTAL,
+    TRANSACTION_DEAD_LETTERED_TOTAL
+)
+from models import Transaction, CategoryEnum, OptimizationGoalEnum
+
+logger = get_logger("transaction_queue")
+
+WRITE_BEHIND_ENABLED = os.getenv("TRANSACTION_WRITE_BEHIND", "false").lower() == "true"
+MAX_SIZE = int(os.getenv("TRANSACTION_QUEUE_MAX_SIZE", "10000"))
+FLUSH_INTERVAL_MS = int(os.getenv("TRANSACTION_FLUSH_INTERVAL_MS", "200"))
+FLUSH_MAX_ROWS = int(os.getenv("TRANSACTION_FLUSH_MAX_ROWS", "500"))
+JOURNAL_PATH = os.getenv("TRANSACTION_JOURNAL_PATH", "./transaction_journal.jsonl")
+DEAD_LETTER_PATH = os.getenv("TRANSACTION_DEAD_LETTER_PATH", "./transaction_dead_letter.jsonl")
+FLUSH_MAX_ATTEMPTS = int(os.getenv("TRANSACTION_FLUSH_MAX_ATTEMPTS", "5"))
+
+# How long shutdown keeps retrying to drain the queue; the rest is replayed on next start
+DRAIN_TIMEOUT_SECONDS = 10.0
+
+# Columns stored as enums / datetimes (JSON holds their values / ISO strings)
+ENUM_COLUMNS = {"category": CategoryEnum, "optimization_goal": OptimizationGoalEnum}
+DATETIME_COLUMNS = ("transaction_date",)
+
+
+# Failures that say nothing about the rows (the database is unreachable);
+# they don't count towards FLUSH_MAX_ATTEMPTS
+TRANSIENT_ERRORS = (DisconnectionError, InterfaceError, PoolTimeoutError, ConnectionError, asyncio.TimeoutError)
+
+
+class QueueFullError(Exception):
+    """The write-behind queue is at TRANSACTION_QUEUE_MAX_SIZE"""
+
+
+def is_transient(error: Exception) -> bool:
+    """Whether a flush failure is a connection problem rather than bad rows"""
+    return isinstance(error, TRANSIENT_ERRORS) or getattr(error, "connection_invalidated", False)
+
+
+def encode_row(row: Dict) -> Dict:
+    """Transaction column values -> JSON-safe values"""
+    encoded = dict(row)
+    for column in ENUM_COLUMNS:
+        if encoded.get(column) is not None:
+            encoded[column] = encoded[column].value
+    for column in DATETIME_COLUMNS:
+        if encoded.get(column) is not None:
+            encoded[column] = encoded[column].isoformat()
+    return encoded
+
+
+def decode_row(encoded: Dict) -> Dict:
+    """Inverse of encode_row"""
+    row = dict(encoded)
+    for column, enum_class in ENUM_COLUMNS.items():
+        if row.get(column) is not None:
+            row[column] = enum_class(row[column])
+    for column in DATETIME_COLUMNS:
+        if row.get(column) is not None:
+            row[column] = datetime.fromisoformat(row[column])
+    return row
+
+
+class TransactionQueue:
+    """Bounded, journaled in-process queue with a batching background flusher"""
+
+    def __init__(
+        self,
+        journal_path: str = JOURNAL_PATH,
+        max_size: int = MAX_SIZE,
+        flush_interval_ms: int = FLUSH_INTERVAL_MS,
+        flush_max_rows: int = FLUSH_MAX_ROWS,
+        enabled: bool = WRITE_BEHIND_ENABLED,
+        dead_letter_path: str = DEAD_LETTER_PATH,
+        flush_max_attempts: int = FLUSH_MAX_ATTEMPTS,
+        worker_id: Optional[str] = None
+    ):
+        """
+        Args:
+            journal_path: Base journal path; this process writes
+                <stem>.<worker_id><ext> next to it
+            worker_id: Names this process's journal (default: the pid)
+        """
+        self.journal_path = journal_path
+        stem, extension = os.path.splitext(journal_path)
+        self.path = f"{stem}.{worker_id or os.getpid()}{extension}"
+        self._journal_name = re.compile(
+            rf"^{re.escape(os.path.basename(stem))}(\.[\w-]+)?{re.escape(extension)}$"
+        )
+        self.dead_letter_path = dead_letter_path
+        self.max_size = max_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.flush_max_rows = flush_max_rows
+        self.flush_max_attempts = flush_max_attempts
+        self.enabled = enabled
+        self._rows: Deque[Tuple[float, Dict]] = deque()  # (enqueued at, monotonic), row
+        self._replayed_ids: Set[str] = set()
+        self._failures = 0  # Consecutive failures of the batch at the head of the queue
+        self._journal = None
+        self._journal_lock = threading.Lock()
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._session_factory: Optional[Callable] = None
+        self._shard_of: Optional[Callable] = None
+
+    # ------------------------------------------------------------------
+    # Journal
+    # ------------------------------------------------------------------
+
+    def _open_journal(self) -> None:
+        """Open this process's journal and hold its lock until stop()"""
+        if self._journal is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            journal = open(self.path, "a", encoding="utf-8")
+            try:
+                fcntl.flock(journal.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                journal.close()
+                raise RuntimeError(f"Transaction journal {self.path} is in use by another queue")
+            self._journal = journal
+
+    def _append(self, record: Dict) -> None:
+        """Append one record and fsync (journal lock held)"""
+        self._open_journal()
+        self._journal.write(json.dumps(record) + "\n")
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+
+    def _read_pending(self, path: Optional[str] = None) -> List[Dict]:
+        """Rows in a journal (default: this process's) that were never marked done"""
+        path = path or self.path
+        if not os.path.exists(path):
+            return []
+        rows, done = {}, set()
+        with open(path, encoding="utf-8") as journal:
+            for line in journal:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn final write from a crash
+                if "row" in record:
+                    rows[record["row"]["transaction_id"]] = record["row"]
+                else:
+                    done.update(record.get("done", ()))
+        return [decode_row(row) for transaction_id, row in rows.items() if transaction_id not in done]
+
+    def _orphaned_journals(self) -> List[str]:
+        """Other journals in the directory (including a pre-per-process shared one)"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        own = os.path.basename(self.path)
+        return sorted(
+            os.path.join(directory, name) for name in os.listdir(directory)
+            if name != own and self._journal_name.match(name)
+        )
+
+    def _adopt_orphaned_journals(self) -> int:
+        """
+        Copy the pending rows of journals whose process died into this
+        process's journal, then delete them. A journal whose lock is held
+        belongs to a live worker and is left alone.
+
+        Returns:
+            Number of rows adopted
+        """
+        adopted = 0
+        for path in self._orphaned_journals():
+            try:
+                orphan = open(path, "a", encoding="utf-8")
+            except FileNotFoundError:
+                continue
+            with orphan:
+                try:
+                    fcntl.flock(orphan.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+                try:
+                    if os.stat(path).st_ino != os.fstat(orphan.fileno()).st_ino:
+                        continue  # Adopted and deleted by another worker meanwhile
+                except FileNotFoundError:
+                    continue
+                rows = self._read_pending(path)
+                with self._journal_lock:
+                    for row in rows:
+                        self._append({"row": encode_row(row)})
+                # Only deleted once its rows are fsynced in this journal
+                os.unlink(path)
+            adopted += len(rows)
+            logger.info("Adopted orphaned transaction journal", extra={
+                'event': 'transaction_journal_adopted',
+                'journal': path,
+                'rows': len(rows)
+            })
+        return adopted
+
+    def _dead_letter(self, row: Dict, error: Exception) -> None:
+        """Append a row that can't be inserted to the dead-letter file (shared by all workers)"""
+        record = {"row": encode_row(row), "error": str(error), "failed_at": datetime.utcnow().isoformat()}
+        directory = os.path.dirname(os.path.abspath(self.dead_letter_path))
+        os.makedirs(directory, exist_ok=True)
+        with open(self.dead_letter_path, "a", encoding="utf-8") as dead_letters:
+            fcntl.flock(dead_letters.fileno(), fcntl.LOCK_EX)
+            dead_letters.write(json.dumps(record) + "\n")
+            dead_letters.flush()
+            os.fsync(dead_letters.fileno())
+        TRANSACTION_DEAD_LETTERED_TOTAL.inc()
+        logger.error("Transaction moved to the dead-letter file", extra={
+            'event': 'transaction_dead_lettered',
+            'transaction_id': row["transaction_id"],
+            'error': str(error)
+        })
+
+    # ------------------------------------------------------------------
+    # Queue
+    # ------------------------------------------------------------------
+
+    @property
+    def depth(self) -> int:
+        return len(self._rows)
+
+    def enqueue(self, values: Dict) -> Dict:
+        """
+        Journal and queue one validated transaction
+
+        Thread-safe; the journal fsync blocks, so async callers run this in
+        the threadpool.
+
+        Args:
+            values: Transaction column values (as for crud.create_transaction)
+
+        Returns:
+            The queued row, with transaction_id, transaction_date and
+            used_recommended_card filled in
+
+        Raises:
+            QueueFullError: The queue is at max_size
+        """
+        row = dict(values)
+        row.setdefault("transaction_id", f"txn_{uuid.uuid4().hex[:12]}")
+        if row.get("transaction_date") is None:
+            row["transaction_date"] = datetime.utcnow()
+        if row.get("recommended_card_id") and row.get("card_id"):
+            row["used_recommended_card"] = row["card_id"] == row["recommended_card_id"]
+        else:
+            # Same keys on every row so a batch is a single executemany
+            row.setdefault("used_recommended_card", None)
+
+        with self._journal_lock:
+            if len(self._rows) >= self.max_size:
+                TRANSACTION_QUEUE_REJECTED_TOTAL.inc()
+                raise QueueFullError(f"Transaction queue is full ({self.max_size} rows)")
+            self._append({"row": encode_row(row)})
+            self._rows.append((time.monotonic(), row))
+            TRANSACTION_QUEUE_DEPTH.set(len(self._rows))
+
+        if len(self._rows) >= self.flush_max_rows and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        return row
+
+    async def _drop_already_inserted(self, session, rows: List[Dict]) -> List[Dict]:
+        """Skip replayed rows whose batch committed before the crash"""
+        replayed = [row["transaction_id"] for row in rows if row["transaction_id"] in self._replayed_ids]
+        if not replayed:
+            return rows
+        result = await session.execute(
+            select(Transaction.transaction_id).where(Transaction.transaction_id.in_(replayed))
+        )
+        existing = set(result.scalars().all())
+        return [row for row in rows if row["transaction_id"] not in existing]
+
+    async def _insert(self, rows: List[Dict]) -> int:
+        """
+        Insert rows, one session per shard
+
+        Returns:
+            Number of rows inserted (replayed rows already in the database are skipped)
+        """
+        committed = []
+        try:
+            for shard_rows in self._group_by_shard(rows):
+                async with self._open_session(shard_rows[0]["user_id"]) as session:
+                    new_rows = await self._drop_already_inserted(session, shard_rows)
+                    if new_rows:
+                        await async_crud.bulk_create_transactions(session, new_rows)
+                self._replayed_ids.difference_update(row["transaction_id"] for row in shard_rows)
+                committed.extend(new_rows)
+        except Exception:
+            # Rows already committed on other shards are skipped when the batch is retried
+            self._replayed_ids.update(row["transaction_id"] for row in committed)
+            raise
+        return len(committed)
+
+    async def _insert_one_by_one(self, rows: List[Dict]) -> Tuple[int, int]:
+        """
+        Insert the rows of a batch that keeps failing one at a time, moving
+        the rows that fail to the dead-letter file. Stops at a connection error.
+
+        Returns:
+            (rows processed from the start of the batch, rows inserted)
+        """
+        processed = inserted = 0
+        for row in rows:
+            try:
+                inserted += await self._insert([row])
+            except Exception as e:
+                if is_transient(e):
+                    break
+                self._dead_letter(row, e)
+            processed += 1
+        return processed, inserted
+
+    def _mark_done(self, batch: List[Tuple[float, Dict]]) -> None:
+        """Drop flushed (or dead-lettered) rows from the head of the queue"""
+        with self._journal_lock:
+            for _ in batch:
+                self._rows.popleft()
+            self._append({"done": [row["transaction_id"] for _, row in batch]})
+            if not self._rows:
+                # Everything journaled is in the database: start a fresh journal
+                # (only this process writes to it)
+                self._journal.truncate(0)
+            TRANSACTION_QUEUE_DEPTH.set(len(self._rows))
+
+    async def flush(self) -> int:
+        """
+        Insert queued rows in batches of flush_max_rows until the queue is empty
+
+        Returns:
+            Number of rows inserted (a failed batch stays queued for the next
+            flush, until it has failed flush_max_attempts times)
+        """
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        inserted = 0
+        async with self._flush_lock:
+            while self._rows:
+                batch = [self._rows[i] for i in range(min(self.flush_max_rows, len(self._rows)))]
+                rows = [dict(row) for _, row in batch]
+                try:
+                    inserted += await self._insert(rows)
+                except Exception as e:
+                    TRANSACTION_FLUSH_FAILURES_TOTAL.inc()
+                    if not is_transient(e):
+                        self._failures += 1
+                    if self._failures < self.flush_max_attempts:
+                        logger.error(f"Transaction flush failed, will retry: {e}", extra={
+                            'event': 'transaction_flush_failed',
+                            'rows': len(batch),
+                            'attempts': self._failures
+                        })
+                        break
+                    logger.error(f"Transaction flush failed {self._failures} times, inserting rows one by one: {e}", extra={
+                        'event': 'transaction_flush_isolating',
+                        'rows': len(batch)
+                    })
+                    processed, isolated = await self._insert_one_by_one(rows)
+                    inserted += isolated
+                    if processed < len(batch):
+                        # Connection lost part-way: the processed rows are done, retry the rest later
+                        if processed:
+                            self._mark_done(batch[:processed])
+                        break
+                self._failures = 0
+                self._mark_done(batch)
+
+                TRANSACTION_FLUSH_SIZE.observe(len(batch))
+                TRANSACTION_FLUSH_LAG.observe(time.monotonic() - batch[0][0])
+        return inserted
+
+    def _group_by_shard(self, rows: List[Dict]) -> List[List[Dict]]:
+        """Split a batch into one list of rows per user shard (a single list when unsharded)"""
+        if self._shard_of is None:
+            return [rows]
+        groups: Dict[int, List[Dict]] = {}
+        for row in rows:
+            groups.setdefault(self._shard_of(row["user_id"]), []).append(row)
+        return list(groups.values())
+
+    def _open_session(self, user_id: str):
+        """A session on user_id's shard (the single session_factory when unsharded)"""
+        if self._shard_of is None:
+            return self._session_factory()
+        return self._session_factory(user_id)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._rows:
+                await self.flush()
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    async def start(self, session_factory: Callable, shard_of: Optional[Callable] = None) -> int:
+        """
+        Replay unflushed journal rows and start the background flusher
+
+        Args:
+            session_factory: Returns a new AsyncSession (database.get_async_session),
+                or with shard_of, the session for a user_id (database.get_async_shard_session)
+            shard_of: Maps a user_id to its shard index, to insert each shard's rows
+                in their own session; None when unsharded
+
+        Returns:
+            Number of rows replayed from this process's journal and orphaned ones
+        """
+        self._session_factory = session_factory
+        self._shard_of = shard_of
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+
+        with self._journal_lock:
+            self._open_journal()
+        self._adopt_orphaned_journals()
+        pending = self._read_pending()
+        with self._journal_lock:
+            for row in pending:
+                self._rows.append((time.monotonic(), row))
+                self._replayed_ids.add(row["transaction_id"])
+            TRANSACTION_QUEUE_DEPTH.set(len(self._rows))
+        if pending:
+            logger.info("Replaying journaled transactions", extra={
+                'event': 'transaction_journal_replay',
+                'rows': len(pending)
+            })
+
+        self._task = asyncio.create_task(self._run())
+        return len(pending)
+
+    async def stop(self) -> int:
+        """
+        Stop the flusher and drain the queue
+
+        Returns:
+            Number of rows left queued (still journaled; adopted by the next worker to start)
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._loop = None
+
+        deadline = time.monotonic() + DRAIN_TIMEOUT_SECONDS
+        while self._rows and self._session_factory is not None and time.monotonic() < deadline:
+            if not await self.flush():
+                await asyncio.sleep(min(self.flush_interval, 1.0))
+
+        with self._journal_lock:
+            if self._journal is not None:
+                if not self._rows:
+                    # Nothing pending: don't leave an empty journal per past pid behind
+                    os.unlink(self.path)
+                self._journal.close()
+                self._journal = None
+        if self._rows:
+            logger.warning("Transaction queue not fully drained", extra={
+                'event': 'transaction_queue_not_drained',
+                'rows': len(self._rows)
+            })
+        return len(self._rows)
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "depth": len(self._rows),
+            "max_size": self.max_size,
+        }
+
+
+transaction_queue = TransactionQueue()
@@ -184,7 +184,7 @@ export default function CardsScreen() {
           style: 'destructive',
           onPress: async () => {
             try {
-              await API.deleteWalletCard(card.userCardId, true); // Hard delete
+              await API.deleteWalletCard(userId, card.userCardId, true); // Hard delete
               await fetchWalletCards();
               Alert.alert('Removed', 'Card removed from wallet');
             } catch (error) {
@@ -195,7 +195,7 @@ export default function CardsScreen() {
         },
       ]
     );
-  }, [fetchWalletCards]);
+  }, [userId, fetchWalletCards]);
 
   // Filter library cards
   const filteredLibraryCards = useMemo(() => {
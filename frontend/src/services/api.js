@@ -95,20 +95,25 @@ export const API = {
     return await apiClient.post(`/users/${userId}/wallet/cards`, cardData);
   },
 
-  updateWalletCard: async (userCardId, updateData) => {
+  // user_id picks the database shard holding the wallet (required by the API)
+  updateWalletCard: async (userId, userCardId, updateData) => {
     console.log('🔧 API.updateWalletCard called for card:', userCardId);
-    return await apiClient.put(`/wallet/cards/${userCardId}`, updateData);
+    return await apiClient.put(`/wallet/cards/${userCardId}`, updateData, {
+      params: { user_id: userId }
+    });
   },
 
-  deleteWalletCard: async (userCardId, permanent = false) => {
+  deleteWalletCard: async (userId, userCardId, permanent = false) => {
     console.log('🔧 API.deleteWalletCard called for card:', userCardId);
     return await apiClient.delete(`/wallet/cards/${userCardId}`, {
-      params: { permanent }
+      params: { user_id: userId, permanent }
     });
   },
 
-  getWalletCardDetails: async (userCardId) => {
-    return await apiClient.get(`/wallet/cards/${userCardId}`);
+  getWalletCardDetails: async (userId, userCardId) => {
+    return await apiClient.get(`/wallet/cards/${userCardId}`, {
+      params: { user_id: userId }
+    });
   },
 
   // Card Library endpoints